@@ -5,17 +5,26 @@ import json
 import base64
 import gspread
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import traceback
 import re
 import time
+import asyncio
+import threading
+import hashlib
+import itertools
+import contextvars
+from contextlib import contextmanager
 from fpdf import FPDF
 from datetime import datetime
 from dotenv import load_dotenv
+from email.utils import make_msgid
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from oauth2client.service_account import ServiceAccountCredentials
@@ -23,9 +32,28 @@ from langchain.agents import Tool, initialize_agent, AgentType
 from langchain_groq import ChatGroq
 from langchain.prompts import StringPromptTemplate, ChatPromptTemplate
 from typing import List
-from tenacity import retry, stop_after_attempt, wait_exponential, RetryError
+from artifact_store import LocalArtifactStore, get_artifact_store, maybe_apply_retention
+from prompt_compaction import compact_frame, compact_timeline, monthly_periods
+from financial_metrics import compute_financial_metrics, metrics_to_dict
+from sheet_schemas import parse_sheet, discover_year_columns, parse_numeric_frame
+from sheet_cache import cache_from_env
+from sheet_streaming import SheetStream, chunk_rows_from_env
+from records import RecordTable, SalaryRecord, BudgetRecord, InventoryRecord, ForecastRecord
+from run_data_store import RunDataStore, observation, clamp_observation
+from tenants import current_tenant, tenant_scope, TenantLocal, ClientPool
+from instrumentation import instrument, span, flush_metrics, record_payload
+from llm_metering import LLMMeter
+from async_clients import AsyncSheetsClient, AsyncGmailClient, gather_limited
+import resilience
+import side_effects
+import jsonschema
+from model_registry import ModelRegistry
+from checkpoints import checkpoint_log_from_env, message_id_for
+from invoice_ageing import ageing_frame, reminder_targets
+from reminder_history import reminder_history_from_env, cadence_from_env, invoice_fingerprint
+from ledger_aggregates import LedgerSpec, ledger_from_env
+from inventory_forecast import forecast_frame, forecast_summary, needs_reorder, forecast_policy_from_env
 from dotenv import load_dotenv
-from langchain.chains import LLMChain
 from langchain.schema import AgentFinish
 from langchain_groq import ChatGroq
 from typing import List
@@ -33,24 +61,217 @@ from typing import List
 # ---------- Load Environment ----------
 load_dotenv()
 CLIENT_SECRETS_FILE = 'client_secret.json'
-SCOPES = ['https://www.googleapis.com/auth/gmail.send']
+# gmail.readonly lets a resumed or retried send look its Message-ID up instead of sending twice
+SCOPES = ['https://www.googleapis.com/auth/gmail.send', 'https://www.googleapis.com/auth/gmail.readonly']
+# The browser consent flow needs a person at the keyboard; the CLI and HTTP service turn it off
+INTERACTIVE_AUTH = os.getenv("GMAIL_INTERACTIVE_AUTH", "1") != "0"
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-SPREADSHEET_NAME = "Invoices"
-SENDER_EMAIL = "syedaliahmed171@gmail.com"
 
 BATCH_SIZE = 5  # Used in all batch operations
+ASYNC_CONCURRENCY = int(os.getenv("ASYNC_CONCURRENCY", "10"))  # In-flight sends/LLM calls per async tool
+# Max tokens of tabular data embedded per report prompt (llama3 context is 8192)
+PROMPT_DATA_TOKEN_BUDGET = int(os.getenv("PROMPT_DATA_TOKEN_BUDGET", "1500"))
+
+# ---------- Tenants ----------
+# Workbook, sender, credentials and quotas come from the current tenant (see
+# tenants.py); without a TENANTS_FILE there is one "default" tenant using the
+# SPREADSHEET_NAME / SENDER_EMAIL / APPROVER_EMAIL environment.
+def sender_email():
+    return current_tenant().sender
+
+def approver_email():
+    return current_tenant().approver
+
+def tenant_path(*parts):
+    """Working-file path for the current tenant (unchanged for the default tenant,
+    under the capture directory while side effects are captured)"""
+    path = current_tenant().path(*parts)
+    current = side_effects.active()
+    return current.sink.workspace_path(path) if current is not None else path
+
+# ---------- Business Date ----------
+# Period-defining dates (payslip month, reminder day, approval day, report year)
+# come from business_date(), so a scheduled backfill can run "as of" a past date.
+# The annual report covers the year before it (see annual_report_year()).
+_business_date = contextvars.ContextVar("business_date", default=None)
+
+def business_date():
+    return _business_date.get() or datetime.now()
+
+@contextmanager
+def as_of(moment):
+    """Run the block with business_date() == moment (a datetime; None keeps the real clock)"""
+    token = _business_date.set(moment)
+    try:
+        yield moment
+    finally:
+        _business_date.reset(token)
+
+# ---------- Procurement State ----------
+class ProcurementState:
+    def __init__(self, tenant=None):
+        self.data = None
+        self.budget_results = None
+        self.inventory_results = None
+        self.forecast_results = None  # RecordTable of ForecastRecord: usage, stockout dates, reorder plan
+        self.approval_results = {'auto_approved': [], 'needs_approval': []}
+        self.po_totals = None  # {view: frame} from PO_LEDGER, for the report's vendor and trend sections
+
+procurement = TenantLocal(ProcurementState)  # One per tenant, so tenants can run in parallel
+
+# ---------- Artifact Store ----------
+# Generated PDFs/charts are written locally first, then published to the shared
+# store (local dir or S3-compatible bucket) so any worker node can send them.
+# While side effects are captured, both go under the capture directory instead.
+artifact_store = side_effects.CaptureLocal(
+    "artifact_store", get_artifact_store(), lambda sink, tenant: LocalArtifactStore(sink.artifact_root))
+
+def publish_artifact(path):
+    """Copy a locally generated file into the artifact store"""
+    try:
+        side_effects.perform("artifact.put", path, lambda: artifact_store.put_file(path),
+                             captured=lambda: artifact_store.put_file(path), bytes=os.path.getsize(path))
+    except Exception as e:
+        print(f"Failed to publish artifact {path}: {str(e)}")
 
-# ---------- Global State ----------
-GLOBAL_BUDGET_RESULTS = None
-GLOBAL_INVENTORY_RESULTS = None
-GLOBAL_PROCUREMENT_DATA = None
+def apply_artifact_retention():
+    """maybe_apply_retention() whose deletes a dry or shadow run records instead of running"""
+    store = artifact_store.target()
+    return maybe_apply_retention(store, via=lambda apply, days: side_effects.perform(
+        "artifact.retention", type(store).__name__, apply, max_age_days=days))
+
+def ensure_local_artifact(path):
+    """Make sure a file exists locally, pulling it from the artifact store if needed"""
+    if os.path.exists(path):
+        return True
+    try:
+        artifact_store.fetch(path, path)
+        return True
+    except FileNotFoundError:
+        return False
 
 # ---------- Google Sheets Client ----------
-def get_gsheet_client():
+# Per-tenant clients (credentials, gspread client, opened spreadsheet, Gmail service)
+# are built once and reused for the life of the process
+tenant_clients = ClientPool()
+
+def _authorize_gspread(tenant):
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", scope)
+    creds = ServiceAccountCredentials.from_json_keyfile_name(tenant.service_account_file, scope)
     return gspread.authorize(creds)
 
+def _open_tenant_spreadsheet(tenant):
+    client = tenant_clients.get("gspread", tenant)
+    if tenant.spreadsheet_id:
+        return resilience.call("sheets", client.open_by_key, tenant.spreadsheet_id)
+    return resilience.call("sheets", client.open, tenant.spreadsheet_name)  # Drive name lookup
+
+tenant_clients.register("gspread", _authorize_gspread)
+tenant_clients.register("spreadsheet", _open_tenant_spreadsheet)
+
+def get_gsheet_client():
+    return tenant_clients.get("gspread")
+
+def open_spreadsheet():
+    """The current tenant's spreadsheet, opened once (by ID when configured)"""
+    return tenant_clients.get("spreadsheet")
+
+# ---------- Sheet Snapshot Cache ----------
+# Worksheets are served from local snapshots until the spreadsheet's Drive
+# modifiedTime changes. Set FORCE_SHEET_REFRESH=1 to always read live.
+sheet_cache = cache_from_env(
+    call=lambda fn, *args: resilience.call("sheets", fn, *args),
+    acall=lambda fn, *args: resilience.acall("sheets", fn, *args),
+)
+FORCE_SHEET_REFRESH = os.getenv("FORCE_SHEET_REFRESH", "0") == "1"
+
+@instrument("sheets")
+def get_sheet_records(worksheet_name, force_refresh=False):
+    """get_all_records() for a worksheet, via the snapshot cache"""
+    return sheet_cache.get_records(
+        current_tenant().spreadsheet_key,
+        worksheet_name,
+        open_spreadsheet=open_spreadsheet,
+        force_refresh=force_refresh or FORCE_SHEET_REFRESH,
+    )
+
+# Async path: same snapshot cache, live reads over httpx instead of gspread
+async_sheets = TenantLocal(lambda t: AsyncSheetsClient(t.spreadsheet_name, t.service_account_file,
+                                                       spreadsheet_id=t.spreadsheet_id))
+
+@instrument("sheets")
+async def aget_sheet_records(worksheet_name, force_refresh=False):
+    """Async get_sheet_records()"""
+    return await sheet_cache.aget_records(
+        current_tenant().spreadsheet_key,
+        worksheet_name,
+        async_sheets,
+        force_refresh=force_refresh or FORCE_SHEET_REFRESH,
+    )
+
+async def aget_sheets(*worksheet_names):
+    """{worksheet: records}, reading all worksheets concurrently"""
+    records = await asyncio.gather(*(aget_sheet_records(name) for name in worksheet_names))
+    return dict(zip(worksheet_names, records))
+
+# ---------- Streaming Reads ----------
+# Large tabs (Spend, Employees, Attendance) are read live in A1-range pages and
+# folded as the pages arrive, instead of materializing get_all_records().
+SHEET_STREAM_CHUNK_ROWS = chunk_rows_from_env()
+
+def stream_sheet(worksheet_name, columns=None, chunk_rows=None):
+    """SheetStream over a worksheet; every page request goes through the sheets resilience policy"""
+    worksheet = resilience.call("sheets", open_spreadsheet().worksheet, worksheet_name)
+    return SheetStream(worksheet, chunk_rows or SHEET_STREAM_CHUNK_ROWS, columns=columns,
+                       call=lambda fn, *args: resilience.call("sheets", fn, *args))
+
+def read_sheet_frame(worksheet_name):
+    """Whole worksheet as one typed frame, built page by page (no per-row dicts)"""
+    frames = list(stream_sheet(worksheet_name).frames(worksheet_name))
+    return pd.concat(frames) if frames else parse_sheet(worksheet_name, [])
+
+# ---------- Incremental Ledger Totals ----------
+# Spend and PO's are append-only: their category/vendor/month totals live in a
+# per-tenant store and each run reads only the rows appended since the last one,
+# recomputing in full when earlier rows were edited (see ledger_aggregates.py).
+ledger = TenantLocal(lambda tenant: ledger_from_env(tenant.state_path))
+
+def with_month(frame):
+    return frame.assign(Month=monthly_periods(frame["Date"]))
+
+SPEND_LEDGER = LedgerSpec("spend", "Spend", ["Category", "Amount Spent"], {
+    "by_category": (["Category"], {"Amount Spent": ("Amount Spent", "sum")}),
+})
+PO_LEDGER = LedgerSpec("purchase_orders", "PO's", ["Date", "Item", "Vendor", "Category", "Qty", "Price"], {
+    "by_vendor": (["Vendor"], {"Price_count": ("Price", "count"), "Price_sum": ("Price", "sum"),
+                               "Qty_sum": ("Qty", "sum")}),
+    "by_category_month": (["Category", "Month"], {"Price": ("Price", "sum"), "Qty": ("Qty", "sum")}),
+}, derive=with_month)
+
+def spreadsheet_modified_time():
+    """Drive modifiedTime of the tenant's spreadsheet, or None when it cannot be read"""
+    try:
+        return resilience.call("sheets", open_spreadsheet().get_lastUpdateTime)
+    except Exception as e:
+        print(f"[ledger] Could not read the spreadsheet's modifiedTime: {e}")
+        return None
+
+def ledger_totals(spec):
+    """{view: totals frame} for a ledger, after folding in the rows appended since the last run"""
+    ledger.sync(spec, stream_sheet(spec.sheet, columns=spec.columns), modified_time=spreadsheet_modified_time())
+    return {view: ledger.totals(spec, view) for view in spec.views}
+
+@instrument("sheets")
+def spend_by_category():
+    """{category: total Amount Spent} over the Spend tab, folded in incrementally"""
+    totals = ledger_totals(SPEND_LEDGER)["by_category"]
+    return dict(zip(totals["Category"], totals["Amount Spent"]))
+
+@instrument("sheets")
+def po_totals():
+    """Vendor and category/month totals over the PO's tab, folded in incrementally"""
+    return ledger_totals(PO_LEDGER)
+
 
 # ----------Streamlit--------
 from langchain.callbacks.base import BaseCallbackHandler
@@ -68,247 +289,467 @@ class StreamCaptureHandler(BaseCallbackHandler):
     def reset(self):
         self.logs = []
 
+class AgentTraceHandler(BaseCallbackHandler):
+    """Per-run ReAct trace (Thought/Action/Observation/Final Answer lines) without redirecting stdout"""
+    def __init__(self):
+        self.lines = []
+
+    def on_agent_action(self, action, **kwargs):
+        self.lines.append(action.log.strip())
+
+    def on_tool_end(self, output, **kwargs):
+        self.lines.append(f"Observation: {output}")
+
+    def on_agent_finish(self, finish, **kwargs):
+        self.lines.append(finish.log.strip())
+
+    def get_trace(self):
+        return "\n".join(self.lines)
+
 
 
 # ---------- Gmail Auth ----------
-def get_gmail_credentials():
+def get_gmail_credentials(tenant=None):
+    token_file = (tenant or current_tenant()).gmail_token_file
     creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+    if os.path.exists(token_file):
+        creds = Credentials.from_authorized_user_file(token_file)
+        if creds.scopes and not creds.has_scopes(SCOPES):
+            if INTERACTIVE_AUTH:
+                creds = None  # Token predates the read scope: ask for consent again
+            else:
+                print(f"[gmail] {token_file} lacks {', '.join(set(SCOPES) - set(creds.scopes))}; "
+                      "interrupted sends cannot be confirmed and are left pending")
+    if creds and not creds.valid and creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+        with open(token_file, 'w') as token:
+            token.write(creds.to_json())
     if not creds or not creds.valid:
+        if not INTERACTIVE_AUTH:
+            raise RuntimeError(f"No valid Gmail token in {token_file}; authorize once interactively first")
         flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
         creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
+        with open(token_file, 'w') as token:
             token.write(creds.to_json())
     return creds
 
+tenant_clients.register("gmail", lambda tenant: build('gmail', 'v1', credentials=get_gmail_credentials(tenant)))
+
+def gmail_service():
+    """The current tenant's Gmail API service (built once per tenant); None while sends are captured"""
+    if side_effects.active() is not None:
+        return None  # Dry runs need no Gmail token
+    return tenant_clients.get("gmail")
+
 # ---------- Utility ----------
 def batch_items(items, batch_size=BATCH_SIZE):
     for i in range(0, len(items), batch_size):
         yield items[i:i + batch_size]
 
 # ---------- Email Function ----------
-def send_email(subject, body, recipient):
+# messages.send is not idempotent: a send that timed out or got a 5xx may still
+# have been delivered. Every message carries a Message-ID, and each retry first
+# looks it up in the mailbox; a found message is returned instead of sent again.
+class UnconfirmedSendError(RuntimeError):
+    """An earlier attempt may have been delivered and the mailbox could not be checked"""
+
+    def __init__(self, message_id, error):
+        super().__init__(f"could not check whether {message_id} was already sent ({error}); left pending")
+        self.message_id = message_id
+
+def ensure_message_id(msg):
+    if not msg['Message-ID']:
+        msg['Message-ID'] = make_msgid(domain="finance-agent.local")
+    return msg['Message-ID']
+
+@instrument("gmail")
+def send_gmail_message(service, msg):
+    """Send a MIME message through the Gmail API, returning the API response"""
+    message_id = ensure_message_id(msg)
+    raw = msg.as_bytes()
+    record_payload(bytes_in=len(raw))
+    attempts = itertools.count(1)
+
+    def execute():
+        if next(attempts) > 1:
+            try:
+                gmail_id = find_sent_message(service, message_id)
+            except Exception as e:
+                raise UnconfirmedSendError(message_id, e) from e
+            if gmail_id:
+                return {"id": gmail_id, "deduplicated": True}
+        raw_msg = base64.urlsafe_b64encode(raw).decode()
+        return service.users().messages().send(userId="me", body={"raw": raw_msg}).execute()
+
+    return side_effects.perform("gmail.send", msg['To'], execute, via=lambda fn: resilience.call("gmail", fn),
+                                payload=raw, suffix=".eml", **message_detail(msg))
+
+# Async path: Gmail REST over httpx, same OAuth token as the sync client
+async_gmail = TenantLocal(lambda tenant: AsyncGmailClient(lambda: get_gmail_credentials(tenant)))
+
+@instrument("gmail")
+async def asend_gmail_message(msg):
+    """Async send_gmail_message()"""
+    message_id = ensure_message_id(msg)
+    raw = msg.as_bytes()
+    record_payload(bytes_in=len(raw))
+    attempts = itertools.count(1)
+
+    async def execute():
+        if next(attempts) > 1:
+            try:
+                gmail_id = await async_gmail.find_message(message_id)
+            except Exception as e:
+                raise UnconfirmedSendError(message_id, e) from e
+            if gmail_id:
+                return {"id": gmail_id, "deduplicated": True}
+        return await async_gmail.send(msg)
+
+    return await side_effects.aperform("gmail.send", msg['To'], execute,
+                                       via=lambda fn: resilience.acall("gmail", fn),
+                                       payload=raw, suffix=".eml", **message_detail(msg))
+
+def message_detail(msg):
+    """What a captured send records besides the .eml itself"""
+    return {"subject": msg['Subject'], "message_id": msg['Message-ID'],
+            "bcc": len([a for a in (msg['Bcc'] or "").split(",") if a.strip()]),
+            "attachments": [part.get_filename() for part in msg.walk() if part.get_filename()]}
+
+def build_email(subject, body, recipient):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email()
+    msg['To'] = recipient
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def send_email(subject, body, recipient, checkpoint=None):
+    """checkpoint=(run_id, unit) sends at most once per unit (see send_message_once)"""
+    try:
+        if checkpoint is not None:
+            send_message_once(*checkpoint, lambda: build_email(subject, body, recipient))
+            return True
+        service = gmail_service()
+        send_gmail_message(service, build_email(subject, body, recipient))
+        return True
+    except Exception as e:
+        print(f"Failed to send email: {str(e)}")
+        return False
+
+async def asend_email(subject, body, recipient, checkpoint=None):
     try:
-        creds = get_gmail_credentials()
-        service = build('gmail', 'v1', credentials=creds)
-
-        msg = MIMEMultipart()
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = recipient
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-
-        raw_msg = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-        service.users().messages().send(
-            userId="me",
-            body={"raw": raw_msg}
-        ).execute()
+        if checkpoint is not None:
+            await asend_message_once(*checkpoint, lambda: build_email(subject, body, recipient))
+            return True
+        await asend_gmail_message(build_email(subject, body, recipient))
         return True
     except Exception as e:
         print(f"Failed to send email: {str(e)}")
         return False
 
+# ---------- Checkpointed Sends ----------
+# Bulk sends record every delivered message in a durable checkpoint log, so a rerun
+# after a crash resumes where it stopped instead of emailing everyone again.
+# While side effects are captured, progress goes to a copy under the capture directory.
+checkpoints = side_effects.CaptureLocal(
+    "checkpoints", TenantLocal(lambda tenant: checkpoint_log_from_env(tenant.state_path)),
+    lambda sink, tenant: checkpoint_log_from_env(lambda path: sink.state_path(tenant.state_path(path), tenant)))
+
+def find_sent_message(service, message_id):
+    """Gmail id of an already sent message with this Message-ID header, or None"""
+    if service is None:
+        return None  # Captured sends never reach the mailbox
+    request = service.users().messages().list(userId="me", q=f"rfc822msgid:{message_id}", includeSpamTrash=True)
+    messages = resilience.call("gmail", request.execute).get("messages") or []
+    return messages[0]["id"] if messages else None
+
+def send_message_once(run_id, unit, build_message, service=None):
+    """Send build_message() unless (run_id, unit) is already done; returns True if sent now"""
+    if checkpoints.is_done(run_id, unit):
+        return False
+    message_id = message_id_for(run_id, unit)
+    service = service or gmail_service()
+
+    def send():
+        msg = build_message()
+        msg['Message-ID'] = message_id
+        response = send_gmail_message(service, msg)
+        return {"message_id": message_id, "gmail_id": response.get("id"), "to": msg['To']}
+
+    def confirm(pending):
+        try:
+            gmail_id = find_sent_message(service, message_id)
+        except Exception as e:
+            raise UnconfirmedSendError(message_id, e) from e
+        return {"message_id": message_id, "gmail_id": gmail_id, "confirmed": True} if gmail_id else None
+
+    return checkpoints.run_once(run_id, unit, send, confirm, message_id=message_id)
+
+async def asend_message_once(run_id, unit, build_message):
+    """Async send_message_once()"""
+    message_id = message_id_for(run_id, unit)
+
+    async def send():
+        msg = build_message()
+        msg['Message-ID'] = message_id
+        response = await asend_gmail_message(msg)
+        return {"message_id": message_id, "gmail_id": response.get("id"), "to": msg['To']}
+
+    async def confirm(pending):
+        if side_effects.active() is not None:
+            return None
+        try:
+            gmail_id = await resilience.acall("gmail", async_gmail.find_message, message_id)
+        except Exception as e:
+            raise UnconfirmedSendError(message_id, e) from e
+        return {"message_id": message_id, "gmail_id": gmail_id, "confirmed": True} if gmail_id else None
+
+    return await checkpoints.arun_once(run_id, unit, send, confirm, message_id=message_id)
+
+# ---------- Send Results ----------
+# Bulk send tools report how many units were sent, skipped (done by an earlier run)
+# and failed as JSON, so an unattended run fails the step when anyone got nothing.
+SEND_OUTCOMES = ("sent", "skipped", "failed")
+
+def send_results(title, outcomes):
+    """Tool result for a bulk send; outcomes are (outcome, line) pairs, outcome one of SEND_OUTCOMES"""
+    counts = {outcome: sum(1 for o, _ in outcomes if o == outcome) for outcome in SEND_OUTCOMES}
+    lines = [line for _, line in outcomes] or ["Nothing to send."]
+    return json.dumps({"status": "error" if counts["failed"] else "success", **counts,
+                       "message": "\n".join([title, *lines])}, ensure_ascii=False)
+
+def payslip_path(employee_id):
+    return tenant_path("payslips", f"payslip_{employee_id}.pdf")
+
+def payslip_run_id():
+    return f"payslips:{business_date().strftime('%Y-%m')}"
+
+PAYSLIP_FIELDS = ("employee_id", "name", "department", "base_salary", "deductions", "bonus", "net_salary")
+
+def payslip_fingerprint(emp):
+    """Hash of everything render_payslip_pdf prints; unchanged hash = reuse the rendered PDF"""
+    fields = [str(emp.get(k, "")) for k in PAYSLIP_FIELDS] + [business_date().strftime('%Y-%m')]
+    return hashlib.sha256("|".join(fields).encode()).hexdigest()[:16]
+
 # ---------- Safe LLM Invocation ----------
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+# All tool-level Groq calls share one rate limit, Retry-After aware backoff and
+# circuit breaker (see resilience.py); retries are also counted by the LLM meter.
+resilience.add_retry_listener(lambda service, error: service == "groq" and llm_meter.record_retry())
+
+@instrument("llm")
 def safe_chat_invoke(chain, prompt: str):
     try:
-        return chain.invoke(prompt)
+        return resilience.call("groq", chain.invoke, prompt)
     except Exception as e:
         print(f"[safe_chat_invoke] Error: {str(e)}")
         raise e
 
+@instrument("llm")
+async def asafe_chat_invoke(chain, prompt: str):
+    try:
+        return await resilience.acall("groq", chain.ainvoke, prompt)
+    except Exception as e:
+        print(f"[asafe_chat_invoke] Error: {str(e)}")
+        raise e
+
+@instrument("llm")
+def invoke_chain(chain, inputs):
+    """chain.invoke with timing, token accounting and the shared Groq resilience policy"""
+    return resilience.call("groq", chain.invoke, inputs)
+
+@instrument("llm")
+async def ainvoke_chain(chain, inputs):
+    """chain.ainvoke with timing, token accounting and the shared Groq resilience policy"""
+    return await resilience.acall("groq", chain.ainvoke, inputs)
+
 # ---------- Shared Data Structures ----------
 class SharedData:
     def __init__(self):
         self.payroll_data = None
+        self.salaries = None  # RecordTable of SalaryRecord from the last calculation
         self.invoice_data = None
+        self.financial_data = None  # Raw records from the last FetchFinancialData
+        self.financial_frames = None  # Typed frames parsed once per financial fetch
         self.last_execution = {}
 
-shared_data = SharedData()
+shared_data = TenantLocal(lambda tenant: SharedData())
 
+# Full tool results live here; agents only see short observations with a handle
+run_data = RunDataStore()
+
+def sheet_counts(data):
+    """{name: row count} for a dict of worksheet record lists"""
+    return {name: len(records) if isinstance(records, (list, dict)) else records for name, records in data.items()}
 
-chat = ChatGroq(
-    model="llama3-70b-8192",
-    temperature=0,
-    api_key=os.getenv("GROQ_API_KEY")
-)
+
+llm_meter = LLMMeter()  # Token/latency/cost accounting for every call through `chat`
+
+def groq_chat(model_name):
+    return ChatGroq(
+        model=model_name,
+        temperature=0,
+        api_key=os.getenv("GROQ_API_KEY"),
+        callbacks=[llm_meter]
+    )
+
+# Fast tier (llama3-8b) for routing, chart insights and PO suggestions; large tier for the rest
+models = ModelRegistry(groq_chat)
+chat = models.model("large")
 
 # ------------------ TOOL FUNCTION HEADS ONLY ------------------
 # Payroll
 def get_invoice_data_from_sheet():
     try:
-        client = get_gsheet_client()
-        spreadsheet = client.open(SPREADSHEET_NAME)
-        worksheet = spreadsheet.worksheet("Invoices")
-        return worksheet.get_all_records()
+        return get_sheet_records("Invoices")
     except Exception as e:
         print(f"Error fetching invoice data: {e}")
         return []
 
+async def aget_invoice_data_from_sheet():
+    try:
+        return await aget_sheet_records("Invoices")
+    except Exception as e:
+        print(f"Error fetching invoice data: {e}")
+        return []
+
+@instrument()
 def fetch_payroll_data_tool(_=None):
     """Fetch all payroll data from Google Sheets"""
     try:
-        client = get_gsheet_client()
-        spreadsheet = client.open(SPREADSHEET_NAME)
-        
         data = {
-            "employees": spreadsheet.worksheet("Employees").get_all_records(),
-            "attendance": spreadsheet.worksheet("Attendance").get_all_records(),
-            "policy": spreadsheet.worksheet("SalaryPolicy").get_all_records()
+            "employees": get_sheet_records("Employees"),
+            "attendance": get_sheet_records("Attendance"),
+            "policy": get_sheet_records("SalaryPolicy")
         }
         shared_data.payroll_data = data
-        return json.dumps({"status": "success", "data": data})
+        shared_data.salaries = None
+        return observation(handle=run_data.put("payroll_data", data), rows=sheet_counts(data),
+                           message="Payroll data loaded. Next: CalculateSalaries")
     except Exception as e:
         return json.dumps({"status": "error", "message": f"Error fetching data: {str(e)}"})
 
+@instrument()
+async def afetch_payroll_data_tool(_=None):
+    """Async FetchPayrollData: the three worksheets are read concurrently"""
+    try:
+        sheets = await aget_sheets("Employees", "Attendance", "SalaryPolicy")
+        data = {
+            "employees": sheets["Employees"],
+            "attendance": sheets["Attendance"],
+            "policy": sheets["SalaryPolicy"]
+        }
+        shared_data.payroll_data = data
+        shared_data.salaries = None
+        return observation(handle=run_data.put("payroll_data", data), rows=sheet_counts(data),
+                           message="Payroll data loaded. Next: CalculateSalaries")
+    except Exception as e:
+        return json.dumps({"status": "error", "message": f"Error fetching data: {str(e)}"})
 
+
+def salary_frame(employees, attendance, policy_map):
+    """Vectorized salaries for typed Employees rows; employees without attendance are skipped"""
+    merged = employees.merge(attendance, on="employee_id", how="inner", sort=False)
+    base = merged["base_salary"].astype("int64")
+    extra_leaves = (merged["leaves_taken"] - merged["allowed_leaves"]).clip(lower=0).astype("int64")
+    deductions = (extra_leaves * policy_map.get("leave_penalty", 0)) + \
+                 (merged["late_arrivals"].astype("int64") * policy_map.get("late_penalty", 0))
+    bonus = merged["overtime_hours"].clip(upper=policy_map.get("max_overtime_allowed", 20)).astype("int64") * \
+            policy_map.get("overtime_rate", 0)
+
+    return pd.DataFrame({
+        "employee_id": merged["employee_id"],
+        "name": merged["name"],
+        "email": merged["email"],
+        "base_salary": base,
+        "deductions": deductions,
+        "bonus": bonus,
+        "net_salary": base - deductions + bonus,
+        "department": merged["department"]
+    })
+
+def salary_policy_map(policy):
+    return dict(zip(policy["rule_name"], policy["value"].tolist()))
+
+def stream_salary_frames():
+    """Salary frames page by page: Employees is streamed, Attendance is held as one typed frame"""
+    policy_map = salary_policy_map(parse_sheet("SalaryPolicy", get_sheet_records("SalaryPolicy")))
+    attendance = read_sheet_frame("Attendance").drop_duplicates("employee_id")
+    for employees in stream_sheet("Employees").frames("Employees"):
+        yield salary_frame(employees, attendance, policy_map)
+
+def calculate_salaries():
+    """Salaries as a RecordTable of SalaryRecord, kept on shared_data for the payslip tools"""
+    if shared_data.payroll_data is None:
+        # Nothing fetched yet: stream the large tabs instead of materializing them
+        frames = list(stream_salary_frames())
+        salaries = RecordTable(pd.concat(frames, ignore_index=True), SalaryRecord) if frames \
+            else RecordTable.empty(SalaryRecord)
+    else:
+        # Parse + validate once, then compute every salary as column arithmetic
+        data = shared_data.payroll_data
+        employees = parse_sheet("Employees", data["employees"])
+        attendance = parse_sheet("Attendance", data["attendance"]).drop_duplicates("employee_id")
+        policy_map = salary_policy_map(parse_sheet("SalaryPolicy", data["policy"]))
+        salaries = RecordTable(salary_frame(employees, attendance, policy_map), SalaryRecord)
+    shared_data.salaries = salaries
+    return salaries
+
+@instrument()
 def calculate_salaries_tool(_=None):
     """Calculate all employee salaries"""
     try:
-        if shared_data.payroll_data is None:
-            fetch_result = json.loads(fetch_payroll_data_tool())
-            if fetch_result["status"] != "success":
-                return fetch_result["message"]
-            data = fetch_result["data"]
-        else:
-            data = shared_data.payroll_data
-            
-        employees = data["employees"]
-        attendance = data["attendance"]
-        policy_map = {p["rule_name"]: int(p["value"]) for p in data["policy"]}
-        
-        results = []
-        for emp in employees:
-            emp_id = emp["employee_id"]
-            att = next((a for a in attendance if a["employee_id"] == emp_id), None)
-            if not att:
-                continue
-
-            base = emp["base_salary"]
-            if isinstance(base, str):
-                base = int(base.replace(",", ""))
-            else:
-                base = int(base)
-            department = emp.get("department", "Unassigned")
-            leaves = int(att.get("leaves_taken", 0))
-            allowed = int(att.get("allowed_leaves", 0))
-            late = int(att.get("late_arrivals", 0))
-            overtime = int(att.get("overtime_hours", 0))
-
-            extra_leaves = max(0, leaves - allowed)
-            deductions = (extra_leaves * policy_map.get("leave_penalty", 0)) + \
-                         (late * policy_map.get("late_penalty", 0))
-            bonus = min(overtime, policy_map.get("max_overtime_allowed", 20)) * \
-                    policy_map.get("overtime_rate", 0)
-            net = base - deductions + bonus
-
-            results.append({
-                "employee_id": emp_id,
-                "name": emp["name"],
-                "email": emp["email"],
-                "base_salary": base,
-                "deductions": deductions,
-                "bonus": bonus,
-                "net_salary": net,
-                "department": department
-            })
-            
-        return json.dumps({"status": "success", "data": results})
+        salaries = calculate_salaries()
+        return observation(handle=run_data.put("salaries", salaries), employees=len(salaries),
+                           total_net_salary=int(salaries.column("net_salary").sum()), total_deductions=int(salaries.column("deductions").sum()),
+                           total_bonus=int(salaries.column("bonus").sum()),
+                           message="Salaries calculated. Next: GeneratePayslips")
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 
-
 from fpdf import FPDF
 import os
 import json
 from datetime import datetime
 
+@instrument()
 def generate_payslips_tool(_=None, **kwargs):
     """Generate PDF payslips for all employees"""
     try:
-        calc_result = json.loads(calculate_salaries_tool())
-        if calc_result["status"] != "success":
-            return calc_result["message"]
-            
-        employees = calc_result["data"]
-        os.makedirs("payslips", exist_ok=True)
+        # Hand-off from CalculateSalaries without a JSON round-trip
+        employees = shared_data.salaries if shared_data.salaries is not None else calculate_salaries()
+        os.makedirs(tenant_path("payslips"), exist_ok=True)
         
-        client = get_gsheet_client()
-        payslip_sheet = client.open(SPREADSHEET_NAME).worksheet("Payslips")
-        existing_records = payslip_sheet.get_all_records()
+        payslip_sheet = resilience.call("sheets", open_spreadsheet().worksheet, "Payslips")
+        with span("Payslips.get_all_records", "sheets"):
+            existing_records = resilience.call("sheets", payslip_sheet.get_all_records)
 
-        today_date = datetime.now().strftime('%Y-%m-%d')
-        current_month = datetime.now().strftime('%Y-%m')
+        today_date = business_date().strftime('%Y-%m-%d')
+        current_month = business_date().strftime('%Y-%m')
+        run_id = payslip_run_id()
         results = []
 
         for emp in employees:
             emp_id = emp["employee_id"]
-            filename = f"payslips/payslip_{emp_id}.pdf"
-
-            # ---------------- PDF DESIGN ----------------
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_auto_page_break(auto=True, margin=15)
-
-            # Header banner
-            pdf.set_fill_color(40, 60, 120)  # Dark blue
-            pdf.set_text_color(255, 255, 255)
-            pdf.set_font("Arial", "B", 16)
-            pdf.cell(0, 15, "MONTHLY PAYSLIP", ln=True, align='C', fill=True)
-            pdf.ln(10)
-
-            # Employee Info Section
-            pdf.set_text_color(0, 0, 0)
-            pdf.set_font("Arial", "B", 12)
-            pdf.set_fill_color(230, 230, 230)
-            pdf.cell(0, 10, "Employee Information", ln=True, fill=True)
-
-            pdf.set_font("Arial", "", 12)
-            pdf.cell(100, 8, f"Name: {emp['name']}", ln=True)
-            pdf.cell(100, 8, f"Employee ID: {emp_id}", ln=True)
-            pdf.cell(100, 8, f"Department: {emp['department']}", ln=True)
-            pdf.cell(100, 8, f"Period: {datetime.now().strftime('%B %Y')}", ln=True)
-            pdf.ln(8)
-
-            # Salary Breakdown Section
-            pdf.set_font("Arial", "B", 12)
-            pdf.set_fill_color(240, 240, 240)
-            pdf.cell(0, 10, "Salary Breakdown", ln=True, fill=True)
-
-            pdf.set_font("Arial", "", 12)
-            pdf.cell(100, 8, f"Base Salary", border=1)
-            pdf.cell(90, 8, f"${emp['base_salary']:,}", border=1, ln=True)
-
-            pdf.cell(100, 8, f"Deductions", border=1)
-            pdf.cell(90, 8, f"${emp['deductions']:,}", border=1, ln=True)
-
-            pdf.cell(100, 8, f"Bonus", border=1)
-            pdf.cell(90, 8, f"${emp['bonus']:,}", border=1, ln=True)
-
-            pdf.set_font("Arial", "B", 12)
-            pdf.cell(100, 10, f"Net Salary", border=1)
-            pdf.cell(90, 10, f"${emp['net_salary']:,}", border=1, ln=True)
-
-            # Footer
-            pdf.set_y(-30)
-            pdf.set_font("Arial", "I", 10)
-            pdf.set_text_color(100)
-            pdf.cell(0, 10, "This payslip is system generated. For queries, contact HR.", ln=True, align='C')
-
-            pdf.output(filename)
+            filename = payslip_path(emp_id)
+
+            # Rendered earlier this month with the same details (e.g. before a crash): keep it
+            fingerprint = payslip_fingerprint(emp)
+            rendered = checkpoints.get(run_id, f"render:{emp_id}")
+            if not (rendered and rendered[0] == "done" and rendered[1].get("fingerprint") == fingerprint
+                    and artifact_store.exists(filename)):
+                render_payslip_pdf(emp, filename)
+                checkpoints.mark_done(run_id, f"render:{emp_id}", file=filename, fingerprint=fingerprint)
 
             # ---------------- Sheet Record ----------------
             if not any(
-                r.get("employee_id") == emp_id and r.get("month", "").startswith(current_month)
+                str(r.get("employee_id")) == emp_id and r.get("month", "").startswith(current_month)
                 for r in existing_records
             ):
-                payslip_sheet.append_row([
-                    emp_id,
-                    emp["name"],
-                    emp["net_salary"],
-                    current_month
-                ])
+                row = [emp_id, emp["name"], emp["net_salary"], current_month]
+                with span("Payslips.append_row", "sheets"):
+                    side_effects.perform("sheets.append_row", "Payslips", lambda: payslip_sheet.append_row(row),
+                                         via=lambda fn: resilience.call("sheets", fn), values=row)
+                sheet_cache.invalidate(current_tenant().spreadsheet_key)
                 results.append(f"✅ Payslip recorded for {emp['name']}")
             else:
                 results.append(f"⚠️ Payslip already recorded for {emp['name']}")
@@ -321,6 +762,91 @@ def generate_payslips_tool(_=None, **kwargs):
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 
+def render_payslip_pdf(emp, filename):
+    """Render and publish one employee's payslip PDF"""
+    emp_id = emp["employee_id"]
+    # ---------------- PDF DESIGN ----------------
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    # Header banner
+    pdf.set_fill_color(40, 60, 120)  # Dark blue
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 15, "MONTHLY PAYSLIP", ln=True, align='C', fill=True)
+    pdf.ln(10)
+
+    # Employee Info Section
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", "B", 12)
+    pdf.set_fill_color(230, 230, 230)
+    pdf.cell(0, 10, "Employee Information", ln=True, fill=True)
+
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(100, 8, f"Name: {emp['name']}", ln=True)
+    pdf.cell(100, 8, f"Employee ID: {emp_id}", ln=True)
+    pdf.cell(100, 8, f"Department: {emp['department']}", ln=True)
+    pdf.cell(100, 8, f"Period: {business_date().strftime('%B %Y')}", ln=True)
+    pdf.ln(8)
+
+    # Salary Breakdown Section
+    pdf.set_font("Arial", "B", 12)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.cell(0, 10, "Salary Breakdown", ln=True, fill=True)
+
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(100, 8, f"Base Salary", border=1)
+    pdf.cell(90, 8, f"${emp['base_salary']:,}", border=1, ln=True)
+
+    pdf.cell(100, 8, f"Deductions", border=1)
+    pdf.cell(90, 8, f"${emp['deductions']:,}", border=1, ln=True)
+
+    pdf.cell(100, 8, f"Bonus", border=1)
+    pdf.cell(90, 8, f"${emp['bonus']:,}", border=1, ln=True)
+
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(100, 10, f"Net Salary", border=1)
+    pdf.cell(90, 10, f"${emp['net_salary']:,}", border=1, ln=True)
+
+    # Footer
+    pdf.set_y(-30)
+    pdf.set_font("Arial", "I", 10)
+    pdf.set_text_color(100)
+    pdf.cell(0, 10, "This payslip is system generated. For queries, contact HR.", ln=True, align='C')
+
+    pdf.output(filename)
+    publish_artifact(filename)
+
+def attach_file(msg, path):
+    with open(path, "rb") as f:
+        part = MIMEApplication(f.read(), Name=os.path.basename(path))
+    part['Content-Disposition'] = f'attachment; filename="{os.path.basename(path)}"'
+    msg.attach(part)
+
+def build_payslip_message(emp, filename):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email()
+    msg['To'] = emp['email']
+    msg['Subject'] = f"Your Payslip - {business_date().strftime('%B %Y')}"
+
+    body = f"""Dear {emp['name']},
+Please find attached your payslip for {business_date().strftime('%B %Y')}.
+
+Details:
+* Employee ID: {emp['employee_id']}
+* Department: {emp['department']}
+
+If you have any questions, please contact HR.
+
+Best regards,
+Payroll Department
+"""
+    msg.attach(MIMEText(body, 'plain'))
+    attach_file(msg, filename)
+    return msg
+
+@instrument()
 def send_payslips_tool(_=None, **kwargs):
     """Send payslip emails to all employees"""
     try:
@@ -328,52 +854,72 @@ def send_payslips_tool(_=None, **kwargs):
             fetch_result = json.loads(fetch_payroll_data_tool())
             if fetch_result["status"] != "success":
                 return fetch_result["message"]
-            employees = fetch_result["data"]["employees"]
-        else:
-            employees = shared_data.payroll_data["employees"]
+        employees = shared_data.payroll_data["employees"]
 
-        payslip_files = [f for f in os.listdir("payslips") if f.startswith("payslip_")]
+        payslip_files = artifact_store.list(tenant_path("payslips", "payslip_"))
         if not payslip_files:
             return "⚠️ No payslips found. Generate them first."
 
-        creds = get_gmail_credentials()
-        service = build('gmail', 'v1', credentials=creds)
+        service = gmail_service()
+        run_id = payslip_run_id()
         results = []
         
         for emp in employees:
-            filename = f"payslips/payslip_{emp['employee_id']}.pdf"
-            if not os.path.exists(filename):
-                results.append(f"⚠️ Payslip not found for {emp['name']}")
+            unit = f"email:{emp['employee_id']}"
+            if checkpoints.is_done(run_id, unit):
+                results.append(("skipped", f"⏭️ Already sent to {emp['name']} ({emp['email']})"))
                 continue
 
-            msg = MIMEMultipart()
-            msg['From'] = SENDER_EMAIL
-            msg['To'] = emp['email']
-            msg['Subject'] = f"Your Payslip - {datetime.now().strftime('%B %Y')}"
-
-            body = f"""Dear {emp['name']},
-Please find attached your payslip for {datetime.now().strftime('%B %Y')}.
+            filename = payslip_path(emp['employee_id'])
+            if not ensure_local_artifact(filename):
+                results.append(("failed", f"⚠️ Payslip not found for {emp['name']}"))
+                continue
 
-Details:
-* Employee ID: {emp['employee_id']}
-* Department: {emp['department']}
+            try:
+                sent = send_message_once(run_id, unit, lambda: build_payslip_message(emp, filename), service)
+            except Exception as e:  # One employee's failure must not hold back everyone else's payslip
+                results.append(("failed", f"⚠️ Not sent to {emp['name']} ({emp['email']}): {e}"))
+                continue
+            results.append(("sent", f"✅ Sent to {emp['name']} ({emp['email']})") if sent
+                           else ("skipped", f"⏭️ Already sent to {emp['name']} ({emp['email']})"))
 
-If you have any questions, please contact HR.
+        return send_results("📤 Email sending results:", results)
+    except Exception as e:
+        return f"❌ Error sending payslips: {str(e)}"
 
-Best regards,
-Payroll Department
-"""
-            msg.attach(MIMEText(body, 'plain'))
-            with open(filename, "rb") as f:
-                part = MIMEApplication(f.read(), Name=os.path.basename(filename))
-            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(filename)}"'
-            msg.attach(part)
+@instrument()
+async def asend_payslips_tool(_=None, **kwargs):
+    """Async SendPayslips: up to ASYNC_CONCURRENCY emails in flight"""
+    try:
+        if shared_data.payroll_data is None:
+            fetch_result = json.loads(await afetch_payroll_data_tool())
+            if fetch_result["status"] != "success":
+                return fetch_result["message"]
+        employees = shared_data.payroll_data["employees"]
 
-            raw_msg = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-            service.users().messages().send(userId="me", body={"raw": raw_msg}).execute()
-            results.append(f"✅ Sent to {emp['name']} ({emp['email']})")
+        payslip_files = await asyncio.to_thread(artifact_store.list, tenant_path("payslips", "payslip_"))
+        if not payslip_files:
+            return "⚠️ No payslips found. Generate them first."
 
-        return "📤 Email sending results:\n" + "\n".join(results)
+        run_id = payslip_run_id()
+
+        async def send_one(emp):
+            unit = f"email:{emp['employee_id']}"
+            if checkpoints.is_done(run_id, unit):
+                return "skipped", f"⏭️ Already sent to {emp['name']} ({emp['email']})"
+            filename = payslip_path(emp['employee_id'])
+            if not await asyncio.to_thread(ensure_local_artifact, filename):
+                return "failed", f"⚠️ Payslip not found for {emp['name']}"
+            try:
+                sent = await asend_message_once(run_id, unit, lambda: build_payslip_message(emp, filename))
+            except Exception as e:
+                return "failed", f"⚠️ Not sent to {emp['name']} ({emp['email']}): {e}"
+            if not sent:
+                return "skipped", f"⏭️ Already sent to {emp['name']} ({emp['email']})"
+            return "sent", f"✅ Sent to {emp['name']} ({emp['email']})"
+
+        results = await gather_limited([send_one(emp) for emp in employees], ASYNC_CONCURRENCY)
+        return send_results("📤 Email sending results:", results)
     except Exception as e:
         return f"❌ Error sending payslips: {str(e)}"
 
@@ -440,81 +986,222 @@ def create_invoice_pdf(data, filename):
     # Save
     os.makedirs(os.path.dirname(filename), exist_ok=True)
     pdf.output(filename)
+    publish_artifact(filename)
+
+# ---------- Per-Customer Consolidation ----------
+# All open (unpaid) invoices of a customer go out as one multi-line PDF in one email,
+# instead of one PDF and one email per invoice row.
+def customer_invoice_groups(invoice_data):
+    """[{customer_name, customer_email, invoices, total}] for every customer with open invoices"""
+    frame = ageing_frame(invoice_data)
+    if frame.empty:
+        return []
+    open_rows = frame[frame["is_open"]]
+    groups = []
+    for email, positions in open_rows.groupby("customer_email", sort=False).indices.items():
+        invoices = [invoice_data[i] for i in open_rows.index[positions]]
+        groups.append({
+            "customer_name": invoices[0]["customer_name"],
+            "customer_email": email,
+            "invoices": invoices,
+            "total": float(open_rows["amount"].iloc[positions].sum()),
+        })
+    return groups
+
+def file_label(value, default):
+    """Sheet text made safe for a file name: no separators, dots or spaces (default if nothing is left)"""
+    return re.sub(r"[^A-Za-z0-9]+", "_", str(value)).strip("_") or default
+
+def customer_invoice_path(group):
+    """Keyed by the grouping email (hashed), so customers sharing a name never share a file"""
+    email_key = hashlib.sha256(str(group['customer_email']).strip().lower().encode()).hexdigest()[:12]
+    return tenant_path("invoices", f"invoice_{file_label(group['customer_name'], 'customer')}_{email_key}.pdf")
+
+def create_customer_invoice_pdf(group, filename):
+    """One invoice PDF listing every open invoice of a customer as a line item, with the total"""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    # Invoice Header Banner
+    pdf.set_font("Arial", "B", 16)
+    pdf.set_fill_color(50, 60, 100)  # Dark blue
+    pdf.set_text_color(255, 255, 255)
+    pdf.cell(0, 15, "INVOICE", ln=True, align='C', fill=True)
+    pdf.ln(10)
 
-def send_invoice_via_gmail(to_email, subject, body, attachment_path, is_html=False):
+    # Customer Details
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_fill_color(220, 220, 220)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, "Customer Details", ln=True, fill=True)
+
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(100, 8, f"Name: {group['customer_name']}", ln=True)
+    pdf.cell(100, 8, f"Email: {group['customer_email']}", ln=True)
+    pdf.cell(100, 8, f"Statement Date: {business_date().strftime('%Y-%m-%d')}", ln=True)
+    pdf.cell(100, 8, f"Open Invoices: {len(group['invoices'])}", ln=True)
+    pdf.ln(10)
+
+    # Line items
+    widths = (45, 40, 40, 65)
+    pdf.set_font("Arial", "B", 12)
+    pdf.set_fill_color(80, 90, 150)
+    pdf.set_text_color(255, 255, 255)
+    for width, title in zip(widths, ("Invoice #", "Invoice Date", "Due Date", "Amount")):
+        pdf.cell(width, 10, title, border=1, fill=True)
+    pdf.ln()
+
+    pdf.set_font("Arial", "", 11)
+    pdf.set_text_color(0, 0, 0)
+    for i, invoice in enumerate(group["invoices"]):
+        fill = i % 2 == 0
+        pdf.set_fill_color(245, 245, 245)
+        pdf.cell(widths[0], 9, str(invoice.get('invoice_id', '')), border=1, fill=fill)
+        pdf.cell(widths[1], 9, str(invoice.get('date', 'N/A')), border=1, fill=fill)
+        pdf.cell(widths[2], 9, str(invoice.get('due_date', 'N/A')), border=1, fill=fill)
+        pdf.cell(widths[3], 9, f"${invoice.get('amount', '0.00')}", border=1, fill=fill, ln=True)
+
+    # Total
+    pdf.set_font("Arial", "B", 12)
+    pdf.set_fill_color(230, 230, 230)
+    pdf.cell(sum(widths[:3]), 10, "Total", border=1, fill=True)
+    pdf.cell(widths[3], 10, f"${group['total']:,.2f}", border=1, fill=True, ln=True)
+
+    # Footer
+    pdf.set_y(-30)
+    pdf.set_font("Arial", "I", 10)
+    pdf.set_text_color(100)
+    pdf.cell(0, 10, "Thank you for your business!", ln=True, align='C')
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    pdf.output(filename)
+    publish_artifact(filename)
+
+def customer_invoice_email(group):
+    """(subject, body) for a customer's consolidated invoice"""
+    count = len(group["invoices"])
+    if count == 1:
+        return "Your Invoice from Our Company", "Hello, please find your invoice attached."
+    return ("Your Invoices from Our Company",
+            f"Hello, please find your {count} open invoices attached (total ${group['total']:,.2f}).")
+
+def customer_invoice_checkpoint(group):
+    """(run_id, unit): the same set of open invoices is emailed to a customer only once"""
+    ids = ",".join(sorted(str(i['invoice_id']) for i in group["invoices"]))
+    return INVOICE_RUN_ID, f"email:{group['customer_email']}:{hashlib.sha256(ids.encode()).hexdigest()[:12]}"
+
+def build_invoice_message(to_email, subject, body, attachment_path, is_html=False):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email()
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'html' if is_html else 'plain'))
+    attach_file(msg, attachment_path)
+    return msg
+
+def send_invoice_via_gmail(to_email, subject, body, attachment_path, is_html=False, checkpoint=None):
+    try:
+        if checkpoint is not None:
+            send_message_once(*checkpoint, lambda: build_invoice_message(to_email, subject, body, attachment_path, is_html))
+            return True
+        service = gmail_service()
+        send_gmail_message(service, build_invoice_message(to_email, subject, body, attachment_path, is_html))
+        return True
+    except Exception as e:
+        print(f"Failed to send email: {str(e)}")
+        return False
+
+async def asend_invoice_via_gmail(to_email, subject, body, attachment_path, is_html=False, checkpoint=None):
     try:
-        creds = get_gmail_credentials()
-        service = build('gmail', 'v1', credentials=creds)
-
-        msg = MIMEMultipart()
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'html' if is_html else 'plain'))
-
-        with open(attachment_path, "rb") as f:
-            part = MIMEApplication(f.read(), Name=os.path.basename(attachment_path))
-        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment_path)}"'
-        msg.attach(part)
-
-        raw_msg = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-        service.users().messages().send(userId="me", body={"raw": raw_msg}).execute()
+        if checkpoint is not None:
+            await asend_message_once(*checkpoint, lambda: build_invoice_message(to_email, subject, body, attachment_path, is_html))
+            return True
+        await asend_gmail_message(build_invoice_message(to_email, subject, body, attachment_path, is_html))
         return True
     except Exception as e:
         print(f"Failed to send email: {str(e)}")
         return False
 
+@instrument()
 def create_all_invoice_pdfs_tool(_=None, **kwargs):
-    """Create invoice PDFs for all customers"""
+    """Create one consolidated invoice PDF per customer covering all their open invoices"""
     shared_data.invoice_data = get_invoice_data_from_sheet()
-    for invoice in shared_data.invoice_data:
-        filename = f"invoices/invoice_{invoice['customer_name'].replace(' ', '_')}.pdf"
-        os.makedirs("invoices", exist_ok=True)
-        create_invoice_pdf(invoice, filename)
-    return "✅ All invoices created as PDF files."
+    groups = customer_invoice_groups(shared_data.invoice_data)
+    for group in groups:
+        create_customer_invoice_pdf(group, customer_invoice_path(group))
+    invoice_count = sum(len(g["invoices"]) for g in groups)
+    return f"✅ All invoices created as PDF files ({invoice_count} open invoices, {len(groups)} customers)."
+
 
+INVOICE_RUN_ID = "invoices"  # Units are keyed by customer + open invoice set (see customer_invoice_checkpoint)
 
+@instrument()
 def send_all_invoices_tool(_=None, **kwargs):
     """Send invoice emails with attached PDFs to all customers"""
     if shared_data.invoice_data is None:
         shared_data.invoice_data = get_invoice_data_from_sheet()
         
     responses = []
-    for invoice in shared_data.invoice_data:
-        filename = f"invoices/invoice_{invoice['customer_name'].replace(' ', '_')}.pdf"
-        if not os.path.exists(filename):
-            responses.append(f"❌ PDF not found for {invoice['customer_name']}. Skipping.")
+    for group in customer_invoice_groups(shared_data.invoice_data):
+        checkpoint = customer_invoice_checkpoint(group)
+        if checkpoints.is_done(*checkpoint):
+            responses.append(("skipped", f"⏭️ Invoice already sent to {group['customer_name']}"))
+            continue
+
+        filename = customer_invoice_path(group)
+        if not ensure_local_artifact(filename):
+            responses.append(("failed", f"❌ PDF not found for {group['customer_name']}. Skipping."))
             continue
             
+        subject, body = customer_invoice_email(group)
         success = send_invoice_via_gmail(
-            to_email=invoice['customer_email'],
-            subject="Your Invoice from Our Company",
-            body="Hello, please find your invoice attached.",
-            attachment_path=filename
+            to_email=group['customer_email'],
+            subject=subject,
+            body=body,
+            attachment_path=filename,
+            checkpoint=checkpoint
         )
         if success:
-            responses.append(f"✅ Sent invoice to {invoice['customer_name']}")
+            responses.append(("sent", f"✅ Sent invoice to {group['customer_name']}"))
         else:
-            responses.append(f"❌ Failed to send invoice to {invoice['customer_name']}")
-    return "\n".join(responses)
+            responses.append(("failed", f"❌ Failed to send invoice to {group['customer_name']}"))
+    return send_results("📤 Invoice sending results:", responses)
 
-
-def remind_overdue_invoices_tool(_=None, **kwargs):
-    """Send reminders for overdue unpaid invoices"""
+@instrument()
+async def asend_all_invoices_tool(_=None, **kwargs):
+    """Async SendInvoices: up to ASYNC_CONCURRENCY emails in flight"""
     if shared_data.invoice_data is None:
-        shared_data.invoice_data = get_invoice_data_from_sheet()
-        
-    today = datetime.today().strftime('%Y-%m-%d')
-    results = []
-    
-    for invoice in shared_data.invoice_data:
-        if invoice['status'] == 'unpaid' and invoice['due_date'] < today:
-            filename = f"invoices/{invoice['customer_name'].replace(' ', '_')}_reminder.pdf"
-            create_invoice_pdf(invoice, filename)
+        shared_data.invoice_data = await aget_invoice_data_from_sheet()
+
+    async def send_one(group):
+        checkpoint = customer_invoice_checkpoint(group)
+        if checkpoints.is_done(*checkpoint):
+            return "skipped", f"⏭️ Invoice already sent to {group['customer_name']}"
+        filename = customer_invoice_path(group)
+        if not await asyncio.to_thread(ensure_local_artifact, filename):
+            return "failed", f"❌ PDF not found for {group['customer_name']}. Skipping."
+        subject, body = customer_invoice_email(group)
+        success = await asend_invoice_via_gmail(
+            to_email=group['customer_email'],
+            subject=subject,
+            body=body,
+            attachment_path=filename,
+            checkpoint=checkpoint
+        )
+        if success:
+            return "sent", f"✅ Sent invoice to {group['customer_name']}"
+        return "failed", f"❌ Failed to send invoice to {group['customer_name']}"
 
-            pay_now_url = f"https://script.google.com/macros/s/AKfycbwmJ-cxnBxqtrbM0h3xobFvQ3nU9ATKhYPHflBx7fJcJTGtT2Hh3nZjwZNa28tC5b0W/exec?invoice_id={invoice['invoice_id']}"
+    groups = await asyncio.to_thread(customer_invoice_groups, shared_data.invoice_data)
+    return send_results("📤 Invoice sending results:",
+                        await gather_limited([send_one(g) for g in groups], ASYNC_CONCURRENCY))
 
-            html_body = f"""
+
+def build_reminder_html(invoice):
+    pay_now_url = f"https://script.google.com/macros/s/AKfycbwmJ-cxnBxqtrbM0h3xobFvQ3nU9ATKhYPHflBx7fJcJTGtT2Hh3nZjwZNa28tC5b0W/exec?invoice_id={invoice['invoice_id']}"
+
+    return f"""
             <p>Dear {invoice['customer_name']},</p>
             <p>This is a reminder that your invoice dated <b>{invoice['date']}</b> is overdue.</p>
             <p>Amount Due: <b>${invoice['amount']}</b></p>
@@ -523,19 +1210,119 @@ def remind_overdue_invoices_tool(_=None, **kwargs):
             <p>Thank you!</p>
             """
 
-            sent = send_invoice_via_gmail(
-                to_email=invoice['customer_email'],
-                subject="⏰ Payment Reminder - Invoice Overdue",
-                body=html_body,
-                attachment_path=filename,
-                is_html=True
-            )
+# Persisted reminder log + cadence policy: repeated daily runs only remind invoices whose
+# interval has elapsed, and reuse the reminder PDF while the invoice is unchanged
+reminder_history = side_effects.CaptureLocal(
+    "reminder_history", TenantLocal(lambda tenant: reminder_history_from_env(tenant.state_path)),
+    lambda sink, tenant: reminder_history_from_env(lambda path: sink.state_path(tenant.state_path(path), tenant)))
+REMINDER_CADENCE = cadence_from_env()
+
+def overdue_invoices(invoice_data):
+    """Invoice dicts due a reminder, selected by the vectorized ageing engine and the cadence policy"""
+    today = business_date()
+    reminder_history.refresh()  # Pick up reminders other workers sent since the last run
+    targets = reminder_targets(
+        ageing_frame(invoice_data, today=today),
+        today=today,
+        last_reminded=reminder_history.last_sent(),
+        min_days_overdue=REMINDER_CADENCE.min_days_overdue,
+        reminder_interval_days=REMINDER_CADENCE.interval_days,
+        reminder_counts=reminder_history.counts(),
+        max_reminders=REMINDER_CADENCE.max_reminders,
+    )
+    return [invoice_data[i] for i in targets.index]
+
+def reminder_pdf_path(invoice):
+    # One file per invoice: customers with several overdue invoices must not overwrite each other
+    name = file_label(invoice['customer_name'], "customer")
+    return tenant_path("invoices", f"{name}_{file_label(invoice['invoice_id'], 'invoice')}_reminder.pdf")
+
+def render_reminder_pdf(invoice):
+    """Reminder PDF path; only re-rendered when the invoice changed since its last reminder"""
+    filename = reminder_pdf_path(invoice)
+    previous = reminder_history.get(invoice['invoice_id'])
+    if previous is None or previous.fingerprint != invoice_fingerprint(invoice) or not ensure_local_artifact(filename):
+        create_invoice_pdf(invoice, filename)
+    return filename
+
+def record_reminder(invoice, run_id):
+    """Log a delivered reminder once, dated business_date() like the cadence it feeds. Also called
+    for a checkpoint found done, in case a crash came between the send and this write."""
+    message_id = message_id_for(run_id, f"email:{invoice['invoice_id']}")
+    if reminder_history.recorded(message_id):
+        return
+    reminder_history.record(invoice['invoice_id'], message_id=message_id,
+                            fingerprint=invoice_fingerprint(invoice), sent_at=business_date())
+
+@instrument()
+def remind_overdue_invoices_tool(_=None, **kwargs):
+    """Send reminders for overdue unpaid invoices"""
+    if shared_data.invoice_data is None:
+        shared_data.invoice_data = get_invoice_data_from_sheet()
+        
+    today = business_date().strftime('%Y-%m-%d')
+    run_id = f"reminders:{today}"
+    results = []
+    
+    for invoice in overdue_invoices(shared_data.invoice_data):
+        unit = f"email:{invoice['invoice_id']}"
+        if checkpoints.is_done(run_id, unit):
+            record_reminder(invoice, run_id)
+            results.append(("skipped", f"{invoice['customer_name']} ⏭️ Already reminded today."))
+            continue
+        filename = render_reminder_pdf(invoice)
+
+        sent = send_invoice_via_gmail(
+            to_email=invoice['customer_email'],
+            subject="⏰ Payment Reminder - Invoice Overdue",
+            body=build_reminder_html(invoice),
+            attachment_path=filename,
+            is_html=True,
+            checkpoint=(run_id, unit)
+        )
+
+        if sent:
+            record_reminder(invoice, run_id)
+            results.append(("sent", f"{invoice['customer_name']} ⏰ Reminder sent."))
+        else:
+            results.append(("failed", f"{invoice['customer_name']} ⚠️ Reminder not sent."))
+
+    return send_results("⏰ Overdue invoice reminders:", results)
 
-            if sent:
-                results.append(f"{invoice['customer_name']} ⏰ Reminder sent.")
+@instrument()
+async def aremind_overdue_invoices_tool(_=None, **kwargs):
+    """Async RemindOverdueInvoices: PDFs render in worker threads, reminders send concurrently"""
+    if shared_data.invoice_data is None:
+        shared_data.invoice_data = await aget_invoice_data_from_sheet()
 
-    return "\n".join(results) if results else "No overdue invoices."
+    today = business_date().strftime('%Y-%m-%d')
+    run_id = f"reminders:{today}"
 
+    async def remind(invoice):
+        filename = await asyncio.to_thread(render_reminder_pdf, invoice)
+        sent = await asend_invoice_via_gmail(
+            to_email=invoice['customer_email'],
+            subject="⏰ Payment Reminder - Invoice Overdue",
+            body=build_reminder_html(invoice),
+            attachment_path=filename,
+            is_html=True,
+            checkpoint=(run_id, f"email:{invoice['invoice_id']}")
+        )
+        if not sent:
+            return "failed", f"{invoice['customer_name']} ⚠️ Reminder not sent."
+        record_reminder(invoice, run_id)
+        return "sent", f"{invoice['customer_name']} ⏰ Reminder sent."
+
+    overdue = await asyncio.to_thread(overdue_invoices, shared_data.invoice_data)
+    done = [i for i in overdue if checkpoints.is_done(run_id, f"email:{i['invoice_id']}")]
+    for invoice in done:
+        record_reminder(invoice, run_id)
+    results = [("skipped", f"{i['customer_name']} ⏭️ Already reminded today.") for i in done]
+    pending = [i for i in overdue if not checkpoints.is_done(run_id, f"email:{i['invoice_id']}")]
+    results += await gather_limited([remind(i) for i in pending], ASYNC_CONCURRENCY)
+    return send_results("⏰ Overdue invoice reminders:", results)
+
+@instrument()
 def mark_paid_invoices_tool(_=None, **kwargs):
     """Mark invoices as paid based on sheet data. 
     This tool should be called only once. It will return which invoices are already paid and which are unpaid.
@@ -572,178 +1359,158 @@ def mark_paid_invoices_tool(_=None, **kwargs):
 
 # Finance Report
 
+@instrument()
 def fetch_financial_data_tool(_=None):
     """Fetch financial data (Income Statement, Balance Sheet, Cash Flow) and stakeholder emails from Google Sheets"""
     try:
-        client = get_gsheet_client()
-        sheet = client.open(SPREADSHEET_NAME)
-
         data = {
-            "income_statement": sheet.worksheet("Income_Statement").get_all_records(),
-            "balance_sheet": sheet.worksheet("Balance_Sheet").get_all_records(),
-            "cash_flow": sheet.worksheet("Cash_Flow").get_all_records(),
-            "stakeholders": sheet.worksheet("Stakeholders").get_all_records()  # Now consistent
+            "income_statement": get_sheet_records("Income_Statement"),
+            "balance_sheet": get_sheet_records("Balance_Sheet"),
+            "cash_flow": get_sheet_records("Cash_Flow"),
+            "stakeholders": get_sheet_records("Stakeholders")  # Now consistent
 
             
         }
-        return json.dumps({"status": "success", "data": data})
+        shared_data.financial_data = data
+        shared_data.financial_frames = None  # Re-parse on next use
+        return observation(handle=run_data.put("financial_data", data), rows=sheet_counts(data))
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 
+@instrument()
+async def afetch_financial_data_tool(_=None):
+    """Async FetchFinancialData: the four worksheets are read concurrently"""
+    try:
+        sheets = await aget_sheets("Income_Statement", "Balance_Sheet", "Cash_Flow", "Stakeholders")
+        data = {
+            "income_statement": sheets["Income_Statement"],
+            "balance_sheet": sheets["Balance_Sheet"],
+            "cash_flow": sheets["Cash_Flow"],
+            "stakeholders": sheets["Stakeholders"]
+        }
+        shared_data.financial_data = data
+        shared_data.financial_frames = None  # Re-parse on next use
+        return observation(handle=run_data.put("financial_data", data), rows=sheet_counts(data))
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)})
+
+
+def get_financial_frames(data):
+    """Typed Income Statement, Balance Sheet and Cash Flow frames, parsed once per fetch"""
+    frames = shared_data.financial_frames  # Local copy: a concurrent fetch may reset the shared one
+    if frames is None:
+        frames = (
+            parse_sheet("Income_Statement", data["income_statement"]).set_index("Metric"),
+            parse_sheet("Balance_Sheet", data["balance_sheet"]).set_index("Metric"),
+            parse_sheet("Cash_Flow", data["cash_flow"]).set_index("Category"),
+        )
+        shared_data.financial_frames = frames
+    return frames
+
 
 # ---------- Tool: Calculate Financial Metrics ----------
+@instrument()
 def calculate_financial_metrics_tool(_=None):
-    """Calculate net profit, equity, and net cash flow per year"""
+    """Calculate net profit, equity, net cash flow and key ratios for every year in the sheets"""
     try:
         raw = json.loads(fetch_financial_data_tool())
         if raw["status"] != "success":
             return json.dumps({"status": "error", "message": raw["message"]})
 
-        data = raw["data"]
-        income_df = pd.DataFrame(data["income_statement"]).set_index("Metric")
-        bs_df = pd.DataFrame(data["balance_sheet"]).set_index("Metric")
-        cf_df = pd.DataFrame(data["cash_flow"]).set_index("Category")
-
-        # Clean and convert values to float
-        for df in [income_df, bs_df, cf_df]:
-            for year in ['2023 (PKR)', '2024 (PKR)', '2025 (PKR)']:
-                df[year] = (df[year].replace({',': '', '': '0', None: '0'}, regex=True).astype(float))
-
-
-        results = {}
-
-        for year in ['2023 (PKR)', '2024 (PKR)', '2025 (PKR)']:
-            # Net Profit
-            net_profit = (
-                income_df.loc['Revenue', year] -
-                income_df.loc['COGS', year] -
-                income_df.loc['Operating Expenses', year] -
-                income_df.loc['Other Expenses', year]
-            )
-
-            # Equity = Total Assets - Total Liabilities
-            total_assets = (
-                bs_df.loc['Cash', year] +
-                bs_df.loc['Inventory', year] +
-                bs_df.loc['Equipment', year]
-            )
-            total_liabilities = (
-                bs_df.loc['Loans', year] +
-                bs_df.loc['Accounts Payable', year]
-            )
-            equity = total_assets - total_liabilities
-
-            # Net Cash Flow
-            starting_balance = cf_df.loc['Starting Balance', year]
-            operating_cash = cf_df.loc['Net Operating Cash Flow', year]
-            investing_cash = cf_df.loc['Net Investing Cash Flow', year]
-            financing_cash = cf_df.loc['Net Financing Cash Flow', year]
-            net_cash_flow = operating_cash + investing_cash + financing_cash
-            ending_balance = starting_balance + net_cash_flow
-
-            results[year] = {
-                "net_profit": round(net_profit),
-                "total_assets": round(total_assets),
-                "total_liabilities": round(total_liabilities),
-                "equity": round(equity),
-                "starting_cash": round(starting_balance),
-                "net_cash_flow": round(net_cash_flow),
-                "ending_cash": round(ending_balance)
-            }
-
-        return json.dumps({"status": "success", "data": results})
+        income_df, bs_df, cf_df = get_financial_frames(shared_data.financial_data)
+
+        # Year columns are discovered from the sheets, all years computed at once
+        metrics = compute_financial_metrics(income_df, bs_df, cf_df)
+        return json.dumps({"status": "success", "data": metrics_to_dict(metrics)})
 
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 # ---------- Tool: Generate LLM Summary & Comparative Insights ----------
 
 # ---------- Modified Tool: Generate Chart + Insight ----------
-def generate_chart_insight_tool(input_json: str) -> str:
-    """Generate financial charts and insights for ALL years"""
-    try:
-        try:
-            input_data = json.loads(input_json)  # Try direct parse first
-        except json.JSONDecodeError:
-            # Extract JSON from text if wrapped (e.g., "Here is your data: {...}")
-            json_start = input_json.find('{')
-            json_end = input_json.rfind('}') + 1
-            if json_start != -1 and json_end != 0:
-                input_data = json.loads(input_json[json_start:json_end])
-            else:
-                return json.dumps({"status": "error", "message": "Invalid JSON input"})
-
-        chart_type = input_data["chart_type"]
-        os.makedirs("reports", exist_ok=True)
-        client = get_gsheet_client()
-        years = ["2023 (PKR)", "2024 (PKR)", "2025 (PKR)"]
-        results = []
+CHART_TYPES = ("income", "balance", "cashflow")
+CHART_SHEETS = {"income": "Income_Statement", "balance": "Balance_Sheet", "cashflow": "Cash_Flow"}
+_PLOT_LOCK = threading.Lock()  # pyplot is not thread-safe; async tools render in worker threads
 
+def parse_chart_request(input_json):
+    """Chart request dict from the agent's tool input (tolerates JSON wrapped in text)"""
+    try:
+        return json.loads(input_json)  # Try direct parse first
+    except json.JSONDecodeError:
+        # Extract JSON from text if wrapped (e.g., "Here is your data: {...}")
+        json_start = input_json.find('{')
+        json_end = input_json.rfind('}') + 1
+        if json_start != -1 and json_end != 0:
+            return json.loads(input_json[json_start:json_end])
+        return None
+
+def render_charts(chart_type, records):
+    """Draw the charts for one statement; returns [(year, chart_path, insight_label, insight_data)]"""
+    os.makedirs(tenant_path("reports"), exist_ok=True)
+    charts = []
+
+    with _PLOT_LOCK:
         if chart_type == "income":
-            income_df = pd.DataFrame(client.open(SPREADSHEET_NAME).worksheet("Income_Statement").get_all_records())
+            income_df = parse_sheet("Income_Statement", records)
             income_df.set_index("Metric", inplace=True)
+            years = discover_year_columns(income_df)
+            income_df = parse_numeric_frame(income_df, years)
             for year in years:
-                income_df[year] = income_df[year].replace({',': '', '': '0', None: '0'}, regex=True).astype(float)
                 data = {
                     "COGS": income_df.at["COGS", year],
                     "Operating Expenses": income_df.at["Operating Expenses", year],
                     "Other Expenses": income_df.at["Other Expenses", year]
                 }
-                
+
                 fig, ax = plt.subplots()
                 ax.pie(data.values(), labels=data.keys(), autopct="%1.1f%%")
                 ax.set_title(f"Income Statement {year}: Expense Breakdown")
-                path = f"reports/income_{year.replace(' ', '_')}.png"
+                path = tenant_path("reports", f"income_{year.replace(' ', '_')}.png")
                 plt.savefig(path)
                 plt.close()
-                                
+                publish_artifact(path)
+
                 total = sum(data.values())
                 percent_data = {k: round(v / total * 100, 1) for k, v in data.items()}
-                insight = generate_insight("Income Statement", year, percent_data)
-                results.append({
-                    "year": year,
-                    "chart_path": path,
-                    "insight": insight
-                })
+                charts.append((year, path, "Income Statement", percent_data))
 
         elif chart_type == "balance":
-            balance_df = pd.DataFrame(client.open(SPREADSHEET_NAME).worksheet("Balance_Sheet").get_all_records())
+            balance_df = parse_sheet("Balance_Sheet", records)
             balance_df.set_index("Metric", inplace=True)
+            years = discover_year_columns(balance_df)
+            balance_df = parse_numeric_frame(balance_df, years)
             for year in years:
-                balance_df[year] = balance_df[year].replace({',': '', '': '0', None: '0'}, regex=True).astype(float)
                 assets = balance_df.loc[["Cash", "Inventory", "Equipment"], year].sum()
                 liabilities = balance_df.loc[["Loans", "Accounts Payable"], year].sum()
                 data = {"Assets": assets, "Liabilities": liabilities}
-                
+
                 fig, ax = plt.subplots()
                 ax.pie(data.values(), labels=data.keys(), autopct="%1.1f%%")
                 ax.set_title(f"Balance Sheet {year}: Assets vs Liabilities")
-                path = f"reports/balance_{year.replace(' ', '_')}.png"
+                path = tenant_path("reports", f"balance_{year.replace(' ', '_')}.png")
                 plt.savefig(path)
                 plt.close()
-                
+                publish_artifact(path)
+
                 total = sum(data.values())
                 percent_data = {k: round(v / total * 100, 1) for k, v in data.items()}
-                insight = generate_insight("Balance Sheet", year, percent_data)
-
-                results.append({
-                    "year": year,
-                    "chart_path": path,
-                    "insight": insight
-                })
+                charts.append((year, path, "Balance Sheet", percent_data))
 
         elif chart_type == "cashflow":
-            cf_df = pd.DataFrame(client.open(SPREADSHEET_NAME).worksheet("Cash_Flow").get_all_records())
+            cf_df = parse_sheet("Cash_Flow", records)
             cf_df.set_index("Category", inplace=True)
+            years = discover_year_columns(cf_df)
+            cf_df = parse_numeric_frame(cf_df, years)
+            period = f"{years[0].split()[0]}-{years[-1].split()[0]}"
             cf_data = []
-            
+
             for year in years:
-                cf_df[year] = cf_df[year].replace({',': '', '': '0', None: '0'}, regex=True).astype(float)
                 cf_data.append({
                     "Operating": cf_df.at["Net Operating Cash Flow", year],
                     "Investing": cf_df.at["Net Investing Cash Flow", year],
                     "Financing": cf_df.at["Net Financing Cash Flow", year]
                 })
-            
+
             # Single comparison chart
             fig, ax = plt.subplots()
             width = 0.2
@@ -758,21 +1525,33 @@ def generate_chart_insight_tool(input_json: str) -> str:
             ax.set_xticks([x + width for x in range(len(years))])
             ax.set_xticklabels([y.split()[0] for y in years])
             ax.legend()
-            path = "reports/cashflow_comparison.png"
+            path = tenant_path("reports", "cashflow_comparison.png")
             plt.savefig(path)
             plt.close()
-            
-            insight = generate_insight("Cash Flow", "2023-2025", cf_data)
-            
-            results.append({
-                "year": "2023-2025",
-                "chart_path": path,
-                "insight": insight
-            })
+            publish_artifact(path)
+
+            charts.append((period, path, "Cash Flow", cf_data))
+
+    return charts
+
+@instrument()
+def generate_chart_insight_tool(input_json: str) -> str:
+    """Generate financial charts and insights for ALL years"""
+    try:
+        input_data = parse_chart_request(input_json)
+        if input_data is None:
+            return json.dumps({"status": "error", "message": "Invalid JSON input"})
 
-        else:
+        chart_type = input_data["chart_type"]
+        if chart_type not in CHART_SHEETS:
             return json.dumps({"status": "error", "message": "Invalid chart type"})
 
+        charts = render_charts(chart_type, get_sheet_records(CHART_SHEETS[chart_type]))
+        results = [
+            {"year": year, "chart_path": path, "insight": insight}
+            for (year, path, _, _), insight in zip(charts, generate_insights(charts))
+        ]
+
         return json.dumps({
             "status": "success",
             "results": results,
@@ -782,24 +1561,157 @@ def generate_chart_insight_tool(input_json: str) -> str:
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 
-def generate_insight(chart_type: str, year: str, data: dict) -> str:
-    """Generate insight text for a chart (70B-compatible)"""
+@instrument()
+async def agenerate_chart_insight_tool(input_json: str) -> str:
+    """Async GenerateChartInsight: charts render in a worker thread, insights are requested concurrently"""
+    try:
+        input_data = parse_chart_request(input_json)
+        if input_data is None:
+            return json.dumps({"status": "error", "message": "Invalid JSON input"})
+
+        chart_type = input_data["chart_type"]
+        if chart_type not in CHART_SHEETS:
+            return json.dumps({"status": "error", "message": "Invalid chart type"})
+
+        records = await aget_sheet_records(CHART_SHEETS[chart_type])
+        charts = await asyncio.to_thread(render_charts, chart_type, records)
+        insights = await agenerate_insights(charts)
+        results = [
+            {"year": year, "chart_path": path, "insight": insight}
+            for (year, path, _, _), insight in zip(charts, insights)
+        ]
+
+        return json.dumps({
+            "status": "success",
+            "results": results,
+            "message": f"Generated {len(results)} {chart_type} charts"
+        })
+
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)})
+
+def _insight_chain(llm):
     prompt = ChatPromptTemplate.from_messages([
         ("system", "You are a financial analyst. Return ONLY the raw insight text with NO additional formatting, quotes, or JSON."),
         ("human", "Given the chart data:\n\nChart Type: {chart_type}\nYear: {year}\nPercentage Breakdown: {values}\n\nWrite a short insight (2-3 lines).")
     ])
-    chain = prompt | chat
-    
-    # Get raw output (70B might wrap in extra text)
-    raw_output = chain.invoke({
-        "chart_type": chart_type,
-        "year": year,
-        "values": data
-    }).content
-    
+    return prompt | llm
+
+def _clean_insight(raw_output):
     # Extract just the insight (remove quotes, extra text)
-    insight = raw_output.strip().strip('"').strip("'").split("\n")[0]
-    return insight
+    return raw_output.strip().strip('"').strip("'").split("\n")[0]
+
+def _valid_insight(text):
+    """A usable one-paragraph insight: non-empty, short, not JSON"""
+    text = text.strip()
+    return bool(text) and len(text) <= 400 and not text.startswith(("{", "["))
+
+def generate_insight(chart_type: str, year: str, data: dict) -> str:
+    """Generate insight text for a chart (fast tier, escalates on unusable output)"""
+    inputs = {"chart_type": chart_type, "year": year, "values": data}
+    return models.invoke(
+        "chart_insight",
+        lambda llm: _clean_insight(invoke_chain(_insight_chain(llm), inputs).content),
+        validate=_valid_insight,
+    )
+
+async def agenerate_insight(chart_type: str, year: str, data: dict) -> str:
+    """Async generate_insight()"""
+    inputs = {"chart_type": chart_type, "year": year, "values": data}
+
+    async def run(llm):
+        response = await ainvoke_chain(_insight_chain(llm), inputs)
+        return _clean_insight(response.content)
+
+    return await models.ainvoke("chart_insight", run, validate=_valid_insight)
+
+# ---------- Batched Chart Insights ----------
+# One structured prompt covers every chart of a report; the JSON answer is schema-checked
+# and any chart missing from it falls back to a single generate_insight() call.
+INSIGHT_LIST_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "required": ["id", "insight"],
+        "properties": {"id": {"type": "string"}, "insight": {"type": "string", "minLength": 1}},
+    },
+}
+
+def _batch_insight_chain(llm):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a financial analyst. Return ONLY a JSON array, no markdown fences or extra text."),
+        ("human", "For each chart dataset below write a short insight (2-3 lines).\n\n{datasets}\n\n"
+         'Respond with a JSON array of objects {{"id": <dataset id>, "insight": <text>}}, one per dataset, same ids.')
+    ])
+    return prompt | llm
+
+def _batch_insight_inputs(charts):
+    datasets = [
+        {"id": f"chart_{i}", "chart_type": label, "year": year, "values": data}
+        for i, (year, _, label, data) in enumerate(charts)
+    ]
+    return {"datasets": json.dumps(datasets, default=str)}
+
+def _parse_batch_insights(raw_output, count):
+    """{index: insight} from the model's JSON list, or None when it is not valid JSON/schema"""
+    start, end = raw_output.find("["), raw_output.rfind("]") + 1
+    try:
+        items = json.loads(raw_output[start:end]) if start != -1 else None
+        jsonschema.validate(items, INSIGHT_LIST_SCHEMA)
+    except (json.JSONDecodeError, jsonschema.ValidationError) as e:
+        print(f"[insights] Unparseable batch response: {getattr(e, 'message', e)}")
+        return None
+    wanted = {f"chart_{i}": i for i in range(count)}
+    insights = {}
+    for item in items:
+        text = _clean_insight(item["insight"])
+        if item["id"] in wanted and _valid_insight(text):
+            insights[wanted[item["id"]]] = text
+    return insights or None
+
+def generate_insights(charts):
+    """Insights for render_charts() output, one LLM call for all of them"""
+    if len(charts) <= 1:
+        return [generate_insight(label, year, data) for year, _, label, data in charts]
+    inputs = _batch_insight_inputs(charts)
+    try:
+        insights = models.invoke(
+            "chart_insight",
+            lambda llm: _parse_batch_insights(invoke_chain(_batch_insight_chain(llm), inputs).content, len(charts)),
+            validate=lambda parsed: parsed is not None and len(parsed) == len(charts),
+        ) or {}
+    except Exception as e:
+        print(f"[insights] Batch request failed, falling back to single charts: {e}")
+        insights = {}
+    return [
+        insights[i] if i in insights else generate_insight(label, year, data)
+        for i, (year, _, label, data) in enumerate(charts)
+    ]
+
+async def agenerate_insights(charts):
+    """Async generate_insights()"""
+    if len(charts) <= 1:
+        return [await agenerate_insight(label, year, data) for year, _, label, data in charts]
+    inputs = _batch_insight_inputs(charts)
+
+    async def run(llm):
+        response = await ainvoke_chain(_batch_insight_chain(llm), inputs)
+        return _parse_batch_insights(response.content, len(charts))
+
+    try:
+        insights = await models.ainvoke(
+            "chart_insight", run,
+            validate=lambda parsed: parsed is not None and len(parsed) == len(charts),
+        ) or {}
+    except Exception as e:
+        print(f"[insights] Batch request failed, falling back to single charts: {e}")
+        insights = {}
+    missing = [i for i in range(len(charts)) if i not in insights]
+    fallback = await gather_limited(
+        [agenerate_insight(charts[i][2], charts[i][0], charts[i][3]) for i in missing], ASYNC_CONCURRENCY
+    )
+    insights.update(zip(missing, fallback))
+    return [insights[i] for i in range(len(charts))]
 
 def write_summary_with_bold(pdf, summary_text):
     """Writes summary text with bold headings (optimized version)."""
@@ -819,6 +1731,28 @@ def write_summary_with_bold(pdf, summary_text):
         
         pdf.ln(2)  # Balanced spacing
 
+def _financial_summary_input(metrics):
+    def pct(value):
+        return "n/a" if value is None else f"{value:.1%}"
+
+    return "\n".join([
+        f"In {year}, the net profit was PKR {data['net_profit']:,}, total assets were PKR {data['total_assets']:,}, "
+        f"liabilities PKR {data['total_liabilities']:,}, equity PKR {data['equity']:,}, net cash flow PKR {data['net_cash_flow']:,} "
+        f"and ending cash PKR {data['ending_cash']:,}. Net margin {pct(data['net_margin'])}, "
+        f"revenue growth {pct(data['revenue_growth'])}, current ratio "
+        f"{'n/a' if data['current_ratio'] is None else round(data['current_ratio'], 2)}."
+        for year, data in metrics.items()
+    ])
+
+def _financial_summary_chain():
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a financial analyst generating summaries."),
+        ("human", "Given the following financial metrics:\n\n{summary_input}\n\nWrite a detailed financial performance summary. "
+        "Use headings (e.g., **headings**) and paragraphs.")
+    ])
+    return prompt | models.for_site("financial_summary")
+
+@instrument()
 def generate_financial_summary_tool(_=None):
     """Generate an LLM-based financial performance summary (TEXT ONLY)"""
     try:
@@ -826,23 +1760,8 @@ def generate_financial_summary_tool(_=None):
         if calc_result["status"] != "success":
             return json.dumps({"status": "error", "message": "Unable to get financial metrics."})
 
-        metrics = calc_result["data"]
-
-        summary_input = "\n".join([
-            f"In {year}, the net profit was PKR {data['net_profit']:,}, total assets were PKR {data['total_assets']:,}, "
-            f"liabilities PKR {data['total_liabilities']:,}, equity PKR {data['equity']:,}, net cash flow PKR {data['net_cash_flow']:,} "
-            f"and ending cash PKR {data['ending_cash']:,}."
-            for year, data in metrics.items()
-        ])
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a financial analyst generating summaries."),
-            ("human", "Given the following financial metrics:\n\n{summary_input}\n\nWrite a detailed financial performance summary. "
-            "Use headings (e.g., **headings**) and paragraphs.")
-        ])
-        chain = prompt | chat
-
-        response = chain.invoke({"summary_input": summary_input})
+        summary_input = _financial_summary_input(calc_result["data"])
+        response = invoke_chain(_financial_summary_chain(), {"summary_input": summary_input})
         
         return json.dumps({
             "status": "success", 
@@ -851,12 +1770,124 @@ def generate_financial_summary_tool(_=None):
 
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
+
+@instrument()
+async def agenerate_financial_summary_tool(_=None, metrics=None):
+    """Async GenerateFinancialSummary (reuses `metrics` when the caller already computed them)"""
+    try:
+        if metrics is None:
+            calc_result = json.loads(await asyncio.to_thread(calculate_financial_metrics_tool))
+            if calc_result["status"] != "success":
+                return json.dumps({"status": "error", "message": "Unable to get financial metrics."})
+            metrics = calc_result["data"]
+
+        summary_input = _financial_summary_input(metrics)
+        response = await ainvoke_chain(_financial_summary_chain(), {"summary_input": summary_input})
+
+        return json.dumps({"status": "success", "summary": response.content})
+
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)})
     
     
     
 
 
 # ---------- Modified Tool: Generate Financial Report ----------
+def _render_report_charts(records_by_sheet):
+    """{chart_type: render_charts(...)} for every statement (a failing statement gets no charts)"""
+    charts_by_type = {}
+    for chart_type in CHART_TYPES:
+        try:
+            charts_by_type[chart_type] = render_charts(chart_type, records_by_sheet[CHART_SHEETS[chart_type]])
+        except Exception as e:
+            print(f"[report] Skipping {chart_type} charts: {e}")
+            charts_by_type[chart_type] = []
+    return charts_by_type
+
+def _report_chart_data(charts_by_type, insights):
+    """{chart_type: [{path, insight, year}]} pairing flattened insights back with their charts"""
+    insights = iter(insights)
+    return {
+        chart_type: [{"path": path, "insight": next(insights), "year": year} for year, path, _, _ in charts]
+        for chart_type, charts in charts_by_type.items()
+    }
+
+def write_financial_report_pdf(metrics, summary_text, chart_data):
+    """Compile metrics, chart sections and the summary into the annual report PDF; returns its path"""
+    filename = tenant_path("reports", f"financial_report_{business_date().strftime('%Y-%m-%d')}.pdf")
+    pdf = FPDF()
+     # Add Unicode-compatible fonts (REPLACEMENT FOR ARIAL)
+    pdf.add_font('DejaVu', '', 'DejaVuSans.ttf', uni=True)
+    pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf', uni=True)
+    pdf.add_font('DejaVu', 'I', 'DejaVuSans-Oblique.ttf', uni=True)
+    pdf.set_font('DejaVu', '', 12)  # Set default font
+
+    pdf.add_page()
+    pdf.set_font("DejaVu", 'B', 14)
+    pdf.cell(200, 10, txt="ANNUAL FINANCIAL REPORT", ln=True, align='C')
+    pdf.ln(10)
+    
+    # Metrics section
+    for year, year_data in metrics.items():
+        pdf.set_font('DejaVu', 'B', 12)
+        pdf.ln(10) 
+        pdf.cell(200, 10, txt=f"Year: {year}", ln=True,align='C')
+        pdf.set_font('DejaVu', '', 12)
+        pdf.cell(200, 10, txt=f"Net Profit: PKR {year_data['net_profit']:,}", ln=True)
+        pdf.cell(200, 10, txt=f"Total Assets: PKR {year_data['total_assets']:,}", ln=True)
+        pdf.cell(200, 10, txt=f"Total Liabilities: PKR {year_data['total_liabilities']:,}", ln=True)
+        pdf.cell(200, 10, txt=f"Equity: PKR {year_data['equity']:,}", ln=True)
+        pdf.cell(200, 10, txt=f"Net Cash Flow: PKR {year_data['net_cash_flow']:,}", ln=True)
+        pdf.cell(200, 10, txt=f"Ending Cash Balance: PKR {year_data['ending_cash']:,}", ln=True)
+        pdf.ln(5)
+          # Add page break after report summary
+
+    # Chart sections
+    def insert_section(title, chart_items):
+        
+        pdf.set_font('DejaVu', 'B', 14)
+        pdf.cell(200, 10, txt=title, ln=True, align='C')
+        pdf.ln(10)
+
+        for item in chart_items:
+            if item["path"] and os.path.exists(item["path"]):
+
+                # Optional: Add chart year heading
+                pdf.set_font('DejaVu', 'B', 12)
+                chart_year = item.get("year", "")
+                pdf.cell(200, 10, txt=f"Chart for {chart_year}", ln=True)
+                pdf.ln(5)
+
+                # ✅ Insert the chart
+                pdf.image(item["path"], x=10, w=180, h=120)
+                pdf.ln(15)
+
+                # Insert insight
+                pdf.set_font('DejaVu', size=12)
+                pdf.multi_cell(0, 10, f"Insight: {item['insight']}")
+                pdf.ln(5)
+
+
+    
+    insert_section("INCOME STATEMENT CHARTS", chart_data["income"])
+    pdf.add_page()
+    insert_section("BALANCE SHEET CHARTS", chart_data["balance"])
+    pdf.add_page()
+    insert_section("CASH FLOW ANALYSIS", chart_data["cashflow"])
+    
+    # Summary section
+    pdf.add_page()
+    pdf.set_font('DejaVu', 'B', 14)
+    pdf.cell(200, 10, txt="SUMMARY & ANALYSIS", ln=True, align='C')
+    pdf.ln(10)
+    write_summary_with_bold(pdf, summary_text)
+    
+    pdf.output(filename)
+    publish_artifact(filename)
+    return filename
+
+@instrument()
 def generate_financial_report_tool(_=None):
     """Generate PDF report using pre-generated charts and insights"""
     try:
@@ -871,127 +1902,42 @@ def generate_financial_report_tool(_=None):
         summary_result = json.loads(generate_financial_summary_tool())
         summary_text = summary_result["summary"] if summary_result["status"] == "success" else "Summary not available."
         
-        # Generate all charts and insights
-        years = ["2023 (PKR)", "2024 (PKR)", "2025 (PKR)"]
-        chart_data = {
-            "income": [],
-            "balance": [],
-            "cashflow": []
-        }
-        
-                # Generate income and balance charts for each year
-                # ✅ Generate income charts once
-        income_result = json.loads(generate_chart_insight_tool(json.dumps({
-            "chart_type": "income"
-        })))
-        if income_result["status"] == "success":
-            for item in income_result["results"]:
-                if "chart_path" in item and "insight" in item:
-                    chart_data["income"].append({
-                        "path": item["chart_path"],
-                        "insight": item["insight"],
-                        "year": item.get("year", "")
-                    })
-
-        # ✅ Generate balance charts once
-        balance_result = json.loads(generate_chart_insight_tool(json.dumps({
-            "chart_type": "balance"
-        })))
-        if balance_result["status"] == "success":
-            for item in balance_result["results"]:
-                if "chart_path" in item and "insight" in item:
-                    chart_data["balance"].append({
-                        "path": item["chart_path"],
-                        "insight": item["insight"],
-                        "year": item.get("year", "")
-                    })
-
-        # ✅ Generate cashflow chart once
-        cashflow_result = json.loads(generate_chart_insight_tool(json.dumps({
-            "chart_type": "cashflow"
-        })))
-        if cashflow_result["status"] == "success":
-            for item in cashflow_result["results"]:
-                if "chart_path" in item and "insight" in item:
-                    chart_data["cashflow"].append({
-                        "path": item["chart_path"],
-                        "insight": item["insight"],
-                        "year": item.get("year", "")
-                    })
-
-        
-        # PDF Generation
-        filename = f"reports/financial_report_{datetime.now().strftime('%Y-%m-%d')}.pdf"
-        pdf = FPDF()
-         # Add Unicode-compatible fonts (REPLACEMENT FOR ARIAL)
-        pdf.add_font('DejaVu', '', 'DejaVuSans.ttf', uni=True)
-        pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf', uni=True)
-        pdf.add_font('DejaVu', 'I', 'DejaVuSans-Oblique.ttf', uni=True)
-        pdf.set_font('DejaVu', '', 12)  # Set default font
+        # ✅ Render income, balance and cashflow charts, then one batched insight call for all of them
+        charts_by_type = _render_report_charts({sheet: get_sheet_records(sheet) for sheet in CHART_SHEETS.values()})
+        all_charts = [chart for charts in charts_by_type.values() for chart in charts]
+        chart_data = _report_chart_data(charts_by_type, generate_insights(all_charts))
 
-        pdf.add_page()
-        pdf.set_font("DejaVu", 'B', 14)
-        pdf.cell(200, 10, txt="ANNUAL FINANCIAL REPORT", ln=True, align='C')
-        pdf.ln(10)
+        filename = write_financial_report_pdf(metrics, summary_text, chart_data)
+        return json.dumps({"status": "success", "message": "Report generated", "file": filename})
         
-        # Metrics section
-        for year, year_data in metrics.items():
-            pdf.set_font('DejaVu', 'B', 12)
-            pdf.ln(10) 
-            pdf.cell(200, 10, txt=f"Year: {year}", ln=True,align='C')
-            pdf.set_font('DejaVu', '', 12)
-            pdf.cell(200, 10, txt=f"Net Profit: PKR {year_data['net_profit']:,}", ln=True)
-            pdf.cell(200, 10, txt=f"Total Assets: PKR {year_data['total_assets']:,}", ln=True)
-            pdf.cell(200, 10, txt=f"Total Liabilities: PKR {year_data['total_liabilities']:,}", ln=True)
-            pdf.cell(200, 10, txt=f"Equity: PKR {year_data['equity']:,}", ln=True)
-            pdf.cell(200, 10, txt=f"Net Cash Flow: PKR {year_data['net_cash_flow']:,}", ln=True)
-            pdf.cell(200, 10, txt=f"Ending Cash Balance: PKR {year_data['ending_cash']:,}", ln=True)
-            pdf.ln(5)
-              # Add page break after report summary
-
-        # Chart sections
-        def insert_section(title, chart_items):
-            
-            pdf.set_font('DejaVu', 'B', 14)
-            pdf.cell(200, 10, txt=title, ln=True, align='C')
-            pdf.ln(10)
-
-            for item in chart_items:
-                if item["path"] and os.path.exists(item["path"]):
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)})
 
-                    # Optional: Add chart year heading
-                    pdf.set_font('DejaVu', 'B', 12)
-                    chart_year = item.get("year", "")
-                    pdf.cell(200, 10, txt=f"Chart for {chart_year}", ln=True)
-                    pdf.ln(5)
+@instrument()
+async def agenerate_financial_report_tool(_=None):
+    """Async GenerateFinancialReport: the summary and all chart insights are produced concurrently"""
+    try:
+        calc_result = json.loads(await asyncio.to_thread(calculate_financial_metrics_tool))
+        if calc_result["status"] != "success":
+            return json.dumps({"status": "error", "message": "Unable to get financial metrics."})
 
-                    # ✅ Insert the chart
-                    pdf.image(item["path"], x=10, w=180, h=120)
-                    pdf.ln(15)
+        metrics = calc_result["data"]
 
-                    # Insert insight
-                    pdf.set_font('DejaVu', size=12)
-                    pdf.multi_cell(0, 10, f"Insight: {item['insight']}")
-                    pdf.ln(5)
+        async def report_charts():
+            records_by_sheet = await aget_sheets(*CHART_SHEETS.values())
+            charts_by_type = await asyncio.to_thread(_render_report_charts, records_by_sheet)
+            all_charts = [chart for charts in charts_by_type.values() for chart in charts]
+            return _report_chart_data(charts_by_type, await agenerate_insights(all_charts))
 
+        summary_json, chart_data = await asyncio.gather(
+            agenerate_financial_summary_tool(metrics=metrics), report_charts()
+        )
+        summary_result = json.loads(summary_json)
+        summary_text = summary_result["summary"] if summary_result["status"] == "success" else "Summary not available."
 
-        
-        insert_section("INCOME STATEMENT CHARTS", chart_data["income"])
-        pdf.add_page()
-        insert_section("BALANCE SHEET CHARTS", chart_data["balance"])
-        pdf.add_page()
-        insert_section("CASH FLOW ANALYSIS", chart_data["cashflow"])
-        
-        # Summary section
-        pdf.add_page()
-        pdf.set_font('DejaVu', 'B', 14)
-        pdf.cell(200, 10, txt="SUMMARY & ANALYSIS", ln=True, align='C')
-        pdf.ln(10)
-        write_summary_with_bold(pdf, summary_text)
-        
-        pdf.output(filename)
+        filename = await asyncio.to_thread(write_financial_report_pdf, metrics, summary_text, chart_data)
         return json.dumps({"status": "success", "message": "Report generated", "file": filename})
-        
+
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
 
@@ -999,18 +1945,53 @@ def generate_financial_report_tool(_=None):
 
 
 # ---------- Tool: Send Financial Report ----------
+def build_report_message(subject, body, attachment_path, bcc):
+    """Report email to ourselves with every stakeholder in Bcc"""
+    msg = MIMEMultipart()
+    msg['From'] = sender_email()
+    msg['To'] = sender_email()  # Primary recipient
+    msg['Bcc'] = ", ".join(bcc)
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    attach_file(msg, attachment_path)
+    return msg
+
+def annual_report_year():
+    """Year the annual report covers: the last closed one (the scheduled job runs on 2 January)"""
+    return business_date().year - 1
+
+# Reports go out once per period like every other send, so a job re-queued after a
+# crash between the send and its bookkeeping does not email every stakeholder again
+def annual_report_checkpoint():
+    return "report:annual", str(annual_report_year())
+
+def procurement_report_checkpoint():
+    return "report:procurement", business_date().strftime('%Y-%m-%d')
+
+FINANCIAL_REPORT_BODY = """Dear Stakeholder,
+Please find attached the annual financial report for your review.
+Best regards,
+Finance Team"""
+
+def _stakeholder_emails(records):
+    """The tenant's configured stakeholder list, else the emails in the Stakeholders sheet records"""
+    configured = list(current_tenant().stakeholders)
+    return configured or [s["stakeholders_email"] for s in records if s.get("stakeholders_email")]
+
+@instrument()
 def send_financial_report_tool(_=None):
     """Send report to all stakeholders from sheet using consistent data access"""
     try:
+        checkpoint = annual_report_checkpoint()
+        if checkpoints.is_done(*checkpoint):
+            return f"⏭️ Annual report for {annual_report_year()} already sent"
+
         # Get all data including stakeholders
         data_result = json.loads(fetch_financial_data_tool())
         if data_result["status"] != "success":
             return f"❌ Error fetching data: {data_result['message']}"
         
-        stakeholder_records = data_result["data"].get("stakeholders", [])
-        # Extract just the emails
-        stakeholder_emails = [s["stakeholders_email"] for s in stakeholder_records 
-                            if "stakeholders_email" in s]
+        stakeholder_emails = _stakeholder_emails(shared_data.financial_data.get("stakeholders", []))
         
         if not stakeholder_emails:
             return "❌ No valid stakeholder emails found"
@@ -1022,193 +2003,225 @@ def send_financial_report_tool(_=None):
 
         # Email setup
         report_path = report_result["file"]
-        creds = get_gmail_credentials()
-        service = build('gmail', 'v1', credentials=creds)
+        if not ensure_local_artifact(report_path):
+            return f"❌ Report file not found: {report_path}"
+        service = gmail_service()
+
+        sent = send_message_once(*checkpoint, lambda: build_report_message(
+            f"Annual Financial Report - {annual_report_year()}",
+            FINANCIAL_REPORT_BODY, report_path, stakeholder_emails
+        ), service)
+        if not sent:
+            return f"⏭️ Annual report for {annual_report_year()} already sent"
+        
+        return f"✅ Report sent to {len(stakeholder_emails)} stakeholders successfully"
+    except Exception as e:
+        return f"❌ Error: {str(e)}"
 
-        msg = MIMEMultipart()
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = SENDER_EMAIL  # Primary recipient
-        msg['Bcc'] = ", ".join(stakeholder_emails)  # Now joining strings
-        msg['Subject'] = f"Annual Financial Report - {datetime.now().strftime('%Y')}"
+@instrument()
+async def asend_financial_report_tool(_=None):
+    """Async SendFinancialReport"""
+    try:
+        checkpoint = annual_report_checkpoint()
+        if checkpoints.is_done(*checkpoint):
+            return f"⏭️ Annual report for {annual_report_year()} already sent"
 
-        # Email content
-        body = """Dear Stakeholder,
-Please find attached the annual financial report for your review.
-Best regards,
-Finance Team"""
-        msg.attach(MIMEText(body, 'plain'))
+        data_result = json.loads(await afetch_financial_data_tool())
+        if data_result["status"] != "success":
+            return f"❌ Error fetching data: {data_result['message']}"
 
-        # Attach report
-        with open(report_path, "rb") as f:
-            part = MIMEApplication(f.read(), Name=os.path.basename(report_path))
-        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(report_path)}"'
-        msg.attach(part)
+        stakeholder_emails = _stakeholder_emails(shared_data.financial_data.get("stakeholders", []))
+        if not stakeholder_emails:
+            return "❌ No valid stakeholder emails found"
+
+        report_result = json.loads(await agenerate_financial_report_tool())
+        if report_result["status"] != "success":
+            return f"❌ Error generating report: {report_result['message']}"
+
+        report_path = report_result["file"]
+        if not await asyncio.to_thread(ensure_local_artifact, report_path):
+            return f"❌ Report file not found: {report_path}"
+
+        sent = await asend_message_once(*checkpoint, lambda: build_report_message(
+            f"Annual Financial Report - {annual_report_year()}",
+            FINANCIAL_REPORT_BODY, report_path, stakeholder_emails
+        ))
+        if not sent:
+            return f"⏭️ Annual report for {annual_report_year()} already sent"
 
-        # Send email
-        raw_msg = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-        service.users().messages().send(userId="me", body={"raw": raw_msg}).execute()
-        
         return f"✅ Report sent to {len(stakeholder_emails)} stakeholders successfully"
     except Exception as e:
         return f"❌ Error: {str(e)}"
 
 # Procurement
+INVENTORY_POLICY = forecast_policy_from_env()  # Lead time, service level and order/holding costs for reorder planning
 
+@instrument()
 def fetch_procurement_data(_=None):
-    global GLOBAL_PROCUREMENT_DATA
     try:
-        client = get_gsheet_client()
-        sheet = client.open(SPREADSHEET_NAME)
+        data = {
+            "POs": get_sheet_records("PO's"),
+            "Budgets": get_sheet_records("Budgets"),
+            "Spend": spend_by_category(),  # {category: total}; the Spend tab is streamed, not stored
+            "Inventory": get_sheet_records("Inventory"),
+        }
+        procurement.data = data
+        procurement.po_totals = po_totals()
+        return observation(handle=run_data.put("procurement_data", data), rows=sheet_counts(data),
+                           message="Procurement data loaded. Next: BudgetProcessor")
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)})
 
+@instrument()
+async def afetch_procurement_data(_=None):
+    """Async FetchProcurementData: the worksheets (and the streamed Spend totals) are read concurrently"""
+    try:
+        sheets, spend, totals = await asyncio.gather(aget_sheets("PO's", "Budgets", "Inventory"),
+                                                     asyncio.to_thread(spend_by_category),
+                                                     asyncio.to_thread(po_totals))
         data = {
-            "POs": sheet.worksheet("PO's").get_all_records(),
-            "Budgets": sheet.worksheet("Budgets").get_all_records(),
-            "Spend": sheet.worksheet("Spend").get_all_records(),
-            "Inventory": sheet.worksheet("Inventory").get_all_records(),
+            "POs": sheets["PO's"],
+            "Budgets": sheets["Budgets"],
+            "Spend": spend,
+            "Inventory": sheets["Inventory"],
         }
-        GLOBAL_PROCUREMENT_DATA = data
-        return json.dumps({"status": "success", "data": data})
+        procurement.data = data
+        procurement.po_totals = totals
+        return observation(handle=run_data.put("procurement_data", data), rows=sheet_counts(data),
+                           message="Procurement data loaded. Next: BudgetProcessor")
     except Exception as e:
         return json.dumps({"status": "error", "message": str(e)})
     
 
+@instrument()
 def budget_processor(_=None) -> str:
-    global GLOBAL_BUDGET_RESULTS, GLOBAL_PROCUREMENT_DATA
     
-    GLOBAL_BUDGET_RESULTS = None  # Reset at start
+    procurement.budget_results = None  # Reset at start
     # Skip if already processed
-    if GLOBAL_BUDGET_RESULTS is not None:
+    if procurement.budget_results is not None:
         return json.dumps({"status": "success", "message": "Budget already processed"})
     try:
-        if not GLOBAL_PROCUREMENT_DATA:
+        if not procurement.data:
             response = fetch_procurement_data()
             parsed = json.loads(response)
             if parsed["status"] != "success":
                 return json.dumps({"status": "error", "message": parsed["message"]})
         
-        data = GLOBAL_PROCUREMENT_DATA
-        pos_list = data["POs"]
-        budgets = data["Budgets"]
-        spend = data["Spend"]
-
-        budget_map = {b["Category"]: float(b["Budget Amount"]) for b in budgets}
-        spend_map = {}
-        for s in spend:
-            cat = s["Category"]
-            amt = float(s.get("Amount Spent", 0))
-            spend_map[cat] = spend_map.get(cat, 0) + amt
-
-        results = []
-        for batch in batch_items(pos_list):
-            for po in batch:
-                category = po["Category"]
-                total_cost = float(po["Qty"]) * float(po["Price"])
-                remaining_budget = budget_map.get(category, 0) - spend_map.get(category, 0)
-                status = "within" if total_cost <= remaining_budget else "exceeded"
-                results.append({
-                    "Item": po.get("Item"),
-                    "Category": category,
-                    "Qty": po.get("Qty"),
-                    "Price": po.get("Price"),
-                    "status": status,
-                    "cost": total_cost,
-                    "remaining_budget": remaining_budget,
-                })
-        
-        GLOBAL_BUDGET_RESULTS = results
-        print(GLOBAL_BUDGET_RESULTS)
+        data = procurement.data
+        pos = parse_sheet("PO's", data["POs"])
+        budgets = parse_sheet("Budgets", data["Budgets"])
+
+        budget_map = budgets.groupby(budgets["Category"].astype(str))["Budget Amount"].last()
+        spend_map = pd.Series(data["Spend"], dtype="float64")
+
+        category = pos["Category"].astype(str)
+        total_cost = pos["Qty"].astype("float64") * pos["Price"]
+        remaining_budget = category.map(budget_map).fillna(0.0) - category.map(spend_map).fillna(0.0)
+        results = RecordTable(pd.DataFrame({
+            "Item": pos["Item"],
+            "Category": pos["Category"],
+            "Qty": pos["Qty"].astype("float64"),
+            "Price": pos["Price"],
+            "status": pd.Categorical(np.where(total_cost <= remaining_budget, "within", "exceeded")),
+            "cost": total_cost,
+            "remaining_budget": remaining_budget,
+        }), BudgetRecord)
+        
+        procurement.budget_results = results
+        run_data.put("budget_results", results)
+        print(procurement.budget_results)
         return f"Budget processing ready ({len(results)} POs analyzed). Next: BudgetSummary"
 
     except Exception as e:
-        return f"Budget processing not ready "
+        return f"Budget processing not ready: {str(e)}"
     
 
+@instrument()
 def budget_summary(_=None) -> str:
-    global GLOBAL_BUDGET_RESULTS
     
-    if not GLOBAL_BUDGET_RESULTS:
+    if not procurement.budget_results:
         return "No budget results available. Run BudgetProcessor first."
     
-    within = sum(1 for r in GLOBAL_BUDGET_RESULTS if r["status"] == "within")
-    exceeded = sum(1 for r in GLOBAL_BUDGET_RESULTS if r["status"] == "exceeded")
+    within = procurement.budget_results.count("status", "within")
+    exceeded = procurement.budget_results.count("status", "exceeded")
     
     return f"Budget Overview: {within} within, {exceeded} exceeded"  # Plain string
 
+@instrument()
 def inventory_processor(_=None):                                                    #Provides quick overview of inventory health
-    global GLOBAL_INVENTORY_RESULTS, GLOBAL_PROCUREMENT_DATA
     
     try:
-        if not GLOBAL_PROCUREMENT_DATA:
+        if not procurement.data:
             response = fetch_procurement_data()
             parsed = json.loads(response)
             if parsed["status"] != "success":
                 return json.dumps({"status": "error", "message": parsed["message"]})
         
-        inventory = GLOBAL_PROCUREMENT_DATA["Inventory"]
-        results = []
-        for batch in batch_items(inventory):
-            for item in batch:
-                stock = int(item["Current Stock"])
-                reorder_level = int(item["Reorder Level"])
-                status = "sufficient" if stock > reorder_level else "low"
-                results.append({
-                    "item": item["Item"],
-                    "category": item["Category"],
-                    "stock": stock,
-                    "reorder_level": reorder_level,
-                    "inventory_status": status,
-                    "supplier": item["Supplier"]
-                })
-        
-        GLOBAL_INVENTORY_RESULTS = results
-        return f"Inventory processing ready ({len(results)} items). Next: InventorySummary"
+        inventory = parse_sheet("Inventory", procurement.data["Inventory"])
+        stock = inventory["Current Stock"]
+        reorder_level = inventory["Reorder Level"]
+        results = RecordTable(pd.DataFrame({
+            "item": inventory["Item"],
+            "category": inventory["Category"],
+            "stock": stock,
+            "reorder_level": reorder_level,
+            "inventory_status": pd.Categorical(np.where(stock > reorder_level, "sufficient", "low")),
+            "supplier": inventory["Supplier"].astype(str).astype("category")
+        }), InventoryRecord)
+        
+        procurement.inventory_results = results
+        run_data.put("inventory_results", results)
+
+        # Usage, days of cover, stockout dates and reorder quantities for every item in one pass
+        forecast = RecordTable(forecast_frame(procurement.data["Inventory"], procurement.data["POs"],
+                                              business_date(), INVENTORY_POLICY), ForecastRecord)
+        procurement.forecast_results = forecast
+        run_data.put("inventory_forecast", forecast)
+        return (f"Inventory processing ready ({len(results)} items, "
+                f"{len(needs_reorder(forecast.frame))} to reorder). Next: InventorySummary")
 
     except Exception as e:
-        return f"Budget processing not ready "
+        return f"Inventory processing not ready: {str(e)}"
 
+@instrument()
 def inventory_summary(_=None):
-    global GLOBAL_INVENTORY_RESULTS
     
-    if not GLOBAL_INVENTORY_RESULTS:
+    if not procurement.inventory_results:
         inventory_processor()
 
-    if not GLOBAL_INVENTORY_RESULTS:
+    if not procurement.inventory_results:
         return "No inventory results available. Run InventoryProcessor first."
     
-    sufficient = sum(1 for r in GLOBAL_INVENTORY_RESULTS if r["inventory_status"] == "sufficient")
-    low = sum(1 for r in GLOBAL_INVENTORY_RESULTS if r["inventory_status"] == "low")
+    sufficient = procurement.inventory_results.count("inventory_status", "sufficient")
+    low = procurement.inventory_results.count("inventory_status", "low")
+    forecast = forecast_summary(procurement.forecast_results.frame)
     
-    return f"Inventory Status: {sufficient} sufficient, {low} low. Next: ApprovalAgent"
-
-GLOBAL_APPROVAL_RESULTS = {
-    'auto_approved': [],
-    'needs_approval': []
-}
+    return (f"Inventory Status: {sufficient} sufficient, {low} low. "
+            f"Forecast: {forecast['by_status']['stockout']} out of stock, {forecast['by_status']['critical']} "
+            f"run out within lead time, {forecast['reorder_items']} to reorder "
+            f"({forecast['reorder_cost']:,.2f}). Next: ApprovalAgent")
 
 
+@instrument()
 def approval_processor(_=None):
-    global GLOBAL_APPROVAL_RESULTS
     
     try:
         # Reset previous results
-        GLOBAL_APPROVAL_RESULTS = {'auto_approved': [], 'needs_approval': []}
+        procurement.approval_results = {'auto_approved': [], 'needs_approval': []}
         
-        if not GLOBAL_PROCUREMENT_DATA:
+        if not procurement.data:
             fetch_procurement_data()
             
-        for po in GLOBAL_PROCUREMENT_DATA['POs']:
-            # Find matching budget result
-            matched = next(
-                (r for r in GLOBAL_BUDGET_RESULTS 
-                 if r['Item'] == po['Item'] 
-                 and r['Category'] == po['Category']),
-                None
-            )
-            
-            if matched and matched['status'] == 'within':
-                GLOBAL_APPROVAL_RESULTS['auto_approved'].append(po)
+        # (Item, Category) of the first budget result per PO key that is within budget
+        budget = procurement.budget_results.frame.drop_duplicates(["Item", "Category"])
+        budget = budget[budget["status"] == "within"]
+        within = set(zip(budget["Item"], budget["Category"].astype(str)))
+
+        for po in procurement.data['POs']:
+            if (str(po['Item']).strip(), str(po['Category']).strip()) in within:
+                procurement.approval_results['auto_approved'].append(po)
             else:
-                GLOBAL_APPROVAL_RESULTS['needs_approval'].append(po)
+                procurement.approval_results['needs_approval'].append(po)
                 
         return "Approval processing complete. Next: ApprovalSummary"
         
@@ -1218,8 +2231,9 @@ def approval_processor(_=None):
 
 
 
+@instrument()
 def approval_summary(_=None):
-    data = GLOBAL_APPROVAL_RESULTS
+    data = procurement.approval_results
     if not data:
         return "No approval results. Run ApprovalProcessor first."
     
@@ -1246,10 +2260,8 @@ def clean_markdown(text):
     text = text.replace("\\n", "\n").replace("\n", "\n")
     return text.strip()
 
-from tenacity import RetryError  # Add this at the top
-
-def generate_suggestion(po):
-    prompt = f"""Suggest solutions for approving this PO:
+def suggestion_prompt(po):
+    return f"""Suggest solutions for approving this PO:
     
 Item: {po['Item']}
 Vendor: {po['Vendor']}
@@ -1260,45 +2272,94 @@ Category: {po['Category']}
 
 Provide 3 specific, numbered recommendations:"""
 
+def _valid_suggestion(response):
+    """The prompt asks for numbered recommendations; require at least two"""
+    return len(re.findall(r"^\s*(?:\*\*)?\d+[.)]", response.content, re.MULTILINE)) >= 2
+
+def generate_suggestion(po):
     try:
-        response = safe_chat_invoke(chat, prompt)
+        prompt = suggestion_prompt(po)
+        response = models.invoke("po_suggestion", lambda llm: safe_chat_invoke(llm, prompt),
+                                 validate=_valid_suggestion)
         return response.content  # Extract actual LLM response
-    except RetryError as re:
-        return f"Could not generate suggestion after retries: {str(re.last_attempt.exception())}"
+    except Exception as e:
+        return f"Could not generate suggestion: {str(e)}"
+
+async def agenerate_suggestion(po):
+    try:
+        prompt = suggestion_prompt(po)
+        response = await models.ainvoke("po_suggestion", lambda llm: asafe_chat_invoke(llm, prompt),
+                                        validate=_valid_suggestion)
+        return response.content
     except Exception as e:
         return f"Could not generate suggestion: {str(e)}"
     
 
 
-def notifier_tool(_=None):
-    if not GLOBAL_APPROVAL_RESULTS:
-        return "Error: No approval data available"
-    
-    if 'needs_approval' not in GLOBAL_APPROVAL_RESULTS:
-        return "Error: No POs requiring approval"
-    
-    results = []
-    for po in GLOBAL_APPROVAL_RESULTS['needs_approval']:
-        try:
-            suggestion = clean_markdown(generate_suggestion(po))
-            subject = f"APPROVAL REQUIRED: {po['Item']}"
-            body = f"""PO DETAILS:
+def approval_checkpoint(po):
+    """(run_id, unit) for one PO's approval request; POs have no id, so key on their fields"""
+    return (f"approvals:{business_date().strftime('%Y-%m-%d')}",
+            f"email:{po['Date']}|{po['Item']}|{po['Vendor']}|{po['Qty']}|{po['Price']}")
+
+def approval_email(po, suggestion):
+    """(subject, body) of the approval request for one PO"""
+    subject = f"APPROVAL REQUIRED: {po['Item']}"
+    body = f"""PO DETAILS:
 Vendor: {po['Vendor']}
 Amount: PKR {po['Qty']*po['Price']:,}
 Category: {po['Category']}
 
 SUGGESTED ACTIONS:
 {suggestion}"""
+    return subject, body
+
+@instrument()
+def notifier_tool(_=None):
+    if not procurement.approval_results:
+        return "Error: No approval data available"
+    
+    results = []
+    for po in procurement.approval_results.get('needs_approval', []):
+        try:
+            checkpoint = approval_checkpoint(po)
+            if checkpoints.is_done(*checkpoint):
+                results.append(("skipped", f"Already sent: {po['Item']}"))
+                continue
+            suggestion = clean_markdown(generate_suggestion(po))
+            subject, body = approval_email(po, suggestion)
             
-            if send_email(subject, body, "syedaliahmedshah677@gmail.com"):
-                results.append(f"Sent: {po['Item']}")
+            if send_email(subject, body, approver_email(), checkpoint=checkpoint):
+                results.append(("sent", f"Sent: {po['Item']}"))
             else:
-                results.append(f"Failed: {po['Item']}")
+                results.append(("failed", f"Failed: {po['Item']}"))
                 
         except Exception as e:
-            results.append(f"Error processing {po['Item']}: {str(e)}")
+            results.append(("failed", f"Error processing {po['Item']}: {str(e)}"))
     
-    return "\n".join(results)
+    return send_results("Approval requests:", results)
+
+@instrument()
+async def anotifier_tool(_=None):
+    """Async Notifier: suggestions and emails for every PO run concurrently"""
+    if not procurement.approval_results:
+        return "Error: No approval data available"
+
+    async def notify(po):
+        try:
+            checkpoint = approval_checkpoint(po)
+            if checkpoints.is_done(*checkpoint):
+                return "skipped", f"Already sent: {po['Item']}"
+            suggestion = clean_markdown(await agenerate_suggestion(po))
+            subject, body = approval_email(po, suggestion)
+            if await asend_email(subject, body, approver_email(), checkpoint=checkpoint):
+                return "sent", f"Sent: {po['Item']}"
+            return "failed", f"Failed: {po['Item']}"
+        except Exception as e:
+            return "failed", f"Error processing {po['Item']}: {str(e)}"
+
+    results = await gather_limited([notify(po) for po in procurement.approval_results.get('needs_approval', [])],
+                                   ASYNC_CONCURRENCY)
+    return send_results("Approval requests:", results)
 
 import re
 
@@ -1341,16 +2402,17 @@ def write_rich_text(pdf, text, font='DejaVu', size=12):
 
 
 
+@instrument()
 def report_generator(_=None):
     try:
         # Verify all data exists
-        if not all([GLOBAL_PROCUREMENT_DATA, GLOBAL_BUDGET_RESULTS, 
-                  GLOBAL_INVENTORY_RESULTS, GLOBAL_APPROVAL_RESULTS]):
+        if not all([procurement.data, procurement.budget_results, 
+                  procurement.inventory_results, procurement.forecast_results, procurement.approval_results]):
             return "Missing data. Complete all previous steps first."
         
         # Create reports directory if it doesn't exist
-        os.makedirs("reports", exist_ok=True)
-        filename = f"reports/procurement_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        os.makedirs(tenant_path("reports"), exist_ok=True)
+        filename = tenant_path("reports", f"procurement_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
         
         # Initialize PDF with better settings
         pdf = FPDF()
@@ -1391,23 +2453,31 @@ def report_generator(_=None):
         pdf.ln(5)
         
         # Generate comprehensive summary using LLM
+        budget_df = procurement.budget_results.frame
+        forecast_df = procurement.forecast_results.frame
+        forecast = forecast_summary(forecast_df)
+        reorder_df = needs_reorder(forecast_df)
+        exceeded_df = budget_df[budget_df['status'] == 'exceeded']
         summary_prompt = f"""Create a detailed executive summary for a procurement report covering these aspects:
         
         **Budget Status**:
-        - Total POs processed: {len(GLOBAL_BUDGET_RESULTS)}
-        - Within budget: {sum(1 for x in GLOBAL_BUDGET_RESULTS if x['status'] == 'within')}
-        - Exceeded budget: {sum(1 for x in GLOBAL_BUDGET_RESULTS if x['status'] == 'exceeded')}
-        - Largest budget overage: {max((x['cost'] - x['remaining_budget'] for x in GLOBAL_BUDGET_RESULTS if x['status'] == 'exceeded'), default=0):,.2f}
+        - Total POs processed: {len(procurement.budget_results)}
+        - Within budget: {procurement.budget_results.count('status', 'within')}
+        - Exceeded budget: {len(exceeded_df)}
+        - Largest budget overage: {(exceeded_df['cost'] - exceeded_df['remaining_budget']).max() if len(exceeded_df) else 0:,.2f}
         
         **Inventory Status**:
-        - Total items tracked: {len(GLOBAL_INVENTORY_RESULTS)}
-        - Items with sufficient stock: {sum(1 for x in GLOBAL_INVENTORY_RESULTS if x['inventory_status'] == 'sufficient')}
-        - Items below reorder level: {sum(1 for x in GLOBAL_INVENTORY_RESULTS if x['inventory_status'] == 'low')}
+        - Total items tracked: {len(procurement.inventory_results)}
+        - Items with sufficient stock: {procurement.inventory_results.count('inventory_status', 'sufficient')}
+        - Items below reorder level: {procurement.inventory_results.count('inventory_status', 'low')}
+        - Items out of stock: {forecast['by_status']['stockout']}
+        - Items forecast to run out within the {INVENTORY_POLICY.lead_time_days:g}-day lead time: {forecast['by_status']['critical']}
+        - Suggested reorders: {forecast['reorder_items']} items, {forecast['reorder_units']:,.0f} units, {forecast['reorder_cost']:,.2f}
         
         **Approval Status**:
-        - Auto-approved POs: {len(GLOBAL_APPROVAL_RESULTS['auto_approved'])}
-        - POs needing manual approval: {len(GLOBAL_APPROVAL_RESULTS['needs_approval'])}
-        - Total value requiring approval: {sum(x['Qty']*x['Price'] for x in GLOBAL_APPROVAL_RESULTS['needs_approval']):,.2f}
+        - Auto-approved POs: {len(procurement.approval_results['auto_approved'])}
+        - POs needing manual approval: {len(procurement.approval_results['needs_approval'])}
+        - Total value requiring approval: {sum(x['Qty']*x['Price'] for x in procurement.approval_results['needs_approval']):,.2f}
         
         Provide 3-4 paragraphs highlighting key findings, risks, and opportunities in professional business language."""
         
@@ -1422,8 +2492,7 @@ def report_generator(_=None):
         pdf.cell(0, 10, '2. Budget Analysis', 0, 1)
         
         # Create budget chart
-        budget_df = pd.DataFrame(GLOBAL_BUDGET_RESULTS)
-        budget_by_category = budget_df.groupby('Category').agg({
+        budget_by_category = budget_df.groupby('Category', observed=True).agg({
             'cost': 'sum',
             'remaining_budget': 'first'
         }).reset_index()
@@ -1435,7 +2504,7 @@ def report_generator(_=None):
         plt.xlabel('Category')
         plt.xticks(rotation=65, ha='right')
 
-        chart_path = "reports/budget_chart.png"
+        chart_path = tenant_path("reports", "budget_chart.png")
         plt.tight_layout()
         plt.savefig(chart_path)
         plt.close()
@@ -1469,7 +2538,7 @@ def report_generator(_=None):
 
             Now analyze this budget data:
 
-            {budget_by_category.to_string()}
+            {compact_frame(budget_by_category, PROMPT_DATA_TOKEN_BUDGET, rank_by='cost')}
 
             Cover the following:
             1. Top 3 Categories by Spending
@@ -1490,29 +2559,69 @@ def report_generator(_=None):
         pdf.set_font('DejaVu', 'B', 16)
         pdf.cell(0, 10, '3. Inventory Status', 0, 1)
         
-        # Inventory analysis
-        inventory_prompt = f"""Analyze this inventory data:
-        - Total items: {len(GLOBAL_INVENTORY_RESULTS)}
-        - Low stock items: {sum(1 for x in GLOBAL_INVENTORY_RESULTS if x['inventory_status'] == 'low')}
-        - Critical items (stock < 50% of reorder level): {sum(1 for x in GLOBAL_INVENTORY_RESULTS if x['stock'] < (x['reorder_level'] * 0.5))}
+        # Reorder plan: computed by the forecast engine, the LLM only narrates it
+        plan_df = reorder_df.assign(
+            stockout_date=reorder_df['stockout_date'].dt.strftime('%Y-%m-%d').fillna('-'),
+            days_of_cover=reorder_df['days_of_cover'].round(1),
+            daily_usage=reorder_df['daily_usage'].round(2),
+        )[['item', 'supplier', 'forecast_status', 'stock', 'daily_usage', 'days_of_cover',
+           'stockout_date', 'reorder_qty', 'reorder_cost']]
+        supplier_df = reorder_df.groupby('supplier', observed=True).agg(
+            items=('item', 'count'), reorder_qty=('reorder_qty', 'sum'), reorder_cost=('reorder_cost', 'sum')
+        ).reset_index()
+        inventory_prompt = f"""Narrate this inventory forecast for a procurement report. All figures are
+        precomputed: quote them as given and do not recalculate, re-rank or invent numbers.
+        - Total items: {forecast['items']}
+        - Items by forecast status: {forecast['by_status']}
+        - Items running out within {forecast['horizon_days']} days: {forecast['stockouts_within_horizon']}
+        - Lead time assumed: {INVENTORY_POLICY.lead_time_days:g} days
+
+        Items to reorder (most urgent first):
+        {compact_frame(plan_df, PROMPT_DATA_TOKEN_BUDGET)}
+
+        Reorders by supplier:
+        {compact_frame(supplier_df, PROMPT_DATA_TOKEN_BUDGET, rank_by='reorder_cost')}
         
         Provide:
-        1. List of top 5 most critical inventory items
-        2. Supplier performance analysis
+        1. The most urgent items and when they run out
+        2. Suppliers carrying the largest reorder volume
         3. Recommendations for inventory optimization"""
         
         llm_inventory = safe_chat_invoke(chat, inventory_prompt)
         pdf.set_font('DejaVu', '', 12)
         write_rich_text(pdf,llm_inventory.content)
+
+        # Reorder table (most urgent first)
+        pdf.ln(5)
+        pdf.set_font('DejaVu', 'B', 10)
+        pdf.cell(40, 10, 'Item', 1)
+        pdf.cell(35, 10, 'Supplier', 1)
+        pdf.cell(20, 10, 'Status', 1)
+        pdf.cell(20, 10, 'Stock', 1)
+        pdf.cell(25, 10, 'Stockout', 1)
+        pdf.cell(20, 10, 'Order Qty', 1)
+        pdf.cell(30, 10, 'Order Cost', 1, 1)
+        pdf.set_font('DejaVu', '', 8)
+        for row in plan_df.head(25).itertuples(index=False):  # Show the 25 most urgent
+            pdf.cell(40, 10, str(row.item)[:25], 1)
+            pdf.cell(35, 10, str(row.supplier)[:20], 1)
+            pdf.cell(20, 10, str(row.forecast_status), 1)
+            pdf.cell(20, 10, f"{row.stock:,.0f}", 1)
+            pdf.cell(25, 10, row.stockout_date, 1)
+            pdf.cell(20, 10, f"{row.reorder_qty:,.0f}", 1)
+            pdf.cell(30, 10, f"{row.reorder_cost:,.2f}", 1, 1)
         
         # ------ 4. Approval Recommendations ------
         pdf.add_page()
         pdf.set_font('DejaVu', 'B', 16)
         pdf.cell(0, 10, '4. Approval Recommendations', 0, 1)
         
-        # Detailed approval analysis
+        # Detailed approval analysis (highest-value POs first, bounded by token budget)
+        approval_df = pd.DataFrame(procurement.approval_results['needs_approval'])
+        if not approval_df.empty:
+            approval_df['Total'] = approval_df['Qty'] * approval_df['Price']
         approval_prompt = f"""Analyze these POs requiring approval:
-        {pd.DataFrame(GLOBAL_APPROVAL_RESULTS['needs_approval']).to_string()}
+        {compact_frame(approval_df, PROMPT_DATA_TOKEN_BUDGET, rank_by='Total' if not approval_df.empty else None)}
         
         Provide:
         1. Priority ranking of approvals needed
@@ -1529,12 +2638,13 @@ def report_generator(_=None):
         pdf.set_font('DejaVu', 'B', 16)
         pdf.cell(0, 10, '5. Vendor Performance', 0, 1)
         
-        # Vendor performance analysis
+        # Vendor performance analysis (running totals over the whole PO ledger, not a regroup of every PO)
+        totals = procurement.po_totals or po_totals()
+        vendor_df = totals['by_vendor']
+        vendor_df = vendor_df.assign(Price_mean=vendor_df['Price_sum'] / vendor_df['Price_count'].clip(lower=1))[
+            ['Vendor', 'Price_count', 'Price_mean', 'Price_sum', 'Qty_sum']]
         vendor_prompt = f"""Analyze vendor performance from this data. Use **bold** to highlight top vendors, spend amounts, and metrics:
-        {pd.DataFrame(GLOBAL_PROCUREMENT_DATA['POs']).groupby('Vendor').agg({
-            'Price': ['count', 'mean', 'sum'],
-            'Qty': 'sum'
-        }).to_string()}
+        {compact_frame(vendor_df, PROMPT_DATA_TOKEN_BUDGET, rank_by='Price_sum')}
 
         Provide:
         1. **Top performing vendors**
@@ -1553,12 +2663,10 @@ def report_generator(_=None):
         pdf.set_font('DejaVu', 'B', 16)
         pdf.cell(0, 10, '6. Category Spending Trends', 0, 1)
         
-        # Spending trend analysis
-        trend_prompt = f"""Analyze spending trends by category:
-        {pd.DataFrame(GLOBAL_PROCUREMENT_DATA['POs']).groupby(['Category', 'Date']).agg({
-            'Price': 'sum',
-            'Qty': 'sum'
-        }).to_string()}
+        # Spending trend analysis (daily POs rolled up to monthly totals as they are appended),
+        # shown as recent months in order so the timeline stays intact
+        trend_prompt = f"""Analyze spending trends by category (monthly totals):
+        {compact_timeline(totals['by_category_month'], 'Month', 'Category', 'Price', PROMPT_DATA_TOKEN_BUDGET)}
         
         Provide:
         1. Seasonal spending patterns
@@ -1586,7 +2694,7 @@ def report_generator(_=None):
         
         # Table rows
         pdf.set_font('DejaVu', '', 8)
-        for po in sorted(GLOBAL_PROCUREMENT_DATA['POs'], 
+        for po in sorted(procurement.data['POs'], 
                         key=lambda x: x['Date'], 
                         reverse=True)[:50]:  # Show last 50 POs
             pdf.cell(30, 10, po['Date'], 1)
@@ -1617,6 +2725,7 @@ def report_generator(_=None):
         
         # Save PDF
         pdf.output(filename)
+        publish_artifact(filename)
         
         # Clean up temporary files
         if os.path.exists(chart_path):
@@ -1639,68 +2748,103 @@ def report_generator(_=None):
         })
     
 
+def procurement_report_body():
+    return f"""Dear Stakeholders,
+        
+Attached is the procurement report as of {business_date().strftime('%d %B %Y')}.
+
+Key Highlights:
+- Generated report with {len(procurement.data['POs'])} purchase orders analyzed
+- {len(procurement.approval_results.get('needs_approval', []))} items require approval
+- {procurement.inventory_results.count('inventory_status', 'low')} inventory items below threshold
+- {forecast_summary(procurement.forecast_results.frame)['reorder_items']} inventory items to reorder now
+
+Please review and let us know if you need any clarification.
+
+Best regards,
+Procurement Automation System
+"""
+
+@instrument()
 def send_report_tool(_=None):
     try:
+        checkpoint = procurement_report_checkpoint()
+        if checkpoints.is_done(*checkpoint):
+            return f"⏭️ Procurement report for {checkpoint[1]} already sent"
+
         # 1. Generate the report first
         result = json.loads(report_generator())
         if result["status"] != "success":
             return "Error generating report: " + result.get("message", "Unknown error")
 
         report_path = result["file"]
+        if not ensure_local_artifact(report_path):
+            return f"Error: Report file not found: {report_path}"
         
         # 2. Fetch stakeholder emails from Google Sheet
         try:
-            client = get_gsheet_client()
-            sheet = client.open("Invoices").worksheet("Stakeholders")
-            stakeholders = sheet.get_all_records()
-            recipient_emails = [s["stakeholders_email"] for s in stakeholders if s.get("stakeholders_email")]
+            stakeholders = [] if current_tenant().stakeholders else get_sheet_records("Stakeholders")
+            recipient_emails = _stakeholder_emails(stakeholders)
             
             if not recipient_emails:
                 return "Error: No valid emails found in Stakeholders sheet"
         except Exception as e:
             return f"Error fetching stakeholder emails: {str(e)}"
 
-        # 3. Prepare email
-        creds = get_gmail_credentials()
-        service = build('gmail', 'v1', credentials=creds)
+        # 3. Prepare email (all stakeholders as BCC)
+        service = gmail_service()
 
-        msg = MIMEMultipart()
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = SENDER_EMAIL  # Main recipient
-        msg['Bcc'] = ", ".join(recipient_emails)  # All stakeholders as BCC
-        msg['Subject'] = f"Procurement Report - {datetime.now().strftime('%d %b %Y')}"
+        # 4. Send email (once per business date)
+        sent = send_message_once(*checkpoint, lambda: build_report_message(
+            f"Procurement Report - {business_date().strftime('%d %b %Y')}",
+            procurement_report_body(), report_path, recipient_emails
+        ), service)
 
-        # Improved email body
-        body = f"""Dear Stakeholders,
-        
-Attached is the latest procurement report generated on {datetime.now().strftime('%d %B %Y')}.
+        # 5. Cleanup local working copy (the artifact store keeps the report)
+        if os.path.exists(report_path):
+            os.remove(report_path)
 
-Key Highlights:
-- Generated report with {len(GLOBAL_PROCUREMENT_DATA['POs'])} purchase orders analyzed
-- {len(GLOBAL_APPROVAL_RESULTS.get('needs_approval', []))} items require approval
-- {sum(1 for x in GLOBAL_INVENTORY_RESULTS if x['inventory_status'] == 'low')} inventory items below threshold
+        if not sent:
+            return f"⏭️ Procurement report for {checkpoint[1]} already sent"
+        return "✅ Report successfully sent to all stakeholders"
+    except Exception as e:
+        return f"❌ Error sending report: {str(e)}"
 
-Please review and let us know if you need any clarification.
+@instrument()
+async def asend_report_tool(_=None):
+    """Async SendProcurementReport (the report itself is generated in a worker thread)"""
+    try:
+        checkpoint = procurement_report_checkpoint()
+        if checkpoints.is_done(*checkpoint):
+            return f"⏭️ Procurement report for {checkpoint[1]} already sent"
 
-Best regards,
-Procurement Automation System
-"""
-        msg.attach(MIMEText(body, 'plain'))
+        result = json.loads(await asyncio.to_thread(report_generator))
+        if result["status"] != "success":
+            return "Error generating report: " + result.get("message", "Unknown error")
+
+        report_path = result["file"]
+        if not await asyncio.to_thread(ensure_local_artifact, report_path):
+            return f"Error: Report file not found: {report_path}"
+
+        try:
+            stakeholders = [] if current_tenant().stakeholders else await aget_sheet_records("Stakeholders")
+            recipient_emails = _stakeholder_emails(stakeholders)
 
-        # Attach report
-        with open(report_path, "rb") as f:
-            part = MIMEApplication(f.read(), Name=os.path.basename(report_path))
-        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(report_path)}"'
-        msg.attach(part)
+            if not recipient_emails:
+                return "Error: No valid emails found in Stakeholders sheet"
+        except Exception as e:
+            return f"Error fetching stakeholder emails: {str(e)}"
 
-        # 4. Send email
-        raw_msg = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-        service.users().messages().send(userId="me", body={"raw": raw_msg}).execute()
+        sent = await asend_message_once(*checkpoint, lambda: build_report_message(
+            f"Procurement Report - {business_date().strftime('%d %b %Y')}",
+            procurement_report_body(), report_path, recipient_emails
+        ))
 
-        # 5. Cleanup
         if os.path.exists(report_path):
             os.remove(report_path)
 
+        if not sent:
+            return f"⏭️ Procurement report for {checkpoint[1]} already sent"
         return "✅ Report successfully sent to all stakeholders"
     except Exception as e:
         return f"❌ Error sending report: {str(e)}"
@@ -1712,6 +2856,7 @@ payroll_tools = [
     Tool(
         name="FetchPayrollData",
         func=fetch_payroll_data_tool,
+        coroutine=afetch_payroll_data_tool,
         description="Fetch employee data and attendance records from Google Sheets. This MUST be done before CalculateSalaries."
     ),
     Tool(
@@ -1727,6 +2872,7 @@ payroll_tools = [
     Tool(
         name="SendPayslips",
         func=send_payslips_tool,
+        coroutine=asend_payslips_tool,
         description="Send payslips to each employee via email. Only run this AFTER GeneratePayslips. This is the FINAL step."
     )
 ]
@@ -1742,11 +2888,13 @@ invoice_tools = [
     Tool(
         name="SendInvoices",
         func=send_all_invoices_tool,
+        coroutine=asend_all_invoices_tool,
         description="Send invoice emails to all customers. Only run this AFTER CreateInvoices has completed successfully. This MUST be done before RemindOverdueInvoices."
     ),
     Tool(
         name="RemindOverdueInvoices",
         func=remind_overdue_invoices_tool,
+        coroutine=aremind_overdue_invoices_tool,
         description="Send reminders for overdue unpaid invoices. Only run this AFTER SendInvoices. This MUST be done before MarkPaidInvoices."
     ),
     Tool(
@@ -1758,17 +2906,17 @@ invoice_tools = [
 
 
 report_tools = [
-    Tool(name="FetchFinancialData", func=fetch_financial_data_tool,
+    Tool(name="FetchFinancialData", func=fetch_financial_data_tool, coroutine=afetch_financial_data_tool,
           description="Fetch financial data from Google Sheets."),
     Tool(name="CalculateFinancialMetrics", func=calculate_financial_metrics_tool,
          description="Calculate key financial metrics such as Net Profit, Total Assets, Liabilities, Equity, and Cash Flows."),
-    Tool(name="GenerateChartInsight", func=generate_chart_insight_tool,
+    Tool(name="GenerateChartInsight", func=generate_chart_insight_tool, coroutine=agenerate_chart_insight_tool,
         description="Generate financial charts and their narrative insights. Input should be a JSON string with 'chart_type' (income/balance/cashflow) and 'year'."),
-    Tool(name="GenerateFinancialSummary", func=generate_financial_summary_tool,
+    Tool(name="GenerateFinancialSummary", func=generate_financial_summary_tool, coroutine=agenerate_financial_summary_tool,
          description="Generate an LLM-based summary and comparative financial analysis between years. Only run this AFTER GenerateChartInsight. This MUST be done before GenerateFinancialReport."),
-    Tool(name="GenerateFinancialReport", func=generate_financial_report_tool,
+    Tool(name="GenerateFinancialReport", func=generate_financial_report_tool, coroutine=agenerate_financial_report_tool,
          description="Generate a PDF report using pre-generated charts and insights.After this, you MUST run SendFinancialReport to complete the task."),
-    Tool(name="SendFinancialReport", func=send_financial_report_tool,
+    Tool(name="SendFinancialReport", func=send_financial_report_tool, coroutine=asend_financial_report_tool,
          description="Email the final PDF financial report to stakeholders. This MUST run AFTER GenerateFinancialReport. This is the FINAL step.")
 ]
 
@@ -1789,23 +2937,34 @@ report_tools = [
 # ]
 
 procurement_tools = [
-     Tool(name="FetchProcurementData", func=fetch_procurement_data, description="Fetch financial data from Google Sheets. Must be done first."),
+     Tool(name="FetchProcurementData", func=fetch_procurement_data, coroutine=afetch_procurement_data, description="Fetch financial data from Google Sheets. Must be done first."),
     Tool(name="BudgetProcessor", func=budget_processor, description="Process all POs for budget checks. Returns success when done. MUST be followed by BudgetSummary."),
     Tool(name="BudgetSummary", func=budget_summary, description="Get summary of budget status. After this, you MUST call InventoryProcessor next."),
-    Tool(name="InventoryProcessor", func=inventory_processor, description="Process all inventory items. After this, you MUST call InventorySummary next."),
+    Tool(name="InventoryProcessor", func=inventory_processor, description="Process all inventory items and forecast stockout dates and reorder quantities. After this, you MUST call InventorySummary next."),
     Tool(name="InventorySummary", func=inventory_summary, description="Get summary of inventory status. Requires InventoryProcessor to run first."),
     Tool(name="ApprovalProcessor", func=approval_processor,description="Process all POs for approval status"),
     Tool(name="ApprovalSummary", func=approval_summary,description="Get approval overview summary"),
-    Tool(name="Notifier", func=notifier_tool, description="Send approval notifications via email. After this, you MUST call GenerateProcurementReport next. Requires ApprovalProcessor to run first."),
+    Tool(name="Notifier", func=notifier_tool, coroutine=anotifier_tool, description="Send approval notifications via email. After this, you MUST call GenerateProcurementReport next. Requires ApprovalProcessor to run first."),
     Tool(name="GenerateProcurementReport", func=report_generator, description="Create PDF report of recent purchase orders.After this, you MUST run SendProcurementReport to complete the task."),
-    Tool(name="SendProcurementReport", func=send_report_tool, description="Email the generated procurement report.This MUST run AFTER GenerateProcurementReport. This is the FINAL step.")
+    Tool(name="SendProcurementReport", func=send_report_tool, coroutine=asend_report_tool, description="Email the generated procurement report.This MUST run AFTER GenerateProcurementReport. This is the FINAL step.")
 ]
 
 # ------------------ AGENT INITIALIZATIONS ------------------
 
+def bounded_tool(tool):
+    """Copy of a Tool whose observations are cut to TOOL_OBSERVATION_MAX_CHARS (full text kept in run_data)"""
+    func, coroutine = tool.func, tool.coroutine
+
+    async def acall(*args, **kwargs):
+        return clamp_observation(await coroutine(*args, **kwargs), run_data)
+
+    return Tool(name=tool.name, description=tool.description,
+                func=lambda *args, **kwargs: clamp_observation(func(*args, **kwargs), run_data),
+                coroutine=acall if coroutine is not None else None)
+
 def init_agent(tools):
     return initialize_agent(
-        tools=tools,
+        tools=[bounded_tool(t) for t in tools],
         llm=chat,
         agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
         verbose=True,
@@ -1885,10 +3044,31 @@ AGENT:
 """
 )
 
-router_chain = LLMChain(llm=chat, prompt=router_prompt)
+ROUTE_NAMES = ("payroll", "invoice", "procurement", "report")
+
+def _route_decided(response: str) -> bool:
+    """The router answered with an agent name (otherwise escalate before keyword fallback)"""
+    return any(name in response.lower() for name in ROUTE_NAMES)
 
+@instrument("llm")
 def route_task(task: str) -> str:
-    response = router_chain.run(input=task).strip().lower()
+    response = models.invoke(
+        "router",
+        lambda llm: resilience.call("groq", (router_prompt | llm).invoke, {"input": task}).content,
+        validate=_route_decided,
+    )
+    return parse_route(task, response)
+
+@instrument("llm", name="route_task")
+async def aroute_task(task: str) -> str:
+    async def run(llm):
+        result = await resilience.acall("groq", (router_prompt | llm).ainvoke, {"input": task})
+        return result.content
+
+    return parse_route(task, await models.ainvoke("router", run, validate=_route_decided))
+
+def parse_route(task: str, response: str) -> str:
+    response = response.strip().lower()
     
     # Normalize the decision from LLM
     if "payroll" in response:
@@ -1921,39 +3101,157 @@ def route_task(task: str) -> str:
 import io
 import contextlib
 
-def execute_task(task: str):
-    agent_type = route_task(task)
-    print(f"🔀 Routed to: {agent_type} agent")
+def execute_task(task: str, tenant=None):
+    """Route and run a task; tenant (ID or Tenant) selects the workbook/sender, default: current tenant"""
+    apply_artifact_retention()
+    with tenant_scope(tenant or current_tenant()), \
+            llm_meter.run("execute_task") as llm_usage, run_data.run(owner=current_tenant().tenant_id) as data_run:
+        agent_type = route_task(task)
+        llm_usage.name = agent_type
+        print(f"🔀 Routed to: {agent_type} agent")
 
-    # Setup buffer to capture printed logs
-    log_buffer = io.StringIO()
+        # Setup buffer to capture printed logs
+        log_buffer = io.StringIO()
 
-    try:
-        with contextlib.redirect_stdout(log_buffer):  # 👈 captures terminal output
-            if agent_type == "payroll":
-                result = payroll_agent.invoke({"input": task})
-            elif agent_type == "invoice":
-                result = invoice_agent.invoke({"input": task})
-            elif agent_type == "report":
-                result = report_agent.invoke({"input": task})
-            elif agent_type == "procurement":
-                result = procurement_agent.invoke({"input": task})
-            else:
-                return {"output": "❌ Unknown agent type."}
+        try:
+            with contextlib.redirect_stdout(log_buffer), span("execute_task", "run", agent=agent_type):  # 👈 captures terminal output
+                if agent_type == "payroll":
+                    result = payroll_agent.invoke({"input": task})
+                elif agent_type == "invoice":
+                    result = invoice_agent.invoke({"input": task})
+                elif agent_type == "report":
+                    result = report_agent.invoke({"input": task})
+                elif agent_type == "procurement":
+                    result = procurement_agent.invoke({"input": task})
+                else:
+                    return {"output": "❌ Unknown agent type.", "llm_usage": llm_usage.summary()}
+
+            # Gather the log content
+            reasoning_trace = log_buffer.getvalue()
+
+            # Ensure result is a dict
+            if not isinstance(result, dict):
+                result = {"output": result}
+            result["trace_log"] = reasoning_trace
+            result["llm_usage"] = llm_usage.summary()
+            result["data_handles"] = run_data.handles(data_run)
+            return result
+
+        except Exception as e:
+            return {"output": f"❌ Error during execution: {str(e)}", "llm_usage": llm_usage.summary()}
+        finally:
+            flush_metrics()
 
-        # Gather the log content
-        reasoning_trace = log_buffer.getvalue()
 
-        # Ensure result is a dict
-        if isinstance(result, dict):
-            result["trace_log"] = reasoning_trace
+AGENTS = {
+    "payroll": payroll_agent,
+    "invoice": invoice_agent,
+    "report": report_agent,
+    "procurement": procurement_agent,
+}
+
+async def aexecute_task(task: str, tenant=None):
+    """Async execute_task: agents run with ainvoke and the tools' coroutine variants, so one
+    event loop can drive many workflows. The trace is collected per run by callback instead
+    of redirecting the process-wide stdout."""
+    await asyncio.to_thread(apply_artifact_retention)
+    with tenant_scope(tenant or current_tenant()), \
+            llm_meter.run("execute_task") as llm_usage, run_data.run(owner=current_tenant().tenant_id) as data_run:
+        agent_type = await aroute_task(task)
+        llm_usage.name = agent_type
+        print(f"🔀 Routed to: {agent_type} agent")
+
+        agent = AGENTS.get(agent_type)
+        if agent is None:
+            return {"output": "❌ Unknown agent type.", "llm_usage": llm_usage.summary()}
+
+        trace = AgentTraceHandler()
+        try:
+            with span("execute_task", "run", agent=agent_type):
+                result = await agent.ainvoke({"input": task}, config={"callbacks": [trace]})
+
+            if not isinstance(result, dict):
+                result = {"output": result}
+            result["trace_log"] = trace.get_trace()
+            result["llm_usage"] = llm_usage.summary()
+            result["data_handles"] = run_data.handles(data_run)
             return result
-        else:
-            return {"output": result, "trace_log": reasoning_trace}
 
-    except Exception as e:
-        return {"output": f"❌ Error during execution: {str(e)}"}
+        except Exception as e:
+            return {"output": f"❌ Error during execution: {str(e)}", "llm_usage": llm_usage.summary()}
+        finally:
+            flush_metrics()
+
+
+# ------------------ SCHEDULED PIPELINES ------------------
+# Fixed tool sequences for unattended runs (scheduler.py): no router and no ReAct
+# loop, each step's tool is called directly in order and the run stops at the
+# first failing step. Bulk send steps fail when any unit was not sent (see
+# send_results). Steps are idempotent per business date (checkpoints), so a
+# retried or backfilled run only does the work still missing.
+PIPELINES = {
+    "payroll": ("FetchPayrollData", "CalculateSalaries", "GeneratePayslips", "SendPayslips"),
+    "invoice_reminders": ("RemindOverdueInvoices",),
+    "annual_report": ("SendFinancialReport",),
+    "procurement": ("FetchProcurementData", "BudgetProcessor", "InventoryProcessor", "ApprovalProcessor",
+                    "Notifier", "GenerateProcurementReport", "SendProcurementReport"),
+}
+OPTIONAL_STEPS = {"Notifier"}  # A failed approval email must not hold back the weekly report; the run still fails
+PIPELINE_TOOLS = {t.name: t for t in payroll_tools + invoice_tools + report_tools + procurement_tools}
 
+def _step_failed(output) -> bool:
+    """Tools report failure as JSON status (send tools also count failed units) or as an error sentence"""
+    try:
+        parsed = json.loads(output)
+        if isinstance(parsed, dict) and "status" in parsed:
+            return parsed["status"] != "success" or bool(parsed.get("failed"))
+    except (TypeError, ValueError):
+        pass
+    text = str(output).strip().lower()
+    return (text.startswith(("❌", "error", "⚠️ no ", "missing data"))
+            or any(phrase in text for phrase in ("not ready", "failed:", " first.")))
+
+def run_pipeline(name: str, tenant=None, as_of_date=None):
+    """Run PIPELINES[name] for a tenant with business_date() == as_of_date (default: now).
+
+    Inside side_effects.capture() the result also carries the captured sends and writes.
+    """
+    steps = PIPELINES[name]
+    apply_artifact_retention()
+    with tenant_scope(tenant or current_tenant()) as scoped_tenant, as_of(as_of_date), \
+            llm_meter.run(f"pipeline:{name}") as llm_usage, run_data.run(owner=current_tenant().tenant_id) as data_run:
+        # Start from the sheets, not from whatever an earlier run left behind
+        shared_data.discard()
+        procurement.discard()
+        result = {"pipeline": name, "tenant": scoped_tenant.tenant_id,
+                  "as_of": business_date().strftime('%Y-%m-%d'), "status": "success", "steps": []}
+        try:
+            with span("run_pipeline", "run", pipeline=name):
+                for step in steps:
+                    started = time.perf_counter()
+                    try:
+                        output = PIPELINE_TOOLS[step].func("")
+                    except Exception as e:
+                        output = f"❌ {type(e).__name__}: {e}"
+                    failed = _step_failed(output)
+                    result["steps"].append({
+                        "step": step,
+                        "status": "error" if failed else "success",
+                        "seconds": round(time.perf_counter() - started, 3),
+                        "output": clamp_observation(output, run_data),
+                    })
+                    if failed:
+                        result["status"] = "error"
+                        if step not in OPTIONAL_STEPS:
+                            break
+            result["llm_usage"] = llm_usage.summary()
+            result["data_handles"] = run_data.handles(data_run)
+            captured = side_effects.active()
+            if captured is not None:
+                result["side_effects"] = {"mode": captured.mode, **captured.sink.summary(scoped_tenant.tenant_id)}
+            return result
+        finally:
+            flush_metrics()
 
 
 # def execute_task(task: str):
@@ -0,0 +1,363 @@
+# Artifact Store for generated PDFs and charts (local filesystem or S3-compatible)
+
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # S3 backend is optional
+    boto3 = None
+    ClientError = Exception
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB streaming chunks
+SPOOL_MAX_SIZE = 8 * 1024 * 1024  # Keep small uploads in memory before hashing
+
+
+def normalize_name(name):
+    """Artifact names are relative, forward-slash paths like 'reports/x.pdf'.
+
+    A leading './' (and the '/' of an absolute working path) is dropped; '..'
+    segments are rejected, so a name never addresses anything outside the store.
+    """
+    name = str(name).replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    parts = [part for part in name.lstrip("/").split("/") if part not in ("", ".")]
+    if not parts or ".." in parts:
+        raise ValueError(f"Invalid artifact name: {name!r}")
+    return "/".join(parts)
+
+
+def _normalize_prefix(prefix):
+    if not prefix:
+        return ""
+    return normalize_name(prefix) + ("/" if prefix.replace("\\", "/").endswith("/") else "")
+
+
+def _copy_and_hash(src, dst):
+    """Stream src into dst in chunks, returning (sha256, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        dst.write(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _ref_record(sha, size, content_type=None):
+    return {
+        "sha256": sha,
+        "size": size,
+        "content_type": content_type,
+        "created_at": datetime.now().isoformat(),
+    }
+
+
+class ArtifactStore(ABC):
+    """Content-addressed blob storage with named references.
+
+    Every artifact is stored once per unique content (sha256) and exposed
+    under one or more names. Deleting a name only removes the reference,
+    unreferenced blobs are cleaned up by apply_retention(), once they are
+    older than the retention period (a concurrent put may not have written
+    its reference yet).
+    """
+
+    @abstractmethod
+    def put(self, name, src, content_type=None):
+        """Store the stream src under name; returns its sha256"""
+
+    @abstractmethod
+    def open(self, name):
+        """Readable binary stream of an artifact (FileNotFoundError if missing)"""
+
+    @abstractmethod
+    def stat(self, name):
+        """The reference record ({sha256, size, content_type, created_at}) or None"""
+
+    @abstractmethod
+    def delete(self, name):
+        """Remove the reference (the blob stays until retention collects it)"""
+
+    @abstractmethod
+    def list(self, prefix=""):
+        """Sorted artifact names starting with prefix"""
+
+    @abstractmethod
+    def apply_retention(self, max_age_days, prefix=""):
+        """Drop references older than max_age_days and old orphan blobs; returns references removed"""
+
+    def _live_hashes(self):
+        refs = (self.stat(name) for name in self.list())
+        return {ref["sha256"] for ref in refs if ref is not None}  # A ref deleted meanwhile is just skipped
+
+    # ---------- Shared helpers ----------
+    def exists(self, name):
+        return self.stat(name) is not None
+
+    def put_file(self, path, name=None, content_type=None):
+        """Store a local file under its relative path (or an explicit name)"""
+        with open(path, "rb") as f:
+            return self.put(name or path, f, content_type=content_type)
+
+    def put_bytes(self, name, data, content_type=None):
+        return self.put(name, io.BytesIO(data), content_type=content_type)
+
+    def read_bytes(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+    def fetch(self, name, dest_path=None):
+        """Materialize an artifact on local disk (streamed), returning the path"""
+        dest_path = dest_path or name
+        dest_dir = os.path.dirname(dest_path)
+        if dest_dir:
+            os.makedirs(dest_dir, exist_ok=True)
+        with self.open(name) as src, open(dest_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        return dest_path
+
+
+# ---------- Local Filesystem Backend ----------
+class LocalArtifactStore(ArtifactStore):
+    """Layout: <root>/objects/ab/<sha256> for blobs, <root>/refs/<name>.json for names"""
+
+    def __init__(self, root="artifacts"):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.refs_dir = os.path.join(root, "refs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        for d in (self.objects_dir, self.refs_dir, self.tmp_dir):
+            os.makedirs(d, exist_ok=True)
+
+    def _object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    def _ref_path(self, name):
+        return os.path.join(self.refs_dir, normalize_name(name) + ".json")
+
+    def put(self, name, src, content_type=None):
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                sha, size = _copy_and_hash(src, tmp)
+            object_path = self._object_path(sha)
+            if os.path.exists(object_path):
+                os.remove(tmp_path)  # Deduplicated: identical content already stored
+                os.utime(object_path)  # Referenced again: restart its grace period
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(tmp_path, object_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        ref_path = self._ref_path(name)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        with open(ref_path, "w") as f:
+            json.dump(_ref_record(sha, size, content_type), f)
+        return sha
+
+    def stat(self, name):
+        ref_path = self._ref_path(name)
+        if not os.path.exists(ref_path):
+            return None
+        with open(ref_path) as f:
+            return json.load(f)
+
+    def open(self, name):
+        ref = self.stat(name)
+        if ref is None:
+            raise FileNotFoundError(f"Artifact not found: {name}")
+        return open(self._object_path(ref["sha256"]), "rb")
+
+    def delete(self, name):
+        ref_path = self._ref_path(name)
+        if os.path.exists(ref_path):
+            os.remove(ref_path)
+            return True
+        return False
+
+    def list(self, prefix=""):
+        prefix = _normalize_prefix(prefix)
+        names = []
+        for dirpath, _, filenames in os.walk(self.refs_dir):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                rel = os.path.relpath(os.path.join(dirpath, filename), self.refs_dir)
+                name = rel[:-len(".json")].replace("\\", "/")
+                if name.startswith(prefix):
+                    names.append(name)
+        return sorted(names)
+
+    def apply_retention(self, max_age_days, prefix=""):
+        """Drop references older than max_age_days, then garbage-collect orphan blobs"""
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        removed = 0
+        for name in self.list(prefix):
+            ref = self.stat(name)
+            if ref and datetime.fromisoformat(ref["created_at"]) < cutoff:
+                self.delete(name)
+                removed += 1
+
+        live = self._live_hashes()
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for sha in filenames:
+                path = os.path.join(dirpath, sha)
+                # Keep fresh blobs: a concurrent put may not have written its ref yet
+                if sha not in live and datetime.fromtimestamp(os.path.getmtime(path)) < cutoff:
+                    os.remove(path)
+        return removed
+
+
+# ---------- S3-Compatible Backend (AWS S3, MinIO, ...) ----------
+class S3ArtifactStore(ArtifactStore):
+    """Same layout as the local store, under s3://<bucket>/<prefix>objects|refs/"""
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, client=None, **client_kwargs):
+        if client is None:
+            if boto3 is None:
+                raise ImportError("boto3 is required for the S3 artifact store (pip install boto3)")
+            client = boto3.client("s3", endpoint_url=endpoint_url, **client_kwargs)
+        self.s3 = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def _object_key(self, sha):
+        return f"{self.prefix}objects/{sha[:2]}/{sha}"
+
+    def _ref_key(self, name):
+        return f"{self.prefix}refs/{normalize_name(name)}.json"
+
+    def _head(self, key):
+        try:
+            return self.s3.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def put(self, name, src, content_type=None):
+        # Spool while hashing: the object key depends on the content hash
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            sha, size = _copy_and_hash(src, spool)
+            object_key = self._object_key(sha)
+            if self._head(object_key) is None:
+                spool.seek(0)
+                extra = {"ContentType": content_type} if content_type else None
+                self.s3.upload_fileobj(spool, self.bucket, object_key, ExtraArgs=extra)
+
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self._ref_key(name),
+            Body=json.dumps(_ref_record(sha, size, content_type)).encode(),
+            ContentType="application/json",
+        )
+        return sha
+
+    def stat(self, name):
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=self._ref_key(name))["Body"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return json.loads(body.read())
+
+    def open(self, name):
+        ref = self.stat(name)
+        if ref is None:
+            raise FileNotFoundError(f"Artifact not found: {name}")
+        return self.s3.get_object(Bucket=self.bucket, Key=self._object_key(ref["sha256"]))["Body"]
+
+    def delete(self, name):
+        self.s3.delete_object(Bucket=self.bucket, Key=self._ref_key(name))
+        return True
+
+    def _iter_keys(self, prefix):
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield obj
+
+    def list(self, prefix=""):
+        refs_prefix = f"{self.prefix}refs/"
+        return sorted(
+            obj["Key"][len(refs_prefix):-len(".json")]
+            for obj in self._iter_keys(refs_prefix + _normalize_prefix(prefix))
+            if obj["Key"].endswith(".json")
+        )
+
+    def apply_retention(self, max_age_days, prefix=""):
+        cutoff = time.time() - max_age_days * 86400
+        refs_prefix = f"{self.prefix}refs/"
+        removed = 0
+        for obj in list(self._iter_keys(refs_prefix + _normalize_prefix(prefix))):
+            if obj["LastModified"].timestamp() < cutoff:
+                self.s3.delete_object(Bucket=self.bucket, Key=obj["Key"])
+                removed += 1
+
+        live = self._live_hashes()
+        for obj in list(self._iter_keys(f"{self.prefix}objects/")):
+            # Keep fresh blobs: a concurrent put may not have written its ref yet
+            if obj["Key"].rsplit("/", 1)[-1] not in live and obj["LastModified"].timestamp() < cutoff:
+                self.s3.delete_object(Bucket=self.bucket, Key=obj["Key"])
+        return removed
+
+
+# ---------- Configured Store ----------
+_store = None
+_store_lock = threading.Lock()
+_last_retention_run = weakref.WeakKeyDictionary()  # store -> time.time() of its last run
+
+
+def get_artifact_store():
+    """Build the store from ARTIFACT_STORE_* env vars (defaults to ./artifacts)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.getenv("ARTIFACT_STORE_BACKEND", "local").lower()
+            if backend == "s3":
+                _store = S3ArtifactStore(
+                    bucket=os.environ["ARTIFACT_S3_BUCKET"],
+                    prefix=os.getenv("ARTIFACT_S3_PREFIX", ""),
+                    endpoint_url=os.getenv("ARTIFACT_S3_ENDPOINT_URL"),
+                )
+            else:
+                _store = LocalArtifactStore(os.getenv("ARTIFACT_STORE_ROOT", "artifacts"))
+        return _store
+
+
+def maybe_apply_retention(store, min_interval_seconds=86400, via=None):
+    """Apply ARTIFACT_RETENTION_DAYS to a store at most once per interval (0 / unset disables).
+
+    via(apply, days) runs the deletes, e.g. through side_effects.perform so
+    that a dry run records them instead.
+    """
+    days = float(os.getenv("ARTIFACT_RETENTION_DAYS", "0") or 0)
+    with _store_lock:
+        if days <= 0 or time.time() - _last_retention_run.get(store, 0.0) < min_interval_seconds:
+            return 0
+        _last_retention_run[store] = time.time()
+    try:
+        apply = lambda: store.apply_retention(days)
+        return via(apply, days) if via else apply()
+    except Exception as e:
+        print(f"[artifact_store] Retention failed: {e}")
+        return 0
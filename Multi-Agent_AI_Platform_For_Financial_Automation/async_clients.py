@@ -0,0 +1,196 @@
+# Async Google clients: Sheets/Drive reads and Gmail sends over a shared httpx.AsyncClient
+#
+# The sync tools go through gspread and googleapiclient, which block a thread per
+# request. These clients talk to the same REST endpoints from an event loop so
+# one worker can fan out many reads/sends with asyncio.gather.
+
+import os
+import base64
+import asyncio
+import threading
+
+import httpx
+from gspread.utils import fill_gaps, numericise_all, to_records
+
+SHEETS_API = "https://sheets.googleapis.com/v4/spreadsheets"
+DRIVE_API = "https://www.googleapis.com/drive/v3/files"
+GMAIL_MESSAGES_API = "https://gmail.googleapis.com/gmail/v1/users/me/messages"
+GMAIL_SEND_API = f"{GMAIL_MESSAGES_API}/send"
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets",
+                 "https://www.googleapis.com/auth/drive"]
+
+HTTP_TIMEOUT = float(os.getenv("ASYNC_HTTP_TIMEOUT", "30"))
+MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "50"))
+
+
+def _new_http_client():
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+    )
+
+
+class _TokenSource:
+    """Bearer tokens from google-auth credentials, refreshed in a worker thread when expired"""
+
+    def __init__(self, load_credentials):
+        self._load_credentials = load_credentials
+        self._credentials = None
+        self._lock = threading.Lock()
+
+    def _token_sync(self):
+        from google.auth.transport.requests import Request
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = self._load_credentials()
+            if not self._credentials.valid:
+                self._credentials.refresh(Request())
+            return self._credentials.token
+
+    async def token(self):
+        creds = self._credentials
+        if creds is not None and creds.valid:
+            return creds.token
+        return await asyncio.to_thread(self._token_sync)
+
+
+async def _close_quietly(client):
+    try:
+        await client.aclose()
+    except Exception:
+        pass  # Its loop is gone; dropping the last reference releases the sockets
+
+
+class _AsyncGoogleClient:
+    def __init__(self, token_source, http=None):
+        self._tokens = token_source
+        self._injected = http
+        self._clients = {}  # event loop -> httpx client
+        self._closing = set()
+        self._lock = threading.Lock()
+
+    @property
+    def http(self):
+        # httpx clients are bound to the loop they were first used on: one client per loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                self._retire_closed_loops(loop)
+                client, self._injected = self._injected or _new_http_client(), None
+                self._clients[loop] = client
+            return client
+
+    def _retire_closed_loops(self, loop):
+        """Close (best effort, on `loop`) the clients of event loops that have since been closed"""
+        for old_loop in [l for l in self._clients if l.is_closed()]:
+            task = loop.create_task(_close_quietly(self._clients.pop(old_loop)))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def _request(self, method, url, **kwargs):
+        headers = {"Authorization": f"Bearer {await self._tokens.token()}"}
+        response = await self.http.request(method, url, headers=headers, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        """Close this loop's client and any left over from closed loops"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.pop(loop, None)
+            self._retire_closed_loops(loop)
+            closing = list(self._closing)
+        if client is not None:
+            await client.aclose()
+        if closing:
+            await asyncio.gather(*closing)
+
+
+class AsyncSheetsClient(_AsyncGoogleClient):
+    """Read worksheets of one spreadsheet, by ID or by title (like gspread's client.open)"""
+
+    def __init__(self, spreadsheet_name, credentials_file="service_account.json", http=None, spreadsheet_id=None):
+        def load():
+            from google.oauth2.service_account import Credentials
+            return Credentials.from_service_account_file(credentials_file, scopes=SHEETS_SCOPES)
+
+        super().__init__(_TokenSource(load), http)
+        self.spreadsheet_name = spreadsheet_name
+        self._spreadsheet_id = spreadsheet_id  # Known ID: no Drive name lookup
+
+    async def spreadsheet_id(self):
+        if self._spreadsheet_id is None:
+            escaped = self.spreadsheet_name.replace("'", "\\'")
+            found = await self._request("GET", DRIVE_API, params={
+                "q": f"name = '{escaped}' and mimeType = 'application/vnd.google-apps.spreadsheet' and trashed = false",
+                "fields": "files(id)",
+                "supportsAllDrives": "true",
+                "includeItemsFromAllDrives": "true",
+            })
+            if not found.get("files"):
+                raise FileNotFoundError(f"Spreadsheet not found: {self.spreadsheet_name}")
+            self._spreadsheet_id = found["files"][0]["id"]
+        return self._spreadsheet_id
+
+    async def get_lastUpdateTime(self):
+        """Drive modifiedTime, same value gspread's Spreadsheet.get_lastUpdateTime() returns"""
+        meta = await self._request("GET", f"{DRIVE_API}/{await self.spreadsheet_id()}",
+                                   params={"fields": "modifiedTime", "supportsAllDrives": "true"})
+        return meta["modifiedTime"]
+
+    async def batch_get_records(self, worksheets):
+        """{worksheet: records} for several tabs in a single values:batchGet request"""
+        spreadsheet_id = await self.spreadsheet_id()
+        payload = await self._request("GET", f"{SHEETS_API}/{spreadsheet_id}/values:batchGet",
+                                      params=[("ranges", a1_sheet_name(w)) for w in worksheets])
+        return {
+            worksheet: _values_to_records(value_range.get("values", []))
+            for worksheet, value_range in zip(worksheets, payload.get("valueRanges", []))
+        }
+
+    async def get_all_records(self, worksheet):
+        return (await self.batch_get_records([worksheet]))[worksheet]
+
+
+def a1_sheet_name(worksheet):
+    """Quoted sheet name for an A1 range: "PO's" -> 'PO''s' (embedded quotes are doubled)"""
+    return "'" + worksheet.replace("'", "''") + "'"
+
+
+def _values_to_records(values):
+    """Mirror gspread's get_all_records(): header row as keys, padded rows, numericised cells"""
+    if not values:
+        return []
+    values = fill_gaps(values)
+    keys, rows = values[0], values[1:]
+    return to_records(keys, [numericise_all(row) for row in rows])
+
+
+class AsyncGmailClient(_AsyncGoogleClient):
+    """users.messages.send for the authorized Gmail account"""
+
+    def __init__(self, load_credentials, http=None):
+        super().__init__(_TokenSource(load_credentials), http)
+
+    async def send(self, msg):
+        raw_msg = base64.urlsafe_b64encode(msg.as_bytes()).decode()
+        return await self._request("POST", GMAIL_SEND_API, json={"raw": raw_msg})
+
+    async def find_message(self, rfc822_message_id):
+        """Gmail id of a message carrying this Message-ID header, or None"""
+        found = await self._request("GET", GMAIL_MESSAGES_API, params={
+            "q": f"rfc822msgid:{rfc822_message_id}", "includeSpamTrash": "true"})
+        messages = found.get("messages") or []
+        return messages[0]["id"] if messages else None
+
+
+async def gather_limited(coros, limit):
+    """asyncio.gather with at most `limit` coroutines in flight (results keep input order)"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros))
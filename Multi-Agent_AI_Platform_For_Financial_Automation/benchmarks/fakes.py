@@ -0,0 +1,377 @@
+# In-process fakes for gspread, the Gmail service, an S3 bucket and ChatGroq (configurable latency)
+
+import io
+import re
+import time
+import json
+import base64
+import asyncio
+import itertools
+import threading
+from dataclasses import dataclass
+from email.parser import BytesHeaderParser
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:  # Same shape as botocore's, which artifact_store falls back to catching as Exception
+    class ClientError(Exception):
+        def __init__(self, error_response, operation_name):
+            super().__init__(f"{operation_name}: {error_response['Error']['Code']}")
+            self.response = error_response
+
+
+@dataclass
+class FakeLatency:
+    """Seconds of simulated network latency per call"""
+    sheets: float = 0.0
+    gmail: float = 0.0
+    llm: float = 0.0
+
+
+def _sleep(seconds):
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def _col_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch.upper()) - 64)
+    return index
+
+
+# ---------- gspread ----------
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, records):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = abs(hash(title)) % 10**9
+        self.header = list(records[0].keys()) if records else []
+        self._rows = [[r.get(h, "") for h in self.header] for r in records]
+        self.calls = 0
+
+    @property
+    def row_count(self):
+        return len(self._rows) + 1
+
+    @property
+    def col_count(self):
+        return len(self.header)
+
+    def _call(self):
+        self.calls += 1
+        _sleep(self.spreadsheet.latency.sheets)
+
+    def get_all_records(self, **kwargs):
+        self._call()
+        return [dict(zip(self.header, row)) for row in self._rows]
+
+    def get_all_values(self, **kwargs):
+        self._call()
+        return [list(self.header)] + [[str(v) for v in row] for row in self._rows]
+
+    def row_values(self, row, **kwargs):
+        self._call()
+        return list(self.header) if row == 1 else [str(v) for v in self._rows[row - 2]]
+
+    def get(self, range_name=None, **kwargs):
+        """A1 ranges like 'A2:F5001' (rows are 1-based and include the header row)"""
+        self._call()
+        table = [list(self.header)] + [list(row) for row in self._rows]
+        if not range_name:
+            return table
+        m = re.match(r"^(?:'?[^!]*'?!)?([A-Z]+)(\d+)?(?::([A-Z]+)(\d+)?)?$", range_name)
+        first_col, first_row, last_col, last_row = m.groups()
+        c0 = _col_index(first_col) - 1
+        c1 = _col_index(last_col or first_col)
+        r0 = int(first_row or 1) - 1
+        r1 = int(last_row) if last_row else len(table)
+        return [row[c0:c1] for row in table[r0:r1]]
+
+    def append_row(self, values, **kwargs):
+        self._call()
+        self._rows.append(list(values))
+        self.spreadsheet.touch()
+
+    def append_rows(self, values, **kwargs):
+        self._call()
+        self._rows.extend(list(v) for v in values)
+        self.spreadsheet.touch()
+
+
+class FakeSpreadsheet:
+    def __init__(self, title, workbook, latency):
+        self.title = title
+        self.id = f"fake-{title}"
+        self.latency = latency
+        self._modified = datetime.now(timezone.utc)
+        self._worksheets = {name: FakeWorksheet(self, name, records) for name, records in workbook.items()}
+
+    def touch(self):
+        self._modified = datetime.now(timezone.utc)
+
+    def worksheet(self, title):
+        _sleep(self.latency.sheets)
+        return self._worksheets[title]
+
+    def worksheets(self):
+        return list(self._worksheets.values())
+
+    def get_lastUpdateTime(self):
+        _sleep(self.latency.sheets)
+        return self._modified.isoformat()
+
+
+class FakeGspreadClient:
+    def __init__(self, workbook, latency=None, title="Invoices"):
+        self.latency = latency or FakeLatency()
+        self.spreadsheet = FakeSpreadsheet(title, workbook, self.latency)
+
+    def open(self, title):
+        _sleep(self.latency.sheets)
+        return self.spreadsheet
+
+    def open_by_key(self, key):
+        _sleep(self.latency.sheets)
+        return self.spreadsheet
+
+
+# ---------- Gmail ----------
+class _FakeRequest:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self, **kwargs):
+        return self._fn()
+
+
+class FakeGmailService:
+    """Mimics build('gmail', 'v1').users().messages().send(userId=..., body=...).execute()"""
+
+    def __init__(self, latency=None):
+        self.latency = latency or FakeLatency()
+        self.sent = []
+        self.bytes_sent = 0
+        self._ids = itertools.count(1)
+        self._by_message_id = {}  # Message-ID header -> id, for rfc822msgid: lookups
+        self._lock = threading.Lock()
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def _record(self, raw, rfc822_message_id=None):
+        with self._lock:
+            message_id = f"fake-{next(self._ids):08d}"
+            self.sent.append(message_id)
+            self.bytes_sent += len(raw)
+            if rfc822_message_id:
+                self._by_message_id[rfc822_message_id] = message_id
+        return {"id": message_id, "threadId": message_id}
+
+    def find(self, rfc822_message_id):
+        with self._lock:
+            return self._by_message_id.get(rfc822_message_id)
+
+    def send(self, userId="me", body=None):
+        def _send():
+            _sleep(self.latency.gmail)
+            raw = body.get("raw", "")
+            headers = BytesHeaderParser().parsebytes(base64.urlsafe_b64decode(raw))
+            return self._record(raw, headers["Message-ID"])
+        return _FakeRequest(_send)
+
+    def list(self, userId="me", q=None, **kwargs):
+        def _list():
+            m = re.match(r"^rfc822msgid:(\S+)$", q or "")
+            found = self.find(m.group(1)) if m else None
+            return {"messages": [{"id": found}] if found else [], "resultSizeEstimate": int(bool(found))}
+        return _FakeRequest(_list)
+
+
+# ---------- Async clients ----------
+class FakeAsyncSheetsClient:
+    """Stands in for async_clients.AsyncSheetsClient, reading a FakeGspreadClient's workbook"""
+
+    def __init__(self, client):
+        self.client = client
+        self.latency = client.latency
+
+    async def get_lastUpdateTime(self):
+        await asyncio.sleep(self.latency.sheets)
+        return self.client.spreadsheet._modified.isoformat()
+
+    async def batch_get_records(self, worksheets):
+        await asyncio.sleep(self.latency.sheets)
+        result = {}
+        for title in worksheets:
+            worksheet = self.client.spreadsheet._worksheets[title]
+            worksheet.calls += 1
+            result[title] = [dict(zip(worksheet.header, row)) for row in worksheet._rows]
+        return result
+
+    async def get_all_records(self, worksheet):
+        return (await self.batch_get_records([worksheet]))[worksheet]
+
+
+class FakeAsyncGmailClient:
+    """Stands in for async_clients.AsyncGmailClient, recording into a FakeGmailService"""
+
+    def __init__(self, gmail):
+        self.gmail = gmail
+
+    async def send(self, msg):
+        await asyncio.sleep(self.gmail.latency.gmail)
+        return self.gmail._record(msg.as_string(), msg["Message-ID"])
+
+    async def find_message(self, rfc822_message_id):
+        return self.gmail.find(rfc822_message_id)
+
+
+# ---------- S3 (MinIO-style) ----------
+class _FakePaginator:
+    def __init__(self, s3):
+        self._s3 = s3
+
+    def paginate(self, Bucket, Prefix=""):
+        keys = self._s3._keys(Bucket, Prefix)
+        for start in range(0, max(len(keys), 1), self._s3.page_size):
+            page = keys[start:start + self._s3.page_size]
+            yield {"KeyCount": len(page), **({"Contents": [self._s3._summary(Bucket, k) for k in page]} if page else {})}
+
+
+class FakeS3Client:
+    """The boto3 S3 client calls S3ArtifactStore makes, against in-memory buckets.
+
+    Like MinIO or S3, missing keys raise ClientError ("NoSuchKey" for GETs,
+    "404" for HEADs) and listings come back in pages of page_size keys, in key
+    order. age(prefix, seconds) backdates LastModified to exercise retention.
+    """
+
+    def __init__(self, buckets=("artifacts",), page_size=1000):
+        self.page_size = page_size
+        self._buckets = {name: {} for name in buckets}
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _bucket(self, bucket, operation):
+        self.calls += 1
+        if bucket not in self._buckets:
+            raise ClientError({"Error": {"Code": "NoSuchBucket", "Message": bucket}}, operation)
+        return self._buckets[bucket]
+
+    def _object(self, bucket, key, operation, code="NoSuchKey"):
+        objects = self._bucket(bucket, operation)
+        with self._lock:
+            if key not in objects:
+                raise ClientError({"Error": {"Code": code, "Message": key}}, operation)
+            return objects[key]
+
+    def _keys(self, bucket, prefix):
+        objects = self._bucket(bucket, "ListObjectsV2")
+        with self._lock:
+            return sorted(k for k in objects if k.startswith(prefix))
+
+    def _summary(self, bucket, key):
+        obj = self._buckets[bucket][key]
+        return {"Key": key, "Size": len(obj["Body"]), "LastModified": obj["LastModified"]}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, **kwargs):
+        objects = self._bucket(Bucket, "PutObject")
+        data = Body if isinstance(Body, bytes) else Body.read()
+        with self._lock:
+            objects[Key] = {"Body": data, "ContentType": ContentType, "LastModified": datetime.now(timezone.utc)}
+        return {"ETag": f'"{len(data)}"'}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        self.put_object(Bucket, Key, Fileobj.read(), **(ExtraArgs or {}))
+
+    def head_object(self, Bucket, Key):
+        obj = self._object(Bucket, Key, "HeadObject", code="404")
+        return {"ContentLength": len(obj["Body"]), "ContentType": obj["ContentType"],
+                "LastModified": obj["LastModified"]}
+
+    def get_object(self, Bucket, Key):
+        obj = self._object(Bucket, Key, "GetObject")
+        return {"Body": io.BytesIO(obj["Body"]), "ContentLength": len(obj["Body"]),
+                "LastModified": obj["LastModified"]}
+
+    def delete_object(self, Bucket, Key):
+        objects = self._bucket(Bucket, "DeleteObject")
+        with self._lock:
+            objects.pop(Key, None)  # Deleting a missing key succeeds, as in S3
+        return {}
+
+    def get_paginator(self, operation):
+        if operation != "list_objects_v2":
+            raise NotImplementedError(operation)
+        return _FakePaginator(self)
+
+    def age(self, bucket, prefix, seconds):
+        """Move LastModified of every key under prefix back by seconds"""
+        with self._lock:
+            for key, obj in self._buckets[bucket].items():
+                if key.startswith(prefix):
+                    obj["LastModified"] -= timedelta(seconds=seconds)
+
+
+# ---------- ChatGroq ----------
+class FakeChatGroq(BaseChatModel):
+    """Deterministic chat model: sleeps `latency` seconds and echoes a canned answer.
+
+    Recognizes the JSON-list prompts used for batched insights and the
+    router prompt, so parsing code paths behave like production.
+    """
+
+    latency: float = 0.0
+    model_name: str = "fake-llama3"
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq"
+
+    def _respond(self, prompt: str) -> str:
+        if "AGENT:" in prompt and "Task:" in prompt:
+            return "Analysis: benchmark routing\nAGENT: PAYROLL"
+        if "JSON" in prompt and "insight" in prompt.lower():
+            ids = re.findall(r'"id":\s*"?([\w\- ()]+?)"?[,}]', prompt)
+            return json.dumps([{"id": i, "insight": f"Synthetic insight for {i}."} for i in ids])
+        return ("**1. Summary**\nSynthetic analysis for benchmarking.\n"
+                "1. First recommendation\n2. Second recommendation\n3. Third recommendation")
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        _sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    def _result(self, messages) -> ChatResult:
+        self.calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = self._respond(prompt)
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(text) // 4)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        message = AIMessage(
+            content=text,
+            response_metadata={"token_usage": usage, "model_name": self.model_name},
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"token_usage": usage, "model_name": self.model_name})
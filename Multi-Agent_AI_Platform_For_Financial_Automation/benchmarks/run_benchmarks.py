@@ -0,0 +1,214 @@
+# Offline benchmark harness: per-tool timings, throughput and peak memory
+#
+# Usage (from the Multi-Agent_AI_Platform_For_Financial_Automation directory):
+#   python -m benchmarks.run_benchmarks --scales 1000,10000,100000 --json bench.json
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks.fakes import (FakeLatency, FakeGspreadClient, FakeGmailService, FakeChatGroq,
+                              FakeAsyncSheetsClient, FakeAsyncGmailClient)
+from benchmarks.synthetic_data import generate_workbook
+
+RENDER_LIMIT = 10_000   # PDF rendering / email steps (one file or message per row)
+QUADRATIC_LIMIT = 10_000
+LLM_PER_ROW_LIMIT = 1_000
+
+# workflow -> [(tool name, module function, tool input, max rows run by default)]
+WORKFLOWS = {
+    "payroll": [
+        ("FetchPayrollData", "fetch_payroll_data_tool", None, None),
+        ("CalculateSalaries", "calculate_salaries_tool", None, None),
+        ("GeneratePayslips", "generate_payslips_tool", None, RENDER_LIMIT),
+        ("SendPayslips", "send_payslips_tool", None, RENDER_LIMIT),
+    ],
+    "invoice": [
+        ("CreateInvoices", "create_all_invoice_pdfs_tool", None, RENDER_LIMIT),
+        ("SendInvoices", "send_all_invoices_tool", None, RENDER_LIMIT),
+        ("RemindOverdueInvoices", "remind_overdue_invoices_tool", None, RENDER_LIMIT),
+        ("MarkPaidInvoices", "mark_paid_invoices_tool", None, None),
+    ],
+    "report": [
+        ("FetchFinancialData", "fetch_financial_data_tool", None, None),
+        ("CalculateFinancialMetrics", "calculate_financial_metrics_tool", None, None),
+        ("GenerateChartInsight", "generate_chart_insight_tool", '{"chart_type": "income"}', None),
+        ("GenerateFinancialSummary", "generate_financial_summary_tool", None, None),
+        ("GenerateFinancialReport", "generate_financial_report_tool", None, None),
+    ],
+    "procurement": [
+        ("FetchProcurementData", "fetch_procurement_data", None, None),
+        ("BudgetProcessor", "budget_processor", None, None),
+        ("InventoryProcessor", "inventory_processor", None, None),
+        ("ApprovalProcessor", "approval_processor", None, QUADRATIC_LIMIT),
+        ("Notifier", "notifier_tool", None, LLM_PER_ROW_LIMIT),
+        ("GenerateProcurementReport", "report_generator", None, QUADRATIC_LIMIT),
+    ],
+}
+
+
+def _copy_fonts(workdir):
+    """The report tools load DejaVu TTFs from the working directory; matplotlib ships them"""
+    import matplotlib
+    font_dir = os.path.join(os.path.dirname(matplotlib.__file__), "mpl-data", "fonts", "ttf")
+    for name in ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf", "DejaVuSans-Oblique.ttf"):
+        src = os.path.join(font_dir, name)
+        if os.path.exists(src):
+            shutil.copy(src, os.path.join(workdir, name))
+
+
+def install_fakes(fma, workbook, latency, workdir):
+    """Point the agent module at in-process fakes and reset its global state"""
+    from artifact_store import LocalArtifactStore
+    from sheet_cache import SheetSnapshotCache
+    from checkpoints import CheckpointLog
+    from reminder_history import ReminderHistory
+    from ledger_aggregates import IncrementalLedger
+    from side_effects import CaptureLocal
+
+    client = FakeGspreadClient(workbook, latency)
+    gmail = FakeGmailService(latency)
+    fma.tenant_clients.reset()
+    fma.tenant_clients.register("gspread", lambda tenant: client)
+    fma.tenant_clients.register("gmail", lambda tenant: gmail)
+    fma.get_gmail_credentials = lambda tenant=None: None
+    fma.build = lambda *args, **kwargs: gmail
+    fma.async_sheets = FakeAsyncSheetsClient(client)
+    fma.async_gmail = FakeAsyncGmailClient(gmail)
+    fma.chat = FakeChatGroq(latency=latency.llm, callbacks=[fma.llm_meter])
+    fma.models.register("large", fma.chat)
+    fma.models.register("fast", FakeChatGroq(latency=latency.llm, model_name="fake-llama3-8b",
+                                             callbacks=[fma.llm_meter]))
+    fma.sheet_cache = SheetSnapshotCache(enabled=False)  # Measure the Sheets read path itself
+    # Captured runs (side_effects.capture) keep their own copies, as in the module
+    fma.artifact_store = CaptureLocal("artifact_store", LocalArtifactStore(os.path.join(workdir, "artifacts")),
+                                      lambda sink, tenant: LocalArtifactStore(sink.artifact_root))
+    fma.checkpoints = CaptureLocal("checkpoints", CheckpointLog(os.path.join(workdir, "checkpoints.sqlite3")),
+                                   lambda sink, tenant: CheckpointLog(sink.state_path("checkpoints.sqlite3", tenant)))
+    fma.reminder_history = CaptureLocal(
+        "reminder_history", ReminderHistory(os.path.join(workdir, "reminder_history.sqlite3")),
+        lambda sink, tenant: ReminderHistory(sink.state_path("reminder_history.sqlite3", tenant)))
+    fma.ledger = IncrementalLedger(os.path.join(workdir, "ledger_aggregates.sqlite3"))
+    for service in ("groq", "sheets", "gmail"):
+        fma.resilience.configure(service, rate=None)  # Fakes have no quota; keep retries/breakers
+
+    fma.shared_data.reset()
+    fma.procurement.reset()
+    return client, gmail
+
+
+def _looks_like_error(output):
+    text = output if isinstance(output, str) else json.dumps(output, default=str)
+    return '"status": "error"' in text or text.startswith("❌") or "not ready" in text
+
+
+def run_step(fn, tool_input, measure_memory):
+    if measure_memory:
+        tracemalloc.start()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = fn(tool_input)
+        status = "error" if _looks_like_error(output) else "ok"
+    except Exception as e:
+        output, status = f"{type(e).__name__}: {e}", "exception"
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    peak = 0
+    if measure_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"status": status, "seconds": wall, "cpu_seconds": cpu,
+            "peak_mb": peak / 2**20, "output": str(output)[:200]}
+
+
+def run_benchmarks(scales, workflows, latency, no_limits=False, measure_memory=True):
+    base_dir = tempfile.mkdtemp(prefix="finance-bench-")
+    os.environ["ARTIFACT_STORE_ROOT"] = os.path.join(base_dir, "artifacts")
+    os.environ.setdefault("GROQ_API_KEY", "benchmark-offline")
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    os.environ.setdefault("SENDER_EMAIL", "finance-bench@example.com")
+    original_cwd = os.getcwd()
+    os.chdir(base_dir)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import Fully_multi_agent as fma
+
+    results = []
+    try:
+        for rows in scales:
+            workbook = generate_workbook(rows)
+            for workflow in workflows:
+                workdir = tempfile.mkdtemp(dir=base_dir)
+                os.chdir(workdir)
+                _copy_fonts(workdir)
+                client, gmail = install_fakes(fma, workbook, latency, workdir)
+                skipped_upstream = False
+                for tool_name, func_name, tool_input, limit in WORKFLOWS[workflow]:
+                    row = {"workflow": workflow, "tool": tool_name, "rows": rows}
+                    if skipped_upstream or (limit and rows > limit and not no_limits):
+                        skipped_upstream = True
+                        row.update(status="skipped", seconds=None)
+                        results.append(row)
+                        continue
+                    row.update(run_step(getattr(fma, func_name), tool_input, measure_memory))
+                    row["rows_per_second"] = rows / row["seconds"] if row["seconds"] else None
+                    row["llm_calls"] = fma.chat.calls
+                    row["emails_sent"] = len(gmail.sent)
+                    results.append(row)
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return results
+
+
+def print_table(results):
+    header = f"{'workflow':<12} {'tool':<28} {'rows':>8} {'status':<9} {'wall s':>9} {'cpu s':>9} {'rows/s':>11} {'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if r["seconds"] is None:
+            print(f"{r['workflow']:<12} {r['tool']:<28} {r['rows']:>8} {r['status']:<9}")
+            continue
+        print(f"{r['workflow']:<12} {r['tool']:<28} {r['rows']:>8} {r['status']:<9} "
+              f"{r['seconds']:>9.3f} {r['cpu_seconds']:>9.3f} {r['rows_per_second'] or 0:>11,.0f} {r['peak_mb']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the finance agent tools")
+    parser.add_argument("--scales", default="1000,10000,100000", help="Comma-separated row counts")
+    parser.add_argument("--workflows", default=",".join(WORKFLOWS), help="Comma-separated workflows")
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="Seconds per Sheets call")
+    parser.add_argument("--gmail-latency", type=float, default=0.0, help="Seconds per Gmail send")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per LLM call")
+    parser.add_argument("--no-limits", action="store_true", help="Run render/LLM-per-row steps at every scale")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (faster, no peak MB)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    latency = FakeLatency(sheets=args.sheets_latency, gmail=args.gmail_latency, llm=args.llm_latency)
+    results = run_benchmarks(
+        scales=[int(s) for s in args.scales.split(",") if s],
+        workflows=[w for w in args.workflows.split(",") if w],
+        latency=latency,
+        no_limits=args.no_limits,
+        measure_memory=not args.no_memory,
+    )
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Synthetic worksheet data for offline benchmarks (same shape as get_all_records())
+
+import random
+from datetime import date, timedelta
+
+DEPARTMENTS = ["Finance", "HR", "Engineering", "Sales", "Operations", "Support"]
+CATEGORIES = ["Office Supplies", "IT Hardware", "Software", "Logistics", "Marketing", "Facilities", "Travel"]
+VENDORS = [f"Vendor {i:03d}" for i in range(150)]
+SUPPLIERS = [f"Supplier {i:03d}" for i in range(60)]
+FIRST_YEAR = 2023
+
+
+def _money(rng, low, high, as_text_ratio=0.3):
+    """Sheets return plain numbers for most cells but formatted text for some"""
+    value = rng.randint(low, high)
+    return f"{value:,}" if rng.random() < as_text_ratio else value
+
+
+def _day(rng, start=date(2023, 1, 1), span_days=900):
+    return (start + timedelta(days=rng.randrange(span_days))).strftime("%Y-%m-%d")
+
+
+def employees(n, rng):
+    return [{
+        "employee_id": f"E{i:06d}",
+        "name": f"Employee {i}",
+        "email": f"employee{i}@example.com",
+        "base_salary": _money(rng, 60_000, 450_000),
+        "department": rng.choice(DEPARTMENTS),
+    } for i in range(n)]
+
+
+def attendance(n, rng):
+    return [{
+        "employee_id": f"E{i:06d}",
+        "leaves_taken": rng.randint(0, 6),
+        "allowed_leaves": 2,
+        "late_arrivals": rng.randint(0, 5),
+        "overtime_hours": rng.randint(0, 30),
+    } for i in range(n)]
+
+
+def salary_policy(n, rng):
+    return [
+        {"rule_name": "leave_penalty", "value": 2000},
+        {"rule_name": "late_penalty", "value": 500},
+        {"rule_name": "overtime_rate", "value": 750},
+        {"rule_name": "max_overtime_allowed", "value": 20},
+    ]
+
+
+def payslips(n, rng):
+    return []
+
+
+def invoices(n, rng):
+    customers = max(1, n // 5)
+    rows = []
+    for i in range(n):
+        c = rng.randrange(customers)
+        issued = _day(rng)
+        due = (date.fromisoformat(issued) + timedelta(days=30)).strftime("%Y-%m-%d")
+        rows.append({
+            "invoice_id": f"INV{i:07d}",
+            "customer_name": f"Customer {c}",
+            "customer_email": f"customer{c}@example.com",
+            "date": issued,
+            "due_date": due,
+            "amount": _money(rng, 5_000, 2_500_000),
+            "status": rng.choice(["paid", "unpaid", "unpaid"]),
+        })
+    return rows
+
+
+def purchase_orders(n, rng):
+    return [{
+        "Date": _day(rng),
+        "Item": f"Item {rng.randrange(max(1, n // 10)):05d}",
+        "Vendor": rng.choice(VENDORS),
+        "Category": rng.choice(CATEGORIES),
+        "Qty": rng.randint(1, 500),
+        "Price": rng.randint(50, 150_000),
+    } for _ in range(n)]
+
+
+def budgets(n, rng):
+    return [{"Category": c, "Budget Amount": rng.randint(20_000_000, 200_000_000)} for c in CATEGORIES]
+
+
+def spend(n, rng):
+    return [{
+        "Date": _day(rng),
+        "Category": rng.choice(CATEGORIES),
+        "Amount Spent": rng.randint(1_000, 400_000),
+    } for _ in range(n)]
+
+
+def inventory(n, rng):
+    return [{
+        "Item": f"Item {i:05d}",
+        "Category": rng.choice(CATEGORIES),
+        "Current Stock": rng.randint(0, 2_000),
+        "Reorder Level": rng.randint(50, 600),
+        "Supplier": rng.choice(SUPPLIERS),
+    } for i in range(max(1, n // 10))]
+
+
+def _year_columns(years):
+    return [f"{FIRST_YEAR + i} (PKR)" for i in range(years)]
+
+
+def income_statement(n, rng, years=3):
+    rows = []
+    for metric, (low, high) in {
+        "Revenue": (80_000_000, 200_000_000),
+        "COGS": (30_000_000, 60_000_000),
+        "Operating Expenses": (10_000_000, 25_000_000),
+        "Other Expenses": (1_000_000, 5_000_000),
+    }.items():
+        rows.append({"Metric": metric, **{y: _money(rng, low, high) for y in _year_columns(years)}})
+    return rows
+
+
+def balance_sheet(n, rng, years=3):
+    return [
+        {"Metric": metric, **{y: _money(rng, 5_000_000, 60_000_000) for y in _year_columns(years)}}
+        for metric in ["Cash", "Inventory", "Equipment", "Loans", "Accounts Payable"]
+    ]
+
+
+def cash_flow(n, rng, years=3):
+    return [
+        {"Category": metric, **{y: _money(rng, -20_000_000, 40_000_000, 0) for y in _year_columns(years)}}
+        for metric in ["Starting Balance", "Net Operating Cash Flow",
+                       "Net Investing Cash Flow", "Net Financing Cash Flow"]
+    ]
+
+
+def stakeholders(n, rng):
+    return [{"stakeholders_email": f"stakeholder{i}@example.com"} for i in range(5)]
+
+
+# Worksheet title -> generator(n, rng)
+GENERATORS = {
+    "Employees": employees,
+    "Attendance": attendance,
+    "SalaryPolicy": salary_policy,
+    "Payslips": payslips,
+    "Invoices": invoices,
+    "PO's": purchase_orders,
+    "Budgets": budgets,
+    "Spend": spend,
+    "Inventory": inventory,
+    "Income_Statement": income_statement,
+    "Balance_Sheet": balance_sheet,
+    "Cash_Flow": cash_flow,
+    "Stakeholders": stakeholders,
+}
+
+
+def generate_workbook(n, seed=42):
+    """{worksheet title: records} for every tab the tools read, scaled to n rows"""
+    rng = random.Random(seed)
+    return {title: generator(n, rng) for title, generator in GENERATORS.items()}
@@ -0,0 +1,243 @@
+# Checkpoints: durable per-run log of completed work units (SQLite reference backend)
+#
+# A run is a deterministic business key such as "payslips:2025-06" or
+# "reminders:2025-06-14"; units are things like "render:E123" or "email:E123".
+# Rerunning a crashed workflow skips every unit already marked done, so
+# recovery costs only the remaining work and nobody gets emailed twice.
+#
+# Sends are two-phase: the unit is claimed as pending (with a deterministic
+# Message-ID) before the Gmail call and done after it. The claim is one
+# BEGIN IMMEDIATE transaction that records an owner and a lease, so of two
+# runs racing for a unit (a scheduled job and an API call, or two service
+# workers on one tenant file) only the winner sends; the loser gets
+# UnitBusyError. A unit found pending with an expired lease crashed mid-send;
+# it is confirmed against the mailbox by Message-ID before sending again.
+
+import os
+import json
+import sqlite3
+import hashlib
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    run_id TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    status TEXT NOT NULL,
+    detail TEXT,
+    updated_at TEXT NOT NULL,
+    owner TEXT,
+    lease_until TEXT,
+    PRIMARY KEY (run_id, unit)
+)
+"""
+
+
+def message_id_for(run_id, unit, domain="finance-agent.local"):
+    """Stable RFC 5322 Message-ID for a unit, so a resumed send can be looked up"""
+    digest = hashlib.sha256(f"{run_id}|{unit}".encode()).hexdigest()[:32]
+    return f"<{digest}@{domain}>"
+
+
+class UnitBusyError(RuntimeError):
+    """Another run holds an unexpired claim on the unit; it is neither done nor ours to redo"""
+
+    def __init__(self, run_id, unit, owner, lease_until):
+        super().__init__(f"{run_id} {unit} is in progress elsewhere (claimed by {owner} until {lease_until})")
+        self.run_id = run_id
+        self.unit = unit
+
+
+class CheckpointLog:
+    def __init__(self, path="checkpoints.sqlite3", enabled=True, lease_seconds=600):
+        self.path = path
+        self.enabled = enabled
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(units)")}
+            for column in ("owner", "lease_until"):  # Files written before claims existed
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE units ADD COLUMN {column} TEXT")
+        return self._conn
+
+    @contextmanager
+    def _cursor(self):
+        with self._lock:
+            yield self.conn
+
+    # ---------- Unit state ----------
+    def get(self, run_id, unit):
+        """(status, detail) for a unit, or None if it was never started"""
+        if not self.enabled:
+            return None
+        with self._cursor() as conn:
+            row = conn.execute("SELECT status, detail FROM units WHERE run_id = ? AND unit = ?",
+                               (run_id, unit)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else {}
+
+    def is_done(self, run_id, unit):
+        state = self.get(run_id, unit)
+        return state is not None and state[0] == "done"
+
+    def _set(self, run_id, unit, status, detail=None):
+        if not self.enabled:
+            return
+        with self._cursor() as conn:
+            conn.execute(
+                "INSERT INTO units (run_id, unit, status, detail, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, unit) DO UPDATE SET status = excluded.status, "
+                "detail = excluded.detail, updated_at = excluded.updated_at, owner = NULL, lease_until = NULL",
+                (run_id, unit, status, json.dumps(detail or {}, default=str), datetime.now().isoformat()),
+            )
+
+    def mark_pending(self, run_id, unit, **detail):
+        self._set(run_id, unit, "pending", detail)
+
+    def mark_done(self, run_id, unit, **detail):
+        self._set(run_id, unit, "done", detail)
+
+    def progress(self, run_id):
+        """{status: count} for a run"""
+        if not self.enabled:
+            return {}
+        with self._cursor() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM units WHERE run_id = ? GROUP BY status",
+                                (run_id,)).fetchall()
+        return dict(rows)
+
+    def reset(self, run_id, unit=None):
+        """Forget a run (or one unit) so it is redone from scratch"""
+        if not self.enabled:
+            return
+        with self._cursor() as conn:
+            if unit is None:
+                conn.execute("DELETE FROM units WHERE run_id = ?", (run_id,))
+            else:
+                conn.execute("DELETE FROM units WHERE run_id = ? AND unit = ?", (run_id, unit))
+
+    # ---------- Claims ----------
+    def claim(self, run_id, unit, owner, **detail):
+        """Atomically take a unit for owner; returns (status, detail) as it was before.
+
+        status is None for a unit never started (it is inserted as pending
+        with detail), "done" (left untouched) or "pending" for one whose
+        previous claim lapsed (the lease moves to owner, its detail is kept
+        for confirmation). An unexpired claim by someone else raises
+        UnitBusyError.
+        """
+        if not self.enabled:
+            return None, {}
+        now = datetime.now()
+        lease_until = (now + timedelta(seconds=self.lease_seconds)).isoformat()
+        with self._cursor() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT status, detail, owner, lease_until FROM units "
+                                   "WHERE run_id = ? AND unit = ?", (run_id, unit)).fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO units (run_id, unit, status, detail, updated_at, owner, lease_until) "
+                                 "VALUES (?, ?, 'pending', ?, ?, ?, ?)",
+                                 (run_id, unit, json.dumps(detail, default=str), now.isoformat(), owner, lease_until))
+                    conn.execute("COMMIT")
+                    return None, {}
+                status, previous, holder, held_until = row
+                if status != "done":
+                    if holder not in (None, owner) and held_until and held_until > now.isoformat():
+                        raise UnitBusyError(run_id, unit, holder, held_until)
+                    conn.execute("UPDATE units SET owner = ?, lease_until = ?, updated_at = ? "
+                                 "WHERE run_id = ? AND unit = ?", (owner, lease_until, now.isoformat(), run_id, unit))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return status, json.loads(previous) if previous else {}
+
+    def release(self, run_id, unit, owner):
+        """Drop owner's lease and leave the unit pending, e.g. after a failed send that may have
+        been delivered; the next run confirms it instead of waiting for the lease to run out"""
+        if not self.enabled:
+            return
+        with self._cursor() as conn:
+            conn.execute("UPDATE units SET owner = NULL, lease_until = NULL "
+                         "WHERE run_id = ? AND unit = ? AND owner = ? AND status = 'pending'", (run_id, unit, owner))
+
+    # ---------- Exactly-once execution ----------
+    def run_once(self, run_id, unit, action, confirm=None, **pending):
+        """Run action() -> detail dict unless the unit is done; returns True if it ran now.
+
+        The unit is claimed first (recording pending, e.g. a Message-ID), so
+        only one run at a time gets past this point. A unit left pending by a
+        crash is passed to confirm(pending_detail), which returns the detail
+        if the side effect already happened (the unit is then marked done
+        without re-running) or None to run again.
+        """
+        owner = uuid.uuid4().hex
+        status, detail = self.claim(run_id, unit, owner, **pending)
+        if status == "done":
+            return False
+        try:
+            if status == "pending" and confirm is not None:
+                confirmed = confirm(detail)
+                if confirmed is not None:
+                    self.mark_done(run_id, unit, **confirmed)
+                    return False
+            detail = action()
+        except BaseException:
+            self.release(run_id, unit, owner)
+            raise
+        self.mark_done(run_id, unit, **(detail or {}))
+        return True
+
+    async def arun_once(self, run_id, unit, action, confirm=None, **pending):
+        """Async run_once(): action() and confirm() return awaitables"""
+        owner = uuid.uuid4().hex
+        status, detail = self.claim(run_id, unit, owner, **pending)
+        if status == "done":
+            return False
+        try:
+            if status == "pending" and confirm is not None:
+                confirmed = await confirm(detail)
+                if confirmed is not None:
+                    self.mark_done(run_id, unit, **confirmed)
+                    return False
+            detail = await action()
+        except BaseException:
+            self.release(run_id, unit, owner)
+            raise
+        self.mark_done(run_id, unit, **(detail or {}))
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def checkpoint_log_from_env(path_for=None):
+    """CHECKPOINT_DB (default ./checkpoints.sqlite3); CHECKPOINTS_DISABLED=1 turns it off;
+    CHECKPOINT_LEASE_SECONDS (default 600) bounds how long a crashed run's claim blocks others
+
+    path_for(path) maps the configured path, e.g. to a per-tenant file.
+    """
+    path = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite3")
+    return CheckpointLog(
+        path=path_for(path) if path_for else path,
+        enabled=os.getenv("CHECKPOINTS_DISABLED", "0") != "1",
+        lease_seconds=float(os.getenv("CHECKPOINT_LEASE_SECONDS", "600")),
+    )
@@ -0,0 +1,232 @@
+# Finance Agent CLI: non-interactive entry points (cron jobs, CI, containers)
+#
+#   python finance_agent.py run payroll --tenant acme [--as-of 2026-05-31] [--dry-run | --shadow | --plan]
+#   python finance_agent.py task "Send late payment reminders" --tenant acme
+#   python finance_agent.py pipelines | tenants
+#   python finance_agent.py schedule run | status | backfill payroll --start 2026-01-01 --end 2026-05-31
+#   python finance_agent.py serve --port 8080 --workers 4
+#
+# Results are printed to stdout as JSON; tool and agent logs go to stderr. The
+# exit code is 0 on success, 1 when the task or pipeline failed and 2 on usage
+# errors, so shell schedulers and CI can act on it. --dry-run / --shadow run
+# everything but capture sends and sheet writes locally (see side_effects.py).
+
+import os
+import sys
+import json
+import argparse
+import contextlib
+from datetime import datetime
+
+import tenants
+import side_effects
+
+EXIT_OK, EXIT_FAILED, EXIT_USAGE = 0, 1, 2
+os.environ.setdefault("GMAIL_INTERACTIVE_AUTH", "0")  # Headless: fail instead of opening a browser
+
+
+def _agent():
+    """Import the agent module with its start-up output on stderr"""
+    with contextlib.redirect_stdout(sys.stderr):
+        import Fully_multi_agent as fma
+    return fma
+
+
+def _date(text):
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO date: {text!r}") from None
+
+
+def _emit(result, as_text=False):
+    if as_text and isinstance(result, dict) and "output" in result:
+        print(result["output"])
+    else:
+        print(json.dumps(result, indent=2, default=str))
+
+
+def _capture_sink(args):
+    """(mode, sink) for --dry-run / --shadow: one capture shared by every tenant the command runs for"""
+    mode = side_effects.DRY_RUN if args.dry_run else side_effects.SHADOW if args.shadow else None
+    if mode is None:
+        return None, None  # Live, unless SIDE_EFFECTS_MODE says otherwise
+    sink = side_effects.CaptureSink(args.capture_dir or side_effects.new_capture_dir(),
+                                    store_payloads=not args.no_payloads, seed_state=not args.fresh_state)
+    print(f"[side_effects] {mode}: capturing outbound effects in {sink.directory}", file=sys.stderr)
+    return mode, sink
+
+
+def _captured(mode, sink):
+    return side_effects.capture(mode, sink) if sink is not None else contextlib.nullcontext()
+
+
+def _tenant_ids(args):
+    if args.all_tenants:
+        return [t.tenant_id for t in tenants.registry()]
+    return [args.tenant or tenants.registry().default.tenant_id]
+
+
+def cmd_run(args):
+    fma = _agent()
+    if args.pipeline not in fma.PIPELINES:
+        print(f"Unknown pipeline {args.pipeline!r}; choose from {', '.join(fma.PIPELINES)}", file=sys.stderr)
+        return EXIT_USAGE
+    tenant_ids = _tenant_ids(args)
+    if args.plan:
+        _emit({"pipeline": args.pipeline, "tenants": tenant_ids, "steps": list(fma.PIPELINES[args.pipeline]),
+               "as_of": (args.as_of or datetime.now()).strftime('%Y-%m-%d')})
+        return EXIT_OK
+    mode, sink = _capture_sink(args)
+
+    def job(tenant):
+        with _captured(mode, sink):  # Entered per job: tenant threads do not inherit the context
+            return fma.run_pipeline(args.pipeline, tenant, args.as_of)
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):  # Process-wide, so once around all tenants' threads
+            if len(tenant_ids) == 1:
+                results = {tenant_ids[0]: job(tenant_ids[0])}
+            else:
+                results = tenants.TenantScheduler().run(job, tenant_ids)
+    finally:
+        if sink is not None:
+            sink.close()
+    failed = any(isinstance(r, Exception) or r.get("status") != "success" for r in results.values())
+    _emit(results[tenant_ids[0]] if len(results) == 1 else results)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def cmd_task(args):
+    fma = _agent()
+    mode, sink = _capture_sink(args)
+    try:
+        with contextlib.redirect_stdout(sys.stderr), _captured(mode, sink):
+            result = fma.execute_task(args.task, tenant=args.tenant)
+    finally:
+        if sink is not None:
+            sink.close()
+    if isinstance(result, dict):
+        if not args.trace:
+            result.pop("trace_log", None)
+        if sink is not None:
+            result["side_effects"] = {"mode": mode, **sink.summary()}
+    _emit(result, as_text=args.text)
+    output = result.get("output", "") if isinstance(result, dict) else str(result)
+    return EXIT_FAILED if str(output).startswith("❌") else EXIT_OK
+
+
+def cmd_pipelines(args):
+    _emit({name: list(steps) for name, steps in _agent().PIPELINES.items()})
+    return EXIT_OK
+
+
+def cmd_tenants(args):
+    _emit([{"tenant_id": t.tenant_id, "spreadsheet": t.spreadsheet_key, "sender_email": t.sender_email,
+            "approver_email": t.approver_email, "max_concurrent_jobs": t.max_concurrent_jobs} for t in tenants.registry()])
+    return EXIT_OK
+
+
+def _scheduler():
+    import scheduler
+
+    fma = _agent()
+    return scheduler.scheduler_from_env(lambda pipeline, tenant_id, as_of: fma.run_pipeline(pipeline, tenant_id, as_of),
+                                        known_pipelines=fma.PIPELINES)
+
+
+def cmd_schedule(args):
+    sched = _scheduler()
+    try:
+        if args.action == "run":
+            try:
+                sched.run_forever(args.poll)
+            except KeyboardInterrupt:
+                print("\n[scheduler] Stopping; waiting for running jobs", file=sys.stderr)
+        elif args.action == "status":
+            _emit({"counts": sched.counts(),
+                   "jobs": [job._asdict() for job in sched.jobs(status=args.status, schedule=args.schedule,
+                                                                limit=args.limit)]})
+        elif args.action == "backfill":
+            if not (args.schedule and args.start and args.end):
+                print("backfill needs --schedule, --start and --end", file=sys.stderr)
+                return EXIT_USAGE
+            end = args.end.replace(hour=23, minute=59) if args.end.time() == datetime.min.time() else args.end
+            created = sched.backfill(args.schedule, args.start, end, tenant_ids=args.tenant, force=args.force)
+            _emit({"schedule": args.schedule, "jobs_created": created})
+    finally:
+        sched.close()
+    return EXIT_OK
+
+
+def cmd_serve(args):
+    import service
+
+    service.serve(args.host, args.port, args.workers)
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="finance-agent", description="Headless finance automation agents")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    capture = argparse.ArgumentParser(add_help=False)
+    effects = capture.add_mutually_exclusive_group()
+    effects.add_argument("--dry-run", action="store_true", help="Capture sends and sheet writes locally instead")
+    effects.add_argument("--shadow", action="store_true",
+                         help="Like --dry-run, but each captured effect waits for the real rate limits")
+    capture.add_argument("--capture-dir", help="Capture directory (default: captures/<timestamp>)")
+    capture.add_argument("--fresh-state", action="store_true",
+                         help="Start the capture with empty checkpoints/reminder history (full-volume load test)")
+    capture.add_argument("--no-payloads", action="store_true", help="Record effects without the .eml payloads")
+
+    run = commands.add_parser("run", parents=[capture], help="Run a deterministic pipeline (no LLM routing)")
+    run.add_argument("pipeline", help="payroll, invoice_reminders, annual_report or procurement")
+    who = run.add_mutually_exclusive_group()
+    who.add_argument("--tenant", help="Tenant ID (default: the default tenant)")
+    who.add_argument("--all-tenants", action="store_true", help="Run for every configured tenant in parallel")
+    run.add_argument("--as-of", type=_date, help="Business date (ISO), e.g. to redo a past payroll month")
+    run.add_argument("--plan", action="store_true", help="Show the steps that would run, without running them")
+    run.set_defaults(func=cmd_run)
+
+    task = commands.add_parser("task", parents=[capture], help="Route a free-text task to an agent (execute_task)")
+    task.add_argument("task")
+    task.add_argument("--tenant")
+    task.add_argument("--trace", action="store_true", help="Include the agent's reasoning trace")
+    task.add_argument("--text", action="store_true", help="Print only the final answer")
+    task.set_defaults(func=cmd_task)
+
+    commands.add_parser("pipelines", help="List pipelines and their steps").set_defaults(func=cmd_pipelines)
+    commands.add_parser("tenants", help="List configured tenants").set_defaults(func=cmd_tenants)
+
+    schedule = commands.add_parser("schedule", help="Run or inspect the cron scheduler")
+    schedule.add_argument("action", choices=("run", "status", "backfill"))
+    schedule.add_argument("--schedule", help="Schedule name (status filter / backfill target)")
+    schedule.add_argument("--start", type=_date)
+    schedule.add_argument("--end", type=_date, help="Inclusive; a bare date covers the whole day")
+    schedule.add_argument("--tenant", action="append", help="Backfill only these tenants (repeatable)")
+    schedule.add_argument("--force", action="store_true", help="Backfill slots that already ran")
+    schedule.add_argument("--status", help="Status filter for 'status'")
+    schedule.add_argument("--limit", type=int, default=50)
+    schedule.add_argument("--poll", type=float, default=float(os.getenv("SCHEDULER_POLL_SECONDS", "30")))
+    schedule.set_defaults(func=cmd_schedule)
+
+    serve = commands.add_parser("serve", help="Start the HTTP API (see service.py)")
+    serve.add_argument("--host")
+    serve.add_argument("--port", type=int)
+    serve.add_argument("--workers", type=int)
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyError as e:  # Unknown tenant or schedule
+        print(f"Error: {e.args[0]}", file=sys.stderr)
+        return EXIT_USAGE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
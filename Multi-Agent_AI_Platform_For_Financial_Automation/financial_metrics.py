@@ -0,0 +1,78 @@
+# Financial Metrics Engine: multi-year, whole-frame metric computation
+
+import numpy as np
+import pandas as pd
+from sheet_schemas import discover_year_columns, parse_numeric_frame
+
+EXPENSE_ROWS = ["COGS", "Operating Expenses", "Other Expenses"]
+ASSET_ROWS = ["Cash", "Inventory", "Equipment"]
+CURRENT_ASSET_ROWS = ["Cash", "Inventory"]
+LIABILITY_ROWS = ["Loans", "Accounts Payable"]
+CURRENT_LIABILITY_ROWS = ["Accounts Payable"]
+CASH_FLOW_ROWS = ["Net Operating Cash Flow", "Net Investing Cash Flow", "Net Financing Cash Flow"]
+
+# Metrics reported as whole currency amounts; everything else is a ratio
+CURRENCY_METRICS = [
+    "revenue", "net_profit", "total_assets", "total_liabilities", "equity",
+    "starting_cash", "net_cash_flow", "ending_cash",
+]
+
+
+def compute_financial_metrics(income_df, bs_df, cf_df, years=None) -> pd.DataFrame:
+    """Return a metrics x years frame of profit, equity, cash-flow metrics and ratios.
+
+    Inputs are the raw sheet frames indexed by 'Metric' / 'Category'. Every
+    metric is computed as a row-vector over all year columns at once.
+    """
+    if years is None:
+        years = [y for y in discover_year_columns(income_df)
+                 if y in bs_df.columns and y in cf_df.columns]
+    if not years:
+        raise ValueError("No year columns (e.g. '2024 (PKR)') found in financial sheets")
+
+    income = parse_numeric_frame(income_df, years)
+    balance = parse_numeric_frame(bs_df, years)
+    cash = parse_numeric_frame(cf_df, years)
+
+    revenue = income.loc["Revenue"]
+    net_profit = revenue - income.loc[EXPENSE_ROWS].sum()
+    total_assets = balance.loc[ASSET_ROWS].sum()
+    total_liabilities = balance.loc[LIABILITY_ROWS].sum()
+    equity = total_assets - total_liabilities
+    starting_cash = cash.loc["Starting Balance"]
+    net_cash_flow = cash.loc[CASH_FLOW_ROWS].sum()
+
+    metrics = pd.DataFrame({
+        "revenue": revenue,
+        "net_profit": net_profit,
+        "total_assets": total_assets,
+        "total_liabilities": total_liabilities,
+        "equity": equity,
+        "starting_cash": starting_cash,
+        "net_cash_flow": net_cash_flow,
+        "ending_cash": starting_cash + net_cash_flow,
+        "gross_margin": (revenue - income.loc["COGS"]) / revenue,
+        "net_margin": net_profit / revenue,
+        "current_ratio": balance.loc[CURRENT_ASSET_ROWS].sum() / balance.loc[CURRENT_LIABILITY_ROWS].sum(),
+        "debt_to_equity": total_liabilities / equity,
+        "revenue_growth": revenue.pct_change(fill_method=None),
+        "net_profit_growth": net_profit.pct_change(fill_method=None),
+    }).T
+
+    return metrics.replace([np.inf, -np.inf], np.nan)
+
+
+def metrics_to_dict(metrics: pd.DataFrame) -> dict:
+    """{year: {metric: value}} with whole-number currency and 4-dp ratios (None if undefined)"""
+    rounded = metrics.copy()
+    ratio_rows = rounded.index.difference(CURRENCY_METRICS)
+    rounded.loc[CURRENCY_METRICS] = rounded.loc[CURRENCY_METRICS].round(0)
+    rounded.loc[ratio_rows] = rounded.loc[ratio_rows].round(4)
+
+    result = {}
+    for year, column in rounded.items():
+        result[year] = {
+            metric: (None if pd.isna(value) else int(value) if metric in CURRENCY_METRICS else float(value))
+            for metric, value in column.items()
+        }
+    return result
@@ -0,0 +1,309 @@
+# Instrumentation: timing and resource records for tools and external calls
+#
+# Every instrumented call becomes a span with wall time, CPU time, bytes in/out,
+# LLM tokens and retry counts. Spans are exported to OpenTelemetry when an OTLP
+# endpoint is configured, otherwise appended to <TELEMETRY_DIR>/spans.jsonl with
+# aggregated Prometheus text metrics in <TELEMETRY_DIR>/metrics.prom.
+
+import os
+import json
+import time
+import uuid
+import atexit
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry is optional
+    otel_trace = None
+
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", "telemetry")
+DISABLED = os.getenv("INSTRUMENTATION_DISABLED", "0") == "1"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_metrics = {}  # (kind, name) -> aggregated counters for Prometheus text export
+
+
+class Span:
+    __slots__ = (
+        "name", "kind", "trace_id", "span_id", "parent", "started_at", "attributes",
+        "wall_seconds", "cpu_seconds", "bytes_in", "bytes_out",
+        "prompt_tokens", "completion_tokens", "retries", "status", "error", "otel_span",
+    )
+
+    def __init__(self, name, kind, parent=None):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.attributes = {}
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.status = "ok"
+        self.error = None
+        self.otel_span = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "started_at": self.started_at,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "retries": self.retries,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+# ---------- Exporters ----------
+def _otel_tracer():
+    if otel_trace is None or not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return None
+    return otel_trace.get_tracer("finance_multi_agent")
+
+
+def _configure_otel_sdk():
+    """Install an OTLP batch exporter when the SDK is available (no-op otherwise)"""
+    if otel_trace is None or not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return
+    try:
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        return
+    provider = TracerProvider()
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    otel_trace.set_tracer_provider(provider)
+
+
+_configure_otel_sdk()
+_TRACER = _otel_tracer()
+
+
+_pending_lines = []
+JSONL_FLUSH_EVERY = 200
+
+
+def flush_spans():
+    with _lock:
+        lines = list(_pending_lines)
+        _pending_lines.clear()
+    if not lines:
+        return
+    os.makedirs(TELEMETRY_DIR, exist_ok=True)
+    with open(os.path.join(TELEMETRY_DIR, "spans.jsonl"), "a") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _export_jsonl(span):
+    line = json.dumps(span.to_dict(), default=str)
+    with _lock:
+        _pending_lines.append(line)
+        full = len(_pending_lines) >= JSONL_FLUSH_EVERY
+    if full:
+        flush_spans()
+
+
+def _aggregate(span):
+    with _lock:
+        m = _metrics.setdefault((span.kind, span.name), {
+            "calls": 0, "errors": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "bytes_in": 0,
+            "bytes_out": 0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0,
+        })
+        m["calls"] += 1
+        m["errors"] += span.status != "ok"
+        for key in ("wall_seconds", "cpu_seconds", "bytes_in", "bytes_out",
+                    "prompt_tokens", "completion_tokens", "retries"):
+            m[key] += getattr(span, key)
+
+
+def flush_metrics():
+    """Flush buffered spans and write aggregated counters in Prometheus text format"""
+    flush_spans()
+    with _lock:
+        snapshot = {k: dict(v) for k, v in _metrics.items()}
+    if not snapshot:
+        return
+    lines = []
+    for metric in ("calls", "errors", "wall_seconds", "cpu_seconds", "bytes_in", "bytes_out",
+                   "prompt_tokens", "completion_tokens", "retries"):
+        prom_name = f"finance_agent_{metric}_total"
+        lines.append(f"# TYPE {prom_name} counter")
+        for (kind, name), values in sorted(snapshot.items()):
+            lines.append(f'{prom_name}{{kind="{kind}",name="{name}"}} {values[metric]}')
+    os.makedirs(TELEMETRY_DIR, exist_ok=True)
+    path = os.path.join(TELEMETRY_DIR, "metrics.prom")
+    with open(path + ".tmp", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(path + ".tmp", path)
+
+
+atexit.register(flush_metrics)
+
+
+def _finish(span):
+    _aggregate(span)
+    if span.otel_span is not None:
+        attrs = {k: v for k, v in span.to_dict().items()
+                 if isinstance(v, (int, float, str)) and k not in ("name", "trace_id", "span_id", "started_at")}
+        span.otel_span.set_attributes(attrs)
+        span.otel_span.end()
+    else:
+        _export_jsonl(span)
+
+
+# ---------- Recording API ----------
+def current_span():
+    return _current_span.get()
+
+
+def record_llm_usage(prompt_tokens=0, completion_tokens=0):
+    s = _current_span.get()
+    if s is not None:
+        s.prompt_tokens += prompt_tokens or 0
+        s.completion_tokens += completion_tokens or 0
+
+
+def record_retry(count=1):
+    s = _current_span.get()
+    if s is not None:
+        s.retries += count
+
+
+def set_attribute(key, value):
+    s = _current_span.get()
+    if s is not None:
+        s.attributes[key] = value
+
+
+def _text_size(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, str):
+        return len(obj.encode("utf-8", "ignore"))
+    content = getattr(obj, "content", None)  # LLM messages
+    if isinstance(content, str):
+        return len(content.encode("utf-8", "ignore"))
+    return 0
+
+
+def payload_size(obj):
+    """Bytes of the text/bytes payloads in obj (a value, or the top level of a tuple, list or dict).
+
+    Nothing is serialized: other objects (records, frames) count 0, so
+    instrumenting a call never costs more than the call; functions that know
+    their wire size report it with record_payload().
+    """
+    if isinstance(obj, (tuple, list)):
+        return sum(_text_size(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(_text_size(value) for value in obj.values())
+    return _text_size(obj)
+
+
+def record_payload(bytes_in=None, bytes_out=None):
+    """Report the current span's payload sizes explicitly (e.g. the raw size of an email sent)"""
+    s = _current_span.get()
+    if s is not None:
+        if bytes_in is not None:
+            s.bytes_in = bytes_in
+        if bytes_out is not None:
+            s.bytes_out = bytes_out
+
+
+def _record_llm_result(result):
+    """Pick token usage off LangChain message results"""
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        record_llm_usage(usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+        return
+    meta = getattr(result, "response_metadata", None) or {}
+    token_usage = meta.get("token_usage") or {}
+    record_llm_usage(token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0))
+
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """Time a block; nested spans roll their tokens and retries up into the parent"""
+    if DISABLED:
+        yield None
+        return
+    parent = _current_span.get()
+    s = Span(name, kind, parent)
+    s.attributes.update(attributes)
+    if _TRACER is not None:
+        ctx = otel_trace.set_span_in_context(parent.otel_span) if parent and parent.otel_span else None
+        s.otel_span = _TRACER.start_span(name, context=ctx)
+    token = _current_span.set(s)
+    wall0, cpu0 = time.perf_counter(), time.thread_time()
+    try:
+        yield s
+    except Exception as e:
+        s.status = "error"
+        s.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        s.wall_seconds = time.perf_counter() - wall0
+        s.cpu_seconds = time.thread_time() - cpu0
+        _current_span.reset(token)
+        if parent is not None:
+            parent.prompt_tokens += s.prompt_tokens
+            parent.completion_tokens += s.completion_tokens
+            parent.retries += s.retries
+        _finish(s)
+
+
+def instrument(kind="tool", name=None):
+    """Decorator: run the function inside a span, measuring payload sizes and LLM tokens"""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        def _measure(s, args, kwargs, result):
+            if s is not None:
+                # Sizes reported with record_payload() take precedence
+                s.bytes_in = s.bytes_in or payload_size(args) + payload_size(kwargs)
+                s.bytes_out = s.bytes_out or payload_size(result)
+                if kind == "llm":
+                    _record_llm_result(result)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, kind) as s:
+                    result = await fn(*args, **kwargs)
+                    _measure(s, args, kwargs, result)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind) as s:
+                result = fn(*args, **kwargs)
+                _measure(s, args, kwargs, result)
+                return result
+
+        return wrapper
+    return decorator
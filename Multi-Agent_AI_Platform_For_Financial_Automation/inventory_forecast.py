@@ -0,0 +1,177 @@
+# Inventory Forecast: vectorized consumption, stockout and reorder planning
+#
+# Consumption per item is estimated from PO history: units bought within the
+# lookback window divided by the days that history covers (purchases replace
+# what was used, so over a window they track usage). The Spend tab holds only
+# category amounts, no items or units, so it cannot give per-item rates.
+# Month-to-month variation of the purchases is the demand spread behind the
+# safety stock. Every SKU is then planned with column operations in one pass:
+#
+#   days_of_cover   stock / daily_usage
+#   stockout_date   as_of + days_of_cover
+#   reorder_point   daily_usage * lead_time + safety_stock (the sheet's Reorder Level if higher)
+#   eoq             sqrt(2 * annual usage * order_cost / (holding_rate * unit_price))
+#   reorder_qty     max(eoq, reorder_point - stock), for items at or below the reorder point
+#   reorder_by      the date stock reaches the reorder point
+#
+# The report's LLM narrates these figures; it no longer decides what is critical.
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from sheet_schemas import parse_sheet
+
+# Most urgent first; needs_reorder() covers the first three
+FORECAST_STATUSES = ["stockout", "critical", "reorder", "ok", "no_demand"]
+REORDER_STATUSES = FORECAST_STATUSES[:3]
+DAYS_PER_MONTH = 365.25 / 12
+MAX_FORECAST_DAYS = 3650  # Further out, stockout / reorder dates are left empty
+
+# service_z: safety-stock z-score (1.65 ~ 95% cycle service level)
+# order_cost: fixed cost per order; holding_rate: yearly holding cost as a share of unit price
+ForecastPolicy = namedtuple("ForecastPolicy", ["lookback_days", "min_history_days", "lead_time_days",
+                                               "service_z", "order_cost", "holding_rate"])
+
+DEFAULT_POLICY = ForecastPolicy(lookback_days=365, min_history_days=30, lead_time_days=14,
+                                service_z=1.65, order_cost=50.0, holding_rate=0.25)
+
+
+def forecast_policy_from_env():
+    """INVENTORY_LOOKBACK_DAYS, INVENTORY_MIN_HISTORY_DAYS, INVENTORY_LEAD_TIME_DAYS,
+    INVENTORY_SERVICE_Z, INVENTORY_ORDER_COST, INVENTORY_HOLDING_RATE"""
+    return ForecastPolicy(
+        lookback_days=int(os.getenv("INVENTORY_LOOKBACK_DAYS", DEFAULT_POLICY.lookback_days)),
+        min_history_days=int(os.getenv("INVENTORY_MIN_HISTORY_DAYS", DEFAULT_POLICY.min_history_days)),
+        lead_time_days=float(os.getenv("INVENTORY_LEAD_TIME_DAYS", DEFAULT_POLICY.lead_time_days)),
+        service_z=float(os.getenv("INVENTORY_SERVICE_Z", DEFAULT_POLICY.service_z)),
+        order_cost=float(os.getenv("INVENTORY_ORDER_COST", DEFAULT_POLICY.order_cost)),
+        holding_rate=float(os.getenv("INVENTORY_HOLDING_RATE", DEFAULT_POLICY.holding_rate)),
+    )
+
+
+def consumption_frame(pos, as_of, policy=DEFAULT_POLICY) -> pd.DataFrame:
+    """Per item (index): daily_usage, usage_std (daily) and unit_price from PO records.
+
+    Usage counts POs dated within lookback_days before as_of; the history an
+    item covers is at least min_history_days, so one recent PO is not read as
+    a burst of demand. unit_price is the quantity-weighted price over all POs.
+    """
+    columns = ["daily_usage", "usage_std", "unit_price"]
+    frame = parse_sheet("PO's", pos)
+    if frame.empty:
+        return pd.DataFrame(columns=columns, dtype="float64")
+
+    item = frame["Item"].astype(str)
+    qty = frame["Qty"].astype("float64")
+    value = qty * frame["Price"].astype("float64")
+    dates = pd.to_datetime(frame["Date"], errors="coerce")
+    totals = pd.DataFrame({"qty": qty, "value": value}).groupby(item, sort=False).sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit_price = (totals["value"] / totals["qty"]).where(totals["qty"] > 0)
+
+    start = as_of - pd.Timedelta(days=policy.lookback_days)
+    window = dates.between(start, as_of)  # NaT dates are never in the window
+    if not window.any():
+        return pd.DataFrame({"daily_usage": 0.0, "usage_std": 0.0, "unit_price": unit_price})
+    recent = pd.DataFrame({"item": item[window], "qty": qty[window], "date": dates[window],
+                           "month": dates[window].dt.to_period("M")})
+    per_item = recent.groupby("item", sort=False).agg(qty=("qty", "sum"), first=("date", "min"))
+    span = (as_of - per_item["first"]).dt.days.clip(lower=policy.min_history_days, upper=policy.lookback_days)
+    daily_usage = per_item["qty"] / span
+
+    # Monthly purchases (zero-filled from each item's first month) -> daily standard deviation
+    months = pd.period_range(start, as_of, freq="M")
+    monthly = recent.groupby(["item", "month"], sort=False)["qty"].sum().unstack(fill_value=0.0)
+    monthly = monthly.reindex(index=per_item.index, columns=months, fill_value=0.0)
+    active = months.to_timestamp().values[None, :] >= per_item["first"].dt.to_period("M").dt.to_timestamp().values[:, None]
+    usage_std = monthly.where(active).std(axis=1, ddof=0).fillna(0.0) / np.sqrt(DAYS_PER_MONTH)
+
+    out = pd.DataFrame({"daily_usage": daily_usage, "usage_std": usage_std}).reindex(unit_price.index)
+    out["unit_price"] = unit_price
+    return out.fillna({"daily_usage": 0.0, "usage_std": 0.0})[columns]
+
+
+def _dates_after(as_of, days):
+    """as_of + whole days, NaT where days is NaN or beyond MAX_FORECAST_DAYS"""
+    days = np.where(days <= MAX_FORECAST_DAYS, np.floor(days), np.nan)
+    return as_of + pd.to_timedelta(pd.Series(days), unit="D")
+
+
+def forecast_frame(inventory, pos, as_of=None, policy=DEFAULT_POLICY) -> pd.DataFrame:
+    """One row per Inventory item with its usage, cover, stockout date and reorder plan.
+
+    Items without PO history in the window have daily_usage 0, no stockout
+    date and status "no_demand" (or "reorder" when below the sheet's Reorder
+    Level, which is then the target). EOQ needs a unit price; without one an
+    order covers 30 days of usage.
+    """
+    as_of = pd.Timestamp.today().normalize() if as_of is None else pd.Timestamp(as_of).normalize()
+    inv = parse_sheet("Inventory", inventory)
+    usage = consumption_frame(pos, as_of, policy)
+    item = inv["Item"].astype(str)
+
+    rate = item.map(usage["daily_usage"]).fillna(0.0).to_numpy(dtype="float64")
+    sigma = item.map(usage["usage_std"]).fillna(0.0).to_numpy(dtype="float64")
+    price = item.map(usage["unit_price"]).to_numpy(dtype="float64")
+    stock = inv["Current Stock"].to_numpy(dtype="float64")
+    level = inv["Reorder Level"].to_numpy(dtype="float64")
+    lead = policy.lead_time_days
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(rate > 0, np.maximum(stock, 0.0) / rate, np.nan)
+        safety = policy.service_z * sigma * np.sqrt(lead)
+        reorder_point = np.maximum(rate * lead + safety, level)
+        eoq = np.sqrt(2.0 * rate * 365.0 * policy.order_cost / (policy.holding_rate * price))
+        until_reorder = np.where(rate > 0, np.maximum(stock - reorder_point, 0.0) / rate, np.nan)
+    eoq = np.where(np.isfinite(eoq), eoq, rate * 30.0)
+
+    status = np.select(
+        [stock <= 0, (rate > 0) & (cover <= lead), stock <= reorder_point, rate == 0],
+        ["stockout", "critical", "reorder", "no_demand"], default="ok")
+    needs = np.isin(status, REORDER_STATUSES)
+    reorder_qty = np.where(needs, np.ceil(np.maximum(eoq, reorder_point - stock)), 0.0)
+    until_reorder = np.where(needs, 0.0, until_reorder)
+
+    return pd.DataFrame({
+        "item": inv["Item"].to_numpy(),
+        "category": inv["Category"].to_numpy(),
+        "supplier": inv["Supplier"].astype(str).to_numpy(),
+        "stock": stock,
+        "reorder_level": level,
+        "daily_usage": rate,
+        "days_of_cover": cover,
+        "stockout_date": _dates_after(as_of, cover),
+        "safety_stock": np.ceil(safety),
+        "reorder_point": np.ceil(reorder_point),
+        "eoq": np.ceil(eoq),
+        "reorder_qty": reorder_qty,
+        "reorder_by": _dates_after(as_of, until_reorder),
+        "unit_price": price,
+        "reorder_cost": np.nan_to_num(reorder_qty * price),
+        "forecast_status": pd.Categorical(status, categories=FORECAST_STATUSES, ordered=True),
+    })
+
+
+def needs_reorder(frame: pd.DataFrame) -> pd.DataFrame:
+    """Items to order now, most urgent first (status, then soonest stockout)"""
+    due = frame[frame["forecast_status"].isin(REORDER_STATUSES)]
+    return due.sort_values(["forecast_status", "stockout_date", "days_of_cover"], na_position="last")
+
+
+def forecast_summary(frame: pd.DataFrame, horizon_days=30) -> dict:
+    """Counts per status, reorder totals and the items running out within horizon_days"""
+    counts = frame["forecast_status"].value_counts()
+    due = needs_reorder(frame)
+    horizon = frame["days_of_cover"] <= horizon_days
+    return {
+        "items": int(len(frame)),
+        "by_status": {status: int(counts.get(status, 0)) for status in FORECAST_STATUSES},
+        "reorder_items": int(len(due)),
+        "reorder_units": float(due["reorder_qty"].sum()),
+        "reorder_cost": float(due["reorder_cost"].sum()),
+        "stockouts_within_horizon": int(horizon.sum()),
+        "horizon_days": horizon_days,
+    }
@@ -0,0 +1,74 @@
+# Invoice Ageing: vectorized receivables ageing buckets and reminder targeting
+#
+# Dates are parsed once into datetime64 columns (any format parse_sheet accepts),
+# so "overdue" no longer depends on ISO strings comparing correctly, and the
+# whole ledger is triaged with column operations instead of a Python loop.
+
+import numpy as np
+import pandas as pd
+
+from sheet_schemas import parse_sheet
+
+# Label -> inclusive upper bound in days past due ("current" = not yet due)
+AGEING_BUCKETS = {"current": 0, "0-30": 30, "31-60": 60, "61-90": 90, "90+": None}
+OPEN_STATUS = "unpaid"
+
+
+def ageing_frame(invoices, today=None) -> pd.DataFrame:
+    """Typed Invoices frame plus is_open, days_overdue and bucket columns.
+
+    Rows keep the index of the input records, so frame.index selects the
+    original invoice dicts. Rows without a due date are never overdue.
+    """
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today).normalize()
+    frame = parse_sheet("Invoices", invoices, errors="drop")
+    if frame.empty:
+        return frame.assign(is_open=pd.Series(dtype=bool), days_overdue=pd.Series(dtype=float),
+                            bucket=pd.Series(dtype="category"))
+
+    days = (today - frame["due_date"]).dt.days  # float, NaN where due_date is missing
+    bounds = [b for b in AGEING_BUCKETS.values() if b is not None]
+    labels = list(AGEING_BUCKETS)
+    conditions = [days <= bounds[0]] + [(days > lo) & (days <= hi) for lo, hi in zip(bounds, bounds[1:])]
+    bucket = np.select(conditions + [days > bounds[-1]], labels, default="current")
+
+    return frame.assign(
+        is_open=frame["status"].astype(str).str.strip().str.lower() == OPEN_STATUS,
+        days_overdue=days.fillna(0).clip(lower=0).astype("int32"),
+        bucket=pd.Categorical(bucket, categories=labels, ordered=True),
+    )
+
+
+def ageing_summary(frame: pd.DataFrame) -> dict:
+    """{bucket: {"count": n, "amount": total}} over open invoices, every bucket present"""
+    open_invoices = frame[frame["is_open"]]
+    grouped = open_invoices.groupby("bucket", observed=False)["amount"].agg(["count", "sum"])
+    return {bucket: {"count": int(row["count"]), "amount": float(row["sum"])} for bucket, row in grouped.iterrows()}
+
+
+def reminder_targets(frame: pd.DataFrame, last_reminded=None, today=None,
+                     min_days_overdue=1, reminder_interval_days=7,
+                     reminder_counts=None, max_reminders=None) -> pd.DataFrame:
+    """Open invoices at least `min_days_overdue` past due that were not reminded recently.
+
+    last_reminded maps invoice_id -> last reminder date (dict or Series); an
+    invoice is due for another reminder once `reminder_interval_days` (a
+    number, or {bucket: days}) have passed since then. With reminder_counts
+    and max_reminders, invoices already reminded that often are left out.
+    """
+    if frame.empty:
+        return frame
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today).normalize()
+    mask = frame["is_open"] & (frame["days_overdue"] >= min_days_overdue)
+    if last_reminded is not None and len(last_reminded):
+        last = pd.to_datetime(frame["invoice_id"].map(pd.Series(last_reminded, dtype=object)), errors="coerce")
+        if isinstance(reminder_interval_days, dict):
+            interval = frame["bucket"].map(reminder_interval_days).astype(float).fillna(
+                max(reminder_interval_days.values(), default=0))
+        else:
+            interval = reminder_interval_days
+        mask &= last.isna() | ((today - last.dt.normalize()).dt.days >= interval)
+    if max_reminders is not None and reminder_counts:
+        counts = frame["invoice_id"].map(pd.Series(reminder_counts, dtype=object)).fillna(0).astype(int)
+        mask &= counts < max_reminders
+    return frame[mask]
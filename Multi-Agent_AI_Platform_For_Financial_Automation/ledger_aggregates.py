@@ -0,0 +1,360 @@
+# Ledger Aggregates: incremental group-by totals over append-only worksheets
+#
+# Spend and PO's only grow at the bottom, yet every procurement run re-read and
+# re-summed the whole history. An IncrementalLedger remembers, per LedgerSpec,
+# how many data rows it has folded in and the running totals of each view
+# (group-by columns -> additive measures), so a run reads only the rows
+# appended since the last one plus a small verification window.
+#
+# Edits are detected with row hashes. Processed rows are hashed in blocks of
+# block_rows; each run re-reads the last (possibly partial) block with the new
+# rows and compares its hash, and spot-checks verify_blocks older blocks in
+# rotation. A mismatch, fewer rows than already processed or a changed spec
+# triggers a full recompute, which also refreshes every block hash. An edit deep
+# in the history is caught within blocks / verify_blocks runs; rebuild() forces
+# a recompute right away (e.g. after a known back-dated correction).
+#
+# Two more bounds on staleness: a full recompute at least every full_every_days,
+# and the spreadsheet's Drive modifiedTime when the caller passes it. Unchanged
+# since the last sync, nothing is read at all; changed while no rows were
+# appended to this ledger, something was edited, so it is recomputed in full.
+#
+# Only additive measures ("sum", "count") are stored; derive means from them.
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from sheet_schemas import parse_sheet
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledgers (
+    name TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    runs INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    full_at TEXT,
+    modified_time TEXT
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    name TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (name, block)
+);
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT NOT NULL,
+    view TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    measure TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, view, grp, measure)
+);
+"""
+
+DEFAULT_BLOCK_ROWS = 1000
+DEFAULT_FULL_EVERY_DAYS = 7
+MEASURE_OPS = ("sum", "count")
+
+# columns: the header names read (and hashed); must include the sheet schema's required columns
+# views: {view: ([group-by columns], {measure: (column, "sum" | "count")})}
+# derive(frame) -> frame adds computed group-by columns (e.g. Month) before grouping
+LedgerSpec = namedtuple("LedgerSpec", ["name", "sheet", "columns", "views", "derive"], defaults=[None])
+LedgerSync = namedtuple("LedgerSync", ["mode", "rows", "new_rows", "rows_read", "reason"])
+_LedgerState = namedtuple("_LedgerState", ["signature", "rows", "runs", "full_at", "modified_time"])
+
+
+class LedgerEdited(Exception):
+    """Already processed rows changed; the running totals cannot be trusted"""
+
+
+def spec_signature(spec, block_rows):
+    """Hash of everything the stored totals depend on; a change forces a full recompute"""
+    for view, (_, measures) in spec.views.items():
+        bad = [m for m, (_, op) in measures.items() if op not in MEASURE_OPS]
+        if bad:
+            raise ValueError(f"{spec.name}/{view}: measure(s) {', '.join(bad)} must use one of {', '.join(MEASURE_OPS)}")
+    views = {view: [list(group_by), {m: list(op) for m, op in measures.items()}]
+             for view, (group_by, measures) in spec.views.items()}
+    derive = getattr(spec.derive, "__qualname__", None)
+    text = json.dumps([spec.sheet, list(spec.columns), views, derive, block_rows], sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _row_bytes(row):
+    return ("\x1f".join(str(v) for v in row) + "\x1e").encode()
+
+
+def hash_rows(rows):
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(_row_bytes(row))
+    return digest.hexdigest()
+
+
+class _BlockHasher:
+    """sha256 per block_rows-row block of a row stream whose first row is data row `first` (0-based)"""
+
+    def __init__(self, block_rows, first):
+        self.block_rows = block_rows
+        self.row = first
+        self.blocks = {}
+        self._digest = hashlib.sha256()
+
+    def add(self, rows):
+        for row in rows:
+            self._digest.update(_row_bytes(row))
+            self.row += 1
+            if self.row % self.block_rows == 0:
+                self.blocks[self.row // self.block_rows - 1] = (self.block_rows, self._digest.hexdigest())
+                self._digest = hashlib.sha256()
+
+    def finish(self):
+        """{block: (rows, hash)} for every block touched, the trailing partial block included"""
+        partial = self.row % self.block_rows
+        if partial:
+            self.blocks[self.row // self.block_rows] = (partial, self._digest.hexdigest())
+        return self.blocks
+
+
+def _group_key(key):
+    return json.dumps(list(key) if isinstance(key, tuple) else [key])
+
+
+class IncrementalLedger:
+    def __init__(self, path="ledger_aggregates.sqlite3", enabled=True, block_rows=DEFAULT_BLOCK_ROWS,
+                 verify_blocks=1, full_every_days=DEFAULT_FULL_EVERY_DAYS):
+        self.path = path
+        self.enabled = enabled
+        self.block_rows = max(1, int(block_rows))
+        self.verify_blocks = max(0, int(verify_blocks))
+        self.full_every_days = max(0.0, float(full_every_days or 0))  # 0: only on detected edits
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(ledgers)")}
+            for column in ("full_at", "modified_time"):  # Files written before these columns existed
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE ledgers ADD COLUMN {column} TEXT")
+        return self._conn
+
+    def _state(self, name):
+        row = self.conn.execute("SELECT signature, rows, runs, full_at, modified_time FROM ledgers WHERE name = ?",
+                                (name,)).fetchone()
+        return _LedgerState(*row) if row else None
+
+    def _full_due(self, state):
+        if not self.full_every_days:
+            return False
+        if state.full_at is None:
+            return True
+        return datetime.now() - datetime.fromisoformat(state.full_at) >= timedelta(days=self.full_every_days)
+
+    def _blocks(self, name):
+        rows = self.conn.execute("SELECT block, rows, hash FROM blocks WHERE name = ?", (name,)).fetchall()
+        return {block: (count, digest) for block, count, digest in rows}
+
+    # ---------- Sync ----------
+    def sync(self, spec, stream, modified_time=None):
+        """Fold the rows appended to spec.sheet since the last sync into its totals.
+
+        stream is a SheetStream over spec.columns; modified_time, if given, is
+        the spreadsheet's current Drive modifiedTime. Falls back to a full
+        recompute when processed rows were edited or removed, or when the
+        last one is older than full_every_days. Returns a LedgerSync.
+        """
+        signature = spec_signature(spec, self.block_rows)
+        with self._lock:
+            state = self._state(spec.name)
+            if not self.enabled:
+                reason = "incremental aggregation disabled"
+            elif state is None or state.rows == 0:
+                reason = "first sync"
+            elif state.signature != signature:
+                reason = "ledger definition changed"
+            elif self._full_due(state):
+                reason = f"scheduled, last full recompute {state.full_at or 'unknown'}"
+            elif modified_time is not None and modified_time == state.modified_time:
+                print(f"[ledger] {spec.name}: spreadsheet unchanged since {modified_time}, nothing read")
+                return LedgerSync("unchanged", state.rows, 0, 0, None)
+            else:
+                try:
+                    return self._incremental(spec, stream, signature, state, modified_time)
+                except LedgerEdited as e:
+                    reason = str(e)
+            return self._full(spec, stream, signature, state.runs if state else 0, reason, modified_time)
+
+    def _spot_check(self, spec, stream, blocks, tail, runs):
+        """Re-hash verify_blocks of the blocks before the tail, rotating through them run by run"""
+        rows_read = 0
+        count = min(self.verify_blocks, tail)
+        for block in sorted({(runs * self.verify_blocks + i) % tail for i in range(count)}):
+            first = block * self.block_rows + 2  # Sheet row of the block's first data row
+            rows = [row for _, page in stream.chunks(first, first + self.block_rows - 1) for row in page]
+            rows_read += len(rows)
+            expected = blocks.get(block)
+            if expected is None or (len(rows), hash_rows(rows)) != expected:
+                raise LedgerEdited(f"rows {first}-{first + self.block_rows - 1} of {spec.sheet} changed")
+        return rows_read
+
+    def _incremental(self, spec, stream, signature, state, modified_time):
+        blocks = self._blocks(spec.name)
+        tail = (state.rows - 1) // self.block_rows
+        rows_read = self._spot_check(spec, stream, blocks, tail, state.runs)
+        result = self._fold(spec, stream, tail * self.block_rows, state.rows, blocks.get(tail))
+        if (result["new_rows"] == 0 and modified_time is not None and state.modified_time is not None
+                and modified_time != state.modified_time):
+            raise LedgerEdited(f"spreadsheet modified at {modified_time} with no rows appended to {spec.sheet}")
+        self._commit(spec, signature, state.rows + result["new_rows"], state.runs + 1, result, replace=False,
+                     full_at=state.full_at, modified_time=modified_time)
+        sync = LedgerSync("incremental", state.rows + result["new_rows"], result["new_rows"],
+                          rows_read + result["rows_read"], None)
+        print(f"[ledger] {spec.name}: +{sync.new_rows} row(s), {sync.rows_read} read, {sync.rows} total")
+        return sync
+
+    def _full(self, spec, stream, signature, runs, reason, modified_time=None):
+        result = self._fold(spec, stream, 0, 0, None)
+        self._commit(spec, signature, result["new_rows"], runs + 1, result, replace=True,
+                     full_at=datetime.now().isoformat(), modified_time=modified_time)
+        print(f"[ledger] {spec.name}: full recompute ({reason}), {result['new_rows']} rows")
+        return LedgerSync("full", result["new_rows"], result["new_rows"], result["rows_read"], reason)
+
+    def _fold(self, spec, stream, start, known, tail_block):
+        """Read from data row `start`; the first known - start rows must match tail_block, the rest are folded in"""
+        hasher = _BlockHasher(self.block_rows, start)
+        expected = known - start
+        seen = []
+        totals = {view: None for view in spec.views}
+        new_rows = rows_read = 0
+        for first_row, page in stream.chunks(start + 2):
+            rows_read += len(page)
+            hasher.add(page)
+            if len(seen) < expected:
+                take = page[:expected - len(seen)]
+                seen.extend(take)
+                if len(seen) == expected and (expected, hash_rows(seen)) != tail_block:
+                    raise LedgerEdited(f"rows {start + 2}-{known + 1} of {spec.sheet} changed")
+                page, first_row = page[len(take):], first_row + len(take)
+            if page:
+                for view, partial in self._aggregate(spec, page, first_row).items():
+                    totals[view] = partial if totals[view] is None else totals[view].add(partial, fill_value=0.0)
+                new_rows += len(page)
+        if len(seen) < expected:
+            raise LedgerEdited(f"{spec.sheet} has fewer rows than the {known} already processed")
+        return {"totals": totals, "blocks": hasher.finish(), "new_rows": new_rows, "rows_read": rows_read}
+
+    def _aggregate(self, spec, rows, first_row):
+        """{view: frame of measures indexed by group} for one page of new rows"""
+        frame = pd.DataFrame.from_records(rows, columns=list(spec.columns),
+                                          index=pd.RangeIndex(first_row - 2, first_row - 2 + len(rows)))
+        frame = parse_sheet(spec.sheet, frame)
+        if spec.derive is not None:
+            frame = spec.derive(frame)
+        partials = {}
+        for view, (group_by, measures) in spec.views.items():
+            keys = [frame[c].astype(str).rename(c) for c in group_by]
+            partials[view] = frame.groupby(keys, sort=False).agg(**{m: op for m, op in measures.items()})
+        return partials
+
+    def _commit(self, spec, signature, rows, runs, result, replace, full_at, modified_time):
+        """Totals, block hashes and the row offset move together, so a crash never double-counts"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                conn.execute("DELETE FROM totals WHERE name = ?", (spec.name,))
+                conn.execute("DELETE FROM blocks WHERE name = ?", (spec.name,))
+            for view, frame in result["totals"].items():
+                if frame is None:
+                    continue
+                conn.executemany(
+                    "INSERT INTO totals (name, view, grp, measure, value) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (name, view, grp, measure) DO UPDATE SET value = totals.value + excluded.value",
+                    [(spec.name, view, _group_key(key), measure, float(value))
+                     for key, values in frame.iterrows() for measure, value in values.items()],
+                )
+            conn.executemany(
+                "INSERT INTO blocks (name, block, rows, hash) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name, block) DO UPDATE SET rows = excluded.rows, hash = excluded.hash",
+                [(spec.name, block, count, digest) for block, (count, digest) in result["blocks"].items()],
+            )
+            conn.execute(
+                "INSERT INTO ledgers (name, signature, rows, runs, updated_at, full_at, modified_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET signature = excluded.signature, rows = excluded.rows, "
+                "runs = excluded.runs, updated_at = excluded.updated_at, full_at = excluded.full_at, "
+                "modified_time = excluded.modified_time",
+                (spec.name, signature, rows, runs, datetime.now().isoformat(), full_at, modified_time),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---------- Reads ----------
+    def totals(self, spec, view):
+        """One row per group: the group-by columns, then the view's measures (count measures as int)"""
+        group_by, measures = spec.views[view]
+        with self._lock:
+            rows = self.conn.execute("SELECT grp, measure, value FROM totals WHERE name = ? AND view = ?",
+                                     (spec.name, view)).fetchall()
+        groups = {}
+        for grp, measure, value in rows:
+            groups.setdefault(grp, {})[measure] = value
+        frame = pd.DataFrame([[*json.loads(grp), *(values.get(m, 0.0) for m in measures)]
+                              for grp, values in groups.items()],
+                             columns=[*group_by, *measures])
+        for measure, (_, op) in measures.items():
+            frame[measure] = frame[measure].astype("int64" if op == "count" else "float64")
+        return frame
+
+    def status(self, name):
+        """{"rows", "runs", "updated_at", "full_at", "modified_time"} for a ledger, or None before its first sync"""
+        fields = ("rows", "runs", "updated_at", "full_at", "modified_time")
+        with self._lock:
+            row = self.conn.execute(f"SELECT {', '.join(fields)} FROM ledgers WHERE name = ?", (name,)).fetchone()
+        return dict(zip(fields, row)) if row else None
+
+    def rebuild(self, name):
+        """Forget a ledger's offset, so its next sync recomputes from the full sheet"""
+        with self._lock:
+            self.conn.execute("DELETE FROM ledgers WHERE name = ?", (name,))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def ledger_from_env(path_for=None):
+    """LEDGER_DB (default ./ledger_aggregates.sqlite3); LEDGER_INCREMENTAL=0 recomputes on every sync
+
+    LEDGER_BLOCK_ROWS (1000) and LEDGER_VERIFY_BLOCKS (1) tune edit detection;
+    LEDGER_FULL_EVERY_DAYS (7, 0 = never) bounds the time between full recomputes.
+    path_for(path) maps the configured path, e.g. to a per-tenant file.
+    """
+    path = os.getenv("LEDGER_DB", "ledger_aggregates.sqlite3")
+    return IncrementalLedger(
+        path=path_for(path) if path_for else path,
+        enabled=os.getenv("LEDGER_INCREMENTAL", "1") != "0",
+        block_rows=int(os.getenv("LEDGER_BLOCK_ROWS", DEFAULT_BLOCK_ROWS)),
+        verify_blocks=int(os.getenv("LEDGER_VERIFY_BLOCKS", "1")),
+        full_every_days=float(os.getenv("LEDGER_FULL_EVERY_DAYS", DEFAULT_FULL_EVERY_DAYS)),
+    )
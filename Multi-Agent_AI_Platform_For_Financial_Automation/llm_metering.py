@@ -0,0 +1,258 @@
+# LLM Metering: per-run token, latency, retry and cost accounting for the shared chat client
+#
+# A LangChain callback handler attached to ChatGroq sees every call made by the
+# router, the agents' ReAct loops and the tools. Calls are attributed to the
+# innermost instrumented tool span (see instrumentation.py), to "router" for
+# route_task, and to "agent" for the agents' own reasoning steps.
+
+import os
+import json
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from instrumentation import current_span
+
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", "telemetry")
+HISTORY_SIZE = 50
+
+# USD per million tokens (input, output); override with LLM_PRICING='{"model": [in, out]}'
+DEFAULT_PRICING = {
+    "llama3-70b-8192": (0.59, 0.79),
+    "llama3-8b-8192": (0.05, 0.08),
+}
+
+_current_run = contextvars.ContextVar("llm_run", default=None)
+
+
+def _load_pricing():
+    pricing = dict(DEFAULT_PRICING)
+    override = os.getenv("LLM_PRICING")
+    if override:
+        try:
+            pricing.update({k: tuple(v) for k, v in json.loads(override).items()})
+        except (ValueError, TypeError) as e:
+            print(f"[llm_metering] Ignoring invalid LLM_PRICING: {e}")
+    return pricing
+
+
+PRICING = _load_pricing()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a list of numbers: the ceil(q/100 * n)-th smallest, None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    price_in, price_out = PRICING.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+class _Bucket:
+    __slots__ = ("calls", "errors", "retries", "prompt_tokens", "completion_tokens", "cost_usd", "latencies")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.latencies = []
+
+    def add(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.retries += other.retries
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cost_usd += other.cost_usd
+        self.latencies.extend(other.latencies)
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "latency_seconds": round(sum(self.latencies), 3),
+            "latency_p50": _round(percentile(self.latencies, 50)),
+            "latency_p95": _round(percentile(self.latencies, 95)),
+            "latency_p99": _round(percentile(self.latencies, 99)),
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+class RunUsage:
+    """LLM usage for one execute_task run, bucketed by tool label"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.by_tool = {}
+        self.models = {}
+        self._lock = threading.Lock()
+
+    def record(self, label, model, latency, prompt_tokens, completion_tokens, error=False):
+        with self._lock:
+            bucket = self.by_tool.setdefault(label, _Bucket())
+            bucket.calls += 1
+            bucket.errors += bool(error)
+            bucket.prompt_tokens += prompt_tokens
+            bucket.completion_tokens += completion_tokens
+            bucket.cost_usd += estimate_cost(model, prompt_tokens, completion_tokens)
+            bucket.latencies.append(latency)
+            if model:
+                self.models[model] = self.models.get(model, 0) + 1
+
+    def record_retry(self, label):
+        with self._lock:
+            self.by_tool.setdefault(label, _Bucket()).retries += 1
+
+    def summary(self):
+        with self._lock:
+            total = _Bucket()
+            for bucket in self.by_tool.values():
+                total.add(bucket)
+            return {
+                "run": self.name,
+                "started_at": self.started_at,
+                "models": dict(self.models),
+                **total.summary(),
+                "by_tool": {label: bucket.summary() for label, bucket in sorted(self.by_tool.items())},
+            }
+
+
+def _call_label():
+    """Innermost tool span name, 'router' for route_task, else 'agent' (ReAct reasoning)"""
+    s = current_span()
+    while s is not None:
+        if s.kind == "tool":
+            return s.name
+        if s.name == "route_task":
+            return "router"
+        s = s.parent
+    return "agent"
+
+
+def _usage_from_result(response):
+    """(prompt_tokens, completion_tokens, model) from an LLMResult"""
+    llm_output = response.llm_output or {}
+    usage = llm_output.get("token_usage") or {}
+    model = llm_output.get("model_name")
+    prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    if not (prompt or completion):
+        for generations in response.generations:
+            for gen in generations:
+                meta = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                prompt += meta.get("input_tokens", 0)
+                completion += meta.get("output_tokens", 0)
+    return prompt or 0, completion or 0, model
+
+
+class LLMMeter(BaseCallbackHandler):
+    """Callback handler aggregating LLM usage into the active run and a rolling history"""
+
+    run_inline = True  # Cheap and thread-safe: skip the executor hop under ainvoke
+
+    def __init__(self, history_size=HISTORY_SIZE, log_path=None):
+        self.history = deque(maxlen=history_size)
+        self.log_path = log_path or os.path.join(TELEMETRY_DIR, "llm_runs.jsonl")
+        self._pending = {}  # callback run_id -> (started, label, model, usage)
+        self._lock = threading.Lock()
+
+    # ---------- Run scope ----------
+    @contextmanager
+    def run(self, name):
+        """Collect every LLM call made inside the block into a fresh RunUsage"""
+        usage = RunUsage(name)
+        token = _current_run.set(usage)
+        try:
+            yield usage
+        finally:
+            _current_run.reset(token)
+            summary = usage.summary()
+            with self._lock:
+                self.history.append(summary)
+            self._append_log(summary)
+
+    def _append_log(self, summary):
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(summary) + "\n")
+        except OSError as e:
+            print(f"[llm_metering] Could not write {self.log_path}: {e}")
+
+    def recent_runs(self):
+        with self._lock:
+            return list(self.history)
+
+    def record_retry(self):
+        usage = _current_run.get()
+        if usage is not None:
+            usage.record_retry(_call_label())
+
+    # ---------- Callbacks ----------
+    def _start(self, run_id, serialized, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or (serialized or {}).get("name")
+        with self._lock:
+            self._pending[run_id] = (time.perf_counter(), _call_label(), model, _current_run.get())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, serialized, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, serialized, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            pending = self._pending.pop(run_id, None)
+        if pending is None or pending[3] is None:
+            return
+        started, label, model, usage = pending
+        prompt, completion, reported_model = _usage_from_result(response)
+        usage.record(label, reported_model or model, time.perf_counter() - started, prompt, completion)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            pending = self._pending.pop(run_id, None)
+        if pending is None or pending[3] is None:
+            return
+        started, label, model, usage = pending
+        usage.record(label, model, time.perf_counter() - started, 0, 0, error=True)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        self.record_retry()
+
+
+def format_usage_report(summary):
+    """Plain-text per-run cost report"""
+    lines = [
+        f"LLM usage for {summary['run']} ({summary['started_at']})",
+        f"  calls={summary['calls']} retries={summary['retries']} errors={summary['errors']}",
+        f"  tokens={summary['total_tokens']} (prompt {summary['prompt_tokens']}, completion {summary['completion_tokens']})",
+        f"  cost≈${summary['cost_usd']:.4f}  latency p50={summary['latency_p50']}s p95={summary['latency_p95']}s p99={summary['latency_p99']}s",
+    ]
+    for label, stats in summary["by_tool"].items():
+        lines.append(f"  - {label}: {stats['calls']} calls, {stats['total_tokens']} tokens, "
+                     f"${stats['cost_usd']:.4f}, p95 {stats['latency_p95']}s")
+    return "\n".join(lines)
@@ -0,0 +1,91 @@
+# Model Registry: per-call-site model tiers with escalation on failed validation
+#
+# High-volume, low-difficulty calls (routing, three-line chart insights, per-PO
+# suggestions) run on the fast tier; long-form summaries and the agents' ReAct
+# loops stay on the large tier. A fast-tier answer that fails the call site's
+# validator is retried once on the next tier up.
+
+import os
+
+from instrumentation import set_attribute
+
+TIER_ORDER = ["fast", "large"]
+
+DEFAULT_MODELS = {
+    "fast": os.getenv("LLM_FAST_MODEL", "llama3-8b-8192"),
+    "large": os.getenv("LLM_LARGE_MODEL", "llama3-70b-8192"),
+}
+
+# Call site -> tier; override one with LLM_TIER_<SITE>=fast|large (e.g. LLM_TIER_ROUTER=large)
+DEFAULT_CALL_SITES = {
+    "router": "fast",
+    "chart_insight": "fast",
+    "po_suggestion": "fast",
+    "financial_summary": "large",
+    "procurement_report": "large",
+    "agent": "large",
+}
+
+
+class ModelRegistry:
+    """Lazily builds one chat model per tier via `factory(model_name)`.
+
+    register() swaps in any LangChain chat model for a tier, e.g. a local
+    stand-in for the fast tier in tests and benchmarks.
+    """
+
+    def __init__(self, factory, models=None, call_sites=None):
+        self.factory = factory
+        self.model_names = dict(models or DEFAULT_MODELS)
+        self.call_sites = dict(call_sites or DEFAULT_CALL_SITES)
+        for site in self.call_sites:
+            tier = os.getenv(f"LLM_TIER_{site.upper()}")
+            if tier in TIER_ORDER:
+                self.call_sites[site] = tier
+        self._models = {}
+        self.escalations = {}  # call site -> count
+
+    def register(self, tier, model):
+        self._models[tier] = model
+
+    def model(self, tier):
+        if tier not in self._models:
+            self._models[tier] = self.factory(self.model_names[tier])
+        return self._models[tier]
+
+    def tier_for(self, site):
+        return self.call_sites.get(site, "large")
+
+    def for_site(self, site):
+        return self.model(self.tier_for(site))
+
+    def _tiers_from(self, site):
+        return TIER_ORDER[TIER_ORDER.index(self.tier_for(site)):]
+
+    def _escalate(self, site, tier, result):
+        self.escalations[site] = self.escalations.get(site, 0) + 1
+        set_attribute("escalated_from", tier)
+        print(f"[model_registry] {site}: {tier} tier output failed validation, escalating "
+              f"({str(getattr(result, 'content', result))[:80]!r})")
+
+    def invoke(self, site, call, validate=None):
+        """call(model) on the site's tier; on a validation failure retry on the next tier.
+
+        The last tier's result is returned even if it fails validation, so the
+        caller's own fallback handling still applies.
+        """
+        tiers = self._tiers_from(site)
+        for i, tier in enumerate(tiers):
+            result = call(self.model(tier))
+            if validate is None or validate(result) or i == len(tiers) - 1:
+                return result
+            self._escalate(site, tier, result)
+
+    async def ainvoke(self, site, call, validate=None):
+        """Async invoke(): `call(model)` returns an awaitable"""
+        tiers = self._tiers_from(site)
+        for i, tier in enumerate(tiers):
+            result = await call(self.model(tier))
+            if validate is None or validate(result) or i == len(tiers) - 1:
+                return result
+            self._escalate(site, tier, result)
@@ -0,0 +1,144 @@
+# Prompt Data Compaction: fit DataFrame dumps into an LLM token budget
+
+import re
+import pandas as pd
+
+try:
+    import tiktoken
+    # Llama 3 uses a tiktoken-style BPE vocabulary, cl100k_base is a close local proxy
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+DEFAULT_TOP_K = 25
+DEFAULT_PERIODS = 12
+DEFAULT_TOP_SERIES = 8
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally (tiktoken when installed, otherwise a BPE-like estimate)"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # Fallback: one token per punctuation mark, ~4 characters per token for words
+    return sum(max(1, (len(t) + 3) // 4) for t in _TOKEN_PATTERN.findall(text))
+
+
+def summarize_distribution(df: pd.DataFrame, columns=None) -> str:
+    """One line per numeric column: count, sum, mean and key percentiles"""
+    numeric = df.select_dtypes("number") if columns is None else df[columns]
+    if numeric.empty:
+        return ""
+    stats = numeric.describe(percentiles=[0.5, 0.9]).T
+    stats["sum"] = numeric.sum()
+    lines = []
+    for col, row in stats.iterrows():
+        lines.append(
+            f"- {col}: count={int(row['count'])}, sum={row['sum']:,.2f}, mean={row['mean']:,.2f}, "
+            f"min={row['min']:,.2f}, median={row['50%']:,.2f}, p90={row['90%']:,.2f}, max={row['max']:,.2f}"
+        )
+    return "\n".join(lines)
+
+
+def compact_frame(df: pd.DataFrame, budget_tokens: int, rank_by=None, top_k=DEFAULT_TOP_K,
+                  columns=None, ascending=False) -> str:
+    """Render a frame as prompt text within budget_tokens.
+
+    Output = distribution summary + the top-k rows ranked by `rank_by`, with k
+    halved until the text fits. Rows that do not fit are reported as a count
+    and total so the LLM still sees the overall magnitude.
+    """
+    if df is None or df.empty:
+        return "(no data)"
+
+    if columns is not None:
+        df = df[columns]
+    if rank_by is not None:
+        df = df.sort_values(rank_by, ascending=ascending)
+
+    summary = summarize_distribution(df)
+    k = min(top_k, len(df))
+    while True:
+        parts = [f"Rows: {len(df)}"]
+        if summary:
+            parts.append("Distribution:\n" + summary)
+        if k > 0:
+            label = f"Top {k} by {rank_by}" if rank_by is not None else f"First {k} rows"
+            parts.append(f"{label}:\n" + df.head(k).to_string(index=False))
+        omitted = len(df) - k
+        if omitted > 0:
+            line = f"({omitted} more rows omitted"
+            if rank_by is not None and pd.api.types.is_numeric_dtype(df[rank_by]):
+                line += f", {rank_by} total {df[rank_by].iloc[k:].sum():,.2f}"
+            parts.append(line + ")")
+        text = "\n\n".join(parts)
+
+        if count_tokens(text) <= budget_tokens:
+            return text
+        if k > 0:
+            k //= 2
+        elif summary:
+            summary = ""  # Last resort: drop the distribution block
+        else:
+            return text
+
+
+def compact_timeline(df: pd.DataFrame, period_col, series_col, value_col, budget_tokens: int,
+                     periods=DEFAULT_PERIODS, top_series=DEFAULT_TOP_SERIES) -> str:
+    """Render per-period totals as prompt text within budget_tokens, oldest period first.
+
+    One row per period and one column per series (e.g. months x categories).
+    Only the most recent `periods` periods and the `top_series` largest series
+    over them are shown, the other series summed as "Other"; series, then
+    periods, are halved until the text fits. Earlier periods are reported as
+    a count and total. Unlike compact_frame(), rows are never ranked by size,
+    so the LLM reads an unbroken timeline.
+    """
+    if df is None or df.empty:
+        return "(no data)"
+    df = df[df[period_col].notna() & (df[period_col].astype(str) != "NaT")]
+    table = df.pivot_table(index=period_col, columns=series_col, values=value_col,
+                           aggfunc="sum", fill_value=0, observed=True).sort_index()
+    if table.empty:
+        return "(no data)"
+
+    n = min(periods, len(table))
+    while True:
+        recent = table.iloc[-n:]
+        ranked = recent.sum().sort_values(ascending=False)
+        keep = list(ranked.index[:top_series])
+        shown = recent[keep]
+        if len(ranked) > len(keep):
+            shown = shown.assign(Other=recent.drop(columns=keep).sum(axis=1))
+        parts = [f"{value_col} by {series_col} per {period_col}, last {n} of {len(table)} periods (oldest first):\n"
+                 + shown.round(2).to_string()]
+        if len(table) > n:
+            parts.append(f"({len(table) - n} earlier periods omitted, {value_col} total "
+                         f"{table.iloc[:-n].to_numpy().sum():,.2f})")
+        text = "\n\n".join(parts)
+
+        if count_tokens(text) <= budget_tokens:
+            return text
+        if top_series > 3 and len(ranked) > 3:
+            top_series = max(3, top_series // 2)
+        elif n > 1:
+            n //= 2
+        else:
+            return text
+
+
+def aggregate_for_prompt(df: pd.DataFrame, by, agg: dict, budget_tokens: int, rank_by=None) -> str:
+    """Pre-aggregate with groupby(by).agg(agg), flatten columns and compact the result"""
+    if df is None or df.empty:
+        return "(no data)"
+    grouped = df.groupby(by, observed=True).agg(agg)
+    if isinstance(grouped.columns, pd.MultiIndex):
+        grouped.columns = ["_".join(c) for c in grouped.columns]
+    grouped = grouped.reset_index()
+    return compact_frame(grouped, budget_tokens, rank_by=rank_by or grouped.columns[-1])
+
+
+def monthly_periods(dates: pd.Series) -> pd.Series:
+    """Bucket date strings into calendar months (YYYY-MM) for trend aggregation"""
+    return pd.to_datetime(dates, errors="coerce").dt.to_period("M").astype(str)
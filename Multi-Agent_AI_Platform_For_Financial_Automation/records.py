@@ -0,0 +1,94 @@
+# Records: compact result containers handed between tools without JSON round-trips
+#
+# Payroll and procurement engines keep their results as one DataFrame (a few
+# numpy/categorical columns) wrapped in a RecordTable. Later tools take the
+# table object itself: summaries and joins read columns, row-wise code iterates
+# slotted tuples. json.dumps happens only where a result is returned to the LLM.
+
+from collections import namedtuple
+import pandas as pd
+
+
+def record_type(name, fields):
+    """Slotted namedtuple that also answers record["field"] / record.get("field")
+
+    Row-wise code written against the old per-row dicts keeps working, while
+    a row costs one tuple instead of a dict with its own key table.
+    """
+    base = namedtuple(name, fields)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    return type(name, (base,), {"__slots__": (), "__getitem__": __getitem__, "get": get,
+                                "keys": lambda self: self._fields, "to_dict": base._asdict})
+
+
+SalaryRecord = record_type("SalaryRecord", ["employee_id", "name", "email", "base_salary", "deductions",
+                                            "bonus", "net_salary", "department"])
+BudgetRecord = record_type("BudgetRecord", ["Item", "Category", "Qty", "Price", "status", "cost",
+                                            "remaining_budget"])
+InventoryRecord = record_type("InventoryRecord", ["item", "category", "stock", "reorder_level",
+                                                  "inventory_status", "supplier"])
+ForecastRecord = record_type("ForecastRecord", ["item", "category", "supplier", "stock", "reorder_level",
+                                                "daily_usage", "days_of_cover", "stockout_date", "safety_stock",
+                                                "reorder_point", "eoq", "reorder_qty", "reorder_by", "unit_price",
+                                                "reorder_cost", "forecast_status"])
+
+
+class RecordTable:
+    """Columnar results: `.frame` holds the data, iteration yields `record` tuples lazily"""
+
+    __slots__ = ("frame", "record")
+
+    def __init__(self, frame, record):
+        self.frame = frame.reset_index(drop=True)[list(record._fields)]
+        self.record = record
+
+    @classmethod
+    def empty(cls, record):
+        return cls(pd.DataFrame(columns=record._fields), record)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __bool__(self):
+        return len(self.frame) > 0
+
+    def __iter__(self):
+        make = self.record._make
+        for row in self.frame.itertuples(index=False, name=None):
+            yield make(row)
+
+    def __getitem__(self, i):
+        return self.record._make(self.frame.iloc[i].tolist())
+
+    def __repr__(self):
+        return f"<RecordTable {self.record.__name__} x {len(self)}>"
+
+    def column(self, name):
+        return self.frame[name]
+
+    def count(self, column, value):
+        """Rows where column == value"""
+        return int((self.frame[column] == value).sum())
+
+    def where(self, column, value):
+        """Sub-table of rows where column == value"""
+        return RecordTable(self.frame[self.frame[column] == value], self.record)
+
+    def to_records(self):
+        """[{field: value}] with plain Python scalars, for JSON at the LLM boundary"""
+        return self.frame.to_dict("records")
+
+    @property
+    def nbytes(self):
+        return int(self.frame.memory_usage(deep=True, index=False).sum())
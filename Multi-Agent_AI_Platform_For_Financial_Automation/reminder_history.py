@@ -0,0 +1,169 @@
+# Reminder History: persisted per-invoice reminder log with an in-memory index
+#
+# Every reminder sent is appended to SQLite (invoice_id, sent_at, message id,
+# fingerprint of the invoice fields it showed). The reminder stage reads the
+# latest entry per invoice from a dict index, so deciding who to remind never
+# touches the database per row, and a cadence policy turns the history into
+# "not yet", "remind again" or "stop". Each run starts with refresh(), which
+# reloads the index when another process (worker, CLI run) has written since.
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    invoice_id TEXT NOT NULL,
+    sent_at TEXT NOT NULL,
+    message_id TEXT,
+    fingerprint TEXT
+)
+"""
+INDEX = "CREATE INDEX IF NOT EXISTS reminders_invoice ON reminders (invoice_id, sent_at)"
+MESSAGE_INDEX = "CREATE INDEX IF NOT EXISTS reminders_message ON reminders (message_id)"
+
+Reminder = namedtuple("Reminder", ["last_sent", "count", "fingerprint"])
+
+# interval_days: days between reminders, per ageing bucket (see invoice_ageing.AGEING_BUCKETS)
+# max_reminders: stop reminding an invoice after this many (None = no limit)
+CadencePolicy = namedtuple("CadencePolicy", ["min_days_overdue", "interval_days", "max_reminders"])
+
+DEFAULT_CADENCE = CadencePolicy(
+    min_days_overdue=1,
+    interval_days={"0-30": 7, "31-60": 5, "61-90": 3, "90+": 3},
+    max_reminders=None,
+)
+
+
+def cadence_from_env():
+    """REMINDER_MIN_DAYS_OVERDUE, REMINDER_INTERVAL_DAYS (int or JSON {bucket: days}), REMINDER_MAX_COUNT"""
+    interval = os.getenv("REMINDER_INTERVAL_DAYS")
+    if interval:
+        interval = json.loads(interval) if interval.strip().startswith("{") else int(interval)
+    max_count = os.getenv("REMINDER_MAX_COUNT")
+    return CadencePolicy(
+        min_days_overdue=int(os.getenv("REMINDER_MIN_DAYS_OVERDUE", DEFAULT_CADENCE.min_days_overdue)),
+        interval_days=interval or DEFAULT_CADENCE.interval_days,
+        max_reminders=int(max_count) if max_count else DEFAULT_CADENCE.max_reminders,
+    )
+
+
+def invoice_fingerprint(invoice):
+    """Hash of the fields a reminder PDF/email shows; unchanged hash = reuse the rendered PDF"""
+    fields = [str(invoice.get(k, "")) for k in ("customer_name", "customer_email", "date", "due_date", "amount")]
+    return hashlib.sha256("|".join(fields).encode()).hexdigest()[:16]
+
+
+class ReminderHistory:
+    def __init__(self, path="reminder_history.sqlite3", enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+        self._index = None  # invoice_id -> Reminder
+        self._data_version = None  # PRAGMA data_version when the index was loaded
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(SCHEMA)
+            self._conn.execute(INDEX)
+            self._conn.execute(MESSAGE_INDEX)
+        return self._conn
+
+    def _load_index(self):
+        self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        rows = self.conn.execute(
+            "SELECT r.invoice_id, r.sent_at, counts.n, r.fingerprint FROM reminders r "
+            "JOIN (SELECT invoice_id, MAX(sent_at) AS last, COUNT(*) AS n FROM reminders GROUP BY invoice_id) counts "
+            "ON r.invoice_id = counts.invoice_id AND r.sent_at = counts.last"
+        ).fetchall()
+        return {invoice_id: Reminder(sent_at, n, fingerprint) for invoice_id, sent_at, n, fingerprint in rows}
+
+    def refresh(self):
+        """Reload the index if another connection wrote reminders since it was loaded; returns True if reloaded"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._index is not None and \
+                    self.conn.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+                return False  # Our own writes are already in the index
+            self._index = self._load_index()
+            return True
+
+    @property
+    def index(self):
+        """{invoice_id: Reminder(last_sent, count, fingerprint)}, as of the last load or refresh()"""
+        if not self.enabled:
+            return {}
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_index()
+            return self._index
+
+    def get(self, invoice_id):
+        return self.index.get(str(invoice_id))
+
+    def last_sent(self):
+        """{invoice_id: last sent timestamp}, as invoice_ageing.reminder_targets() expects"""
+        return {invoice_id: r.last_sent for invoice_id, r in self.index.items()}
+
+    def counts(self):
+        return {invoice_id: r.count for invoice_id, r in self.index.items()}
+
+    def recorded(self, message_id):
+        """True if a reminder with this Message-ID is already in the history"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM reminders WHERE message_id = ? LIMIT 1",
+                                     (message_id,)).fetchone() is not None
+
+    def record(self, invoice_id, message_id=None, fingerprint=None, sent_at=None):
+        """Append a reminder; sent_at is the run's business date (datetime or ISO text), default now"""
+        if not self.enabled:
+            return
+        invoice_id = str(invoice_id)
+        sent_at = sent_at or datetime.now()
+        if isinstance(sent_at, datetime):
+            sent_at = sent_at.isoformat(timespec="seconds")
+        index = self.index
+        with self._lock:
+            self.conn.execute("INSERT INTO reminders (invoice_id, sent_at, message_id, fingerprint) VALUES (?, ?, ?, ?)",
+                              (invoice_id, sent_at, message_id, fingerprint))
+            previous = index.get(invoice_id)
+            index[invoice_id] = Reminder(sent_at, (previous.count if previous else 0) + 1, fingerprint)
+
+    def history(self, invoice_id):
+        """[(sent_at, message_id)] for one invoice, oldest first"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            return self.conn.execute("SELECT sent_at, message_id FROM reminders WHERE invoice_id = ? ORDER BY sent_at",
+                                     (str(invoice_id),)).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._index = None
+
+
+def reminder_history_from_env(path_for=None):
+    """REMINDER_HISTORY_DB (default ./reminder_history.sqlite3); REMINDER_HISTORY_DISABLED=1 turns it off
+
+    path_for(path) maps the configured path, e.g. to a per-tenant file.
+    """
+    path = os.getenv("REMINDER_HISTORY_DB", "reminder_history.sqlite3")
+    return ReminderHistory(
+        path=path_for(path) if path_for else path,
+        enabled=os.getenv("REMINDER_HISTORY_DISABLED", "0") != "1",
+    )
@@ -0,0 +1,367 @@
+# Resilience: shared rate limiting, Retry-After aware retries and circuit breakers
+#
+# One policy per external service (groq, sheets, gmail) lives in a process-wide
+# registry, so every thread and event loop draws from the same token bucket and
+# trips the same breaker. A 429 pauses the whole bucket for the Retry-After
+# period instead of letting each concurrent workflow hammer the quota on its own.
+#
+# A scope (e.g. a tenant with its own service account) can carry its own policy
+# for a service via configure_scoped(); calls made inside scoped(name) use it
+# instead of the process-wide one. A scoped call still draws from the
+# process-wide bucket as well, so tenants sharing one key (Groq) never add up
+# to more than the key's quota; only the breaker is the scope's own.
+
+import os
+import re
+import time
+import random
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+from instrumentation import record_retry
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# Defaults per service (requests/second, burst, retries, backoff, breaker); every value can be
+# overridden with RESILIENCE_<SERVICE>_<PARAM>, e.g. RESILIENCE_GROQ_RATE=1.0
+SERVICE_DEFAULTS = {
+    "groq": {"rate": 0.5, "burst": 5, "max_attempts": 4, "base_delay": 2.0, "max_delay": 60.0,
+             "failure_threshold": 5, "reset_timeout": 30.0},   # 30 requests/minute
+    "sheets": {"rate": 1.0, "burst": 10, "max_attempts": 5, "base_delay": 1.0, "max_delay": 64.0,
+               "failure_threshold": 5, "reset_timeout": 30.0},  # 60 reads/minute/user
+    "gmail": {"rate": 2.5, "burst": 10, "max_attempts": 5, "base_delay": 1.0, "max_delay": 32.0,
+              "failure_threshold": 8, "reset_timeout": 60.0},   # 250 quota units/s, 100 per send
+}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the service while its circuit breaker is open"""
+
+    def __init__(self, service, retry_in):
+        super().__init__(f"{service} circuit open after repeated failures; retry in {retry_in:.0f}s")
+        self.service = service
+        self.retry_in = retry_in
+
+
+# ---------- Error Classification ----------
+def _status_and_headers(error):
+    """(HTTP status, headers) from httpx, requests/gspread, googleapiclient and groq errors"""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    resp = getattr(error, "resp", None)  # googleapiclient.errors.HttpError
+    if resp is not None:
+        status = status or getattr(resp, "status", None)
+        headers = resp
+    try:
+        status = int(status) if status is not None else None
+    except (TypeError, ValueError):
+        status = None
+    return status, headers
+
+
+def _parse_retry_after(value):
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(error):
+    """Server-requested wait from Retry-After headers or 'try again in 7.5s' style messages"""
+    _, headers = _status_and_headers(error)
+    for key in ("retry-after", "Retry-After", "x-ratelimit-reset-requests"):
+        seconds = _parse_retry_after(headers.get(key) if hasattr(headers, "get") else None)
+        if seconds is not None:
+            return seconds
+    m = re.search(r"try again in (?:(\d+)m)?([\d.]+)(ms|s)", str(error))
+    if m:
+        minutes, value, unit = m.groups()
+        return int(minutes or 0) * 60 + float(value) / (1000 if unit == "ms" else 1)
+    return None
+
+
+def is_retryable(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    status, _ = _status_and_headers(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(error).__name__
+    return name in {"ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError",
+                    "APIConnectionError", "APITimeoutError", "RateLimitError", "ServerNotFoundError"}
+
+
+def is_rate_limited(error):
+    status, _ = _status_and_headers(error)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+# ---------- Primitives ----------
+class TokenBucket:
+    """Thread-safe token bucket shared by sync and async callers (rate=None disables it)"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token (possibly going into debt) and return how long the caller must wait"""
+        with self._lock:
+            now = time.monotonic()
+            pause = max(0.0, self.blocked_until - now)
+            if self.rate is None:
+                return pause
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            debt = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(pause, debt)
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds` (server said Retry-After)"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open single trial after reset_timeout
+
+    before_call() returns a trial token for the call that gets the half-open
+    trial; the caller hands it back to release_trial() however the call ends,
+    so a cancelled or interrupted trial does not leave the breaker waiting on
+    it forever.
+    """
+
+    def __init__(self, service, failure_threshold, reset_timeout):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._trial = None  # Token of the half-open trial in flight
+        self._trials = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """None to go ahead, a trial token for the half-open trial; raises CircuitOpenError otherwise"""
+        with self._lock:
+            if self.state == "closed":
+                return None
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == "open" and elapsed >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and self._trial is None:
+                self._trial = next(self._trials)
+                return self._trial
+            raise CircuitOpenError(self.service, max(0.0, self.reset_timeout - elapsed))
+
+    def release_trial(self, trial):
+        """End a trial that recorded no outcome (cancelled, interrupted); the next call gets a new one"""
+        with self._lock:
+            if trial is not None and self._trial == trial:
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"[resilience] {self.service} circuit closed")
+            self.failures = 0
+            self.state = "closed"
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = None
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[resilience] {self.service} circuit opened for {self.reset_timeout:.0f}s "
+                          f"after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+# ---------- Service Policy ----------
+class ServicePolicy:
+    def __init__(self, name, rate, burst, max_attempts, base_delay, max_delay,
+                 failure_threshold, reset_timeout, shared_with=None):
+        self.name = name
+        self.shared_with = shared_with  # Service whose process-wide bucket every call also draws from
+        self.max_attempts = int(max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name, int(failure_threshold), reset_timeout)
+
+    def buckets(self):
+        """Own bucket, then (for scoped policies) the current process-wide one"""
+        if self.shared_with is None:
+            return (self.bucket,)
+        with _registry_lock:
+            return (self.bucket, _process_policy(self.shared_with).bucket)
+
+    def backoff(self, attempt, error):
+        """Seconds to wait before retry `attempt` (1-based); a 429 pauses the shared bucket too"""
+        server_wait = retry_after_seconds(error)
+        if server_wait is not None:
+            if is_rate_limited(error):
+                for bucket in self.buckets():
+                    bucket.pause(server_wait)
+            return min(self.max_delay, server_wait) + random.uniform(0, 0.25 * self.base_delay)
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _on_failure(self, attempt, error):
+        """Record the failure; returns the retry delay, or re-raises when giving up"""
+        if not is_retryable(error):
+            self.breaker.record_success()  # The service answered; the request itself was bad
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_attempts:
+            raise error
+        record_retry()
+        for listener in _retry_listeners:
+            listener(self.name, error)
+        return self.backoff(attempt, error)
+
+    def call(self, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            trial = self.breaker.before_call()
+            try:
+                for bucket in self.buckets():
+                    bucket.acquire()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    delay = self._on_failure(attempt, e)
+                else:
+                    self.breaker.record_success()
+                    return result
+            finally:
+                self.breaker.release_trial(trial)
+            time.sleep(delay)
+
+    async def acall(self, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            trial = self.breaker.before_call()
+            try:
+                for bucket in self.buckets():
+                    await bucket.aacquire()
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    delay = self._on_failure(attempt, e)
+                else:
+                    self.breaker.record_success()
+                    return result
+            finally:
+                self.breaker.release_trial(trial)
+            await asyncio.sleep(delay)
+
+
+# ---------- Registry ----------
+_policies = {}
+_registry_lock = threading.Lock()
+_retry_listeners = []
+_scoped_policies = {}  # (scope, service) -> ServicePolicy
+_current_scope = contextvars.ContextVar("resilience_scope", default=None)
+
+
+def _env_settings(name):
+    settings = dict(SERVICE_DEFAULTS.get(name, SERVICE_DEFAULTS["sheets"]))
+    for key, default in settings.items():
+        value = os.getenv(f"RESILIENCE_{name.upper()}_{key.upper()}")
+        if value is not None:
+            settings[key] = None if value.lower() in ("", "none", "off") else type(default)(value)
+    return settings
+
+
+def _process_policy(name):
+    """The process-wide policy (caller holds _registry_lock)"""
+    if name not in _policies:
+        _policies[name] = ServicePolicy(name, **_env_settings(name))
+    return _policies[name]
+
+
+def policy(name):
+    """The policy for a service: the current scope's own one if configured, else the process-wide one"""
+    with _registry_lock:
+        scope = _current_scope.get()
+        if scope is not None and (scope, name) in _scoped_policies:
+            return _scoped_policies[(scope, name)]
+        return _process_policy(name)
+
+
+def configure(name, **overrides):
+    """Replace a service's policy (e.g. configure('groq', rate=None) to lift rate limits)"""
+    settings = _env_settings(name)
+    settings.update(overrides)
+    with _registry_lock:
+        _policies[name] = ServicePolicy(name, **settings)
+    return _policies[name]
+
+
+def configure_scoped(scope, name, **overrides):
+    """Give `scope` its own policy (own bucket and breaker, within the process-wide bucket) for a service"""
+    settings = _env_settings(name)
+    settings.update(overrides)
+    with _registry_lock:
+        _scoped_policies[(scope, name)] = ServicePolicy(f"{name}@{scope}", shared_with=name, **settings)
+    return _scoped_policies[(scope, name)]
+
+
+@contextmanager
+def scoped(scope):
+    """Calls inside the block use `scope`'s policies where configured"""
+    token = _current_scope.set(scope)
+    try:
+        yield
+    finally:
+        _current_scope.reset(token)
+
+
+def add_retry_listener(listener):
+    """listener(service, error) is called before every retry"""
+    _retry_listeners.append(listener)
+
+
+def call(service, fn, *args, **kwargs):
+    """fn(*args, **kwargs) under the service's rate limit, retries and circuit breaker"""
+    return policy(service).call(fn, *args, **kwargs)
+
+
+async def acall(service, fn, *args, **kwargs):
+    """await fn(*args, **kwargs) under the service's rate limit, retries and circuit breaker"""
+    return await policy(service).acall(fn, *args, **kwargs)
@@ -0,0 +1,154 @@
+# Run Data Store: full tool results kept out of the agent's scratchpad
+#
+# A ReAct agent resends every earlier observation to the LLM on each step, so a
+# tool that returns its whole dataset makes every later step as large as the
+# data. Tools put full results here and return a short observation naming a
+# handle ("run-3/payroll_data#1"); other tools and the caller of execute_task
+# resolve the handle to the original object (no copy, no JSON); HTTP clients
+# read it as JSON from GET /data/{handle} (see service.py). Each run keeps its
+# own entries; runs in progress are never evicted, and the last few finished
+# runs are retained so results can be fetched after a run returns.
+
+import os
+import json
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict
+
+import pandas as pd
+
+MAX_OBSERVATION_CHARS = int(os.getenv("TOOL_OBSERVATION_MAX_CHARS", "1200"))
+KEEP_RUNS = int(os.getenv("RUN_DATA_KEEP_RUNS", "4"))
+DEFAULT_RUN = "default"  # Tools called outside execute_task (scripts, benchmarks)
+
+_current_run = contextvars.ContextVar("current_data_run", default=DEFAULT_RUN)
+_MISSING = object()
+
+
+class RunDataStore:
+    def __init__(self, keep_runs=KEEP_RUNS):
+        self.keep_runs = keep_runs
+        self._lock = threading.Lock()
+        self._runs = OrderedDict()  # run_id -> {handle: value}
+        self._active = set()  # Runs whose block has not exited yet
+        self._owners = {}  # run_id -> owner (e.g. tenant ID) allowed to read it
+        self._ids = itertools.count(1)
+        self._run_ids = itertools.count(1)
+
+    @contextmanager
+    def run(self, run_id=None, owner=None):
+        """Scope every put() inside the block (threads and tasks included) to one run"""
+        run_id = run_id or f"run-{next(self._run_ids)}"
+        with self._lock:
+            self._runs[run_id] = {}
+            self._active.add(run_id)
+            self._owners[run_id] = owner
+        token = _current_run.set(run_id)
+        try:
+            yield run_id
+        finally:
+            _current_run.reset(token)
+            with self._lock:
+                self._active.discard(run_id)
+                self._trim()
+
+    def _trim(self):
+        """Drop the oldest finished runs beyond keep_runs (however many runs are still in progress)"""
+        finished = [r for r in self._runs if r != DEFAULT_RUN and r not in self._active]
+        for run_id in finished[:max(0, len(finished) - self.keep_runs)]:
+            del self._runs[run_id]
+            self._owners.pop(run_id, None)
+
+    @property
+    def current_run(self):
+        return _current_run.get()
+
+    def put(self, kind, value):
+        """Store value for the current run; returns its handle.
+
+        Outside a run only the latest value per kind is kept, so direct tool
+        calls in a long-lived process do not accumulate data.
+        """
+        run_id = self.current_run
+        with self._lock:
+            entries = self._runs.setdefault(run_id, {})
+            if run_id == DEFAULT_RUN:
+                for handle in [h for h in entries if h.split("/", 1)[1].split("#")[0] == kind]:
+                    del entries[handle]
+            handle = f"{run_id}/{kind}#{next(self._ids)}"
+            entries[handle] = value
+        return handle
+
+    def get(self, handle, default=None):
+        run_id = handle.split("/", 1)[0]
+        with self._lock:
+            return self._runs.get(run_id, {}).get(handle, default)
+
+    def resolve(self, handle, owner=None):
+        """The stored value; KeyError if the handle is unknown, evicted or belongs to another owner"""
+        run_id = handle.split("/", 1)[0]
+        with self._lock:
+            value = self._runs.get(run_id, {}).get(handle, _MISSING)
+            if value is _MISSING or self._owners.get(run_id) not in (None, owner):
+                raise KeyError(handle)
+            return value
+
+    def latest(self, kind, run_id=None):
+        """Most recent value of a kind in a run (default: the current run)"""
+        with self._lock:
+            entries = self._runs.get(run_id or self.current_run, {})
+            for handle in reversed(list(entries)):
+                if handle.split("/", 1)[1].split("#")[0] == kind:
+                    return entries[handle]
+        return None
+
+    def handles(self, run_id=None):
+        with self._lock:
+            return list(self._runs.get(run_id or self.current_run, {}))
+
+    def drop(self, run_id):
+        with self._lock:
+            self._runs.pop(run_id, None)
+            self._owners.pop(run_id, None)
+
+
+def to_jsonable(value):
+    """JSON-ready form of a stored value: frames and RecordTables become lists of records"""
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict("records")
+    if hasattr(value, "to_records") and hasattr(value, "frame"):  # records.RecordTable
+        return value.to_records()
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    return value
+
+
+def observation(status="success", handle=None, message=None, max_chars=MAX_OBSERVATION_CHARS, **summary):
+    """Short JSON observation for the agent: status, optional handle/message and a few summary fields.
+
+    Summary fields are dropped (never cut mid-value) if the result would exceed
+    max_chars, so the observation always stays valid JSON of bounded size.
+    """
+    body = {"status": status}
+    if handle:
+        body["handle"] = handle
+    if message:
+        body["message"] = message
+    text = json.dumps({**body, **summary}, default=str)
+    if len(text) <= max_chars:
+        return text
+    body["truncated"] = True
+    text = json.dumps(body, default=str)
+    return text if len(text) <= max_chars else json.dumps({"status": status, "truncated": True})
+
+
+def clamp_observation(output, store, max_chars=MAX_OBSERVATION_CHARS):
+    """Cut an oversized tool output to max_chars, keeping the full text in the store"""
+    if not isinstance(output, str) or len(output) <= max_chars:
+        return output
+    handle = store.put("observation", output)
+    return f"{output[:max_chars]}\n... [{len(output):,} chars, full output stored as {handle}]"
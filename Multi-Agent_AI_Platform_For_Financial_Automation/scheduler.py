@@ -0,0 +1,449 @@
+# Scheduler: cron-style runs of the deterministic pipelines for every tenant
+#
+# A Schedule names a pipeline (payroll, invoice_reminders, annual_report,
+# procurement; see PIPELINES in Fully_multi_agent.py), a 5-field cron expression
+# and optionally the tenants it covers. Each tick() turns every cron slot that
+# came due since the previous tick into one job per tenant; the tenants' jobs
+# start stagger_seconds apart so a 06:00 slot does not hit Sheets, Gmail and
+# Groq for every tenant in the same second. Jobs run with business_date() set to
+# their slot, so a late or backfilled run produces the period it stands for.
+#
+# Jobs and the last slot seen per schedule live in SQLite: a restarted scheduler
+# neither repeats finished slots nor loses slots missed while it was down (up to
+# SCHEDULER_MAX_CATCHUP per schedule), and jobs interrupted mid-run are retried
+# until they have used max_attempts (a job that keeps crashing the process fails).
+# One scheduler process per state file.
+
+import os
+import json
+import sqlite3
+import calendar
+import threading
+from collections import namedtuple, Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, time as dtime
+
+import tenants
+
+MONTH_NAMES = {name.lower(): i for i, name in enumerate(calendar.month_abbr) if name}
+WEEKDAY_NAMES = {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    schedule TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    pipeline TEXT NOT NULL,
+    run_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at TEXT,
+    finished_at TEXT,
+    detail TEXT,
+    PRIMARY KEY (schedule, tenant, slot)
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at);
+CREATE TABLE IF NOT EXISTS ticks (
+    schedule TEXT PRIMARY KEY,
+    last_slot TEXT NOT NULL
+);
+"""
+
+
+def _stamp(moment):
+    return moment.isoformat(timespec="seconds")
+
+
+def _parse_field(text, low, high, names=None):
+    """One cron field -> set of ints: '*', 'a', 'a-b', lists and '/step' on any of them"""
+    values = set()
+    for part in text.lower().split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = low, high
+        else:
+            start, _, end = part.partition("-")
+            start = int(names.get(start, start) if names else start)
+            end = int(names.get(end, end) if names else end) if end else (high if step > 1 else start)
+        if not (low <= start <= high and low <= end <= high) or start > end or step < 1:
+            raise ValueError(f"Cron field {text!r}: out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSpec:
+    """Standard 5-field cron (minute hour day-of-month month day-of-week) plus 'L' = last day of month.
+
+    As in cron, a restricted day-of-month and day-of-week match when either
+    does. Day-of-week accepts 0-7 (0 and 7 are Sunday) and mon..sun.
+    """
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expr!r}: expected 5 fields")
+        minute, hour, day, month, weekday = fields
+        self.expr = expr
+        self.minutes = sorted(_parse_field(minute, 0, 59))
+        self.hours = sorted(_parse_field(hour, 0, 23))
+        day_parts = day.upper().split(",")
+        self.last_day = "L" in day_parts
+        day_parts = [p for p in day_parts if p != "L"]
+        self.days = _parse_field(",".join(day_parts), 1, 31) if day_parts else set()
+        self.months = _parse_field(month, 1, 12, MONTH_NAMES)
+        self.weekdays = {d % 7 for d in _parse_field(weekday, 0, 7, WEEKDAY_NAMES)}
+        self.any_day = day == "*"
+        self.any_weekday = weekday == "*"
+
+    def matches_date(self, day):
+        if day.month not in self.months:
+            return False
+        in_month = day.day in self.days or (self.last_day and day.day == calendar.monthrange(day.year, day.month)[1])
+        in_week = day.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_week if self.any_day else in_month
+        return in_month or in_week
+
+    def slots(self, after, until):
+        """Matching minutes in (after, until], oldest first"""
+        day = after.date()
+        while day <= until.date():
+            if self.matches_date(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        slot = datetime.combine(day, dtime(hour, minute))
+                        if after < slot <= until:
+                            yield slot
+            day += timedelta(days=1)
+
+    def __repr__(self):
+        return f"CronSpec({self.expr!r})"
+
+
+# tenants: tenant IDs the schedule covers (None = every configured tenant)
+# stagger_seconds: delay between consecutive tenants' jobs for the same slot
+Schedule = namedtuple("Schedule", ["name", "pipeline", "cron", "tenants", "stagger_seconds", "enabled"],
+                      defaults=[None, 60, True])
+
+DEFAULT_SCHEDULES = (
+    Schedule("payroll", "payroll", "0 6 L * *"),                  # Last day of the month, 06:00
+    Schedule("invoice_reminders", "invoice_reminders", "0 8 * * 1-5"),  # Weekdays, 08:00
+    Schedule("annual_report", "annual_report", "0 7 2 1 *"),      # 2 January, 07:00
+    Schedule("procurement", "procurement", "0 7 * * 1"),          # Mondays, 07:00
+)
+
+Job = namedtuple("Job", ["schedule", "tenant", "slot", "pipeline", "run_at", "status", "attempts",
+                         "started_at", "finished_at", "detail"])
+
+
+def schedule_from_dict(raw):
+    raw = dict(raw)
+    unknown = set(raw) - set(Schedule._fields)
+    if unknown:
+        raise ValueError(f"Schedule {raw.get('name')!r}: unknown field(s) {', '.join(sorted(unknown))}")
+    raw.setdefault("pipeline", raw.get("name"))
+    if raw.get("tenants") is not None:
+        raw["tenants"] = tuple(raw["tenants"])
+    schedule = Schedule(**raw)
+    CronSpec(schedule.cron)  # Fail on load, not at the first tick
+    return schedule
+
+
+def schedules_from_env():
+    """SCHEDULES_FILE (JSON list, default ./schedules.json); without it DEFAULT_SCHEDULES"""
+    path = os.getenv("SCHEDULES_FILE", "schedules.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return [schedule_from_dict(raw) for raw in json.load(f)]
+    return list(DEFAULT_SCHEDULES)
+
+
+def job_detail(result):
+    """Compact, JSON-safe record of a pipeline result for the jobs table"""
+    if isinstance(result, dict):
+        return {
+            "status": result.get("status", "success"),
+            "steps": [[s.get("step"), s.get("status"), s.get("seconds")] for s in result.get("steps", [])],
+        }
+    return {"status": "success", "result": str(result)[:500]}
+
+
+class Scheduler:
+    """Persistent cron scheduler; runner(pipeline, tenant_id, as_of) executes one job.
+
+    tick(now) enqueues due slots and starts due jobs; run_forever() ticks every
+    poll_seconds. A failed job is retried after retry_seconds * attempts, up to
+    max_attempts. At most max_workers jobs run at once, and per tenant at most
+    its max_concurrent_jobs.
+    """
+
+    def __init__(self, schedules, runner, path="scheduler.sqlite3", max_workers=4, max_catchup=3,
+                 max_attempts=3, retry_seconds=600, tenant_registry=None, known_pipelines=None):
+        self.schedules = {s.name: s for s in schedules}
+        self.specs = {s.name: CronSpec(s.cron) for s in schedules}
+        if known_pipelines is not None:
+            unknown = sorted({s.pipeline for s in schedules} - set(known_pipelines))
+            if unknown:
+                raise ValueError(f"Unknown pipeline(s): {', '.join(unknown)}")
+        self.runner = runner
+        self.path = path
+        self.max_workers = max_workers
+        self.max_catchup = max_catchup
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._registry = tenant_registry
+        self._lock = threading.Lock()
+        self._conn = None
+        self._executor = None
+        self._futures = set()
+        self._running = Counter()  # tenant_id -> jobs in flight in this process
+        self._stop = threading.Event()
+
+    @property
+    def registry(self):
+        return self._registry or tenants.registry()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            # Jobs still "running" were interrupted by a crash or restart: run them again, unless
+            # they already used every attempt (e.g. the job itself keeps taking the process down)
+            detail = json.dumps({"status": "error", "error": "Interrupted by a shutdown on its last attempt"})
+            abandoned = self._conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, detail = ? WHERE status = 'running' AND attempts >= ?",
+                (_stamp(datetime.now()), detail, self.max_attempts)).rowcount
+            recovered = self._conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'").rowcount
+            if abandoned:
+                print(f"[scheduler] Failed {abandoned} interrupted job(s) that used all {self.max_attempts} attempts")
+            if recovered:
+                print(f"[scheduler] Re-queued {recovered} job(s) interrupted by the last shutdown")
+        return self._conn
+
+    # ---------- Enqueueing ----------
+    def _tenant_ids(self, schedule, only=None):
+        ids = list(schedule.tenants) if schedule.tenants else sorted(t.tenant_id for t in self.registry)
+        return [t for t in ids if only is None or t in only]
+
+    def _enqueue(self, schedule, slot, base, tenant_ids, replace=False):
+        """One job per tenant for a slot, tenant i starting at base + i * stagger_seconds; returns jobs created"""
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        rows = [(schedule.name, tenant_id, _stamp(slot), schedule.pipeline,
+                 _stamp(base + timedelta(seconds=i * schedule.stagger_seconds)), "pending", 0)
+                for i, tenant_id in enumerate(tenant_ids)]
+        with self._lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                f"{verb} INTO jobs (schedule, tenant, slot, pipeline, run_at, status, attempts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            return self.conn.total_changes - before
+
+    def enqueue_due(self, now=None):
+        """Create jobs for every slot in (last tick, now]; returns the number of new jobs"""
+        now = now or datetime.now()
+        created = 0
+        for name, schedule in self.schedules.items():
+            if not schedule.enabled:
+                continue
+            with self._lock:
+                row = self.conn.execute("SELECT last_slot FROM ticks WHERE schedule = ?", (name,)).fetchone()
+            if row is None:
+                self._set_last_slot(name, now)  # First sight of a schedule: start from now, no history
+                continue
+            slots = list(self.specs[name].slots(datetime.fromisoformat(row[0]), now))
+            if len(slots) > self.max_catchup:
+                print(f"[scheduler] {name}: {len(slots)} missed slot(s), catching up the last {self.max_catchup} "
+                      "(use backfill for the rest)")
+                slots = slots[-self.max_catchup:]
+            tenant_ids = self._tenant_ids(schedule)
+            for slot in slots:
+                # Staggered from now: a slot caught up after downtime still spreads its tenants out
+                created += self._enqueue(schedule, slot, now, tenant_ids)
+            self._set_last_slot(name, now)
+        return created
+
+    def _set_last_slot(self, name, moment):
+        with self._lock:
+            self.conn.execute("INSERT INTO ticks (schedule, last_slot) VALUES (?, ?) "
+                              "ON CONFLICT (schedule) DO UPDATE SET last_slot = excluded.last_slot",
+                              (name, _stamp(moment)))
+
+    def backfill(self, schedule_name, start, end, tenant_ids=None, force=False, now=None):
+        """Enqueue every slot of a schedule in [start, end] (datetimes); returns the jobs created.
+
+        Jobs start from now, staggered as usual, each with its slot as business
+        date. Slots already queued or done are left alone unless force=True.
+        """
+        schedule = self.schedules[schedule_name]
+        now = now or datetime.now()
+        ids = self._tenant_ids(schedule, set(tenant_ids) if tenant_ids else None)
+        created = 0
+        for slot in self.specs[schedule_name].slots(start - timedelta(seconds=1), end):
+            created += self._enqueue(schedule, slot, now, ids, replace=force)
+        return created
+
+    # ---------- Dispatch ----------
+    def _capacity(self, tenant_id):
+        try:
+            return max(1, self.registry.get(tenant_id).max_concurrent_jobs)
+        except KeyError:
+            return 0
+
+    def dispatch(self, now=None):
+        """Start pending jobs whose run_at has passed, within the concurrency limits; returns jobs started"""
+        now = now or datetime.now()
+        with self._lock:
+            due = self.conn.execute(
+                "SELECT schedule, tenant, slot, pipeline FROM jobs WHERE status = 'pending' AND run_at <= ? "
+                "ORDER BY run_at, slot", (_stamp(now),)).fetchall()
+        started = 0
+        for schedule, tenant_id, slot, pipeline in due:
+            if sum(self._running.values()) >= self.max_workers:
+                break
+            capacity = self._capacity(tenant_id)
+            if capacity == 0:
+                self._finish(schedule, tenant_id, slot, "failed", {"error": f"Unknown tenant: {tenant_id}"})
+                continue
+            if self._running[tenant_id] >= capacity:
+                continue
+            with self._lock:
+                claimed = self.conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? "
+                    "WHERE schedule = ? AND tenant = ? AND slot = ? AND status = 'pending'",
+                    (_stamp(datetime.now()), schedule, tenant_id, slot)).rowcount
+                if not claimed:
+                    continue
+                self._running[tenant_id] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scheduler")
+            future = self._executor.submit(self._run_job, schedule, tenant_id, slot, pipeline)
+            self._futures.add(future)
+            future.add_done_callback(self._futures.discard)
+            started += 1
+        return started
+
+    def _run_job(self, schedule, tenant_id, slot, pipeline):
+        print(f"[scheduler] {schedule}/{tenant_id} @ {slot}: starting {pipeline}")
+        try:
+            result = self.runner(pipeline, tenant_id, datetime.fromisoformat(slot))
+            detail = job_detail(result)
+            status = "done" if detail["status"] == "success" else "error"
+        except Exception as e:
+            detail, status = {"status": "error", "error": f"{type(e).__name__}: {e}"}, "error"
+        finally:
+            with self._lock:
+                self._running[tenant_id] -= 1
+        if status == "error":
+            status = self._retry_or_fail(schedule, tenant_id, slot)
+        self._finish(schedule, tenant_id, slot, status, detail)
+        print(f"[scheduler] {schedule}/{tenant_id} @ {slot}: {status}")
+        return status
+
+    def _retry_or_fail(self, schedule, tenant_id, slot):
+        with self._lock:
+            attempts = self.conn.execute("SELECT attempts FROM jobs WHERE schedule = ? AND tenant = ? AND slot = ?",
+                                         (schedule, tenant_id, slot)).fetchone()[0]
+            if attempts >= self.max_attempts:
+                return "failed"
+            retry_at = datetime.now() + timedelta(seconds=self.retry_seconds * attempts)
+            self.conn.execute("UPDATE jobs SET run_at = ? WHERE schedule = ? AND tenant = ? AND slot = ?",
+                              (_stamp(retry_at), schedule, tenant_id, slot))
+        return "pending"
+
+    def _finish(self, schedule, tenant_id, slot, status, detail):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, detail = ? WHERE schedule = ? AND tenant = ? AND slot = ?",
+                (status, _stamp(datetime.now()), json.dumps(detail, default=str), schedule, tenant_id, slot))
+
+    def tick(self, now=None):
+        """Enqueue newly due slots and start due jobs; returns the number of jobs started"""
+        now = now or datetime.now()
+        self.enqueue_due(now)
+        return self.dispatch(now)
+
+    def wait(self):
+        """Block until every job started so far has finished"""
+        for future in list(self._futures):
+            future.result()
+
+    # ---------- Inspection ----------
+    def jobs(self, status=None, schedule=None, limit=100):
+        """Most recent jobs first, optionally filtered by status / schedule"""
+        query, args = "SELECT * FROM jobs WHERE 1 = 1", []
+        if status:
+            query, args = query + " AND status = ?", args + [status]
+        if schedule:
+            query, args = query + " AND schedule = ?", args + [schedule]
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY slot DESC, tenant LIMIT ?", args + [limit]).fetchall()
+        return [Job(*row[:-1], json.loads(row[-1]) if row[-1] else None) for row in rows]
+
+    def counts(self):
+        """{status: count} over all jobs"""
+        with self._lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    # ---------- Lifecycle ----------
+    def run_forever(self, poll_seconds=30):
+        """Tick every poll_seconds until stop() (call from a thread or the main loop)"""
+        print(f"[scheduler] Running {len(self.schedules)} schedule(s), polling every {poll_seconds}s")
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[scheduler] Tick failed: {e}")
+            self._stop.wait(poll_seconds)
+
+    def start(self, poll_seconds=30):
+        """run_forever() on a daemon thread; returns the thread"""
+        self._stop.clear()
+        thread = threading.Thread(target=self.run_forever, args=(poll_seconds,), name="scheduler", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def scheduler_from_env(runner, schedules=None, known_pipelines=None):
+    """SCHEDULER_DB (./scheduler.sqlite3), SCHEDULER_WORKERS (4), SCHEDULER_MAX_CATCHUP (3),
+    SCHEDULER_MAX_ATTEMPTS (3), SCHEDULER_RETRY_SECONDS (600); schedules from SCHEDULES_FILE"""
+    return Scheduler(
+        schedules if schedules is not None else schedules_from_env(),
+        runner,
+        path=os.getenv("SCHEDULER_DB", "scheduler.sqlite3"),
+        max_workers=int(os.getenv("SCHEDULER_WORKERS", "4")),
+        max_catchup=int(os.getenv("SCHEDULER_MAX_CATCHUP", "3")),
+        max_attempts=int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "3")),
+        retry_seconds=float(os.getenv("SCHEDULER_RETRY_SECONDS", "600")),
+        known_pipelines=known_pipelines,
+    )
+
+
+if __name__ == "__main__":
+    import Fully_multi_agent as fma
+
+    scheduler = scheduler_from_env(lambda pipeline, tenant_id, as_of: fma.run_pipeline(pipeline, tenant_id, as_of),
+                                   known_pipelines=fma.PIPELINES)
+    try:
+        scheduler.run_forever(float(os.getenv("SCHEDULER_POLL_SECONDS", "30")))
+    except KeyboardInterrupt:
+        print("\n[scheduler] Stopping; waiting for running jobs")
+    finally:
+        scheduler.close()
@@ -0,0 +1,241 @@
+# Service: HTTP API over execute_task and the deterministic pipelines
+#
+#   GET  /healthz                 liveness, worker pid and client warm-up failures
+#   GET  /pipelines               {pipeline: [steps]}
+#   POST /tasks                   {"task": "...", "tenant": "acme"} -> execute_task result
+#   POST /pipelines/{name}        {"tenant": "acme", "as_of": "2026-05-31"} -> run_pipeline result
+#   GET  /data/{handle}           ?tenant=acme&offset=0&limit=500 -> a result named in "data_handles"
+#
+# Both POSTs accept "mode": "dry_run" or "shadow" to capture sends and sheet
+# writes instead of performing them (see side_effects.py).
+#
+# Each worker process imports the agent module once, builds every tenant's
+# gspread/Sheets/Gmail clients at startup (ClientPool.warm) and keeps them for
+# its lifetime, so requests never pay for authorization or spreadsheet lookups.
+# Workers hold no request state; with --workers N they share one port
+# (SO_REUSEPORT) and the kernel spreads connections, and several hosts can sit
+# behind a load balancer. A tenant runs at most max_concurrent_jobs requests at
+# a time per worker. Set FINANCE_API_TOKEN to require "Authorization: Bearer".
+# Data handles live in the worker that ran the task (and only for its last few
+# runs), so with several workers use sticky routing for GET /data.
+
+import os
+import json
+import asyncio
+import contextlib
+import multiprocessing
+from datetime import datetime
+
+from aiohttp import web
+
+import tenants
+import side_effects
+from run_data_store import to_jsonable
+
+WARM_CLIENTS = ("gspread", "spreadsheet", "gmail")
+os.environ.setdefault("GMAIL_INTERACTIVE_AUTH", "0")  # Workers must never block on a browser consent flow
+
+_AGENT = web.AppKey("agent", object)
+_SLOTS = web.AppKey("tenant_slots", dict)
+_WARM_FAILURES = web.AppKey("warm_failures", dict)
+
+
+def _dumps(value):
+    return json.dumps(value, default=str)
+
+
+def _error(status, message):
+    return web.json_response({"status": "error", "message": message}, status=status, dumps=_dumps)
+
+
+async def _body(request):
+    if not request.can_read_body:
+        return {}
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text=_dumps({"status": "error", "message": "Body must be JSON"}),
+                                 content_type="application/json")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=_dumps({"status": "error", "message": "Body must be a JSON object"}),
+                                 content_type="application/json")
+    return body
+
+
+def _tenant(body):
+    """Tenant named in the body (default tenant when absent); HTTPNotFound for unknown IDs"""
+    tenant_id = body.get("tenant")
+    if not tenant_id:
+        return tenants.registry().default
+    try:
+        return tenants.registry().get(tenant_id)
+    except KeyError as e:
+        raise web.HTTPNotFound(text=_dumps({"status": "error", "message": str(e.args[0])}),
+                               content_type="application/json")
+
+
+def _capture_mode(body):
+    mode = body.get("mode") or None
+    if mode is not None and mode not in side_effects.MODES:
+        raise web.HTTPBadRequest(text=_dumps({"status": "error",
+                                              "message": f"Field 'mode' must be one of {', '.join(side_effects.MODES)}"}),
+                                 content_type="application/json")
+    return mode
+
+
+def _captured(mode):
+    return side_effects.capture(mode) if mode else contextlib.nullcontext()
+
+
+def _slot(app, tenant):
+    slots = app[_SLOTS]
+    if tenant.tenant_id not in slots:
+        slots[tenant.tenant_id] = asyncio.Semaphore(max(1, tenant.max_concurrent_jobs))
+    return slots[tenant.tenant_id]
+
+
+@web.middleware
+async def auth_middleware(request, handler):
+    token = os.getenv("FINANCE_API_TOKEN")
+    if token and request.path != "/healthz" and request.headers.get("Authorization") != f"Bearer {token}":
+        return _error(401, "Missing or invalid bearer token")
+    return await handler(request)
+
+
+async def healthz(request):
+    failures = request.app[_WARM_FAILURES]
+    return web.json_response({
+        "status": "ok" if not failures else "degraded",
+        "pid": os.getpid(),
+        "tenants": len(tenants.registry()),
+        "warm_failures": {f"{tenant_id}/{kind}": str(e) for (tenant_id, kind), e in failures.items()},
+    }, dumps=_dumps)
+
+
+async def list_pipelines(request):
+    return web.json_response({name: list(steps) for name, steps in request.app[_AGENT].PIPELINES.items()})
+
+
+async def run_task(request):
+    body = await _body(request)
+    task = str(body.get("task") or "").strip()
+    if not task:
+        return _error(400, "Field 'task' is required")
+    tenant = _tenant(body)
+    mode = _capture_mode(body)
+    async with _slot(request.app, tenant):
+        with _captured(mode) as sink:
+            result = await request.app[_AGENT].aexecute_task(task, tenant=tenant)
+            result = result if isinstance(result, dict) else {"output": result}
+            if sink is not None:
+                result["side_effects"] = {"mode": mode, **sink.summary()}
+    return web.json_response(result, dumps=_dumps)
+
+
+async def run_pipeline(request):
+    fma = request.app[_AGENT]
+    name = request.match_info["name"]
+    if name not in fma.PIPELINES:
+        return _error(404, f"Unknown pipeline: {name}")
+    body = await _body(request)
+    tenant = _tenant(body)
+    try:
+        as_of = datetime.fromisoformat(body["as_of"]) if body.get("as_of") else None
+    except ValueError:
+        return _error(400, "Field 'as_of' must be an ISO date, e.g. 2026-05-31")
+    mode = _capture_mode(body)
+    async with _slot(request.app, tenant):
+        with _captured(mode):
+            # Pipelines use the blocking clients; keep the event loop free for other requests
+            result = await asyncio.to_thread(fma.run_pipeline, name, tenant, as_of)
+    return web.json_response(result, dumps=_dumps)
+
+
+async def get_data(request):
+    handle = request.match_info["handle"]  # e.g. run-3/payroll_data#1, with '#' sent as %23
+    tenant = _tenant(dict(request.query))
+    try:
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query["limit"]) if "limit" in request.query else None
+    except ValueError:
+        return _error(400, "Query 'offset' and 'limit' must be integers")
+    try:
+        value = request.app[_AGENT].run_data.resolve(handle, owner=tenant.tenant_id)
+    except KeyError:
+        return _error(404, f"Unknown or expired data handle: {handle}")
+    data = await asyncio.to_thread(to_jsonable, value)
+    result = {"handle": handle}
+    if isinstance(data, list):
+        result["total"] = len(data)
+        end = offset + limit if limit is not None else None
+        data = data[offset:end]
+        result["offset"] = offset
+    result["data"] = data
+    return web.json_response(result, dumps=_dumps)
+
+
+async def _warm_up(app):
+    import Fully_multi_agent as fma  # Builds the agents and model clients once per worker
+
+    app[_AGENT] = fma
+    failures = await asyncio.to_thread(fma.tenant_clients.warm, WARM_CLIENTS, list(tenants.registry()))
+    for (tenant_id, kind), e in failures.items():
+        print(f"[service] {tenant_id}: could not warm {kind} client: {e}")
+    app[_WARM_FAILURES] = failures
+    print(f"[service] Worker {os.getpid()} ready ({len(tenants.registry())} tenant(s))")
+
+
+async def _shutdown(app):
+    if _AGENT in app:
+        app[_AGENT].flush_metrics()
+
+
+def create_app(agent=None):
+    """aiohttp application; `agent` replaces the Fully_multi_agent module (e.g. with fakes installed)"""
+    app = web.Application(middlewares=[auth_middleware])
+    app[_SLOTS] = {}
+    app[_WARM_FAILURES] = {}
+    if agent is not None:
+        app[_AGENT] = agent
+    else:
+        app.on_startup.append(_warm_up)
+    app.on_cleanup.append(_shutdown)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/pipelines", list_pipelines)
+    app.router.add_post("/tasks", run_task)
+    app.router.add_post("/pipelines/{name}", run_pipeline)
+    app.router.add_get("/data/{handle:.+}", get_data)
+    return app
+
+
+def _serve_worker(host, port, reuse_port):
+    web.run_app(create_app(), host=host, port=port, reuse_port=reuse_port, print=None)
+
+
+def serve(host=None, port=None, workers=None):
+    """Run the API; FINANCE_API_HOST (0.0.0.0), FINANCE_API_PORT (8080), FINANCE_API_WORKERS (1)"""
+    host = host or os.getenv("FINANCE_API_HOST", "0.0.0.0")
+    port = int(port or os.getenv("FINANCE_API_PORT", "8080"))
+    workers = int(workers or os.getenv("FINANCE_API_WORKERS", "1"))
+    print(f"[service] Listening on {host}:{port} with {workers} worker(s)")
+    if workers == 1:
+        _serve_worker(host, port, reuse_port=False)
+        return
+    # Spawned (not forked) workers: each builds its own clients, nothing is shared across processes
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_serve_worker, args=(host, port, True), name=f"finance-api-{i}")
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    serve()
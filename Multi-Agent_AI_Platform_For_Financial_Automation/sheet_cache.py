@@ -0,0 +1,192 @@
+# Sheet Snapshot Cache: local Parquet snapshots of worksheets with change detection
+
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+from datetime import datetime
+import pandas as pd
+
+DEFAULT_CACHE_DIR = ".sheet_cache"
+DEFAULT_METADATA_TTL = 30  # seconds between Drive modifiedTime checks per spreadsheet
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(name)).strip("_") or "sheet"
+
+
+class SheetSnapshotCache:
+    """Serve get_all_records() from disk while the spreadsheet's Drive modifiedTime is unchanged.
+
+    Each worksheet is stored as <root>/<spreadsheet>/<worksheet>.parquet (pickle
+    when a column mixes types Arrow cannot store) next to a .meta.json holding
+    the modifiedTime it was taken at. If the Sheets/Drive API is unreachable,
+    the last snapshot is served instead of failing.
+
+    Every remote request goes through call(fn, *args) / acall(fn, *args) when
+    given, e.g. a resilience policy that rate-limits and retries it.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, metadata_ttl=DEFAULT_METADATA_TTL, enabled=True,
+                 call=None, acall=None):
+        self.root = root
+        self.metadata_ttl = metadata_ttl
+        self.enabled = enabled
+        self.call = call or (lambda fn, *args: fn(*args))
+        self.acall = acall or (lambda fn, *args: fn(*args))
+        self._meta = {}  # spreadsheet key -> (checked_at, modified_time, spreadsheet)
+        self._async_meta = {}  # spreadsheet key -> (checked_at, modified_time) for async clients
+        self._lock = threading.Lock()
+
+    # ---------- Paths ----------
+    def _paths(self, key, worksheet):
+        base = os.path.join(self.root, _safe_name(key), _safe_name(worksheet))
+        return base + ".meta.json", base
+
+    def _load_meta(self, key, worksheet):
+        meta_path, _ = self._paths(key, worksheet)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    # ---------- Snapshot I/O ----------
+    def _read_snapshot(self, key, worksheet, meta):
+        _, base = self._paths(key, worksheet)
+        if meta["format"] == "parquet":
+            df = pd.read_parquet(base + ".parquet")
+        else:
+            df = pd.read_pickle(base + ".pkl")
+        return df.to_dict("records")
+
+    def _write_snapshot(self, key, worksheet, records, modified_time):
+        meta_path, base = self._paths(key, worksheet)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        df = pd.DataFrame.from_records(records)
+
+        try:
+            df.to_parquet(base + ".parquet.tmp", index=False)
+            os.replace(base + ".parquet.tmp", base + ".parquet")
+            fmt = "parquet"
+        except Exception:
+            # pyarrow missing, or a column mixes numbers and text (e.g. '' in a numeric column)
+            if os.path.exists(base + ".parquet.tmp"):
+                os.remove(base + ".parquet.tmp")
+            df.to_pickle(base + ".pkl.tmp")
+            os.replace(base + ".pkl.tmp", base + ".pkl")
+            fmt = "pickle"
+
+        meta = {
+            "modified_time": modified_time,
+            "fetched_at": datetime.now().isoformat(),
+            "rows": len(df),
+            "format": fmt,
+        }
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    # ---------- Change Detection ----------
+    def _spreadsheet_state(self, key, open_spreadsheet, force_refresh):
+        """(modified_time, spreadsheet), re-checking Drive at most once per metadata_ttl"""
+        with self._lock:
+            cached = self._meta.get(key)
+        if cached and not force_refresh and time.time() - cached[0] < self.metadata_ttl:
+            return cached[1], cached[2]
+
+        spreadsheet = cached[2] if cached else self.call(open_spreadsheet)
+        try:
+            modified_time = self.call(spreadsheet.get_lastUpdateTime)
+        except AttributeError:
+            modified_time = None  # Client without Drive metadata support: never trust snapshots
+        with self._lock:
+            self._meta[key] = (time.time(), modified_time, spreadsheet)
+        return modified_time, spreadsheet
+
+    def invalidate(self, key=None):
+        """Forget cached modifiedTime (call after writing to the spreadsheet)"""
+        with self._lock:
+            if key is None:
+                self._meta.clear()
+                self._async_meta.clear()
+            else:
+                self._meta.pop(key, None)
+                self._async_meta.pop(key, None)
+
+    # ---------- Public API ----------
+    def get_records(self, key, worksheet, open_spreadsheet, force_refresh=False):
+        """Records of `worksheet` in the spreadsheet identified by `key`.
+
+        open_spreadsheet is a zero-argument callable returning a gspread
+        Spreadsheet; it is only called when Drive metadata must be checked.
+        """
+        if not self.enabled:
+            return self.call(lambda: open_spreadsheet().worksheet(worksheet).get_all_records())
+
+        meta = self._load_meta(key, worksheet)
+        try:
+            modified_time, spreadsheet = self._spreadsheet_state(key, open_spreadsheet, force_refresh)
+            if (meta and not force_refresh and modified_time is not None
+                    and meta["modified_time"] == modified_time):
+                return self._read_snapshot(key, worksheet, meta)
+
+            records = self.call(lambda: spreadsheet.worksheet(worksheet).get_all_records())
+        except Exception as e:
+            if meta is None:
+                raise
+            print(f"[sheet_cache] Sheets unavailable ({e}); serving snapshot of "
+                  f"'{worksheet}' from {meta['fetched_at']}")
+            return self._read_snapshot(key, worksheet, meta)
+
+        if modified_time is not None:
+            self._write_snapshot(key, worksheet, records, modified_time)
+        return records
+
+
+    # ---------- Async API ----------
+    async def _amodified_time(self, key, client, force_refresh):
+        with self._lock:
+            cached = self._async_meta.get(key)
+        if cached and not force_refresh and time.time() - cached[0] < self.metadata_ttl:
+            return cached[1]
+        modified_time = await self.acall(client.get_lastUpdateTime)
+        with self._lock:
+            self._async_meta[key] = (time.time(), modified_time)
+        return modified_time
+
+    async def aget_records(self, key, worksheet, client, force_refresh=False):
+        """get_records() for an async_clients.AsyncSheetsClient; snapshot I/O runs in a worker thread"""
+        if not self.enabled:
+            return await self.acall(client.get_all_records, worksheet)
+
+        meta = await asyncio.to_thread(self._load_meta, key, worksheet)
+        try:
+            modified_time = await self._amodified_time(key, client, force_refresh)
+            if (meta and not force_refresh and modified_time is not None
+                    and meta["modified_time"] == modified_time):
+                return await asyncio.to_thread(self._read_snapshot, key, worksheet, meta)
+
+            records = await self.acall(client.get_all_records, worksheet)
+        except Exception as e:
+            if meta is None:
+                raise
+            print(f"[sheet_cache] Sheets unavailable ({e}); serving snapshot of "
+                  f"'{worksheet}' from {meta['fetched_at']}")
+            return await asyncio.to_thread(self._read_snapshot, key, worksheet, meta)
+
+        if modified_time is not None:
+            await asyncio.to_thread(self._write_snapshot, key, worksheet, records, modified_time)
+        return records
+
+
+def cache_from_env(call=None, acall=None):
+    """SHEET_CACHE_DIR, SHEET_CACHE_TTL and SHEET_CACHE_DISABLED=1 configure the cache"""
+    return SheetSnapshotCache(
+        root=os.getenv("SHEET_CACHE_DIR", DEFAULT_CACHE_DIR),
+        metadata_ttl=float(os.getenv("SHEET_CACHE_TTL", DEFAULT_METADATA_TTL)),
+        enabled=os.getenv("SHEET_CACHE_DISABLED", "0") != "1",
+        call=call,
+        acall=acall,
+    )
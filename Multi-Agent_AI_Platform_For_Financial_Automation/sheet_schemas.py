@@ -0,0 +1,211 @@
+# Sheet Schemas: typed, vectorized parsing and validation of worksheet records
+
+import re
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# kind: "id" (non-empty text), "str", "category", "int" (int32), "float" (float32),
+#       "money" (float64, keeps cent precision on large totals), "date" (datetime64)
+Column = namedtuple("Column", ["kind", "required", "default"], defaults=[True, None])
+
+SHEET_SCHEMAS = {
+    "Employees": {
+        "employee_id": Column("id"),
+        "name": Column("str"),
+        "email": Column("str"),
+        "base_salary": Column("money"),
+        "department": Column("category", required=False, default="Unassigned"),
+    },
+    "Attendance": {
+        "employee_id": Column("id"),
+        "leaves_taken": Column("int", required=False, default=0),
+        "allowed_leaves": Column("int", required=False, default=0),
+        "late_arrivals": Column("int", required=False, default=0),
+        "overtime_hours": Column("int", required=False, default=0),
+    },
+    "SalaryPolicy": {
+        "rule_name": Column("id"),
+        "value": Column("int"),
+    },
+    "Invoices": {
+        "invoice_id": Column("id"),
+        "customer_name": Column("str"),
+        "customer_email": Column("str"),
+        "date": Column("date", required=False, default=""),
+        "due_date": Column("date", required=False, default=""),
+        "amount": Column("money"),
+        "status": Column("category"),
+    },
+    "PO's": {
+        "Item": Column("id"),
+        "Vendor": Column("category", required=False, default="Unknown"),
+        "Category": Column("category"),
+        "Qty": Column("float"),
+        "Price": Column("money"),
+        "Date": Column("str", required=False, default=""),
+    },
+    "Budgets": {
+        "Category": Column("category"),
+        "Budget Amount": Column("money"),
+    },
+    "Spend": {
+        "Category": Column("category"),
+        "Amount Spent": Column("money", required=False, default=0),
+    },
+    "Inventory": {
+        "Item": Column("id"),
+        "Category": Column("category"),
+        "Current Stock": Column("int"),
+        "Reorder Level": Column("int"),
+        "Supplier": Column("category", required=False, default="Unknown"),
+    },
+    # Financial tabs: a label column plus one money column per year (discovered)
+    "Income_Statement": {"Metric": Column("id")},
+    "Balance_Sheet": {"Metric": Column("id")},
+    "Cash_Flow": {"Category": Column("id")},
+}
+
+FINANCIAL_SHEETS = {"Income_Statement", "Balance_Sheet", "Cash_Flow"}
+YEAR_COLUMN_PATTERN = re.compile(r"^\s*(\d{4})\b")
+MAX_REPORTED_ERRORS = 10
+
+_EMPTY_VALUES = {"": "0", "None": "0", "nan": "0", "NaN": "0", "-": "0"}
+_INT32 = np.iinfo(np.int32)
+
+
+class SchemaError(ValueError):
+    """Raised when worksheet records do not match their schema"""
+
+    def __init__(self, sheet, errors):
+        self.sheet = sheet
+        self.errors = errors
+        shown = "; ".join(errors[:MAX_REPORTED_ERRORS])
+        more = f" (+{len(errors) - MAX_REPORTED_ERRORS} more)" if len(errors) > MAX_REPORTED_ERRORS else ""
+        super().__init__(f"Invalid data in '{sheet}' sheet: {shown}{more}")
+
+
+def discover_year_columns(df: pd.DataFrame) -> list:
+    """Columns whose header starts with a 4-digit year (e.g. '2024 (PKR)'), oldest first"""
+    matches = [(int(m.group(1)), col) for col in df.columns
+               if (m := YEAR_COLUMN_PATTERN.match(str(col)))]
+    return [col for _, col in sorted(matches)]
+
+
+def _clean_numeric_strings(values: pd.Series) -> pd.Series:
+    cleaned = values.astype(str).str.replace(r"[,\s]|PKR|Rs\.?|\$", "", regex=True).replace(_EMPTY_VALUES)
+    return cleaned.str.replace(r"^\((.*)\)$", r"-\1", regex=True)  # Accounting negatives
+
+
+def clean_numeric(series: pd.Series) -> pd.Series:
+    """Vectorized '1,250' / '(300)' / '' -> float64; unparseable cells become NaN"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64").fillna(0.0)
+    # Plain numbers parse in C; only cells with separators/currency go through the regex clean-up
+    parsed = pd.to_numeric(series, errors="coerce").astype("float64")
+    rest = parsed.isna()
+    if rest.any():
+        parsed[rest] = pd.to_numeric(_clean_numeric_strings(series[rest]), errors="coerce")
+    return parsed
+
+
+def parse_numeric_frame(df: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """Parse several numeric sheet columns in a single pass, raising on bad cells"""
+    columns = list(df.columns) if columns is None else list(columns)
+    block = df[columns]
+    if all(pd.api.types.is_numeric_dtype(dtype) for dtype in block.dtypes):
+        return block.astype(float)  # Already parsed by parse_sheet
+    flat = pd.Series(block.to_numpy().ravel(), dtype=object)
+    values = pd.to_numeric(_clean_numeric_strings(flat), errors="raise").to_numpy(dtype=float)
+    return pd.DataFrame(values.reshape(block.shape), index=block.index, columns=columns)
+
+
+def parse_dates(text: pd.Series) -> pd.Series:
+    """Vectorized ISO-8601 parse with a per-format fallback for the remaining cells ('' -> NaT).
+
+    The fallback reads numeric dates day first, as the sheets write them:
+    05/06/2025 is 5 June.
+    """
+    text = text.where(text != "")
+    parsed = pd.to_datetime(text, errors="coerce", format="ISO8601")
+    rest = parsed.isna() & text.notna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(text[rest], errors="coerce", format="mixed", dayfirst=True)
+    return parsed
+
+
+def _row_error(index, message):
+    return index, f"row {index + 2}: {message}"  # +1 for header, +1 for 1-based sheet rows
+
+
+def _coerce_column(name, column, values, errors):
+    kind = column.kind
+    if kind in ("int", "float", "money"):
+        parsed = clean_numeric(values)
+        bad = parsed.isna()
+        for idx in parsed.index[bad]:
+            errors.append(_row_error(idx, f"{name}={values[idx]!r} is not a number"))
+        parsed = parsed.fillna(0.0)
+        if kind == "int":
+            fractional = (parsed % 1 != 0) & ~bad
+            overflow = (parsed < _INT32.min) | (parsed > _INT32.max)
+            for idx in parsed.index[fractional | overflow]:
+                errors.append(_row_error(idx, f"{name}={values[idx]!r} is not a valid integer"))
+            return parsed.clip(_INT32.min, _INT32.max).round().astype("int32")
+        return parsed.astype("float32" if kind == "float" else "float64")
+
+    if kind == "date":
+        text = values.astype(str).str.strip()
+        parsed = parse_dates(text)
+        for idx in parsed.index[parsed.isna() & (text != "")]:
+            errors.append(_row_error(idx, f"{name}={values[idx]!r} is not a date"))
+        return parsed
+
+    text = values.fillna("").astype(str).str.strip()
+    if kind == "id":
+        for idx in text.index[text == ""]:
+            errors.append(_row_error(idx, f"{name} is empty"))
+    if kind == "category":
+        return text.astype("category")
+    return text
+
+
+def parse_sheet(sheet: str, records, errors: str = "raise") -> pd.DataFrame:
+    """Parse get_all_records() output into a compact, typed DataFrame.
+
+    errors="raise" raises SchemaError listing offending sheet rows,
+    errors="drop" removes the offending rows and prints a warning instead.
+    """
+    schema = SHEET_SCHEMAS[sheet]
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(records)
+
+    if df.empty:
+        return df.reindex(columns=list(dict.fromkeys([*schema, *df.columns])))
+    missing = [name for name, col in schema.items() if col.required and name not in df.columns]
+    if missing:
+        raise SchemaError(sheet, [f"missing column(s) {', '.join(missing)}"])
+
+    row_errors = []
+    out = {}
+    for name, column in schema.items():
+        values = df[name] if name in df.columns else pd.Series(column.default, index=df.index)
+        out[name] = _coerce_column(name, column, values, row_errors)
+
+    if sheet in FINANCIAL_SHEETS:
+        for year in discover_year_columns(df):
+            out[year] = _coerce_column(year, Column("money"), df[year], row_errors)
+
+    # Keep unknown columns untouched so sheet additions do not break tools
+    for name in df.columns:
+        if name not in out:
+            out[name] = df[name]
+    frame = pd.DataFrame(out, index=df.index)
+
+    if row_errors:
+        messages = [message for _, message in sorted(row_errors)]
+        if errors == "raise":
+            raise SchemaError(sheet, messages)
+        bad_rows = sorted({idx for idx, _ in row_errors})
+        print(f"[sheet_schemas] Dropping {len(bad_rows)} invalid row(s) from '{sheet}': {messages[:3]}")
+        frame = frame.drop(index=bad_rows)
+    return frame
@@ -0,0 +1,144 @@
+# Sheet Streaming: paged A1-range reads of large worksheets
+#
+# get_all_records() builds one dict per row (keys repeated on every row) for the
+# whole tab before any work starts. SheetStream fetches `chunk_rows` rows per
+# values.get request instead and yields them as plain tuples, typed DataFrames
+# (via parse_sheet) or Arrow record batches, so consumers can aggregate as the
+# pages arrive and peak memory is bounded by the chunk size, not the tab size.
+
+import os
+import pandas as pd
+
+from sheet_schemas import parse_sheet
+
+try:
+    import pyarrow as pa
+except ImportError:  # Optional: only needed for record_batches()
+    pa = None
+
+DEFAULT_CHUNK_ROWS = 5000
+
+
+def column_letter(index):
+    """1-based column index -> A1 letters (1 -> 'A', 27 -> 'AA')"""
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class SheetStream:
+    """Iterate a worksheet in pages of `chunk_rows` data rows.
+
+    columns restricts the read to the contiguous A1 span covering those header
+    names (rows are then trimmed to exactly those columns). Every remote request
+    goes through call(fn, *args) when given, e.g. a resilience policy.
+    """
+
+    def __init__(self, worksheet, chunk_rows=DEFAULT_CHUNK_ROWS, columns=None, call=None):
+        self.worksheet = worksheet
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.columns = list(columns) if columns else None
+        self._call = call or (lambda fn, *args: fn(*args))
+        self._header = None
+        self.requests = 0
+
+    @property
+    def sheet_header(self):
+        """Full header row of the worksheet (fetched once)"""
+        if self._header is None:
+            self.requests += 1
+            self._header = [str(h).strip() for h in self._call(self.worksheet.row_values, 1)]
+        return self._header
+
+    @property
+    def header(self):
+        """Names of the columns each yielded row holds"""
+        return self.columns or self.sheet_header
+
+    def _span(self):
+        """(first, last) 1-based column indexes to request"""
+        if not self.columns:
+            return 1, len(self.sheet_header)
+        missing = [c for c in self.columns if c not in self.sheet_header]
+        if missing:
+            raise KeyError(f"{self.worksheet.title}: no column(s) {', '.join(missing)}")
+        positions = [self.sheet_header.index(c) + 1 for c in self.columns]
+        return min(positions), max(positions)
+
+    def chunks(self, start=2, stop=None):
+        """Yield (first_row_number, [tuple, ...]) per page; row numbers are 1-based sheet rows.
+
+        start/stop (inclusive) limit the read to a row range, e.g. only the rows
+        appended since the last run.
+        """
+        first_col, last_col = self._span()
+        width = last_col - first_col + 1
+        picks = None
+        if self.columns:
+            picks = [self.sheet_header.index(c) + 1 - first_col for c in self.columns]
+        last_row = getattr(self.worksheet, "row_count", None)
+        if stop is not None:
+            last_row = stop if last_row is None else min(last_row, stop)
+        while last_row is None or start <= last_row:
+            end = start + self.chunk_rows - 1
+            if last_row is not None:
+                end = min(end, last_row)
+            a1 = f"{column_letter(first_col)}{start}:{column_letter(last_col)}{end}"
+            self.requests += 1
+            values = self._call(self.worksheet.get, a1)
+            if not values:
+                return
+            # The API trims trailing empty cells; pad so every tuple has the same width
+            rows = [tuple(row) + ("",) * (width - len(row)) for row in values]
+            if picks is not None:
+                rows = [tuple(row[i] for i in picks) for row in rows]
+            yield start, rows
+            if len(values) < end - start + 1:
+                return  # Short page: past the last non-empty row
+            start = end + 1
+
+    def __iter__(self):
+        for _, rows in self.chunks():
+            yield from rows
+
+    def frames(self, sheet=None, errors="raise"):
+        """One DataFrame per page, typed with parse_sheet(sheet) when given.
+
+        The index is the 0-based data row, so schema errors report the same
+        sheet row numbers a full read would.
+        """
+        header = self.header
+        for start, rows in self.chunks():
+            frame = pd.DataFrame.from_records(rows, columns=header,
+                                              index=pd.RangeIndex(start - 2, start - 2 + len(rows)))
+            if sheet is not None:
+                frame = parse_sheet(sheet, frame, errors=errors)
+            yield frame
+
+    def record_batches(self):
+        """One pyarrow.RecordBatch of string columns per page (requires pyarrow)"""
+        if pa is None:
+            raise ImportError("record_batches() requires pyarrow")
+        header = self.header
+        for _, rows in self.chunks():
+            columns = list(zip(*rows)) if rows else [()] * len(header)
+            yield pa.RecordBatch.from_arrays([pa.array([str(v) for v in col], pa.string()) for col in columns],
+                                             names=header)
+
+
+def sum_by(frames, key, value):
+    """Group-by sum folded over a stream of frames: only the partial totals are kept"""
+    totals = None
+    for frame in frames:
+        if frame.empty:
+            continue
+        partial = frame.groupby(frame[key].astype(str), sort=False)[value].sum()
+        totals = partial if totals is None else totals.add(partial, fill_value=0.0)
+    return totals if totals is not None else pd.Series(dtype="float64")
+
+
+def chunk_rows_from_env():
+    """SHEET_STREAM_CHUNK_ROWS (default 5000 rows per request)"""
+    return int(os.getenv("SHEET_STREAM_CHUNK_ROWS", DEFAULT_CHUNK_ROWS))
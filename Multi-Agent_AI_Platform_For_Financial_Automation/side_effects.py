@@ -0,0 +1,267 @@
+# Side Effects: dry-run and shadow capture of every outbound write
+#
+# Gmail sends and Sheets writes go through perform()/aperform(). Normally that
+# just runs the call. Inside capture() (or process-wide with SIDE_EFFECTS_MODE)
+# the call is replaced by a record in a CaptureSink: one JSON line per effect
+# (kind, target, tenant, timestamp, seconds, details) in effects.jsonl, and the
+# full payload (e.g. the .eml with its attachments) under payloads/. Everything
+# upstream -- sheet reads, salary maths, PDF rendering, LLM calls -- runs for
+# real, so full pipelines can be load-tested at production volume.
+#
+#   dry_run  record immediately; measures the pipeline without API quotas
+#   shadow   pass each effect through the service's rate limiter first, so the
+#            timings match what production quotas would allow
+#
+# Checkpoints and reminder history are written to a copy under the capture
+# directory (seeded from the live files unless seed_state=False), so a dry run
+# neither marks real sends as done nor is skipped because of them. Generated
+# files (PDFs, charts) go to <capture>/workspace/ and are published to a store
+# under <capture>/artifacts/; artifact retention is recorded, never run.
+
+import os
+import json
+import time
+import sqlite3
+import itertools
+import threading
+import contextvars
+from collections import namedtuple, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from tenants import current_tenant
+from llm_metering import percentile
+
+LIVE, DRY_RUN, SHADOW = "live", "dry_run", "shadow"
+MODES = (LIVE, DRY_RUN, SHADOW)
+CAPTURE_ROOT = os.getenv("SIDE_EFFECTS_CAPTURE_DIR", "captures")
+
+Capture = namedtuple("Capture", ["sink", "mode"])
+
+_active = contextvars.ContextVar("side_effect_capture", default=None)
+_process_capture = None
+_process_lock = threading.Lock()
+_capture_ids = itertools.count(1)
+
+
+class CaptureSink:
+    """Append-only record of captured side effects in one directory"""
+
+    def __init__(self, directory, store_payloads=True, seed_state=True):
+        self.directory = directory
+        self.store_payloads = store_payloads
+        self.seed_state = seed_state
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._timings = defaultdict(list)
+        self._instances = {}
+        os.makedirs(directory, exist_ok=True)
+        self._log = open(os.path.join(directory, "effects.jsonl"), "a", encoding="utf-8")
+        self.started = time.perf_counter()
+
+    def record(self, kind, target, mode, seconds, detail=None, payload=None, suffix=".bin"):
+        """Append one effect; returns its sequence number"""
+        seq = next(self._seq)
+        tenant_id = current_tenant().tenant_id
+        entry = {
+            "seq": seq,
+            "kind": kind,
+            "target": target,
+            "tenant": tenant_id,
+            "mode": mode,
+            "at": datetime.now().isoformat(timespec="microseconds"),
+            "offset_seconds": round(time.perf_counter() - self.started, 6),
+            "seconds": round(seconds, 6),
+            **(detail or {}),
+        }
+        if payload is not None:
+            entry["bytes"] = len(payload)
+            if self.store_payloads:
+                relative = os.path.join("payloads", f"{seq:08d}{suffix}")
+                os.makedirs(os.path.join(self.directory, "payloads"), exist_ok=True)
+                with open(os.path.join(self.directory, relative), "wb") as f:
+                    f.write(payload)
+                entry["payload"] = relative
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            self._log.write(line + "\n")
+            self._log.flush()
+            self._timings[(tenant_id, kind)].append(seconds)
+        return seq
+
+    def summary(self, tenant_id=None):
+        """{"directory", "effects", "by_kind": {kind: {count, seconds_total, p50, p95, max}}}, optionally for one tenant"""
+        timings = defaultdict(list)
+        with self._lock:
+            for (tenant, kind), values in self._timings.items():
+                if tenant_id is None or tenant == tenant_id:
+                    timings[kind].extend(values)
+        timings = {kind: sorted(values) for kind, values in timings.items()}
+        return {
+            "directory": self.directory,
+            "effects": sum(len(v) for v in timings.values()),
+            "by_kind": {kind: {"count": len(v), "seconds_total": round(sum(v), 6),
+                               "p50": percentile(v, 50), "p95": percentile(v, 95), "max": v[-1]}
+                        for kind, v in timings.items()},
+        }
+
+    def state_path(self, live_path, tenant=None):
+        """Capture-local copy of a tenant's SQLite state file, seeded from the live file once"""
+        tenant = tenant or current_tenant()
+        path = os.path.join(self.directory, "state", tenant.tenant_id, os.path.basename(live_path))
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.seed_state and os.path.exists(live_path):
+                # backup() copies a consistent snapshot even while the live file is in WAL use
+                src, dst = sqlite3.connect(live_path), sqlite3.connect(path)
+                try:
+                    src.backup(dst)
+                finally:
+                    src.close()
+                    dst.close()
+        return path
+
+    def workspace_path(self, path):
+        """Capture-local location of a generated working file, so live files are never overwritten"""
+        return os.path.join(self.directory, "workspace", path)
+
+    @property
+    def artifact_root(self):
+        return os.path.join(self.directory, "artifacts")
+
+    def instance(self, name, factory):
+        """One factory(self, tenant) object per (name, current tenant) for this capture"""
+        tenant = current_tenant()
+        with self._lock:
+            key = (name, tenant.tenant_id)
+            if key not in self._instances:
+                self._instances[key] = factory(self, tenant)
+            return self._instances[key]
+
+    def close(self):
+        with self._lock:
+            for obj in self._instances.values():
+                close = getattr(obj, "close", None)
+                if close:
+                    close()
+            self._instances.clear()
+            if not self._log.closed:
+                self._log.close()
+
+
+def new_capture_dir(root=None):
+    return os.path.join(root or CAPTURE_ROOT, f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{next(_capture_ids)}")
+
+
+def mode_from_env():
+    """SIDE_EFFECTS_MODE: live (default), dry_run or shadow"""
+    mode = os.getenv("SIDE_EFFECTS_MODE", LIVE).strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"SIDE_EFFECTS_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+    return mode
+
+
+def active():
+    """The Capture in effect (from capture() or SIDE_EFFECTS_MODE), or None when effects are live"""
+    global _process_capture
+    current = _active.get()
+    if current is not None:
+        return current if current.mode != LIVE else None
+    mode = mode_from_env()
+    if mode == LIVE:
+        return None
+    with _process_lock:
+        if _process_capture is None or _process_capture.mode != mode:
+            sink = CaptureSink(new_capture_dir(), store_payloads=os.getenv("SIDE_EFFECTS_STORE_PAYLOADS", "1") != "0")
+            _process_capture = Capture(sink, mode)
+            print(f"[side_effects] {mode}: capturing outbound effects in {sink.directory}")
+        return _process_capture
+
+
+@contextmanager
+def capture(mode=DRY_RUN, directory=None, store_payloads=True, seed_state=True):
+    """Capture side effects of the block (asyncio tasks and to_thread calls included); yields the sink.
+
+    directory may be an open CaptureSink to share one capture between several
+    blocks (e.g. one per tenant thread); it is then left open. mode="live"
+    runs effects for real even when SIDE_EFFECTS_MODE is set.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    owned = mode != LIVE and not isinstance(directory, CaptureSink)
+    if mode == LIVE:
+        sink = None
+    elif owned:
+        sink = CaptureSink(directory or new_capture_dir(), store_payloads, seed_state)
+    else:
+        sink = directory
+    token = _active.set(Capture(sink, mode))
+    try:
+        yield sink
+    finally:
+        _active.reset(token)
+        if owned:
+            sink.close()
+
+
+def _captured_response(seq):
+    return {"id": f"captured-{seq}", "captured": True}
+
+
+def perform(kind, target, execute, via=None, payload=None, suffix=".bin", captured=None, **detail):
+    """execute() the side effect through via(fn) (e.g. a resilience policy), or capture it.
+
+    Returns execute()'s result when live, else {"id": "captured-N", "captured": True}.
+    captured(), if given, runs in place of execute() while capturing, against
+    capture-local state (e.g. publishing a file to the capture's artifact store).
+    """
+    via = via or (lambda fn: fn())
+    current = active()
+    if current is None:
+        return via(execute)
+    started = time.perf_counter()
+    if current.mode == SHADOW:
+        via(lambda: None)  # Same token bucket wait as the real call
+    if captured is not None:
+        captured()
+    seq = current.sink.record(kind, target, current.mode, time.perf_counter() - started, detail, payload, suffix)
+    return _captured_response(seq)
+
+
+async def aperform(kind, target, execute, via=None, payload=None, suffix=".bin", captured=None, **detail):
+    """Async perform(): execute(), via(fn) and captured() return awaitables"""
+    current = active()
+    if current is None:
+        return await (via(execute) if via else execute())
+    started = time.perf_counter()
+    if current.mode == SHADOW and via is not None:
+        async def noop():
+            return None
+        await via(noop)
+    if captured is not None:
+        await captured()
+    seq = current.sink.record(kind, target, current.mode, time.perf_counter() - started, detail, payload, suffix)
+    return _captured_response(seq)
+
+
+class CaptureLocal:
+    """Attribute proxy to `live`, or to a capture-local factory(sink, tenant) object while capturing"""
+
+    __slots__ = ("_name", "_live", "_factory")
+
+    def __init__(self, name, live, factory):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_live", live)
+        object.__setattr__(self, "_factory", factory)
+
+    def target(self):
+        current = active()
+        if current is None:
+            return self._live
+        return current.sink.instance(self._name, self._factory)
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.target(), name, value)
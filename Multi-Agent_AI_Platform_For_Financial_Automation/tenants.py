@@ -0,0 +1,312 @@
+# Tenants: per-business-unit workbook, sender identity, credentials and quotas
+#
+# Each tenant names its spreadsheet by ID (opened with open_by_key, so there is
+# no Drive name lookup per open), its Gmail sender and token, the approver for
+# purchase orders, optional fixed stakeholder list and per-service quotas. Code runs "as" a tenant inside
+# tenant_scope(); TenantLocal state, pooled clients, working-file paths and
+# resilience quotas then all resolve to that tenant. TenantScheduler runs one
+# job for many tenants in parallel, at most max_concurrent_jobs per tenant.
+#
+# Tenants are read from TENANTS_FILE (JSON list, default ./tenants.json). With
+# no file, a single "default" tenant reproduces the single-workbook setup.
+
+import os
+import json
+import asyncio
+import threading
+import contextvars
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import resilience
+
+DEFAULT_TENANT_ID = "default"
+TENANT_WORKSPACE_ROOT = os.getenv("TENANT_WORKSPACE_ROOT", "tenants")
+
+_TenantBase = namedtuple("Tenant", [
+    "tenant_id", "spreadsheet_id", "spreadsheet_name", "sender_email", "stakeholders",
+    "service_account_file", "gmail_token_file", "quotas", "max_concurrent_jobs", "approver_email",
+], defaults=[None, "Invoices", None, (), "service_account.json", "token.json", None, 1, None])
+
+
+class Tenant(_TenantBase):
+    __slots__ = ()
+
+    @property
+    def is_default(self):
+        return self.tenant_id == DEFAULT_TENANT_ID
+
+    @property
+    def sender(self):
+        """The From address; there is no built-in default"""
+        if not self.sender_email:
+            raise RuntimeError(f"Tenant {self.tenant_id!r} has no sender_email (set it in TENANTS_FILE or SENDER_EMAIL)")
+        return self.sender_email
+
+    @property
+    def approver(self):
+        """Where PO approval requests go: approver_email, else the sender's own mailbox"""
+        return self.approver_email or self.sender
+
+    @property
+    def spreadsheet_key(self):
+        """Stable identifier for caches: the spreadsheet ID when known, else its name"""
+        return self.spreadsheet_id or self.spreadsheet_name
+
+    def path(self, *parts):
+        """Working-file path for this tenant ('payslips/x.pdf' stays as is for the default tenant)"""
+        if self.is_default:
+            return "/".join(parts)
+        return "/".join([TENANT_WORKSPACE_ROOT, self.tenant_id, *parts])  # Also the artifact store key
+
+    def state_path(self, path):
+        """Per-tenant variant of a state file path such as checkpoints.sqlite3"""
+        if self.is_default:
+            return path
+        return os.path.join(TENANT_WORKSPACE_ROOT, self.tenant_id, os.path.basename(path))
+
+
+def tenant_from_dict(raw):
+    raw = dict(raw)
+    raw["stakeholders"] = tuple(raw.get("stakeholders") or ())
+    unknown = set(raw) - set(Tenant._fields)
+    if unknown:
+        raise ValueError(f"Tenant {raw.get('tenant_id')!r}: unknown field(s) {', '.join(sorted(unknown))}")
+    return Tenant(**raw)
+
+
+def default_tenant():
+    """The single-workbook tenant, from SPREADSHEET_ID / SPREADSHEET_NAME / SENDER_EMAIL / APPROVER_EMAIL"""
+    return Tenant(
+        tenant_id=DEFAULT_TENANT_ID,
+        spreadsheet_id=os.getenv("SPREADSHEET_ID") or None,
+        spreadsheet_name=os.getenv("SPREADSHEET_NAME", "Invoices"),
+        sender_email=os.getenv("SENDER_EMAIL") or None,
+        approver_email=os.getenv("APPROVER_EMAIL") or None,
+    )
+
+
+class TenantRegistry:
+    def __init__(self, tenants):
+        self.tenants = {t.tenant_id: t for t in tenants}
+        if not self.tenants:
+            self.tenants[DEFAULT_TENANT_ID] = default_tenant()
+        for tenant in self.tenants.values():
+            apply_quotas(tenant)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls([tenant_from_dict(raw) for raw in json.load(f)])
+
+    def get(self, tenant_id):
+        try:
+            return self.tenants[tenant_id]
+        except KeyError:
+            raise KeyError(f"Unknown tenant: {tenant_id}") from None
+
+    @property
+    def default(self):
+        return self.tenants.get(DEFAULT_TENANT_ID) or next(iter(self.tenants.values()))
+
+    def __iter__(self):
+        return iter(self.tenants.values())
+
+    def __len__(self):
+        return len(self.tenants)
+
+
+def apply_quotas(tenant):
+    """quotas={"sheets": {"rate": 1.0, "burst": 5}, ...} -> resilience policies scoped to the tenant"""
+    for service, overrides in (tenant.quotas or {}).items():
+        resilience.configure_scoped(tenant.tenant_id, service, **overrides)
+
+
+def registry_from_env():
+    """TENANTS_FILE (default ./tenants.json); without it only the default tenant exists"""
+    path = os.getenv("TENANTS_FILE", "tenants.json")
+    if os.path.exists(path):
+        return TenantRegistry.from_file(path)
+    return TenantRegistry([])
+
+
+_registry = None
+_registry_lock = threading.Lock()
+_current_tenant = contextvars.ContextVar("current_tenant", default=None)
+
+
+def registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = registry_from_env()
+        return _registry
+
+
+def set_registry(new_registry):
+    global _registry
+    with _registry_lock:
+        _registry = new_registry
+
+
+def current_tenant():
+    return _current_tenant.get() or registry().default
+
+
+@contextmanager
+def tenant_scope(tenant):
+    """Run the block as `tenant` (a Tenant or tenant ID), including its resilience quotas"""
+    if not isinstance(tenant, Tenant):
+        tenant = registry().get(tenant)
+    token = _current_tenant.set(tenant)
+    try:
+        with resilience.scoped(tenant.tenant_id):
+            yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+class TenantLocal:
+    """One `factory(tenant)` instance per tenant, reached through attribute access on this proxy"""
+
+    __slots__ = ("_factory", "_instances", "_lock")
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instances", {})
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def instance(self, tenant=None):
+        tenant = tenant or current_tenant()
+        with self._lock:
+            if tenant.tenant_id not in self._instances:
+                self._instances[tenant.tenant_id] = self._factory(tenant)
+            return self._instances[tenant.tenant_id]
+
+    def __getattr__(self, name):
+        return getattr(self.instance(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.instance(), name, value)
+
+    def discard(self, tenant=None):
+        """Drop one tenant's instance (default: the current tenant); the next access builds a fresh one"""
+        tenant = tenant or current_tenant()
+        with self._lock:
+            self._instances.pop(tenant.tenant_id, None)
+
+    def reset(self):
+        with self._lock:
+            self._instances.clear()
+
+
+class ClientPool:
+    """Long-lived clients per (tenant, kind), built once by registered factories.
+
+    Credentials, authorized gspread clients, opened spreadsheets and Gmail
+    services are expensive to create; the pool keeps one of each per tenant
+    for the life of the process.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def register(self, kind, factory):
+        """factory(tenant) -> client"""
+        self._factories[kind] = factory
+
+    def get(self, kind, tenant=None):
+        tenant = tenant or current_tenant()
+        key = (tenant.tenant_id, kind)
+        with self._lock:
+            client = self._clients.get(key)
+        if client is None:
+            client = self._factories[kind](tenant)  # Outside the lock: factories may use other pooled clients
+            with self._lock:
+                client = self._clients.setdefault(key, client)
+        return client
+
+    def warm(self, kinds, tenants):
+        """Build clients ahead of the first request; returns {(tenant_id, kind): error} for failures"""
+        failures = {}
+        for tenant in tenants:
+            for kind in kinds:
+                try:
+                    self.get(kind, tenant)
+                except Exception as e:
+                    failures[(tenant.tenant_id, kind)] = e
+        return failures
+
+    def reset(self, kind=None):
+        with self._lock:
+            if kind is None:
+                self._clients.clear()
+            else:
+                for key in [k for k in self._clients if k[1] == kind]:
+                    del self._clients[key]
+
+
+class TenantScheduler:
+    """Run job(tenant) for many tenants in parallel.
+
+    At most max_workers jobs run at once overall and each tenant's
+    max_concurrent_jobs per tenant; inside a job the tenant's quotas apply.
+    Results are {tenant_id: result}, with the exception as the result of a
+    failed job.
+    """
+
+    def __init__(self, max_workers=None, tenant_registry=None):
+        self.max_workers = max_workers or int(os.getenv("TENANT_WORKERS", "4"))
+        self._registry = tenant_registry
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    @property
+    def registry(self):
+        return self._registry or registry()
+
+    def _tenants(self, tenants):
+        if tenants is None:
+            return list(self.registry)
+        return [t if isinstance(t, Tenant) else self.registry.get(t) for t in tenants]
+
+    def _slot(self, tenant):
+        with self._lock:
+            if tenant.tenant_id not in self._slots:
+                self._slots[tenant.tenant_id] = threading.BoundedSemaphore(max(1, tenant.max_concurrent_jobs))
+            return self._slots[tenant.tenant_id]
+
+    def _run_one(self, job, tenant):
+        with self._slot(tenant), tenant_scope(tenant):
+            try:
+                return job(tenant)
+            except Exception as e:
+                print(f"[tenants] {tenant.tenant_id}: job failed: {e}")
+                return e
+
+    def run(self, job, tenants=None):
+        tenants = self._tenants(tenants)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tenant") as pool:
+            futures = {t.tenant_id: pool.submit(self._run_one, job, t) for t in tenants}
+        return {tenant_id: future.result() for tenant_id, future in futures.items()}
+
+    async def arun(self, job, tenants=None):
+        """Async run(): job(tenant) returns an awaitable; all tenants share one event loop"""
+        tenants = self._tenants(tenants)
+        overall = asyncio.Semaphore(self.max_workers)
+        per_tenant = {t.tenant_id: asyncio.Semaphore(max(1, t.max_concurrent_jobs)) for t in tenants}
+
+        async def run_one(tenant):
+            async with overall, per_tenant[tenant.tenant_id]:
+                with tenant_scope(tenant):
+                    try:
+                        return await job(tenant)
+                    except Exception as e:
+                        print(f"[tenants] {tenant.tenant_id}: job failed: {e}")
+                        return e
+
+        results = await asyncio.gather(*(run_one(t) for t in tenants))
+        return {t.tenant_id: r for t, r in zip(tenants, results)}
@@ -0,0 +1,10 @@
+# The modules live flat in the package directory; make them importable from tests/
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Spans and LLM run logs written by the code under test stay out of the working tree
+os.environ.setdefault("TELEMETRY_DIR", tempfile.mkdtemp(prefix="finance-agent-telemetry-"))
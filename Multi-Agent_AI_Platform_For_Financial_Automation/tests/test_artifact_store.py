@@ -0,0 +1,154 @@
+import io
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from artifact_store import ArtifactStore, LocalArtifactStore, S3ArtifactStore, normalize_name
+from benchmarks.fakes import FakeS3Client
+
+DAY = 86400
+
+
+def _age_local(store, seconds):
+    """Backdate every ref and blob of a LocalArtifactStore"""
+    for dirpath, _, filenames in os.walk(store.refs_dir):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path) as f:
+                ref = json.load(f)
+            ref["created_at"] = (datetime.fromisoformat(ref["created_at"]) - timedelta(seconds=seconds)).isoformat()
+            with open(path, "w") as f:
+                json.dump(ref, f)
+    for dirpath, _, filenames in os.walk(store.objects_dir):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            mtime = os.path.getmtime(path) - seconds
+            os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture(params=["local", "s3"])
+def store(request, tmp_path):
+    """(store, age(seconds)) for each backend; S3 runs against the in-memory MinIO stand-in"""
+    if request.param == "local":
+        local = LocalArtifactStore(str(tmp_path / "artifacts"))
+        return local, lambda seconds: _age_local(local, seconds)
+    client = FakeS3Client(page_size=2)
+    return (S3ArtifactStore("artifacts", prefix="tenant-a", client=client),
+            lambda seconds: client.age("artifacts", "", seconds))
+
+
+def _blob_count(s):
+    if isinstance(s, LocalArtifactStore):
+        return sum(len(files) for _, _, files in os.walk(s.objects_dir))
+    return len(list(s._iter_keys(f"{s.prefix}objects/")))
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("reports/x.pdf", "reports/x.pdf"),
+    ("./reports/x.pdf", "reports/x.pdf"),
+    ("././reports//./x.pdf", "reports/x.pdf"),
+    (".hidden/x.pdf", ".hidden/x.pdf"),
+    ("..data/x.pdf", "..data/x.pdf"),
+    ("reports\\x.pdf", "reports/x.pdf"),
+    ("/tmp/captures/workspace/x.pdf", "tmp/captures/workspace/x.pdf"),
+])
+def test_normalize_name(name, expected):
+    assert normalize_name(name) == expected
+
+
+@pytest.mark.parametrize("name", ["../x.pdf", "reports/../../x.pdf", "reports/..", "..\\x.pdf", "", "./"])
+def test_normalize_name_rejects_escapes(name):
+    with pytest.raises(ValueError):
+        normalize_name(name)
+
+
+def test_artifact_store_is_abstract():
+    with pytest.raises(TypeError):
+        ArtifactStore()
+
+    class Partial(ArtifactStore):
+        def put(self, name, src, content_type=None):
+            return "sha"
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_put_stat_open_and_dedup(store):
+    s, _ = store
+    sha = s.put_bytes("reports/a.pdf", b"same", content_type="application/pdf")
+    assert s.put("./reports/b.pdf", io.BytesIO(b"same")) == sha
+    assert s.stat("reports/a.pdf")["size"] == 4
+    assert s.read_bytes("reports/b.pdf") == b"same"
+    assert s.exists("reports/b.pdf") and not s.exists("reports/c.pdf")
+    assert _blob_count(s) == 1
+    with pytest.raises(FileNotFoundError):
+        s.open("reports/c.pdf")
+    with pytest.raises(ValueError):
+        s.put_bytes("../escape.pdf", b"x")
+
+
+def test_list_by_prefix_across_pages(store):
+    s, _ = store
+    for i in range(5):
+        s.put_bytes(f"payslips/payslip_{i}.pdf", str(i).encode())
+    s.put_bytes("reports/r.pdf", b"r")
+    assert s.list("payslips/") == [f"payslips/payslip_{i}.pdf" for i in range(5)]
+    assert s.list("./payslips/payslip_") == s.list("payslips/")
+    assert len(s.list()) == 6
+
+
+def test_delete_keeps_blob_until_retention(store):
+    s, age = store
+    s.put_bytes("a.pdf", b"a")
+    assert s.delete("a.pdf")
+    assert s.stat("a.pdf") is None and _blob_count(s) == 1
+    assert s.apply_retention(1) == 0
+    assert _blob_count(s) == 1  # Orphan, but within the grace period
+    age(2 * DAY)
+    s.apply_retention(1)
+    assert _blob_count(s) == 0
+
+
+def test_retention_drops_old_refs_and_old_orphans_only(store):
+    s, age = store
+    s.put_bytes("old/a.pdf", b"a")
+    s.put_bytes("old/shared.pdf", b"shared")
+    age(3 * DAY)
+    s.put_bytes("new/shared.pdf", b"shared")  # Still references the old blob
+    s.put_bytes("new/b.pdf", b"b")
+
+    assert s.apply_retention(2) == 2
+    assert s.list() == ["new/b.pdf", "new/shared.pdf"]
+    assert s.read_bytes("new/shared.pdf") == b"shared"
+    assert _blob_count(s) == 2  # "a" collected; "shared" and "b" still referenced
+
+
+def test_retention_respects_prefix(store):
+    s, age = store
+    s.put_bytes("payslips/p.pdf", b"p")
+    s.put_bytes("reports/r.pdf", b"r")
+    age(3 * DAY)
+    assert s.apply_retention(2, prefix="payslips/") == 1
+    assert s.list() == ["reports/r.pdf"]
+
+
+def test_retention_skips_refs_deleted_meanwhile(store, monkeypatch):
+    s, age = store
+    s.put_bytes("kept.pdf", b"k")
+    age(3 * DAY)
+    names = s.list()
+    monkeypatch.setattr(s, "list", lambda prefix="": names + ["vanished.pdf"])
+    assert s.apply_retention(30) == 0
+    assert s.read_bytes("kept.pdf") == b"k"
+
+
+def test_fake_s3_reports_missing_keys_like_s3():
+    client = FakeS3Client()
+    store = S3ArtifactStore("artifacts", client=client)
+    assert store.stat("nope.pdf") is None
+    with pytest.raises(Exception) as error:
+        client.get_object(Bucket="missing", Key="x")
+    assert error.value.response["Error"]["Code"] == "NoSuchBucket"
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from checkpoints import CheckpointLog, UnitBusyError
+
+RUN, UNIT = "payslips:2025-06", "email:E1"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "checkpoints.sqlite3")
+
+
+@pytest.fixture
+def log(path):
+    log = CheckpointLog(path)
+    yield log
+    log.close()
+
+
+def crash_mid_send(path, **pending):
+    """Leave UNIT pending the way a process killed during the send does"""
+    crashed = CheckpointLog(path, lease_seconds=0)
+    crashed.claim(RUN, UNIT, "crashed-worker", **pending)
+    crashed.close()
+
+
+def test_run_once_runs_action_then_skips(log):
+    calls = []
+    assert log.run_once(RUN, UNIT, lambda: calls.append(1) or {"gmail_id": "g1"})
+    assert not log.run_once(RUN, UNIT, lambda: calls.append(2))
+    assert calls == [1]
+    assert log.get(RUN, UNIT) == ("done", {"gmail_id": "g1"})
+
+
+@pytest.mark.parametrize("shared", [True, False], ids=["one-log", "two-connections"])
+def test_concurrent_claims_run_the_action_once(path, shared):
+    logs = [CheckpointLog(path)] * 2 if shared else [CheckpointLog(path), CheckpointLog(path)]
+    start = threading.Barrier(2)
+    sent, outcomes = [], []
+
+    def send():
+        sent.append(threading.current_thread().name)
+        time.sleep(0.1)  # Hold the claim while the other run tries
+        return {}
+
+    def worker(log):
+        start.wait()
+        try:
+            outcomes.append(log.run_once(RUN, UNIT, send))
+        except UnitBusyError:
+            outcomes.append("busy")
+
+    threads = [threading.Thread(target=worker, args=(log,)) for log in logs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(sent) == 1
+    assert sorted(outcomes, key=str) == [True, "busy"]
+    assert logs[0].is_done(RUN, UNIT)
+    for log in set(logs):
+        log.close()
+
+
+def test_busy_unit_is_retried_after_it_finishes(path):
+    first, second = CheckpointLog(path), CheckpointLog(path)
+    first.claim(RUN, UNIT, "worker-1")
+    with pytest.raises(UnitBusyError):
+        second.run_once(RUN, UNIT, lambda: {})
+    first.mark_done(RUN, UNIT)
+    assert not second.run_once(RUN, UNIT, lambda: pytest.fail("sent twice"))
+    first.close()
+    second.close()
+
+
+def test_pending_unit_confirmed_on_resume_is_not_resent(log, path):
+    crash_mid_send(path, message_id="<m1@x>")
+    seen = []
+
+    def confirm(pending):
+        seen.append(pending)
+        return {"gmail_id": "g1", "confirmed": True}
+
+    assert not log.run_once(RUN, UNIT, lambda: pytest.fail("resent a delivered message"), confirm)
+    assert seen == [{"message_id": "<m1@x>"}]
+    assert log.get(RUN, UNIT) == ("done", {"gmail_id": "g1", "confirmed": True})
+
+
+def test_unconfirmed_pending_unit_is_sent_again(log, path):
+    crash_mid_send(path, message_id="<m1@x>")
+    assert log.run_once(RUN, UNIT, lambda: {"gmail_id": "g2"}, lambda pending: None)
+    assert log.get(RUN, UNIT) == ("done", {"gmail_id": "g2"})
+
+
+def test_failed_action_stays_pending_and_is_confirmed_by_the_next_run(log):
+    def fail():
+        raise TimeoutError("send timed out")
+
+    with pytest.raises(TimeoutError):
+        log.run_once(RUN, UNIT, fail, message_id="<m1@x>")
+    assert log.get(RUN, UNIT) == ("pending", {"message_id": "<m1@x>"})
+    # The lease was released, so the rerun confirms at once instead of waiting for it to lapse
+    assert not log.run_once(RUN, UNIT, lambda: pytest.fail("resent"), lambda pending: {"gmail_id": "g1"})
+    assert log.is_done(RUN, UNIT)
+
+
+def test_cancelled_action_releases_the_claim(log):
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(log.arun_once(RUN, UNIT, slow), 0.05)
+
+        async def confirm(pending):
+            return {"gmail_id": "g1"}
+
+        return await log.arun_once(RUN, UNIT, slow, confirm)
+
+    assert asyncio.run(main()) is False
+    assert log.is_done(RUN, UNIT)
+
+
+def test_async_concurrent_claims_run_the_action_once(path):
+    first, second = CheckpointLog(path), CheckpointLog(path)
+    sent = []
+
+    async def send():
+        sent.append(1)
+        await asyncio.sleep(0.05)
+        return {}
+
+    async def main():
+        return await asyncio.gather(first.arun_once(RUN, UNIT, send), second.arun_once(RUN, UNIT, send),
+                                    return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    assert sent == [1]
+    assert outcomes[0] is True and isinstance(outcomes[1], UnitBusyError)
+    first.close()
+    second.close()
+
+
+def test_disabled_log_always_runs(tmp_path):
+    log = CheckpointLog(str(tmp_path / "unused.sqlite3"), enabled=False)
+    calls = []
+    assert log.run_once(RUN, UNIT, lambda: calls.append(1))
+    assert log.run_once(RUN, UNIT, lambda: calls.append(2))
+    assert calls == [1, 2]
+
+
+def test_files_without_claim_columns_are_migrated(path):
+    import sqlite3
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE units (run_id TEXT NOT NULL, unit TEXT NOT NULL, status TEXT NOT NULL, "
+                 "detail TEXT, updated_at TEXT NOT NULL, PRIMARY KEY (run_id, unit))")
+    conn.execute("INSERT INTO units VALUES (?, ?, 'pending', '{}', '2025-06-01T00:00:00')", (RUN, UNIT))
+    conn.commit()
+    conn.close()
+    log = CheckpointLog(path)
+    assert not log.run_once(RUN, UNIT, lambda: pytest.fail("resent"), lambda pending: {"gmail_id": "g1"})
+    log.close()
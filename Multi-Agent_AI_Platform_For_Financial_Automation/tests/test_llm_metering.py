@@ -0,0 +1,158 @@
+import itertools
+import json
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+import llm_metering
+import resilience
+from instrumentation import span
+from llm_metering import LLMMeter, estimate_cost, format_usage_report, percentile
+
+MODEL = "llama3-70b-8192"
+_services = itertools.count()
+
+
+@pytest.mark.parametrize("values, q, expected", [
+    ([1, 2, 3, 4], 50, 2),          # ceil(0.5 * 4) = 2nd smallest
+    ([1, 2, 3, 4, 5], 50, 3),
+    ([1, 2, 3, 4], 25, 1),
+    ([1, 2, 3, 4], 75, 3),
+    ([1, 2, 3, 4], 100, 4),
+    ([1, 2, 3, 4], 0, 1),
+    (list(range(1, 21)), 95, 19),   # ceil(19.0) = 19, not the maximum
+    (list(range(1, 101)), 95, 95),
+    (list(range(1, 101)), 99, 99),
+    ([7], 95, 7),
+    ([3, 1, 2], 50, 2),             # Input order does not matter
+])
+def test_percentile_is_nearest_rank(values, q, expected):
+    assert percentile(values, q) == expected
+
+
+def test_percentile_of_nothing_is_none():
+    assert percentile([], 95) is None
+
+
+# ---------- LLMMeter ----------
+@pytest.fixture
+def meter(tmp_path):
+    return LLMMeter(history_size=2, log_path=str(tmp_path / "llm_runs.jsonl"))
+
+
+def token_usage_result(prompt, completion, model=MODEL):
+    """LLMResult as ChatGroq reports it: llm_output token_usage and model_name"""
+    return LLMResult(generations=[[ChatGeneration(message=AIMessage(content="ok"))]],
+                     llm_output={"token_usage": {"prompt_tokens": prompt, "completion_tokens": completion},
+                                 "model_name": model})
+
+
+def usage_metadata_result(prompt, completion):
+    """LLMResult without llm_output; tokens only on the message's usage_metadata"""
+    message = AIMessage(content="ok", usage_metadata={"input_tokens": prompt, "output_tokens": completion,
+                                                      "total_tokens": prompt + completion})
+    return LLMResult(generations=[[ChatGeneration(message=message)]])
+
+
+def llm_call(meter, result, model=MODEL):
+    run_id = uuid.uuid4()
+    meter.on_chat_model_start({"name": "ChatGroq"}, [[]], run_id=run_id,
+                              invocation_params={"model_name": model})
+    if isinstance(result, Exception):
+        meter.on_llm_error(result, run_id=run_id)
+    else:
+        meter.on_llm_end(result, run_id=run_id)
+
+
+def test_calls_are_bucketed_per_tool(meter):
+    with meter.run("task") as usage:
+        with span("GenerateReport", "tool"):
+            llm_call(meter, token_usage_result(1000, 200))
+            with span("groq.invoke", "llm"):  # Inner non-tool spans still count for the tool
+                llm_call(meter, usage_metadata_result(300, 50))
+        with span("route_task"):
+            llm_call(meter, token_usage_result(100, 5))
+        llm_call(meter, token_usage_result(400, 40))
+    summary = usage.summary()
+    assert set(summary["by_tool"]) == {"GenerateReport", "router", "agent"}
+    report = summary["by_tool"]["GenerateReport"]
+    assert (report["calls"], report["prompt_tokens"], report["completion_tokens"]) == (2, 1300, 250)
+    assert summary["by_tool"]["router"]["total_tokens"] == 105
+    assert (summary["calls"], summary["total_tokens"]) == (4, 1300 + 250 + 105 + 440)
+    assert summary["models"] == {MODEL: 4}
+
+
+def test_latency_percentiles_per_bucket(meter, monkeypatch):
+    clock = iter([0.0, 1.0, 10.0, 12.0, 20.0, 23.0])  # start/end pairs: 1s, 2s, 3s
+    monkeypatch.setattr(llm_metering.time, "perf_counter", lambda: next(clock))
+    with meter.run("task") as usage:
+        for _ in range(3):
+            llm_call(meter, token_usage_result(10, 1))
+    agent = usage.summary()["by_tool"]["agent"]
+    assert agent["latency_seconds"] == 6.0
+    assert (agent["latency_p50"], agent["latency_p95"], agent["latency_p99"]) == (2.0, 3.0, 3.0)
+
+
+def test_cost_comes_from_the_pricing_table(meter, monkeypatch):
+    monkeypatch.setitem(llm_metering.PRICING, "priced-model", (2.0, 10.0))
+    with meter.run("task") as usage:
+        llm_call(meter, token_usage_result(500_000, 100_000, model="priced-model"))
+        llm_call(meter, token_usage_result(1_000_000, 1_000_000, model="unpriced-model"))
+    assert usage.summary()["cost_usd"] == pytest.approx(0.5 * 2.0 + 0.1 * 10.0)
+    assert estimate_cost("unpriced-model", 10, 10) == 0.0
+
+
+def test_model_falls_back_to_invocation_params(meter, monkeypatch):
+    monkeypatch.setitem(llm_metering.PRICING, "fast-model", (1.0, 1.0))
+    with meter.run("task") as usage:
+        llm_call(meter, usage_metadata_result(1_000_000, 0), model="fast-model")
+    assert usage.summary()["models"] == {"fast-model": 1}
+    assert usage.summary()["cost_usd"] == pytest.approx(1.0)
+
+
+def test_errors_are_counted(meter):
+    with meter.run("task") as usage:
+        with span("SendPayslips", "tool"):
+            llm_call(meter, RuntimeError("503"))
+    bucket = usage.summary()["by_tool"]["SendPayslips"]
+    assert (bucket["calls"], bucket["errors"], bucket["total_tokens"]) == (1, 1, 0)
+
+
+def test_retries_are_counted_through_the_retry_listener(meter):
+    service = f"groq-test-{next(_services)}"
+    resilience.configure(service, rate=None, max_attempts=3, base_delay=0.0, max_delay=0.0,
+                         failure_threshold=10)
+    resilience.add_retry_listener(lambda name, error: name == service and meter.record_retry())
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    with meter.run("task") as usage:
+        with span("GenerateReport", "tool"):
+            assert resilience.call(service, flaky) == "ok"
+    assert usage.summary()["by_tool"]["GenerateReport"]["retries"] == 2
+    assert usage.summary()["retries"] == 2
+
+
+def test_calls_outside_a_run_are_ignored(meter):
+    llm_call(meter, token_usage_result(10, 1))
+    meter.record_retry()
+    assert meter.recent_runs() == []
+
+
+def test_runs_are_kept_in_history_and_logged(meter):
+    for name in ("first", "second", "third"):
+        with meter.run(name):
+            llm_call(meter, token_usage_result(10, 1))
+    assert [run["run"] for run in meter.recent_runs()] == ["second", "third"]  # history_size=2
+    with open(meter.log_path) as f:
+        logged = [json.loads(line) for line in f]
+    assert [run["run"] for run in logged] == ["first", "second", "third"]
+    assert logged[0]["total_tokens"] == 11
+    assert "LLM usage for third" in format_usage_report(logged[-1])
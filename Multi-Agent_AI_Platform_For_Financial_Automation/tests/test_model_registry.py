@@ -0,0 +1,90 @@
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from model_registry import ModelRegistry
+
+ROUTES = {"payroll", "invoice", "report", "procurement"}
+
+
+def no_remote_models(model_name):
+    raise AssertionError(f"tried to build {model_name}; every tier should be a local stand-in")
+
+
+def registry_with(fast, large, **kwargs):
+    """Both tiers served by local stand-ins that answer from a fixed list"""
+    registry = ModelRegistry(no_remote_models, **kwargs)
+    registry.register("fast", FakeListChatModel(responses=fast))
+    registry.register("large", FakeListChatModel(responses=large))
+    return registry
+
+
+def route(model):
+    return model.invoke("Classify: send this month's payslips").content.strip().lower()
+
+
+def is_route(answer):
+    return answer in ROUTES
+
+
+def test_valid_fast_answer_is_not_escalated():
+    registry = registry_with(fast=["payroll"], large=["invoice"])
+    assert registry.invoke("router", route, validate=is_route) == "payroll"
+    assert registry.escalations == {}
+
+
+def test_failed_validation_escalates_to_the_large_tier():
+    registry = registry_with(fast=["I think it is about salaries"], large=["payroll"])
+    assert registry.invoke("router", route, validate=is_route) == "payroll"
+    assert registry.escalations == {"router": 1}
+
+
+def test_escalations_are_counted_per_site():
+    registry = registry_with(fast=["?", "payroll", "?"], large=["payroll", "invoice"])
+    answers = [registry.invoke("router", route, validate=is_route) for _ in range(3)]
+    assert answers == ["payroll", "payroll", "invoice"]
+    registry.invoke("chart_insight", lambda model: model.invoke("x").content)  # No validator: never escalates
+    assert registry.escalations == {"router": 2}
+
+
+def test_last_tier_result_is_returned_even_if_invalid():
+    registry = registry_with(fast=["?"], large=["still unsure"])
+    assert registry.invoke("router", route, validate=is_route) == "still unsure"
+    assert registry.escalations == {"router": 1}
+
+
+def test_large_tier_sites_do_not_escalate():
+    registry = registry_with(fast=["payroll"], large=["?"])
+    assert registry.invoke("financial_summary", route, validate=is_route) == "?"
+    assert registry.escalations == {}
+
+
+def test_async_escalation():
+    registry = registry_with(fast=["?"], large=["report"])
+
+    async def aroute(model):
+        return (await model.ainvoke("Classify: annual report")).content.strip().lower()
+
+    assert asyncio.run(registry.ainvoke("router", aroute, validate=is_route)) == "report"
+    assert registry.escalations == {"router": 1}
+
+
+def test_models_are_built_lazily_once_per_tier():
+    built = []
+
+    def factory(name):
+        built.append(name)
+        return FakeListChatModel(responses=["payroll"])
+
+    registry = ModelRegistry(factory, models={"fast": "small-model", "large": "big-model"})
+    for _ in range(3):
+        registry.invoke("router", route, validate=is_route)
+    assert built == ["small-model"]
+
+
+def test_call_site_tier_can_be_overridden_from_the_environment(monkeypatch):
+    monkeypatch.setenv("LLM_TIER_ROUTER", "large")
+    registry = registry_with(fast=["invoice"], large=["payroll"])
+    assert registry.tier_for("router") == "large"
+    assert registry.invoke("router", route, validate=is_route) == "payroll"
+    assert registry.tier_for("unknown_site") == "large"
@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, TokenBucket, retry_after_seconds
+
+_names = itertools.count()
+
+
+class HTTPError(Exception):
+    """Shaped like an httpx / requests error: .response.status_code and .response.headers"""
+
+    def __init__(self, status, headers=None, message=""):
+        super().__init__(message or f"HTTP {status}")
+        self.response = SimpleNamespace(status_code=status, headers=headers or {})
+
+
+def configure(**overrides):
+    """A fresh process-wide policy under a unique service name, without rate limits or real sleeps"""
+    settings = {"rate": None, "burst": 1, "max_attempts": 1, "base_delay": 0.0, "max_delay": 0.0,
+                "failure_threshold": 1, "reset_timeout": 0.05}
+    settings.update(overrides)
+    name = f"test-{next(_names)}"
+    return name, resilience.configure(name, **settings)
+
+
+def fail():
+    raise ConnectionError("down")
+
+
+def trip(name):
+    with pytest.raises(ConnectionError):
+        resilience.call(name, fail)
+
+
+# ---------- Circuit breaker ----------
+def test_breaker_opens_after_threshold_and_rejects_without_calling():
+    name, _ = configure(failure_threshold=2, reset_timeout=60)
+    trip(name)
+    trip(name)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        resilience.call(name, calls.append, 1)
+    assert calls == []
+
+
+def test_half_open_trial_success_closes_the_breaker():
+    name, policy = configure()
+    trip(name)
+    time.sleep(0.06)
+    assert resilience.call(name, lambda: "ok") == "ok"
+    assert policy.breaker.state == "closed"
+
+
+def test_half_open_trial_failure_reopens():
+    name, policy = configure()
+    trip(name)
+    time.sleep(0.06)
+    trip(name)
+    assert policy.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        resilience.call(name, lambda: "ok")
+
+
+def test_only_one_half_open_trial_at_a_time():
+    breaker = CircuitBreaker("x", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    trial = breaker.before_call()
+    assert trial is not None
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.release_trial(trial)
+    assert breaker.before_call() is not None
+
+
+def test_cancelled_trial_is_released():
+    name, policy = configure()
+    trip(name)
+    time.sleep(0.06)
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(resilience.acall(name, slow), 0.05)
+
+    asyncio.run(main())
+    assert resilience.call(name, lambda: "ok") == "ok"
+    assert policy.breaker.state == "closed"
+
+
+def test_interrupted_trial_is_released():
+    name, _ = configure()
+    trip(name)
+    time.sleep(0.06)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        resilience.call(name, interrupted)
+    assert resilience.call(name, lambda: "ok") == "ok"
+
+
+def test_stale_release_does_not_end_a_newer_trial():
+    breaker = CircuitBreaker("x", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    first = breaker.before_call()
+    breaker.record_failure()  # The first trial failed and reopened the breaker
+    second = breaker.before_call()
+    breaker.release_trial(first)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.release_trial(second)
+
+
+def test_client_errors_do_not_trip_the_breaker():
+    name, policy = configure()
+
+    def bad_request():
+        raise HTTPError(400)
+
+    for _ in range(3):
+        with pytest.raises(HTTPError):
+            resilience.call(name, bad_request)
+    assert policy.breaker.state == "closed"
+
+
+def test_retryable_errors_are_retried_up_to_max_attempts():
+    name, _ = configure(max_attempts=3, failure_threshold=10)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise HTTPError(503)
+        return "ok"
+
+    assert resilience.call(name, flaky) == "ok"
+    assert len(attempts) == 3
+
+
+# ---------- Retry-After ----------
+@pytest.mark.parametrize("error, expected", [
+    (HTTPError(429, {"retry-after": "7"}), 7.0),
+    (HTTPError(429, {"Retry-After": "1.5"}), 1.5),
+    (HTTPError(429, {"x-ratelimit-reset-requests": "3"}), 3.0),
+    (Exception("Rate limit reached. Please try again in 7.5s."), 7.5),
+    (Exception("Please try again in 1m2.5s"), 62.5),
+    (Exception("Please try again in 250ms"), 0.25),
+    (HTTPError(429), None),
+    (Exception("boom"), None),
+])
+def test_retry_after_seconds(error, expected):
+    assert retry_after_seconds(error) == (None if expected is None else pytest.approx(expected))
+
+
+def test_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    seconds = retry_after_seconds(HTTPError(429, {"Retry-After": format_datetime(when, usegmt=True)}))
+    assert 25 < seconds <= 30
+
+
+def test_retry_after_in_the_past_is_zero():
+    when = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert retry_after_seconds(HTTPError(503, {"Retry-After": format_datetime(when, usegmt=True)})) == 0.0
+
+
+# ---------- Rate limiting ----------
+def test_bucket_charges_debt_beyond_the_burst():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket._reserve() == 0
+    assert bucket._reserve() == 0
+    assert bucket._reserve() == pytest.approx(0.1, abs=0.01)
+
+
+def test_rate_limit_pauses_the_bucket_for_retry_after():
+    _, policy = configure(base_delay=0.0, max_delay=60)
+    delay = policy.backoff(1, HTTPError(429, {"retry-after": "5"}))
+    assert delay == pytest.approx(5.0)
+    assert policy.bucket._reserve() == pytest.approx(5.0, abs=0.1)
+
+
+def test_server_error_with_retry_after_does_not_pause_the_bucket():
+    _, policy = configure(max_delay=60)
+    assert policy.backoff(1, HTTPError(503, {"retry-after": "5"})) == pytest.approx(5.0)
+    assert policy.bucket._reserve() == 0
+
+
+def test_scoped_rate_limit_pauses_the_process_wide_bucket_too():
+    name, shared = configure()
+    scoped = resilience.configure_scoped("tenant-a", name, rate=None, max_delay=60, base_delay=0.0)
+    scoped.backoff(1, HTTPError(429, {"retry-after": "4"}))
+    assert scoped.bucket._reserve() == pytest.approx(4.0, abs=0.1)
+    assert shared.bucket._reserve() == pytest.approx(4.0, abs=0.1)
+    with resilience.scoped("tenant-a"):
+        assert resilience.policy(name) is scoped
+    assert resilience.policy(name) is shared
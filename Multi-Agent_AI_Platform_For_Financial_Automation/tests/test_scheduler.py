@@ -0,0 +1,172 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from scheduler import CronSpec, Schedule, Scheduler
+from tenants import Tenant, TenantRegistry
+
+DAILY = Schedule("daily", "payroll", "0 6 * * *", stagger_seconds=30)
+START = datetime(2025, 1, 1)
+
+
+# ---------- Cron expressions ----------
+@pytest.mark.parametrize("expr, day, expected", [
+    ("0 6 L * *", date(2025, 1, 31), True),
+    ("0 6 L * *", date(2025, 1, 30), False),
+    ("0 6 L * *", date(2024, 2, 29), True),           # Leap year
+    ("0 6 L * *", date(2025, 2, 28), True),
+    ("0 6 15,L * *", date(2025, 4, 15), True),
+    ("0 6 15,L * *", date(2025, 4, 30), True),
+    ("0 8 * * 1-5", date(2025, 6, 13), True),         # Friday
+    ("0 8 * * 1-5", date(2025, 6, 14), False),        # Saturday
+    ("0 8 * * mon-fri", date(2025, 6, 16), True),
+    ("0 8 * * 7", date(2025, 6, 15), True),           # 7 is Sunday, as is 0
+    ("0 8 * * 0", date(2025, 6, 15), True),
+    ("0 7 2 1 *", date(2025, 1, 2), True),
+    ("0 7 2 1 *", date(2025, 2, 2), False),
+    ("0 7 2 jan *", date(2025, 1, 2), True),
+    ("0 7 1-7/3 * *", date(2025, 3, 4), True),        # 1, 4, 7
+    ("0 7 1-7/3 * *", date(2025, 3, 5), False),
+    # A restricted day-of-month and day-of-week match when either does
+    ("0 0 1 * 1", date(2025, 6, 1), True),            # The 1st, a Sunday
+    ("0 0 1 * 1", date(2025, 6, 2), True),            # A Monday
+    ("0 0 1 * 1", date(2025, 6, 3), False),
+    ("0 0 * * 1", date(2025, 6, 1), False),           # Day-of-month "*" leaves day-of-week alone
+    ("0 0 1 * *", date(2025, 6, 2), False),
+])
+def test_cron_matches_date(expr, day, expected):
+    assert CronSpec(expr).matches_date(day) is expected
+
+
+@pytest.mark.parametrize("expr", ["0 6 * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * 5-1 * *",
+                                  "* * * 13 *", "*/0 * * * *"])
+def test_invalid_cron_expressions_raise(expr):
+    with pytest.raises(ValueError):
+        CronSpec(expr)
+
+
+def test_slots_are_exclusive_of_after_and_inclusive_of_until():
+    spec = CronSpec("*/30 9-10 * * *")
+    slots = list(spec.slots(datetime(2025, 1, 1, 9, 0), datetime(2025, 1, 1, 10, 30)))
+    assert slots == [datetime(2025, 1, 1, 9, 30), datetime(2025, 1, 1, 10, 0), datetime(2025, 1, 1, 10, 30)]
+
+
+# ---------- Scheduler ----------
+class Runner:
+    def __init__(self, status="success"):
+        self.status = status
+        self.calls = []
+
+    def __call__(self, pipeline, tenant_id, as_of):
+        self.calls.append((pipeline, tenant_id, as_of))
+        return {"status": self.status, "steps": []}
+
+
+@pytest.fixture
+def registry():
+    return TenantRegistry([Tenant("acme"), Tenant("globex")])
+
+
+@pytest.fixture
+def make_scheduler(tmp_path, registry):
+    made = []
+
+    def make(runner=None, **kwargs):
+        kwargs.setdefault("retry_seconds", 0)
+        scheduler = Scheduler([DAILY], runner or Runner(), path=str(tmp_path / "scheduler.sqlite3"),
+                              tenant_registry=registry, **kwargs)
+        made.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in made:
+        scheduler.close()
+
+
+def slots_of(scheduler):
+    return sorted({(job.slot, job.tenant) for job in scheduler.jobs()})
+
+
+def test_first_tick_starts_from_now(make_scheduler):
+    scheduler = make_scheduler()
+    assert scheduler.enqueue_due(START) == 0
+    assert scheduler.enqueue_due(START + timedelta(hours=7)) == 2  # 06:00 for both tenants
+
+
+def test_catch_up_is_bounded_and_never_repeats(make_scheduler):
+    scheduler = make_scheduler(max_catchup=2)
+    scheduler.enqueue_due(START)
+    assert scheduler.enqueue_due(START + timedelta(days=9)) == 4
+    assert slots_of(scheduler) == [("2025-01-08T06:00:00", "acme"), ("2025-01-08T06:00:00", "globex"),
+                                   ("2025-01-09T06:00:00", "acme"), ("2025-01-09T06:00:00", "globex")]
+    assert scheduler.enqueue_due(START + timedelta(days=9)) == 0
+
+
+def test_tenants_are_staggered(make_scheduler):
+    scheduler = make_scheduler()
+    scheduler.enqueue_due(START)
+    now = START + timedelta(hours=7)
+    scheduler.enqueue_due(now)
+    run_at = {job.tenant: job.run_at for job in scheduler.jobs()}
+    assert run_at == {"acme": now.isoformat(), "globex": (now + timedelta(seconds=30)).isoformat()}
+
+
+def test_jobs_run_as_of_their_slot(make_scheduler):
+    runner = Runner()
+    scheduler = make_scheduler(runner)
+    scheduler.enqueue_due(START)
+    scheduler.enqueue_due(START + timedelta(days=1))
+    assert scheduler.dispatch(START + timedelta(days=2)) == 2
+    scheduler.wait()
+    assert sorted(runner.calls) == [("payroll", "acme", datetime(2025, 1, 1, 6)),
+                                    ("payroll", "globex", datetime(2025, 1, 1, 6))]
+    assert scheduler.counts() == {"done": 2}
+
+
+def test_failed_jobs_are_retried_then_fail(make_scheduler):
+    runner = Runner(status="error")
+    scheduler = make_scheduler(runner, max_attempts=2)
+    scheduler.backfill("daily", datetime(2025, 1, 1), datetime(2025, 1, 1, 23, 59), tenant_ids=["acme"], now=START)
+    scheduler.dispatch(START + timedelta(days=1))
+    scheduler.wait()
+    assert scheduler.counts() == {"pending": 1}
+    scheduler.dispatch(datetime.now())  # Retries are scheduled on the real clock
+    scheduler.wait()
+    assert scheduler.counts() == {"failed": 1}
+    assert len(runner.calls) == 2
+
+
+def test_backfill_enqueues_every_slot_once(make_scheduler):
+    scheduler = make_scheduler()
+    assert scheduler.backfill("daily", datetime(2025, 1, 1), datetime(2025, 1, 3, 23, 59), now=START) == 6
+    assert scheduler.backfill("daily", datetime(2025, 1, 1), datetime(2025, 1, 3, 23, 59), now=START) == 0
+    assert scheduler.backfill("daily", datetime(2025, 1, 2, 6), datetime(2025, 1, 2, 6),
+                              tenant_ids=["acme"], now=START) == 0
+    assert scheduler.backfill("daily", datetime(2025, 1, 2, 6), datetime(2025, 1, 2, 6),
+                              tenant_ids=["acme"], force=True, now=START) == 1
+
+
+def test_backfill_leaves_done_slots_alone_unless_forced(make_scheduler):
+    runner = Runner()
+    scheduler = make_scheduler(runner)
+    scheduler.backfill("daily", datetime(2025, 1, 1), datetime(2025, 1, 1, 23, 59), tenant_ids=["acme"], now=START)
+    scheduler.dispatch(START)
+    scheduler.wait()
+    scheduler.backfill("daily", datetime(2025, 1, 1), datetime(2025, 1, 1, 23, 59), tenant_ids=["acme"], now=START)
+    assert scheduler.dispatch(START) == 0
+    scheduler.backfill("daily", datetime(2025, 1, 1), datetime(2025, 1, 1, 23, 59), tenant_ids=["acme"],
+                       force=True, now=START)
+    assert scheduler.dispatch(START) == 1
+    scheduler.wait()
+    assert len(runner.calls) == 2
+
+
+@pytest.mark.parametrize("attempts, expected", [(1, "pending"), (3, "failed")])
+def test_interrupted_jobs_are_requeued_until_out_of_attempts(make_scheduler, attempts, expected):
+    scheduler = make_scheduler(max_attempts=3)
+    scheduler.backfill("daily", datetime(2025, 1, 1), datetime(2025, 1, 1, 23, 59), tenant_ids=["acme"], now=START)
+    scheduler.conn.execute("UPDATE jobs SET status = 'running', attempts = ?", (attempts,))
+    scheduler.close()  # As if the process died mid-run
+
+    restarted = make_scheduler(max_attempts=3)
+    assert restarted.counts() == {expected: 1}
@@ -0,0 +1,134 @@
+import pandas as pd
+import pytest
+
+from sheet_schemas import SchemaError, clean_numeric, parse_sheet
+
+
+def invoice(**overrides):
+    row = {"invoice_id": "INV-1", "customer_name": "Acme", "customer_email": "ap@acme.test",
+           "date": "2025-05-01", "due_date": "2025-05-31", "amount": "1,250.50", "status": "unpaid"}
+    row.update(overrides)
+    return row
+
+
+def employee(**overrides):
+    row = {"employee_id": "E1", "name": "Ana", "email": "ana@corp.test", "base_salary": "120,000"}
+    row.update(overrides)
+    return row
+
+
+# ---------- Coercion ----------
+@pytest.mark.parametrize("cell, expected", [
+    ("1,250.50", 1250.5),
+    ("PKR 1,000,000", 1_000_000.0),
+    ("Rs. 2,500", 2500.0),
+    ("$ 12,345.67", 12345.67),
+    ("(300)", -300.0),
+    (" 42 ", 42.0),
+    ("", 0.0),
+    ("-", 0.0),
+    (1500, 1500.0),
+])
+def test_money_cells(cell, expected):
+    frame = parse_sheet("Invoices", [invoice(amount=cell)])
+    assert frame["amount"].iloc[0] == pytest.approx(expected)
+    assert frame["amount"].dtype == "float64"
+
+
+def test_large_money_totals_keep_cent_precision():
+    frame = parse_sheet("Budgets", [{"Category": "IT", "Budget Amount": "123,456,789.01"}])
+    assert frame["Budget Amount"].iloc[0] == 123456789.01
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("2025-06-05", "2025-06-05"),
+    ("05/06/2025", "2025-06-05"),   # dd/mm/yyyy
+    ("13/06/2025", "2025-06-13"),
+    ("5 Jun 2025", "2025-06-05"),
+    ("June 5, 2025", "2025-06-05"),
+])
+def test_due_dates(cell, expected):
+    frame = parse_sheet("Invoices", [invoice(due_date=cell)])
+    assert frame["due_date"].iloc[0] == pd.Timestamp(expected)
+
+
+def test_empty_dates_are_missing_not_errors():
+    frame = parse_sheet("Invoices", [invoice(due_date="", date="")])
+    assert frame["due_date"].isna().all() and frame["date"].isna().all()
+
+
+def test_dtypes_are_compact():
+    frame = parse_sheet("Inventory", [{"Item": "Toner", "Category": "Office", "Current Stock": "1,200",
+                                       "Reorder Level": 50, "Supplier": "Acme"}])
+    assert frame["Current Stock"].dtype == "int32" and frame["Current Stock"].iloc[0] == 1200
+    assert isinstance(frame["Category"].dtype, pd.CategoricalDtype)
+    frame = parse_sheet("PO's", [{"Item": "Toner", "Category": "Office", "Qty": "2.5", "Price": "10"}])
+    assert frame["Qty"].dtype == "float32"
+
+
+def test_optional_columns_get_their_defaults():
+    frame = parse_sheet("Employees", [employee()])
+    assert frame["department"].iloc[0] == "Unassigned"
+    frame = parse_sheet("Attendance", [{"employee_id": "E1", "leaves_taken": 2}])
+    assert frame[["leaves_taken", "allowed_leaves", "overtime_hours"]].iloc[0].tolist() == [2, 0, 0]
+    frame = parse_sheet("PO's", [{"Item": "Toner", "Category": "Office", "Qty": 1, "Price": 10}])
+    assert frame["Vendor"].iloc[0] == "Unknown"
+
+
+def test_unknown_columns_are_kept():
+    frame = parse_sheet("Employees", [employee(notes="remote")])
+    assert frame["notes"].iloc[0] == "remote"
+
+
+def test_financial_year_columns_are_discovered_oldest_first():
+    frame = parse_sheet("Income_Statement", [{"Metric": "Revenue", "2024 (PKR)": "2,000", "2023 (PKR)": "1,500"}])
+    assert frame[["2023 (PKR)", "2024 (PKR)"]].iloc[0].tolist() == [1500.0, 2000.0]
+
+
+def test_clean_numeric_marks_unparseable_cells():
+    parsed = clean_numeric(pd.Series(["1,000", "n/a", "(5)"]))
+    assert parsed.iloc[0] == 1000 and pd.isna(parsed.iloc[1]) and parsed.iloc[2] == -5
+
+
+# ---------- Validation ----------
+def test_raise_reports_sheet_rows():
+    records = [invoice(), invoice(invoice_id="INV-2", amount="lots"), invoice(invoice_id="", due_date="soon")]
+    with pytest.raises(SchemaError) as raised:
+        parse_sheet("Invoices", records)
+    error = raised.value
+    assert error.sheet == "Invoices"
+    # Data row i is sheet row i + 2 (1-based, after the header)
+    assert error.errors == ["row 3: amount='lots' is not a number",
+                            "row 4: due_date='soon' is not a date",
+                            "row 4: invoice_id is empty"]
+    assert "Invalid data in 'Invoices' sheet: row 3" in str(error)
+
+
+def test_raise_on_invalid_integers():
+    with pytest.raises(SchemaError, match=r"row 2: Current Stock='2\.5' is not a valid integer"):
+        parse_sheet("Inventory", [{"Item": "Toner", "Category": "Office", "Current Stock": "2.5", "Reorder Level": 1}])
+
+
+def test_missing_required_columns_raise_even_when_dropping():
+    with pytest.raises(SchemaError, match="missing column"):
+        parse_sheet("Employees", [{"employee_id": "E1", "name": "Ana"}], errors="drop")
+
+
+def test_drop_removes_only_invalid_rows(capsys):
+    records = [invoice(), invoice(invoice_id="INV-2", due_date="31/31/2025"), invoice(invoice_id="INV-3")]
+    frame = parse_sheet("Invoices", records, errors="drop")
+    assert frame["invoice_id"].tolist() == ["INV-1", "INV-3"]
+    assert frame.index.tolist() == [0, 2]  # Index still points at the original records
+    assert "Dropping 1 invalid row(s) from 'Invoices'" in capsys.readouterr().out
+
+
+def test_many_errors_are_summarised():
+    records = [employee(employee_id=f"E{i}", base_salary="?") for i in range(12)]
+    with pytest.raises(SchemaError, match=r"\(\+2 more\)") as raised:
+        parse_sheet("Employees", records)
+    assert len(raised.value.errors) == 12
+
+
+def test_empty_sheet_has_the_schema_columns():
+    frame = parse_sheet("Invoices", [])
+    assert frame.empty and {"invoice_id", "due_date", "amount"} <= set(frame.columns)
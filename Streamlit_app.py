@@ -1,12 +1,49 @@
 import streamlit as st
 from PIL import Image
 import os, re, time, glob
+import pandas as pd
 from Fully_multi_agent import execute_task
 
+LLM_USAGE_HISTORY = 20  # runs kept in the rolling usage panel
+
 # ── helpers ─────────────────────────────────────────────────────────
 def remove_ansi(text: str) -> str:
     return re.sub(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])', '', text)
 
+def record_llm_usage(usage: dict):
+    runs = st.session_state.setdefault("llm_runs", [])
+    runs.append(usage)
+    del runs[:-LLM_USAGE_HISTORY]
+
+def render_llm_usage_panel(usage: dict):
+    runs = st.session_state.get("llm_runs", [])
+    with st.expander("💰 LLM Usage & Cost", expanded=False):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("LLM calls", usage["calls"], help=f"{usage['retries']} retries, {usage['errors']} errors")
+        c2.metric("Tokens", f"{usage['total_tokens']:,}",
+                  help=f"prompt {usage['prompt_tokens']:,} / completion {usage['completion_tokens']:,}")
+        c3.metric("Est. cost (USD)", f"${usage['cost_usd']:.4f}")
+        c4.metric("Latency p95", f"{usage['latency_p95'] or 0:.2f}s",
+                  help=f"p50 {usage['latency_p50'] or 0:.2f}s / p99 {usage['latency_p99'] or 0:.2f}s")
+
+        if usage["by_tool"]:
+            st.markdown("**This run, by tool**")
+            st.dataframe(pd.DataFrame.from_dict(usage["by_tool"], orient="index")[
+                ["calls", "retries", "prompt_tokens", "completion_tokens", "cost_usd",
+                 "latency_p50", "latency_p95", "latency_p99"]
+            ], use_container_width=True)
+
+        if len(runs) > 1:
+            st.markdown(f"**Last {len(runs)} runs**")
+            history = pd.DataFrame([
+                {"run": f"{i + 1}. {r['run']}", "prompt_tokens": r["prompt_tokens"],
+                 "completion_tokens": r["completion_tokens"], "cost_usd": r["cost_usd"]}
+                for i, r in enumerate(runs)
+            ]).set_index("run")
+            st.bar_chart(history[["prompt_tokens", "completion_tokens"]])
+            st.caption(f"Session total: {int(history[['prompt_tokens', 'completion_tokens']].values.sum()):,} tokens, "
+                       f"≈ ${history['cost_usd'].sum():.4f}")
+
 def run_and_render(prompt: str):
     start = time.time()
     with st.spinner("🤖 Thinking…"):
@@ -19,6 +56,11 @@ def run_and_render(prompt: str):
     output = result.get("output", result) if isinstance(result, dict) else result
     st.write(output)
 
+    usage = result.get("llm_usage") if isinstance(result, dict) else None
+    if usage:
+        record_llm_usage(usage)
+        render_llm_usage_panel(usage)
+
     trace = remove_ansi(result.get("trace_log", "")) if isinstance(result, dict) else ""
     if trace:
         with st.expander("🧠 Agent Reasoning Trace", expanded=True):